@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+annotation.py is part of Coquery.
+
+Copyright (c) 2016-2022 Gero Kunter (gero.kunter@coquery.org)
+
+Coquery is released under the terms of the GNU General Public License (v3).
+For details, see the file LICENSE that you should have received along
+with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides the AnnotationPipeline class that tokenizes, POS-tags
+and lemmatizes sentences with NLTK for the corpus installers.
+
+Sentences are annotated in batches by a pool of worker processes. Each
+worker loads the POS tagger and the WordNet lemmatizer only once, and
+remembers the lemmas of the word/POS pairs that it has already seen. The
+annotated sentences are returned in the same order as the input
+sentences, so that the installer can add the tokens to the corpus while
+later batches are still being annotated.
+"""
+
+from __future__ import unicode_literals
+
+import functools
+import itertools
+import multiprocessing
+import os
+import string
+
+DEFAULT_BATCH_SIZE = 100
+
+# The NLTK POS tagger produces some labels that are different from the
+# labels used in WordNet. This dictionary translates the first two
+# characters of the NLTK labels into WordNet labels:
+WORDNET_POS = {"NN": "n", "JJ": "a", "VB": "v", "RB": "r"}
+
+# the tagger and the lemmatizer of the current process:
+_tagger = None
+_lemmatizer = None
+
+
+def load_models():
+    """
+    Load the POS tagger and the WordNet lemmatizer of the current process.
+    """
+    global _tagger
+    global _lemmatizer
+    import nltk
+
+    if _tagger is None:
+        _tagger = nltk.tag.PerceptronTagger()
+    if _lemmatizer is None:
+        _lemmatizer = nltk.stem.wordnet.WordNetLemmatizer()
+
+
+def init_worker():
+    """
+    Initialize a worker process.
+
+    Errors are ignored here: a pool restarts worker processes whose
+    initializer fails over and over again. Instead, the error is raised
+    again when the first batch is annotated, and is passed on to the
+    installer.
+    """
+    try:
+        load_models()
+    except Exception:
+        pass
+
+
+@functools.lru_cache(maxsize=100000)
+def lemmatize(word, pos):
+    """
+    Return the lemma of the word.
+
+    Parameters
+    ----------
+    word : str
+        The word-form
+    pos : str
+        The NLTK POS tag of the word. If the tag can't be translated into
+        a WordNet label, the word-form is used as the lemma.
+
+    Returns
+    -------
+    lemma : str
+    """
+    try:
+        wordnet_pos = WORDNET_POS[pos.upper()[:2]]
+    except (KeyError, AttributeError):
+        return word
+    if _lemmatizer is None:
+        load_models()
+    try:
+        return _lemmatizer.lemmatize(word, pos=wordnet_pos)
+    except Exception:
+        return word
+
+
+def annotate_sentence(sentence):
+    """
+    Tokenize, tag and lemmatize a sentence.
+
+    Returns
+    -------
+    tokens : list
+        A list of tuples (token, pos, lemma). The lemma of punctuation
+        tokens is None.
+    """
+    import nltk
+
+    if _tagger is None:
+        load_models()
+    tokens = []
+    for token, pos in _tagger.tag(nltk.word_tokenize(sentence)):
+        if all(x in string.punctuation for x in token):
+            lemma = None
+        else:
+            lemma = lemmatize(token, pos)
+        tokens.append((token, pos, lemma))
+    return tokens
+
+
+def annotate_batch(sentences):
+    """
+    Annotate a list of sentences, and return the list of annotated
+    sentences.
+    """
+    return [annotate_sentence(sentence) for sentence in sentences]
+
+
+def iter_batches(iterable, size):
+    """
+    Yield lists with up to `size` items from the iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            break
+        yield batch
+
+
+class AnnotationPipeline(object):
+    """
+    Annotate sentences in a pool of worker processes.
+
+    The pipeline is used as a context manager. The worker processes are
+    started when entering the context, and are stopped when leaving it.
+
+    Parameters
+    ----------
+    workers : int
+        The number of worker processes. If None, one process is used for
+        each CPU. If 1, the sentences are annotated in the current process.
+    batch_size : int
+        The number of sentences that are sent to a worker at a time
+    annotate : callable
+        The function that annotates a list of sentences in the worker
+        processes
+    initializer : callable
+        The function that is called once in each worker process
+    """
+    def __init__(self, workers=None, batch_size=DEFAULT_BATCH_SIZE,
+                 annotate=annotate_batch, initializer=init_worker):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = max(1, int(batch_size))
+        self._annotate = annotate
+        self._initializer = initializer
+        self._pool = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._pool = multiprocessing.Pool(self.workers,
+                                              initializer=self._initializer)
+        elif self._initializer:
+            self._initializer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._pool is not None:
+            if exc_type is None:
+                self._pool.close()
+            else:
+                self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def annotate(self, sentences):
+        """
+        Yield the annotated sentences in the order of the input sentences.
+
+        Parameters
+        ----------
+        sentences : iterable
+            An iterable of sentence strings
+        """
+        batches = iter_batches(sentences, self.batch_size)
+        if self._pool is None:
+            results = map(self._annotate, batches)
+        else:
+            results = self._pool.imap(self._annotate, batches)
+        for batch in results:
+            for sentence in batch:
+                yield sentence
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+coltypes.py is part of Coquery.
+
+Copyright (c) 2016-2022 Gero Kunter (gero.kunter@coquery.org)
+
+Coquery is released under the terms of the GNU General Public License (v3).
+For details, see the file LICENSE that you should have received along
+with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides the functions that determine and set the data types
+of the columns in a results table.
+
+The type of a column is described by a kind (integer, float, boolean,
+string, or other values). If the corpus schema provides the SQL data type
+of a column, the kind is derived from that type. Otherwise, it is
+determined from the values in the column. For columns that already have a
+numeric or boolean dtype, this only requires looking at the dtype (and,
+for floats, at whether all values are whole numbers), so that the values
+don't have to be copied or converted just to find out their type.
+
+String columns can be stored as categorical columns. In a categorical
+column, each distinct string is stored only once, and the rows contain
+integer codes. As lexical columns such as word or lemma columns contain
+few distinct values compared to the number of rows, this reduces the
+memory used by the results table, and grouping and comparing the column
+only requires looking at the codes.
+"""
+
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+KIND_INT = "int"
+KIND_FLOAT = "float"
+KIND_BOOL = "bool"
+KIND_STR = "str"
+KIND_OBJECT = "object"
+
+_SQL_FLOAT_TYPES = ("FLOAT", "REAL", "DECIMAL", "NUMERIC", "DOUBLE")
+_SQL_STR_TYPES = ("CHAR", "VARCHAR", "TEXT", "TINYTEXT", "MEDIUMTEXT",
+                  "LONGTEXT", "ENUM", "SET")
+
+
+def get_sql_kind(data_type):
+    """
+    Return the kind that corresponds to an SQL data type, or None if the
+    data type is not known.
+
+    Parameters
+    ----------
+    data_type : str
+        A MySQL or SQLite data type description, e.g. 'VARCHAR(12) NOT
+        NULL' or 'MEDIUMINT'
+    """
+    if not data_type:
+        return None
+    base_type = str(data_type).split()[0].partition("(")[0].upper()
+    if base_type.endswith("INT") or base_type == "INTEGER":
+        return KIND_INT
+    elif base_type in _SQL_FLOAT_TYPES:
+        return KIND_FLOAT
+    elif base_type in _SQL_STR_TYPES:
+        return KIND_STR
+    return None
+
+
+def _is_integral(values):
+    """
+    Return True if all values in the float array that are not missing are
+    finite whole numbers.
+    """
+    values = values[~np.isnan(values)]
+    return bool(np.isfinite(values).all() and
+                (values == np.floor(values)).all())
+
+
+def infer_kind(S):
+    """
+    Return the kind of the values in the Series.
+
+    Float columns that contain only whole numbers (apart from missing
+    values) are treated as integer columns.
+    """
+    dtype = S.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return KIND_BOOL
+    elif pd.api.types.is_integer_dtype(dtype):
+        return KIND_INT
+    elif pd.api.types.is_float_dtype(dtype):
+        if _is_integral(np.asarray(S, dtype=float)):
+            return KIND_INT
+        return KIND_FLOAT
+    elif not pd.api.types.is_object_dtype(dtype):
+        return KIND_OBJECT
+
+    inferred = pd.api.types.infer_dtype(S, skipna=True)
+    if inferred == "string":
+        return KIND_STR
+    elif inferred == "integer":
+        return KIND_INT
+    elif inferred == "boolean":
+        return KIND_BOOL
+    elif inferred in ("floating", "mixed-integer-float", "decimal"):
+        values = pd.to_numeric(S, errors="coerce").values.astype(float)
+        if _is_integral(values):
+            return KIND_INT
+        return KIND_FLOAT
+    return KIND_OBJECT
+
+
+def get_dtype(S):
+    """
+    Return the dtype that best describes the values in the Series.
+
+    The dtype is the same as the one that pandas chooses when calling
+    S.dropna().convert_dtypes(), but it is determined without converting
+    the values.
+    """
+    kind = infer_kind(S)
+    if kind == KIND_INT:
+        return pd.Int64Dtype()
+    elif kind == KIND_FLOAT:
+        return pd.Float64Dtype()
+    elif kind == KIND_BOOL:
+        return pd.BooleanDtype()
+    elif kind == KIND_STR:
+        return pd.StringDtype()
+    return S.dtype
+
+
+def to_categorical(S, max_ratio=0.5):
+    """
+    Return the string column as a categorical column.
+
+    The categories are sorted. If the number of distinct values exceeds
+    the given proportion of the number of rows, or if the values can't be
+    sorted, the column is returned unchanged.
+    """
+    try:
+        codes, uniques = pd.factorize(S, sort=True)
+    except TypeError:
+        return S
+    if len(uniques) > max_ratio * len(S):
+        return S
+    return pd.Series(pd.Categorical.from_codes(codes, categories=uniques),
+                     index=S.index, name=S.name)
+
+
+def remove_unused_categories(df):
+    """
+    Return the data frame with unused categories removed from all
+    categorical columns, e.g. after rows have been filtered.
+    """
+    columns = [col for col in df.columns
+               if isinstance(df[col].dtype, pd.CategoricalDtype)]
+    if not columns:
+        return df
+    return df.assign(**{col: df[col].cat.remove_unused_categories()
+                        for col in columns})
+
+
+def cast_column(S, kind=None, categorical=False):
+    """
+    Return the Series with the dtype that matches the kind of its values.
+
+    Integer values use the nullable Int64 dtype, float values use float64,
+    and boolean values with missing values use the nullable boolean
+    dtype. In all other columns, missing values are represented by pd.NA.
+
+    Parameters
+    ----------
+    S : pandas.Series
+        The column
+    kind : str
+        The kind of the column as given by the corpus schema. If the kind is
+        KIND_STR, the values are not inspected. Otherwise, the kind is
+        determined from the values.
+    categorical : bool
+        If True, string columns are returned as categorical columns (see
+        to_categorical()).
+    """
+    if not (kind == KIND_STR and pd.api.types.is_object_dtype(S.dtype)):
+        kind = infer_kind(S)
+
+    if kind == KIND_INT:
+        if pd.api.types.is_object_dtype(S.dtype):
+            S = pd.to_numeric(S, errors="coerce")
+        return S.astype(pd.Int64Dtype())
+    elif kind == KIND_FLOAT:
+        if pd.api.types.is_float_dtype(S.dtype):
+            return S
+        return pd.to_numeric(S, errors="coerce").astype(float)
+    elif kind == KIND_BOOL:
+        if pd.api.types.is_bool_dtype(S.dtype):
+            return S
+        return S.astype(pd.BooleanDtype())
+    elif kind == KIND_STR and categorical:
+        categorical_column = to_categorical(S)
+        if categorical_column is not S:
+            return categorical_column
+
+    if pd.api.types.is_object_dtype(S.dtype):
+        missing = pd.isna(S.values)
+        if missing.any():
+            S = S.where(~missing, pd.NA)
+    return S
@@ -7,10 +7,23 @@ Copyright (c) 2017-2022 Gero Kunter (gero.kunter@coquery.org)
 Coquery is released under the terms of the GNU General Public License (v3).
 For details, see the file LICENSE that you should have received along
 with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+The corpus modules of a connection are described by a manifest file in the
+corpora directory of the connection. For each corpus module, the manifest
+stores the name and database of the corpus, the resource features, and the
+modification time, size and SHA1 hash of the module file. The list of
+available corpora is read from the manifest, and a corpus module is only
+imported when its resource is used for the first time. Modules that are
+new or that have been modified since the manifest was written are
+imported once to update the manifest. Modules that can't be imported are
+stored in the manifest as well, so that they are only reported once.
 """
 
 import os
 import glob
+import json
+import hashlib
+from collections.abc import MutableMapping
 
 import sqlalchemy
 import imp
@@ -21,6 +34,97 @@ from coquery.general import CoqObject, get_home_dir
 from coquery.unicode import utf8
 
 
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def get_file_hash(path):
+    """
+    Return the SHA1 hex digest of the content of the file.
+    """
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class ResourceDict(MutableMapping):
+    """
+    A dictionary of resource tuples (Resource, Corpus, module_name) with
+    the corpus names as keys.
+
+    Resources can be added either as a resource tuple, or as a manifest
+    entry (see set_entry()). The corpus names from the manifest entries
+    are available without importing the corpus modules. A corpus module
+    is imported when the resource tuple is accessed for the first time.
+
+    Parameters
+    ----------
+    loader : callable
+        A function that takes a manifest entry, imports the corpus module,
+        and adds the resource tuple to the dictionary
+    """
+    def __init__(self, loader=None):
+        self._loaded = {}
+        self._entries = {}
+        self._loader = loader
+
+    def set_entry(self, entry):
+        self._entries[entry["name"]] = entry
+
+    def get_entry(self, name):
+        """
+        Return the manifest entry of the corpus, or None if the resource
+        was not added from the manifest.
+        """
+        return self._entries.get(name)
+
+    def get_db_name(self, name):
+        """
+        Return the database name of the corpus without importing the
+        corpus module.
+        """
+        if name in self._entries:
+            return self._entries[name].get("db_name")
+        return getattr(self._loaded[name][0], "db_name", None)
+
+    def is_loaded(self, name):
+        return name in self._loaded
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            entry = self._entries.get(name)
+            if entry is None or self._loader is None:
+                raise KeyError(name)
+            self._loader(entry)
+            if name not in self._loaded:
+                raise KeyError(name)
+        return self._loaded[name]
+
+    def __setitem__(self, name, tup):
+        self._loaded[name] = tup
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self._loaded.pop(name, None)
+        self._entries.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._loaded or name in self._entries
+
+    def __iter__(self):
+        return iter(list(self._loaded) +
+                    [x for x in self._entries if x not in self._loaded])
+
+    def __len__(self):
+        return len(set(self._loaded) | set(self._entries))
+
+    def __repr__(self):
+        return "ResourceDict({})".format(list(self))
+
+
 class Connection(CoqObject):
     MODULE = 1 << 1
     INSTALLER = 1 << 2
@@ -28,7 +132,8 @@ class Connection(CoqObject):
 
     def __init__(self, name, db_type=None):
         self.name = name
-        self._resources = {}
+        self._resources = ResourceDict()
+        self._scanned = False
         self._db_type = db_type
         self.enabled = True
 
@@ -43,31 +148,186 @@ class Connection(CoqObject):
         path = os.path.join(self.base_path(), "corpora")
         return path
 
-    def find_resources(self):
-        self._resources = {}
-        path = os.path.join(self.resource_path(), "*.py")
-        for module_name in glob.glob(path):
-            corpus_name, _ = os.path.splitext(os.path.basename(module_name))
-            corpus_name = utf8(corpus_name)
+    def manifest_path(self):
+        return os.path.join(self.resource_path(), MANIFEST_FILE)
+
+    def _import_module(self, module_name):
+        """
+        Import a corpus module and add its resource to the resources of the
+        connection.
+
+        Parameters
+        ----------
+        module_name : str
+            The path to the corpus module
 
+        Returns
+        -------
+        tup : tuple
+            A tuple (Resource, Corpus, module_name)
+        """
+        corpus_name, _ = os.path.splitext(os.path.basename(module_name))
+        corpus_name = utf8(corpus_name)
+
+        find = imp.find_module(corpus_name, [self.resource_path()])
+        module = imp.load_module(corpus_name, *find)
+        try:
+            tup = (module.Resource, module.Corpus, module_name)
+        except AttributeError:
+            raise ValueError(
+                "{} does not appear to be a valid corpus module.".format(
+                    module_name))
+        self._resources[module.Resource.name] = tup
+        return tup
+
+    @staticmethod
+    def _report_module_error(module_name, e):
+        s = ("There is an error in corpus module '{}': {}\n"
+             "The corpus is not available for queries.").format(
+                 os.path.splitext(os.path.basename(module_name))[0], str(e))
+        print(s)
+        logging.warning(s)
+
+    def _load_module(self, module_name):
+        """
+        Import a corpus module, and return the resource tuple, or None if
+        the corpus module could not be imported.
+        """
+        try:
+            return self._import_module(module_name)
+        except Exception as e:
+            self._report_module_error(module_name, e)
+        return None
+
+    def _load_entry(self, entry):
+        return self._load_module(
+            os.path.join(self.resource_path(), entry["module"]))
+
+    def read_manifest(self):
+        """
+        Return the manifest of the corpus modules as a dictionary with the
+        module file names as keys. If there is no valid manifest, an empty
+        dictionary is returned.
+        """
+        try:
+            with open(self.manifest_path(), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning("Could not read corpus manifest: {}".format(e))
+            return {}
+        if (not isinstance(manifest, dict) or
+                manifest.get("version") != MANIFEST_VERSION):
+            return {}
+        return manifest.get("modules", {})
+
+    def write_manifest(self, modules):
+        """
+        Write the manifest of the corpus modules. The file is replaced in
+        one step so that other processes never read an incomplete
+        manifest.
+        """
+        path = self.manifest_path()
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "modules": modules},
+                          f, indent=1, sort_keys=True)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning("Could not write corpus manifest: {}".format(e))
+
+    def _inspect_module(self, module_name):
+        """
+        Import a corpus module, and return its manifest entry.
+        """
+        entry = {"module": os.path.basename(module_name)}
+        try:
+            resource, _, _ = self._import_module(module_name)
+        except Exception as e:
+            self._report_module_error(module_name, e)
+            entry["error"] = str(e) or type(e).__name__
+        else:
+            entry["name"] = resource.name
+            entry["db_name"] = getattr(resource, "db_name", None)
             try:
-                find = imp.find_module(corpus_name, [self.resource_path()])
-                module = imp.load_module(corpus_name, *find)
-            except Exception as e:
-                s = ("There is an error in corpus module '{}': {}\n"
-                     "The corpus is not available for queries.").format(
-                         corpus_name, str(e))
-                print(s)
-                logging.warning(s)
-            else:
-                try:
-                    tup = (module.Resource, module.Corpus, module_name)
-                    self._resources[module.Resource.name] = tup
-                except AttributeError:
-                    full_path = module_name
-                    s = "{} does not appear to be a valid corpus module."
-                    logging.warning(s.format(full_path))
-                    print(s.format(full_path))
+                entry["features"] = list(resource.get_resource_features())
+            except Exception:
+                entry["features"] = []
+        return entry
+
+    def update_manifest(self):
+        """
+        Return the manifest of the corpus modules, updated for the corpus
+        modules that have been added, changed or removed since the
+        manifest was written.
+
+        A module is only imported if its modification time or size differs
+        from the manifest, and if the SHA1 hash of the file has changed as
+        well.
+        """
+        old = self.read_manifest()
+        modules = {}
+        path = os.path.join(self.resource_path(), "*.py")
+        for module_name in sorted(glob.glob(path)):
+            file_name = os.path.basename(module_name)
+            try:
+                stat = os.stat(module_name)
+            except OSError:
+                continue
+            entry = old.get(file_name)
+            if (entry and entry.get("mtime") == stat.st_mtime_ns and
+                    entry.get("size") == stat.st_size):
+                if entry.get("error"):
+                    logging.info("Skipping corpus module '{}': {}".format(
+                        file_name, entry["error"]))
+                modules[file_name] = entry
+                continue
+
+            sha1 = get_file_hash(module_name)
+            if not (entry and entry.get("sha1") == sha1):
+                entry = self._inspect_module(module_name)
+            modules[file_name] = dict(entry, mtime=stat.st_mtime_ns,
+                                      size=stat.st_size, sha1=sha1)
+
+        if modules != old:
+            self.write_manifest(modules)
+        return modules
+
+    def find_resources(self):
+        """
+        Update the available corpus resources from the manifest.
+
+        Only corpus modules that are new or that have been modified are
+        imported. All other modules are imported when their resource is
+        accessed for the first time.
+        """
+        self._resources = ResourceDict(self._load_entry)
+        for entry in self.update_manifest().values():
+            if not entry.get("error"):
+                self._resources.set_entry(entry)
+        self._scanned = True
+
+    def find_resource(self, name):
+        """
+        Return the resource tuple of a corpus. Only the corpus module of
+        this corpus is imported.
+
+        Parameters
+        ----------
+        name : str
+            The name of the corpus
+
+        Returns
+        -------
+        tup : tuple or None
+            A tuple (Resource, Corpus, module_name), or None if there is no
+            corpus module for the corpus.
+        """
+        if name not in self._resources and not self._scanned:
+            self.find_resources()
+        return self._resources.get(name)
 
     def resources(self):
         return self._resources
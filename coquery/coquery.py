@@ -41,8 +41,6 @@ from .defines import (msg_missing_modules, msg_options_error,
                       QUERY_MODE_STATISTICS, LOG_STRING)
 from .unicode import utf8
 
-from .gui.classes import CoqApplication
-
 
 class CoqLogHandler(logging.StreamHandler):
     """
@@ -133,18 +131,22 @@ def main():
         options.cfg.coquery_home = coquery_home
 
         # Check if a valid corpus was specified, but only if no GUI is
-        # requested (the GUI will handle corpus selection later):
+        # requested (the GUI will handle corpus selection later). Only the
+        # corpus module of the requested corpus is loaded if possible:
         if not (options.cfg.gui):
-            if not options.cfg.current_connection.resources():
-                raise NoCorpusError
-
-            if not options.cfg.corpus:
+            connection = options.cfg.current_connection
+            if options.cfg.corpus:
+                options.cfg.corpus = utf8(options.cfg.corpus)
+                if not connection.find_resource(options.cfg.corpus):
+                    if not connection.resources():
+                        raise NoCorpusError
+                    raise CorpusUnavailableError(options.cfg.corpus)
+            elif not options.cfg.server:
+                # (query jobs sent to the server can specify the corpus)
+                connection.find_resources()
+                if not connection.resources():
+                    raise NoCorpusError
                 raise NoCorpusSpecifiedError
-
-            options.cfg.corpus = utf8(options.cfg.corpus)
-            if (options.cfg.corpus not in
-                    options.cfg.current_connection.resources()):
-                raise CorpusUnavailableError(options.cfg.corpus)
     except Exception as e:
         print_exception(e)
         sys.exit(1)
@@ -161,12 +163,16 @@ def main():
     if options.cfg.comment:
         logger.info(options.cfg.comment)
 
-    options.set_current_server(options.cfg.current_connection.name)
+    # The command-line tool only uses the corpus module that has already
+    # been loaded, so the other corpus modules are only loaded for the GUI:
+    options.set_current_server(options.cfg.current_connection.name,
+                               find_resources=bool(options.cfg.gui))
 
     # Run the Application GUI?
     if options.cfg.gui and options.use_qt:
         from PyQt5 import QtCore, QtWidgets, QtGui
         from coquery.gui.pyqt_compat import close_toplevel_widgets
+        from .gui.classes import CoqApplication
 
         options.cfg.app = CoqApplication(sys.argv)
         translator = QtCore.QTranslator()
@@ -228,6 +234,17 @@ def main():
         logger.info("--- Finished program (after {:.3} seconds) ---".format(
             time.time() - start_time))
 
+    # Run the query server?
+    elif options.cfg.server:
+        from . import server
+
+        try:
+            server.serve(options.cfg.port)
+        except KeyboardInterrupt:
+            logger.info("Query server interrupted, exiting.")
+        logger.info("--- Done (after {:.3f} seconds) ---".format(
+            time.time() - start_time))
+
     # Otherwise, run program as a command-line tool:
     else:
         from . import session
@@ -261,7 +278,8 @@ def main():
         logger.info("--- Done (after {.3f} seconds) ---".format(
             time.time() - start_time))
 
-    if options.cfg.use_cache:
+    # (the cache settings are missing if no configuration file was read)
+    if getattr(options.cfg, "use_cache", False):
         options.cfg.query_cache.save()
 
 
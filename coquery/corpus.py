@@ -11,9 +11,12 @@ with Coquery. If not, see <http://www.gnu.org/licenses/>.
 
 import warnings
 from collections import defaultdict
+import itertools
 import re
 import logging
 import math
+import threading
+import numpy as np
 import pandas as pd
 import os
 import tempfile
@@ -30,11 +33,26 @@ from .defines import (
     CONTEXT_NONE,
     PREFERRED_ORDER)
 
-from .general import collapse_words, CoqObject, html_escape, Print
+from .general import (collapse_words, CoqObject, html_escape, Print,
+                      LRUCache)
+from . import linkcache
 from . import tokens
+from . import trigrams
 from . import options
 from .links import get_by_hash
 
+# Prefix of the names of bind parameters used in query templates:
+_PARAM_PREFIX = "coq_param_"
+
+# Limits for statements that combine query templates by UNION ALL. SQLite
+# rejects compound statements with more than 500 SELECTs, and versions
+# before 3.32 accept at most 999 bind parameters per statement:
+MAX_UNION_BRANCHES = 500
+MAX_UNION_PARAMETERS = 999
+
+# Cache of parameterized SQL strings, see SQLResource.get_query_template():
+_query_templates = LRUCache(maxsize=512)
+
 
 class LexiconClass:
     pass
@@ -216,9 +234,13 @@ class BaseResource(CoqObject):
         tables += cls.special_table_list
 
         # return the features that can be constructed from the feature name
-        # and the table:
+        # and the table. Columns containing reversed strings and trigram
+        # tables are only used internally for queries, and are therefore
+        # not included:
         return ["{}_{}".format(table, feature)
-                for _, table, feature in split_features if table in tables]
+                for _, table, feature in split_features
+                if table in tables and
+                not feature.endswith(("_rev", "_trigrams"))]
 
     @classmethod
     def get_queryable_features(cls):
@@ -662,6 +684,7 @@ class BaseResource(CoqObject):
 
 class SQLResource(BaseResource):
     _get_orth_str = None
+    _feature_types_cache = {}
 
     def __init__(self, _, corpus):
         super(SQLResource, self).__init__()
@@ -720,15 +743,16 @@ class SQLResource(BaseResource):
         engine.dispose()
         return size
 
-    def get_table_names(self, rc_table):
+    @classmethod
+    def get_table_names(cls, rc_table):
         """
         Return a list containing the SQL table field information.
         """
 
         # FIXME: This is probably a method that should be provided by the
         # connection and not by the resource
-        engine = options.cfg.current_connection.get_engine(self.db_name)
-        table_name = getattr(self, "{}_table".format(rc_table))
+        engine = options.cfg.current_connection.get_engine(cls.db_name)
+        table_name = getattr(cls, "{}_table".format(rc_table))
         db_type = options.cfg.current_connection.db_type()
         if db_type == SQL_MYSQL:
             S = "SHOW FIELDS FROM {}"
@@ -780,7 +804,8 @@ class SQLResource(BaseResource):
         path = options.cfg.current_connection.resources()[self.name][-1]
         return path
 
-    def get_table_descriptor(self):
+    @classmethod
+    def get_table_descriptor(cls):
         """
         Return a description of all SQL tables provided by the resource.
 
@@ -793,18 +818,20 @@ class SQLResource(BaseResource):
             dictionaries as values.
         """
         d = {}
-        feature_map = [(x, getattr(self, x))
-                       for x in self.get_resource_features()]
+        feature_map = [(x, getattr(cls, x))
+                       for x in cls.get_resource_features()]
 
-        for tab in self.get_table_tree("corpus") + ["tag"]:
-            table_name = getattr(self, "{}_table".format(tab))
+        for tab in cls.get_table_tree("corpus") + ["tag"]:
+            if not hasattr(cls, "{}_table".format(tab)):
+                continue
+            table_name = getattr(cls, "{}_table".format(tab))
 
             d[tab] = dict(Fields={}, Primary=None, Name=table_name)
-            for row in self.get_table_names(tab):
+            for row in cls.get_table_names(tab):
                 field_name = row["name"]
                 rc_feature = None
                 for rc_feature, name in feature_map:
-                    tup = self.split_resource_feature(rc_feature)
+                    tup = cls.split_resource_feature(rc_feature)
                     _, table, feature = tup
                     if table == tab and name == field_name:
                         break
@@ -818,6 +845,34 @@ class SQLResource(BaseResource):
                     "Name": field_name}
         return d
 
+    @classmethod
+    def get_feature_types(cls):
+        """
+        Return the SQL data types of the resource features.
+
+        The data types are taken from the table descriptor, and are cached
+        for each database.
+
+        Returns
+        -------
+        d : dict
+            A dictionary with resource features as keys, and the data types
+            of the corresponding table columns as values.
+        """
+        key = (options.cfg.current_connection.name, cls.db_name)
+        if key not in cls._feature_types_cache:
+            d = {}
+            for tab, desc in cls.get_table_descriptor().items():
+                for rc_feature, field in desc["Fields"].items():
+                    # only use fields that have been matched to a resource
+                    # feature of the table:
+                    if (rc_feature and
+                            cls.split_resource_feature(rc_feature)[1] == tab
+                            and getattr(cls, rc_feature) == field["Name"]):
+                        d[rc_feature] = field["Type"]
+            cls._feature_types_cache[key] = d
+        return cls._feature_types_cache[key]
+
     @classmethod
     def get_pack_steps(cls):
         """
@@ -1276,6 +1331,10 @@ class SQLResource(BaseResource):
         """
         Return the join string for the link represented by the
         resource feature.
+
+        If the link cache for the link is available (see linkcache.py), the
+        cache table from the corpus database is joined instead of the
+        linked table.
         """
         hashed, table, _ = cls.split_resource_feature(rc_feature)
         link, res = get_by_hash(hashed)
@@ -1288,17 +1347,20 @@ class SQLResource(BaseResource):
         ext_name = "{}.{}".format(res.db_name, ext_table)
         ext_column = getattr(res, link.rc_to)
 
+        cache_table = linkcache.get_cache_table(cls, link)
+        if cache_table:
+            ext_name = cache_table
+            ext_column = linkcache.CACHE_KEY_COLUMN
+
         table_string = "{ext_name} AS {ext_alias}".format(
             ext_name=ext_name, ext_alias=ext_alias)
 
         if int_tab == "corpus":
-            s = "{ext_alias}.{ext_column} = {int_alias}.{int_column}{N}"
+            int_name = "{}.{}{}".format(int_alias, int_column, n+1)
         else:
-            s = "{ext_alias}.{ext_column} = {int_alias}.{int_column}"
-        where_string = s.format(
-            ext_alias=ext_alias, ext_column=ext_column,
-            int_alias=int_alias, int_column=int_column,
-            N=n+1)
+            int_name = "{}.{}".format(int_alias, int_column)
+        where_string = "{ext_alias}.{ext_column} = {int_name}".format(
+            ext_alias=ext_alias, ext_column=ext_column, int_name=int_name)
 
         table_string = "{} {} ON {}".format(
             link.join_type, table_string, where_string)
@@ -1396,7 +1458,8 @@ class SQLResource(BaseResource):
             hashed, _, _ = cls.split_resource_feature(rc_feature)
             if hashed is not None:
                 link, res = get_by_hash(hashed)
-                attach_list.add(res.db_name)
+                if not linkcache.get_cache_table(cls, link):
+                    attach_list.add(res.db_name)
         return attach_list
 
     @classmethod
@@ -1474,11 +1537,26 @@ class SQLResource(BaseResource):
                 return f"{s} COLLATE NOCASE"
 
     @classmethod
-    def get_token_conditions(cls, i, token):
+    def get_token_conditions(cls, i, token, params=None):
         """
         Return a dictionary with required tables as names, and SQL
         conditions as values.
+
+        If `params` is a dictionary, the literal values from the token
+        specifications are not inserted into the SQL conditions. Instead,
+        each value is replaced by a named bind parameter, and the value is
+        stored in `params` under the name of that parameter.
         """
+        counter = itertools.count()
+
+        def get_literal(val):
+            if params is None:
+                return f"'{val}'"
+            name = f"{_PARAM_PREFIX}{i + 1}_{next(counter)}"
+            # the token parser escapes quotes for literal SQL strings, which
+            # is not needed for bind parameters:
+            params[name] = val.replace("''", "'")
+            return f":{name}"
 
         def get_operator(S):
             if options.cfg.regexp:
@@ -1538,11 +1616,25 @@ class SQLResource(BaseResource):
             if len(spec_list) == 1:
                 x = spec_list[0]
                 val = tokens.COCAToken.replace_wildcards(x)
-                format_str = cls._handle_case("{alias} {op} '{val}'")
-                s = format_str.format(alias=alias,
-                                      op=get_operator(x),
-                                      val=(val if not reverse_str else
-                                           val[::-1]))
+                if reverse_str:
+                    val = val[::-1]
+                op = get_operator(x)
+                format_str = cls._handle_case("{alias} {op} {val}")
+                if op == "REGEXP" and cls._use_regexp_prefilter(tab):
+                    s = cls.get_regexp_prefilter(
+                        i, tab, format_str.format(alias=col,
+                                                  op=op,
+                                                  val=get_literal(val)))
+                else:
+                    s = format_str.format(alias=alias,
+                                          op=op,
+                                          val=get_literal(val))
+                if op == "REGEXP" or (op == "LIKE" and
+                                      val.startswith(("%", "_"))):
+                    trigram_str = cls.get_trigram_condition(
+                        i, query_feature, x, get_literal)
+                    if trigram_str:
+                        s = f"{s} AND {trigram_str}"
             else:
                 wildcards = []
                 explicit = []
@@ -1554,8 +1646,11 @@ class SQLResource(BaseResource):
 
                 # a query string is considered 'explicit' if it doesn't contain
                 # any wildcards
+                if reverse_str:
+                    explicit = [x[::-1] for x in explicit]
+
                 if explicit:
-                    s_list = ", ".join([f"'{x}'" for x in explicit])
+                    s_list = ", ".join([get_literal(x) for x in explicit])
                     s_exp = [cls._handle_case(f"{alias} IN ({s_list})")]
                 else:
                     s_exp = []
@@ -1564,12 +1659,28 @@ class SQLResource(BaseResource):
                     operator = "REGEXP"
                 else:
                     operator = "LIKE"
-                format_str = cls._handle_case("{alias} {op} '{val}'")
-                s_list = [format_str.format(
-                            alias=alias,
-                            op=operator,
-                            val=tokens.COCAToken.replace_wildcards(x))
-                          for x in wildcards]
+                format_str = cls._handle_case("{alias} {op} {val}")
+                s_list = []
+                for x in wildcards:
+                    val = tokens.COCAToken.replace_wildcards(x)
+                    if reverse_str:
+                        val = val[::-1]
+                    if (operator == "REGEXP" and
+                            cls._use_regexp_prefilter(tab)):
+                        s_wild = cls.get_regexp_prefilter(
+                            i, tab, format_str.format(alias=col,
+                                                      op=operator,
+                                                      val=get_literal(val)))
+                    else:
+                        s_wild = format_str.format(alias=alias,
+                                                   op=operator,
+                                                   val=get_literal(val))
+                    if operator == "REGEXP" or val.startswith(("%", "_")):
+                        trigram_str = cls.get_trigram_condition(
+                            i, query_feature, x, get_literal)
+                        if trigram_str:
+                            s_wild = f"({s_wild} AND {trigram_str})"
+                    s_list.append(s_wild)
                 s = " OR ".join(s_list + s_exp)
 
             d[tab].append(s)
@@ -1591,6 +1702,105 @@ class SQLResource(BaseResource):
 
         return d
 
+    @classmethod
+    def _use_regexp_prefilter(cls, tab):
+        """
+        Return True if regular expressions on the table are evaluated in a
+        subquery on the table instead of on the joined query table.
+        """
+        return (tab != "corpus" and
+                options.cfg.current_connection.db_type() == SQL_SQLITE and
+                options.cfg.regexp_prefilter)
+
+    @classmethod
+    def get_regexp_prefilter(cls, i, tab, condition):
+        """
+        Return an SQL condition that evaluates the condition on the entries
+        of the table in a subquery.
+
+        In SQLite, REGEXP is a user function that is implemented in Python.
+        If the REGEXP condition is placed in the WHERE clause of the query,
+        SQLite may call the function once for every corpus token that is
+        joined to the table, i.e. several times for the same entry. The
+        subquery is not correlated with the main query, so SQLite evaluates
+        it only once, and the function is called exactly once for each
+        distinct entry in the table.
+
+        Parameters
+        ----------
+        i : int
+            The number of the query item
+        tab : str
+            The resource table, e.g. 'word'
+        condition : str
+            The condition that is evaluated on the table. The condition has
+            to use the unqualified column names of the table.
+
+        Returns
+        -------
+        S : str
+            The SQL condition
+        """
+        table = getattr(cls, f"{tab}_table")
+        id_column = getattr(cls, f"{tab}_id")
+        return (f"COQ_{tab.upper()}_{i+1}.{id_column} IN ("
+                f"SELECT {id_column} FROM {table} WHERE {condition})")
+
+    @classmethod
+    def get_trigram_condition(cls, i, query_feature, spec, get_literal):
+        """
+        Return an SQL condition that restricts the lexicon entries to those
+        that contain all trigrams required by the query item specification.
+
+        The condition uses the trigram table that was created by the corpus
+        builder for the query feature (see
+        BaseCorpusBuilder.build_trigram_index()). It is meant to be combined
+        with the LIKE or REGEXP condition for the specification: the
+        trigram table is used to look up a small set of candidate entries so
+        that the pattern only needs to be evaluated for these entries.
+
+        Parameters
+        ----------
+        i : int
+            The number of the query item
+        query_feature : str
+            The resource feature that is queried, e.g. 'word_label'
+        spec : str
+            The query item specification, e.g. '*tion*'
+        get_literal : function
+            The function that is used to insert literal values into the
+            condition
+
+        Returns
+        -------
+        S : str or None
+            The SQL condition, or None if the resource has no trigram table
+            for the query feature or if no trigrams can be determined from
+            the specification.
+        """
+        trigram_table = getattr(cls, f"{query_feature}_trigrams", None)
+        if not trigram_table:
+            return None
+        _, tab, _ = cls.split_resource_feature(query_feature)
+        if tab == "corpus":
+            return None
+
+        trigram_set = trigrams.get_pattern_trigrams(
+            spec.replace("''", "'"), regexp=options.cfg.regexp)
+        if not trigram_set:
+            return None
+
+        id_column = getattr(cls, f"{tab}_id")
+        trigram_column = trigrams.TRIGRAM_COLUMN
+        trigram_list = ", ".join([get_literal(x.replace("'", "''"))
+                                  for x in sorted(trigram_set)])
+        return (f"COQ_{tab.upper()}_{i+1}.{id_column} IN ("
+                f"SELECT {id_column} FROM {trigram_table} "
+                f"WHERE {trigram_column} IN ({trigram_list}) "
+                f"GROUP BY {id_column} "
+                f"HAVING COUNT(DISTINCT {trigram_column}) = "
+                f"{len(trigram_set)})")
+
     @classmethod
     def get_annotation(cls, length, table):
         """
@@ -1773,7 +1983,8 @@ class SQLResource(BaseResource):
         return columns
 
     @classmethod
-    def get_condition_list(cls, query_items, join_list, selected):
+    def get_condition_list(cls, query_items, join_list, selected,
+                           params=None):
         condition_list = []
         current_pos = 0
         # go through the query items and add all required list as well as
@@ -1787,7 +1998,7 @@ class SQLResource(BaseResource):
                     first_item = pos
                 token = tokens.COCAToken(s)
                 if s != "*":
-                    conditions = cls.get_token_conditions(i, token)
+                    conditions = cls.get_token_conditions(i, token, params)
                 else:
                     conditions = {}
                 for _, l in conditions.items():
@@ -1810,9 +2021,13 @@ class SQLResource(BaseResource):
 
     @classmethod
     def get_query_string(cls,
-                         query_items, selected, columns=None, to_file=False):
+                         query_items, selected, columns=None, to_file=False,
+                         params=None):
         """
         Return an SQL string for the specified query.
+
+        If `params` is a dictionary, the literal values from the query items
+        are passed as bind parameters (see get_token_conditions()).
         """
         if columns is None or columns == []:
             columns = cls.get_required_columns(query_items, selected, to_file)
@@ -1838,7 +2053,8 @@ class SQLResource(BaseResource):
         # get list of conditions that will be placed in the WHERE clause:
         condition_list = cls.get_condition_list(query_items,
                                                 join_list,
-                                                selected)
+                                                selected,
+                                                params)
 
         if condition_list:
             sql_template = """{}
@@ -1854,6 +2070,181 @@ class SQLResource(BaseResource):
             """.format(S, int(options.cfg.number_of_tokens))
         return S
 
+    @classmethod
+    def get_query_template(cls, query_items, selected, to_file=False):
+        """
+        Return a parameterized SQL string for the specified query, together
+        with the values of the bind parameters.
+
+        Query items that differ only in their literal values (e.g. 'walk'
+        and 'talk', or 'walk*' and 'talk*') produce SQL strings that are
+        identical apart from these values. For this reason, the SQL string
+        is only assembled for the first query with a given token structure,
+        and stored as a template. Subsequent queries with the same
+        structure reuse the template so that only the bind values have to
+        be determined.
+
+        Returns
+        -------
+        tup : tuple
+            A tuple with the SQL string as the first element and a
+            dictionary of bind values as the second element. The SQL string
+            uses the named parameter style of sqlalchemy.text().
+        """
+        params = {}
+        structure = []
+        token_list = []
+        offset = 0
+        for i, (pos, s) in enumerate(query_items):
+            if s is None:
+                structure.append((pos, None))
+                continue
+            token = tokens.COCAToken(s)
+            if s != "*":
+                conditions = cls.get_token_conditions(i, token, params)
+            else:
+                conditions = {}
+            # the conditions contain placeholders instead of the literal
+            # values, so they describe the structure of the token:
+            structure.append(
+                (pos, token.negated,
+                 tuple((tab, tuple(lst)) for tab, lst in conditions.items())))
+            token_list.append((offset, (i + 1, s)))
+            offset += 1
+
+        # the order of the corpus joins depends on the token strings, so it
+        # is also part of the structure:
+        order = tuple(offset for offset, _ in cls.get_token_order(token_list))
+
+        key = (cls, tuple(structure), order, tuple(selected), to_file,
+               options.cfg.limit_matches, options.cfg.number_of_tokens,
+               options.cfg.context_mode, linkcache.get_state())
+
+        template = _query_templates.get(key)
+        if template is None:
+            sql = cls.get_query_string(query_items, selected,
+                                       to_file=to_file, params={})
+            # escape colons that are not bind parameters so that they are
+            # not mistaken for parameters by sqlalchemy.text():
+            template = re.sub(r"(?<!\\):(?!{})(?=\w)".format(_PARAM_PREFIX),
+                              r"\\:", sql)
+            _query_templates[key] = template
+        return template, params
+
+    @classmethod
+    def get_union_query_templates(cls, query_list, selected,
+                                  to_file=False):
+        """
+        Return a list of parameterized SQL strings that combine the queries
+        for the query item lists, together with the values of their bind
+        parameters.
+
+        Quantified query strings are expanded into one list of query items
+        for each combination of quantifiers (see tokens.preprocess_query()).
+        All expansions produce the same result columns because empty slots
+        are selected as NULL, so their queries can be combined by UNION ALL.
+        In this way, the database server receives only a few statements
+        instead of one statement for each expansion.
+
+        Each branch of a combined statement adds the two columns
+        coquery_invisible_subquery (the index of the query item list in
+        `query_list`) and coquery_invisible_number_of_tokens (the number of
+        query items that are not empty in the query item list).
+
+        The query item lists are split into several statements so that no
+        statement has more than MAX_UNION_BRANCHES branches or more than
+        MAX_UNION_PARAMETERS bind parameters, which are the limits of
+        compound SELECT statements and of host parameters in SQLite.
+
+        Returns
+        -------
+        lst : list or None
+            A list of tuples (template, params), or None if the queries
+            can't be combined because they produce different result
+            columns.
+        """
+        branches = cls.get_union_branches(query_list, selected, to_file)
+        if branches is None:
+            return None
+
+        statements = []
+        chunk = []
+        n_params = 0
+        for branch, params in branches:
+            if chunk and (len(chunk) >= MAX_UNION_BRANCHES or
+                          n_params + len(params) > MAX_UNION_PARAMETERS):
+                statements.append(cls.join_union_branches(chunk))
+                chunk = []
+                n_params = 0
+            chunk.append((branch, params))
+            n_params += len(params)
+        if chunk:
+            statements.append(cls.join_union_branches(chunk))
+        return statements
+
+    @classmethod
+    def get_union_branches(cls, query_list, selected, to_file=False):
+        """
+        Return a list of tuples (branch, params) with the SQL string of the
+        UNION ALL branch and the bind values for each query item list, or
+        None if the branches produce different result columns.
+        """
+        branches = []
+        aliases = None
+        for k, query_items in enumerate(query_list):
+            columns = cls.get_required_columns(query_items, selected, to_file)
+            current = [x.rpartition(" AS ")[-1] for x in columns]
+            if aliases is None:
+                aliases = current
+            elif current != aliases:
+                return None
+
+            template, branch_params = cls.get_query_template(
+                query_items, selected, to_file)
+
+            # each branch uses its own bind parameter names:
+            prefix = f"{_PARAM_PREFIX}u{k}_"
+            template = re.sub(r"(?<!\\):{}".format(_PARAM_PREFIX),
+                              f":{prefix}", template)
+            params = {f"{prefix}{name[len(_PARAM_PREFIX):]}": val
+                      for name, val in branch_params.items()}
+
+            n = len([x for _, x in query_items if x])
+            # the query is used as a derived table so that a LIMIT clause
+            # applies to each branch separately:
+            branches.append((
+                f"SELECT {k} AS coquery_invisible_subquery, "
+                f"{n} AS coquery_invisible_number_of_tokens, "
+                f"COQ_UNION_{k+1}.* FROM ({template}) AS COQ_UNION_{k+1}",
+                params))
+        return branches
+
+    @staticmethod
+    def join_union_branches(branches):
+        """
+        Return a tuple with the SQL string that combines the branches by
+        UNION ALL, and the dictionary of bind values of all branches.
+        """
+        params = {}
+        for _, branch_params in branches:
+            params.update(branch_params)
+        return "\nUNION ALL\n".join([x for x, _ in branches]), params
+
+    @staticmethod
+    def render_query_template(template, params):
+        """
+        Return the SQL string of the template with the bind parameters
+        replaced by their quoted values.
+
+        This string is only used for display purposes, e.g. in the SQL log.
+        """
+        def quote(match):
+            val = params[match.group(1)]
+            return "'{}'".format(str(val).replace("'", "''"))
+
+        S = re.sub(r":({}\w+)".format(_PARAM_PREFIX), quote, template)
+        return S.replace("\\:", ":")
+
     def is_part_of_speech(self, pos):
         pos_feature = getattr(self, QUERY_ITEM_POS, None)
         if pos_feature:
@@ -2158,9 +2549,18 @@ class CorpusClass(object):
     _corpus_size_cache = {}
     _subcorpus_size_cache = {}
     _corpus_range_cache = {}
-    _context_cache = {}
+    # token windows used by the context renderer, see get_context_window():
+    _context_cache = LRUCache(maxsize=32)
+    _context_lock = threading.RLock()
+    _context_engines = {}
+    # sorted token IDs from the results table, see get_result_token_ids():
+    _result_id_index = None
     _corpus_statistcs_cache = {}
 
+    # number of tokens that are read to the left and to the right of the
+    # target token for the context renderer:
+    context_window_size = 1000
+
     def __init__(self):
         super(CorpusClass, self).__init__()
         self.resource = None
@@ -2520,6 +2920,16 @@ class CorpusClass(object):
             return []
 
     def _read_context_for_renderer(self, token_id, source_id, token_width):
+        """
+        Read the window of tokens around the token from the database.
+
+        The window contains `context_window_size` tokens to the left and to
+        the right of the token. It is stored in the context cache, and
+        returned as a tuple of two data frames, the first containing the
+        tokens, and the second containing the tags.
+        """
+        start = max(0, token_id - self.context_window_size)
+        end = token_id + token_width + self.context_window_size - 1
         origin_id = (getattr(self.resource, "corpus_source_id", None) or
                      getattr(self.resource, "corpus_file_id", None) or
                      getattr(self.resource, "corpus_sentence_id", None) or
@@ -2565,8 +2975,8 @@ class CorpusClass(object):
                 "attribute": self.resource.tag_attribute,
 
                 "current_source_id": source_id,
-                "start": max(0, token_id - 1000),
-                "end": token_id + token_width + 999}
+                "start": start,
+                "end": end}
             column_string = """
                     {corpus}.{corpus_id} AS coquery_invisible_corpus_id,
                     {word_table}.{word} AS coq_word_label_1,
@@ -2606,8 +3016,8 @@ class CorpusClass(object):
                 "joined_tables": " ".join(self.resource.table_list),
 
                 "current_source_id": source_id,
-                "start": max(0, token_id - 1000),
-                "end": token_id + token_width + 999}
+                "start": start,
+                "end": end}
 
         if word_start and word_end:
             column_string = """{},
@@ -2623,8 +3033,7 @@ class CorpusClass(object):
                 "    AND {corpus}.{source_id} = '{current_source_id}'")
         S = format_string.format(**kwargs)
 
-        engine = options.cfg.current_connection.get_engine(
-            self.resource.db_name)
+        engine = self._get_context_engine()
         df = pd.read_sql(S, engine)
         if hasattr(self.resource, "tag_table"):
             S = """
@@ -2641,19 +3050,117 @@ class CorpusClass(object):
                        corpus_id=self.resource.tag_corpus_id,
                        tag_type=self.resource.tag_type,
                        attribute=self.resource.tag_attribute,
-                       start=max(0, token_id - 1000),
-                       end=token_id + token_width + 999)
+                       start=start,
+                       end=end)
             tags = pd.read_sql(S, engine)
         else:
             tags = pd.DataFrame(columns=["COQ_TAG_TAG", "COQ_TAG_TYPE",
                                          "COQ_ATTRIBUTE", "COQ_ID"])
-        engine.dispose()
 
         try:
             df = df.sort_values(by=headers)
         except AttributeError:
             df = df.sort(columns=headers)
-        self._context_cache[(token_id, source_id, token_width)] = (df, tags)
+        df = df.reset_index(drop=True)
+        self._context_cache[
+            (self.resource.db_name, source_id, start, end)] = (df, tags)
+        return df, tags
+
+    def _get_context_engine(self):
+        """
+        Return the database engine used by the context renderer.
+
+        The engine is reused for all context windows from the same
+        database.
+        """
+        key = (options.cfg.current_connection.name, self.resource.db_name)
+        engine = self._context_engines.get(key)
+        if engine is None:
+            engine = options.cfg.current_connection.get_engine(
+                self.resource.db_name)
+            self._context_engines[key] = engine
+        return engine
+
+    def get_context_window(self, token_id, source_id, token_width,
+                           context_width=0):
+        """
+        Return the window of tokens that contains the token and at least
+        `context_width` tokens to the left and to the right of it.
+
+        If a window that contains these tokens has been read before, it is
+        taken from the context cache. Otherwise, the window is read from the
+        database. This method can be called from several threads.
+
+        Returns
+        -------
+        tup : tuple
+            A tuple of two data frames, the first containing the tokens
+            sorted by their ID, and the second containing the tags.
+        """
+        first = max(0, token_id - context_width)
+        last = token_id + token_width + context_width - 1
+        with self._context_lock:
+            for key in reversed(self._context_cache.keys()):
+                db_name, window_source, start, end = key
+                if (db_name == self.resource.db_name and
+                        window_source == source_id and
+                        start <= first and last <= end):
+                    return self._context_cache[key]
+            return self._read_context_for_renderer(
+                token_id, source_id, token_width)
+
+    def prefetch_context(self, token_list, context_width=0):
+        """
+        Read the context windows for the tokens in the list so that they
+        are available in the context cache when they are rendered.
+
+        Parameters
+        ----------
+        token_list : list
+            A list of tuples (token_id, source_id, token_width)
+        context_width : int
+            The number of context tokens on either side of the tokens
+        """
+        for token_id, source_id, token_width in token_list:
+            self.get_context_window(token_id, source_id, token_width,
+                                    context_width)
+
+    @classmethod
+    def get_result_token_ids(cls, data_table, first, last):
+        """
+        Return the IDs of the first and last tokens of all matches in the
+        results table that start between `first` and `last` (exclusively).
+
+        The IDs are looked up in a sorted index of the token IDs from the
+        results table. The index is created once for each results table, so
+        that lookups only require a binary search.
+
+        Returns
+        -------
+        tup : tuple
+            A tuple of two arrays. The first contains the IDs of the first
+            tokens, the second the IDs of the last tokens of the matches.
+        """
+        index = cls._result_id_index
+        if (index is None or index[0] is not data_table or
+                index[1] != len(data_table)):
+            starts = pd.to_numeric(
+                data_table["coquery_invisible_corpus_id"]).values
+            widths = pd.to_numeric(
+                data_table["coquery_invisible_number_of_tokens"]).values
+            valid = ~(pd.isna(starts) | pd.isna(widths))
+            starts = starts[valid].astype(np.int64)
+            widths = widths[valid].astype(np.int64)
+            order = np.argsort(starts, kind="stable")
+            starts = starts[order]
+            ends = starts + widths[order] - 1
+            index = (data_table, len(data_table), starts, ends)
+            CorpusClass._result_id_index = index
+
+        _, _, starts, ends = index
+        lower = np.searchsorted(starts, first, side="right")
+        upper = np.searchsorted(starts, last, side="left")
+        return starts[lower:upper], ends[lower:upper]
 
     def parse_tags(self, row, open=True):
         if open:
@@ -2711,26 +3218,34 @@ class CorpusClass(object):
         return list(range(int(x.coquery_invisible_corpus_id), int(x.end)))
 
     def parse_df(self, df, tags, token_id, token_width):
-        df["COQ_FORMATTED"] = df["coq_word_label_1"].apply(lambda x: [x])
+        """
+        Return the list of words and markup strings for the tokens in the
+        data frame.
 
+        The markup is determined for all tokens at once: each token
+        contributes up to five strings (the opening token style, the
+        opening bold tag, the word, the closing bold tag, and the closing
+        token style), and a mask selects the strings that are used.
+        """
+        ids = df["coquery_invisible_corpus_id"].values
         token_style = "<span style='{};'>".format(
             self.resource.render_token_style)
 
-        mask = df["coquery_invisible_corpus_id"] == token_id
-        df.loc[mask, "COQ_FORMATTED"] = df.loc[mask, "COQ_FORMATTED"].apply(
-            lambda x: ["<b>"] + x)
-        mask = df["coquery_invisible_corpus_id"] == token_id + token_width - 1
-        df.loc[mask, "COQ_FORMATTED"] = df.loc[mask, "COQ_FORMATTED"].apply(
-            lambda x: x + ["</b>"])
+        parts = np.empty((len(df), 5), dtype=object)
+        parts[:, 0] = token_style
+        parts[:, 1] = "<b>"
+        parts[:, 2] = df["coq_word_label_1"].values
+        parts[:, 3] = "</b>"
+        parts[:, 4] = "</span>"
 
-        mask = df["coquery_invisible_corpus_id"].isin(self.id_start_list)
-        df.loc[mask, "COQ_FORMATTED"] = df.loc[mask, "COQ_FORMATTED"].apply(
-            lambda x: [token_style] + x)
-        mask = df["coquery_invisible_corpus_id"].isin(self.id_end_list)
-        df.loc[mask, "COQ_FORMATTED"] = df.loc[mask, "COQ_FORMATTED"].apply(
-            lambda x: x + ["</span>"])
+        mask = np.empty((len(df), 5), dtype=bool)
+        mask[:, 0] = np.isin(ids, np.asarray(self.id_start_list))
+        mask[:, 1] = ids == token_id
+        mask[:, 2] = True
+        mask[:, 3] = ids == token_id + token_width - 1
+        mask[:, 4] = np.isin(ids, np.asarray(self.id_end_list))
 
-        return [item for sublist in df["COQ_FORMATTED"] for item in sublist]
+        return list(parts.ravel()[mask.ravel()])
 
     def get_rendered_context(self, token_id, source_id, token_width,
                              context_width, widget):
@@ -2763,32 +3278,24 @@ class CorpusClass(object):
 
         time_lst = [(datetime.now().timestamp(), "start")]
 
-        if not (token_id, source_id, token_width) in self._context_cache:
-            self._read_context_for_renderer(token_id, source_id, token_width)
+        df, tags = self.get_context_window(token_id, source_id, token_width,
+                                           context_width)
         time_lst.append((datetime.now().timestamp(), "reading context"))
-        df, tags = self._context_cache[(token_id, source_id, token_width)]
-        df = df.reset_index(drop=True)
 
-        ix = df.index[df.coquery_invisible_corpus_id == token_id][0]
+        ids = df["coquery_invisible_corpus_id"].values
+        ix = int(np.searchsorted(ids, token_id))
         context_start = max(0, ix - context_width)
         context_end = ix + token_width + context_width
 
-        df = df[(df.index >= context_start) & (df.index < context_end)]
+        df = df.iloc[context_start:context_end]
         time_lst.append((datetime.now().timestamp(), "limiting rows"))
         # create a list of all token ids that are also listed in the results
         # table:
-        template = (f"{token_id - 1000} < coquery_invisible_corpus_id "
-                    f"< {token_id + 1000 + token_width}")
-        try:
-            tab = options.cfg.main_window.Session.data_table.query(template)
-        except ValueError:
-            tab = options.cfg.main_window.Session.data_table.query(
-                template, engine="python")
-
+        self.id_start_list, self.id_end_list = self.get_result_token_ids(
+            options.cfg.main_window.Session.data_table,
+            token_id - self.context_window_size,
+            token_id + self.context_window_size + token_width)
         time_lst.append((datetime.now().timestamp(), "retrieving ids"))
-        self.id_start_list = tab["coquery_invisible_corpus_id"]
-        self.id_end_list = (self.id_start_list +
-                            tab["coquery_invisible_number_of_tokens"] - 1)
 
         time_lst.append((datetime.now().timestamp(), "creating id lists"))
         context = self.parse_df(df, tags, token_id, token_width)
@@ -17,6 +17,7 @@ import os.path
 import warnings
 import time
 import pandas as pd
+import sqlalchemy
 import re
 import sys
 import fnmatch
@@ -26,10 +27,11 @@ from lxml import etree as ET
 from . import sqlwrap
 from . import options
 from . import corpus
+from . import trigrams
 from .tables import Column, Identifier, Link, Table
 
 from .errors import DependencyError, get_error_repr
-from .defines import (SQL_MYSQL,
+from .defines import (SQL_MYSQL, SQL_SQLITE,
                       DEFAULT_MISSING_VALUE,
                       QUERY_ITEM_GLOSS, QUERY_ITEM_LEMMA,
                       QUERY_ITEM_TRANSCRIPT, QUERY_ITEM_POS,
@@ -82,6 +84,9 @@ XML version of the British National Corpus.
 
 insert_cache = collections.defaultdict(list)
 
+# the number of characters that are read from XML files at a time:
+XML_CHUNK_SIZE = 65536
+
 new_code_str = """
     @staticmethod
     def get_name():
@@ -186,6 +191,187 @@ class Corpus(CorpusClass):
 """
 
 
+def is_root_child(element):
+    """
+    Return True if the element is a direct child of the root element.
+    """
+    parent = element.getparent()
+    return parent is not None and parent.getparent() is None
+
+
+def iter_chunks(file_object, size=XML_CHUNK_SIZE):
+    """
+    Yield the content of the file object in chunks of the given size.
+    """
+    while True:
+        chunk = file_object.read(size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def join_lines(lines, size=XML_CHUNK_SIZE):
+    """
+    Yield chunks that together contain the lines joined by newlines, i.e.
+    the same content as "\\n".join(lines), without joining all lines at
+    once.
+    """
+    separator = ""
+    buffer = []
+    length = 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield separator + "\n".join(buffer)
+            separator = "\n"
+            buffer = []
+            length = 0
+    if buffer:
+        yield separator + "\n".join(buffer)
+
+
+class XMLStreamProcessor(object):
+    """
+    Process the elements of an XML document while it is being parsed.
+
+    Only the elements of body elements are processed. For each of these
+    elements, the callbacks are called in the same order as in a recursive
+    traversal of the complete tree:
+
+    1. enter(element) when entering the element
+    2. the callbacks for every nested element
+    3. leave(element) when leaving the element
+    4. tail(element) to process the tail of the element
+
+    The text of an element is only complete once the parser has reached
+    either the first child or the end of the element, and the tail of an
+    element is only complete once the parser has reached the next element
+    or the end of the parent. The callbacks are delayed until then. The
+    callbacks for a childless element are therefore only called after the
+    element has been completely parsed, and enter() sees the text and the
+    attributes of every element, as well as its first child if there is
+    one.
+
+    After the tail of an element has been processed, the element is
+    cleared and removed from its parent. Only the elements between the
+    root and the current element are kept in memory, so that the memory
+    that is needed doesn't depend on the size of the document. As a
+    consequence, leave() can't access the children of an element.
+    Elements that are outside of a body element, e.g. the header, are not
+    cleared.
+
+    Parameters
+    ----------
+    enter, leave, tail : callable
+        The functions that are called with the element as the argument
+    is_body : callable
+        A function that returns True if the element is a body element
+    start_body : callable
+        A function that is called with the body element when the parser
+        enters a body element. At this point, all elements that precede
+        the body element have been parsed completely.
+    strip_namespace : bool
+        If True, the namespace is removed from the tags of all elements
+    """
+    def __init__(self, enter, leave, tail, is_body, start_body=None,
+                 strip_namespace=False):
+        self._enter = enter
+        self._leave = leave
+        self._tail = tail
+        self._is_body = is_body
+        self._start_body = start_body
+        self._strip_namespace = strip_namespace
+
+        # the stack contains [element, entered] lists for the currently
+        # open elements within the body:
+        self._stack = []
+        self._pending = None
+        self._pending_remove = False
+
+    def _enter_entry(self, entry):
+        if not entry[1]:
+            entry[1] = True
+            self._enter(entry[0])
+
+    def _process_pending(self):
+        element = self._pending
+        if element is None:
+            return
+        self._pending = None
+        self._tail(element)
+        element.clear()
+        if self._pending_remove:
+            parent = element.getparent()
+            while element.getprevious() is not None:
+                del parent[0]
+
+    def start(self, element):
+        if self._strip_namespace:
+            element.tag = element.tag.rpartition("}")[-1]
+        self._process_pending()
+        if self._stack:
+            self._enter_entry(self._stack[-1])
+            self._stack.append([element, False])
+        elif self._is_body(element):
+            if self._start_body:
+                self._start_body(element)
+            self._stack.append([element, False])
+
+    def end(self, element):
+        self._process_pending()
+        if self._stack:
+            entry = self._stack.pop()
+            self._enter_entry(entry)
+            self._leave(element)
+            self._pending = element
+            # the elements preceding a body element are kept:
+            self._pending_remove = bool(self._stack)
+
+    def process_events(self, events):
+        """
+        Process an iterable of (event, element) tuples, as returned by
+        ET.iterparse() or ET.XMLPullParser.read_events(), using the
+        events 'start' and 'end'.
+        """
+        for event, element in events:
+            if event == "start":
+                self.start(element)
+            elif event == "end":
+                self.end(element)
+
+    def close(self):
+        """
+        Finish processing after the last event.
+        """
+        self._process_pending()
+
+    def parse(self, chunks):
+        """
+        Parse and process an XML document.
+
+        Parameters
+        ----------
+        chunks : iterable
+            An iterable of strings or byte strings that contain the XML
+            document
+
+        Returns
+        -------
+        root : Element
+            The root element of the document
+        """
+        parser = ET.XMLPullParser(events=("start", "end"),
+                                  remove_comments=True)
+        for chunk in chunks:
+            parser.feed(chunk)
+            self.process_events(parser.read_events())
+        root = parser.close()
+        self.process_events(parser.read_events())
+        self.close()
+        return root
+
+
 class BaseCorpusBuilder(corpus.SQLResource):
     """
     This class is the base class used to build and install a corpus for
@@ -214,6 +400,17 @@ class BaseCorpusBuilder(corpus.SQLResource):
     # contain token information, and therefore should not be stored as a
     # source file.
     special_files = []
+    # query item types for which a column containing the reversed strings
+    # is added to the lexicon tables (see build_reverse_columns()):
+    reverse_query_items = [QUERY_ITEM_WORD, QUERY_ITEM_LEMMA,
+                           QUERY_ITEM_TRANSCRIPT]
+    # query item types for which a trigram index is created (see
+    # build_trigram_index()):
+    trigram_query_items = [QUERY_ITEM_WORD, QUERY_ITEM_LEMMA,
+                           QUERY_ITEM_TRANSCRIPT]
+    # number of lexicon entries that are read at a time when building the
+    # trigram tables:
+    trigram_chunk_size = 50000
     __version__ = "1.0"
     # file that contains meta data (only applicable in user corpora):
     meta_data = ""
@@ -845,6 +1042,61 @@ class BaseCorpusBuilder(corpus.SQLResource):
             raise e
         return e
 
+    def xml_stream_file(self, file_object, body_tags, process_meta=None):
+        """ Process the body of the XML file while the file is parsed.
+
+        The elements of the body are passed to the same hooks that are
+        used by xml_process_element(), in the same order, but without
+        building the complete XML tree first. Each element is cleared once
+        it has been processed, so that large files can be processed
+        without a lot of memory. See XMLStreamProcessor for details.
+
+        Parameters
+        ----------
+        file_object : str or file-like object
+            The name of the XML file, or a file-like object that returns
+            strings or byte strings
+        body_tags : iterable
+            The tags of the body elements. Only children of the root
+            element are used as body elements.
+        process_meta : callable
+            If not None, this function is called with the root element
+            when the parser enters the body. At this point, all elements
+            preceding the body (e.g. the header) are complete.
+
+        Returns
+        -------
+        root : Element
+            The root element of the document
+        """
+        def enter(element):
+            self.xml_preprocess_tag(element)
+            if element.text:
+                self.xml_process_content(element.text)
+
+        def tail(element):
+            if element.tail is not None and element.tail.strip():
+                self.xml_process_tail(element.tail.strip())
+
+        def start_body(element):
+            if process_meta:
+                process_meta(element.getparent())
+
+        body_tags = set(body_tags)
+        processor = XMLStreamProcessor(
+            enter, self.xml_postprocess_tag, tail,
+            is_body=lambda x: x.tag in body_tags and is_root_child(x),
+            start_body=start_body)
+        try:
+            if isinstance(file_object, str):
+                with open(file_object, "rb") as input_file:
+                    return processor.parse(iter_chunks(input_file))
+            else:
+                return processor.parse(iter_chunks(file_object))
+        except ET.ParseError as e:
+            logging.error(e)
+            raise e
+
     def xml_get_body(self, root):
         """ Return the XML body from the root."""
         raise NotImplementedError("xml_get_body")
@@ -1389,6 +1641,189 @@ class BaseCorpusBuilder(corpus.SQLResource):
         if self.interrupted:
             return
 
+    def build_reverse_columns(self):
+        """
+        Add columns that contain the reversed strings of the word, lemma,
+        and transcript query item features.
+
+        Query items that start with a wildcard such as '*ness' can't use an
+        index on the column, and are therefore evaluated by scanning the
+        whole table. If a resource provides a reversed column for the query
+        item feature (e.g. 'word_label_rev' for 'word_label'),
+        get_token_conditions() matches the reversed query string against
+        this column instead, e.g. "WordRev LIKE 'ssen%'", which is an index
+        range scan.
+
+        This method adds such a column to the lexicon table of each query
+        item type listed in `reverse_query_items`, unless the installer
+        already provides one. The column is also added to the table
+        description so that it is indexed by build_create_indices().
+        Features that are stored in the corpus table are skipped.
+        """
+        for item_type in self.reverse_query_items:
+            rc_feature = getattr(self, item_type, None)
+            if not rc_feature or hasattr(self, f"{rc_feature}_rev"):
+                continue
+            _, tab, _ = self.split_resource_feature(rc_feature)
+            if tab == "corpus":
+                continue
+            table = self.table(getattr(self, f"{tab}_table", None))
+            column = getattr(self, rc_feature)
+            if table is None or table.get_column(column) is None:
+                continue
+
+            rev_column = f"{column}Rev"
+            if table.get_column(rev_column) is not None:
+                continue
+
+            data_type = table.get_column(column).data_type
+            data_type = re.sub(r"\s+NOT NULL", "", data_type,
+                               flags=re.IGNORECASE)
+
+            logging.info(f"Adding reversed column {table.name}.{rev_column}")
+            if self.DB.db_type == SQL_SQLITE:
+                # SQLite doesn't provide a REVERSE() function:
+                self.DB.connection.connection.create_function(
+                    "REVERSE", 1, lambda x: x[::-1] if x else x)
+            self.DB.execute(
+                f"ALTER TABLE {table.name} ADD COLUMN {rev_column} "
+                f"{data_type}")
+            self.DB.execute(
+                f"UPDATE {table.name} SET {rev_column} = REVERSE({column})")
+
+            table.add_column(Column(rev_column, data_type))
+            setattr(self, f"{rc_feature}_rev", rev_column)
+
+            if self.interrupted:
+                return
+
+    def find_reverse_columns(self):
+        """
+        Set the attributes for the columns with reversed strings that
+        already exist in the database.
+
+        build_reverse_columns() sets these attributes only while the
+        database is built. This method is used instead if only the corpus
+        module is written, so that the module still uses the reversed
+        columns.
+        """
+        inspector = sqlalchemy.inspect(self.DB.engine)
+        for item_type in self.reverse_query_items:
+            rc_feature = getattr(self, item_type, None)
+            if not rc_feature or hasattr(self, f"{rc_feature}_rev"):
+                continue
+            _, tab, _ = self.split_resource_feature(rc_feature)
+            table_name = getattr(self, f"{tab}_table", None)
+            if tab == "corpus" or not table_name:
+                continue
+            rev_column = f"{getattr(self, rc_feature)}Rev"
+            try:
+                columns = inspector.get_columns(table_name)
+            except sqlalchemy.exc.NoSuchTableError:
+                continue
+            if rev_column in [col["name"] for col in columns]:
+                setattr(self, f"{rc_feature}_rev", rev_column)
+
+    def find_trigram_indexes(self):
+        """
+        Set the attributes for the trigram tables that already exist in the
+        database.
+
+        build_trigram_index() sets these attributes only while the
+        database is built. This method is used instead if only the corpus
+        module is written, so that the module still uses the trigram
+        tables.
+        """
+        table_names = set(sqlalchemy.inspect(self.DB.engine).get_table_names())
+        for item_type in self.trigram_query_items:
+            rc_feature = getattr(self, item_type, None)
+            if not rc_feature or hasattr(self, f"{rc_feature}_trigrams"):
+                continue
+            _, tab, _ = self.split_resource_feature(rc_feature)
+            table_name = getattr(self, f"{tab}_table", None)
+            if tab == "corpus" or not table_name:
+                continue
+            trigram_table = f"{table_name}{getattr(self, rc_feature)}Trigrams"
+            if trigram_table in table_names:
+                setattr(self, f"{rc_feature}_trigrams", trigram_table)
+
+    def build_trigram_index(self):
+        """
+        Create trigram tables for the word, lemma, and transcript query item
+        features.
+
+        Query items with infix wildcards such as '*tion*' and regular
+        expressions can use neither an ordinary index nor a column with
+        reversed strings, so they are evaluated by comparing every entry in
+        the lexicon table. A trigram table maps each sequence of three
+        characters to the IDs of the lexicon entries that contain it. If a
+        resource provides a trigram table for a query item feature (e.g.
+        'word_label_trigrams' for 'word_label'), get_token_conditions()
+        uses it to restrict the comparison to those entries that contain
+        all trigrams of the query item.
+
+        This method creates such a table for each query item type listed in
+        `trigram_query_items`, unless the installer already provides one.
+        Features that are stored in the corpus table are skipped.
+        """
+        for item_type in self.trigram_query_items:
+            rc_feature = getattr(self, item_type, None)
+            if not rc_feature or hasattr(self, f"{rc_feature}_trigrams"):
+                continue
+            _, tab, _ = self.split_resource_feature(rc_feature)
+            if tab == "corpus":
+                continue
+            table = self.table(getattr(self, f"{tab}_table", None))
+            column = getattr(self, rc_feature)
+            id_column = getattr(self, f"{tab}_id", None)
+            if (table is None or id_column is None or
+                    table.get_column(column) is None):
+                continue
+
+            trigram_table = f"{table.name}{column}Trigrams"
+            logging.info(f"Creating trigram table {trigram_table}")
+
+            # The trigram column needs a fixed width because MySQL can't
+            # index TEXT columns without a key length. A trigram consists
+            # of three characters, and the width of a VARCHAR column is
+            # given in characters, not in bytes:
+            dtype = {trigrams.TRIGRAM_COLUMN: sqlalchemy.types.VARCHAR(3),
+                     id_column: sqlalchemy.types.Integer}
+            columns = [trigrams.TRIGRAM_COLUMN, id_column]
+            pd.DataFrame([], columns=columns).to_sql(
+                trigram_table, self.DB.engine, if_exists="replace",
+                index=False, dtype=dtype)
+
+            # The lexicon is read in chunks of consecutive IDs so that no
+            # cursor is kept open while the trigram table is written:
+            last_id = None
+            while True:
+                S = f"SELECT {id_column}, {column} FROM {table.name}"
+                if last_id is not None:
+                    S = f"{S} WHERE {id_column} > {last_id}"
+                S = (f"{S} ORDER BY {id_column} "
+                     f"LIMIT {self.trigram_chunk_size}")
+                df = pd.read_sql(S, self.DB.engine)
+                if df.empty:
+                    break
+                last_id = int(df[id_column].iloc[-1])
+                rows = [(trigram, entry_id)
+                        for entry_id, label in zip(df[id_column], df[column])
+                        for trigram in trigrams.get_trigrams(label)]
+                pd.DataFrame(rows, columns=columns).to_sql(
+                    trigram_table, self.DB.engine, if_exists="append",
+                    index=False, dtype=dtype)
+                if self.interrupted:
+                    return
+
+            self.DB.create_index(trigram_table, f"{trigram_table}Index",
+                                 [trigrams.TRIGRAM_COLUMN, id_column])
+
+            setattr(self, f"{rc_feature}_trigrams", trigram_table)
+
+            if self.interrupted:
+                return
+
     def build_create_indices(self):
         """
         Create a MySQL index for each column in the database.
@@ -1788,6 +2223,10 @@ class BaseCorpusBuilder(corpus.SQLResource):
           specified by previous calls to :func:`create_table_description`
         * :func:`build_load_files` to read all datafiles, process their
           content, and insert the content into the SQL tables
+        * :func:`build_reverse_columns` to add columns with reversed strings
+          that speed up query items starting with a wildcard
+        * :func:`build_trigram_index` to create trigram tables that speed up
+          query items with infix wildcards and regular expressions
         * :func:`build_lookup_ngram` to create an n-gram lookup table that
           increases query performance of multi-item queries, but which
           requires a lot of disk space
@@ -1865,6 +2304,10 @@ class BaseCorpusBuilder(corpus.SQLResource):
                         for stage in self.additional_stages:
                             if not self.interrupted:
                                 stage()
+                        if not self.interrupted:
+                            self.build_reverse_columns()
+                        if not self.interrupted:
+                            self.build_trigram_index()
 
                     # optimize
                     if (not self.interrupted and
@@ -1894,6 +2337,8 @@ class BaseCorpusBuilder(corpus.SQLResource):
 
                 else:
                     self.set_query_items()
+                    self.find_reverse_columns()
+                    self.find_trigram_indexes()
 
                 # write module
                 if not self.interrupted:
@@ -2002,7 +2447,12 @@ class BaseCorpusBuilder(corpus.SQLResource):
 class XMLCorpusBuilder(BaseCorpusBuilder):
     """
     Define a BaseCorpusBuilder subclass that can process XML files.
+
+    If `stream_xml` is True, the body of each file is processed while the
+    file is parsed (see stream_file()). Otherwise, the complete XML tree
+    is built first.
     """
+    stream_xml = False
 
     def __init__(self, gui=None, strip_namespace=True):
         super(XMLCorpusBuilder, self).__init__(gui=gui)
@@ -2036,6 +2486,23 @@ class XMLCorpusBuilder(BaseCorpusBuilder):
             data = input_file.readlines()
         return data
 
+    def iter_file(self, file_name, encoding="utf-8"):
+        """
+        Open the file, and yield the lines of the file one at a time.
+
+        Parameters
+        ----------
+        file_name : str
+            The name of the file
+        encoding : str
+            The encoding that is used to read the file (default: 'utf-8')
+        """
+        with codecs.open(file_name,
+                         "r",
+                         encoding=encoding) as input_file:
+            for line in input_file:
+                yield line
+
     def preprocess_data(self, data):
         """
         Preprocess the data that has been retrieved from a file.
@@ -2064,8 +2531,11 @@ class XMLCorpusBuilder(BaseCorpusBuilder):
         return tree
 
     def process_file(self, file_name):
+        if self.stream_xml:
+            self.stream_file(file_name)
+            return
         data = self.read_file(file_name, self.encoding)
-        data = self.preprocess_data(data)
+        data = list(self.preprocess_data(data))
         try:
             tree = self.make_tree(data)
         except Exception as e:
@@ -2074,6 +2544,56 @@ class XMLCorpusBuilder(BaseCorpusBuilder):
             raise e
         self.process_tree(tree, file_name)
 
+    def stream_file(self, file_name):
+        """
+        Process the file while it is being parsed.
+
+        The lines of the file are passed through preprocess_data() and are
+        parsed incrementally. When the parser enters the body element,
+        process_header() is called with the parent of the body. The
+        elements of the body are passed to preprocess_element(),
+        process_content() and postprocess_element() in the same order as
+        in process_element(). As the elements are cleared once they have
+        been processed, postprocess_element() can't access the children of
+        the element.
+
+        Parameters
+        ----------
+        file_name : str
+            The name of the file
+        """
+        def enter(element):
+            self.preprocess_element(element)
+            if element.text:
+                self.process_content(element.text)
+
+        def tail(element):
+            if element.tail:
+                self.process_content(element.tail)
+
+        def start_body(element):
+            self.process_header(element.getparent())
+            self.body = element
+
+        processor = XMLStreamProcessor(
+            enter, self.postprocess_element, tail,
+            is_body=self.is_body,
+            start_body=start_body,
+            strip_namespace=self._strip_namespace)
+        data = self.preprocess_data(self.iter_file(file_name, self.encoding))
+        try:
+            processor.parse(join_lines(data))
+        except ET.ParseError as e:
+            print(self._current_file)
+            print(e)
+            raise e
+
+    def is_body(self, element):
+        """
+        Return True if the element is the body element of the file.
+        """
+        return element.tag == self.body_tag and is_root_child(element)
+
     def process_tree(self, tree, file_name=None):
         self.process_header(tree.root)
         self.process_body(tree.root)
@@ -2202,6 +2722,11 @@ class TEICorpusBuilder(XMLCorpusBuilder):
             # assume that this is just one TEI document
             super(TEICorpusBuilder, self).process_tree(tree)
 
+    def is_body(self, element):
+        parent = element.getparent()
+        return (element.tag == self.body_tag and
+                parent is not None and parent.tag == "TEI")
+
     def process_header(self, tree):
         """
         See TEI Header examples:
@@ -165,6 +165,7 @@ COLUMN_NAMES = {
     "statistics_tokens": "Tokens (=number of matches)",
     "statistics_types": "Types (=number of distinct matches)",
     "statistics_ttr": "Type-token ratio",
+    "statistics_yules_k": "Yule's K",
     "statistics_rank": "Rank",
     "statistics_column_total": "ALL",
 
@@ -220,6 +221,10 @@ FUNCTION_DESC = {
         "Calculate the standardized type-token ratio (chunk size: 2500 words)",
     "STTR250":
         "Calculate the standardized type-token ratio (chunk size: 250 words)",
+    "MATTR":
+        "Calculate the moving-average type-token ratio",
+    "statistics_yules_k":
+        "Calculate Yule's K as a measure of lexical repetitiveness",
     "reference_frequency":
         "Count the frequeny of the match in the reference corpus",
     "reference_frequency_ptw":
@@ -417,6 +422,15 @@ MODULE_INFORMATION = {
              "0.43",
              "Allows installers to access various database formats",
              "https://github.com/reubano/meza"),
+    "pyarrow": ("Python library for Apache Arrow",
+                "1.0",
+                "Save query results as Parquet files",
+                "https://arrow.apache.org/docs/python/"),
+    "openpyxl": ("openpyxl – A Python library to read/write Excel 2010 "
+                 "xlsx/xlsm files",
+                 "3.0",
+                 "Save query results as Microsoft Excel files",
+                 "https://openpyxl.readthedocs.io/"),
     }
 
 
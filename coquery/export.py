@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+export.py is part of Coquery.
+
+Copyright (c) 2016-2022 Gero Kunter (gero.kunter@coquery.org)
+
+Coquery is released under the terms of the GNU General Public License (v3).
+For details, see the file LICENSE that you should have received along
+with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides the TableExporter class that writes result tables to
+files or to a string.
+
+The exporter writes the table in chunks of rows, so that only the current
+chunk has to be converted to its output representation at any time. After
+each chunk, a progress callback is called, and the export can be cancelled
+between two chunks. This makes the exporter suitable for being run in a
+worker thread.
+"""
+
+from __future__ import unicode_literals
+
+import io
+import gzip
+
+from . import options
+from .errors import DependencyError
+
+EXPORT_CSV = "csv"
+EXPORT_TSV = "tsv"
+EXPORT_GZIP = "gzip"
+EXPORT_PARQUET = "parquet"
+EXPORT_EXCEL = "excel"
+
+# the number of rows that fit into an Excel worksheet, including the
+# header row:
+EXCEL_MAX_ROWS = 1048576
+
+_extensions = [
+    (".csv.gz", EXPORT_GZIP),
+    (".gz", EXPORT_GZIP),
+    (".tsv", EXPORT_TSV),
+    (".tab", EXPORT_TSV),
+    (".parquet", EXPORT_PARQUET),
+    (".xlsx", EXPORT_EXCEL),
+    ]
+
+
+def get_export_format(path):
+    """
+    Return the export format that matches the file name extension.
+
+    File names with an unknown extension are exported as CSV files.
+    """
+    path = path.lower()
+    for ext, fmt in _extensions:
+        if path.endswith(ext):
+            return fmt
+    return EXPORT_CSV
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class TableExporter(object):
+    """
+    Write a data frame in chunks of rows.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The data frame that is exported
+    header : list
+        The column names used in the output. If None, the column names of
+        the data frame are used.
+    chunk_size : int
+        The number of rows that are written at once
+    progress : callable
+        A function that is called after each chunk with the number of rows
+        that have been written so far
+    """
+    def __init__(self, df, header=None, chunk_size=50000, progress=None):
+        self.df = df
+        if header is None:
+            header = list(df.columns)
+        self.header = list(header)
+        self.chunk_size = max(1, chunk_size)
+        self.progress = progress
+        self.rows_written = 0
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Stop the export after the current chunk.
+        """
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def chunks(self):
+        """
+        Yield the chunks of the data frame, using the output column names.
+
+        After a chunk has been processed by the caller, the progress
+        function is called. If the export has been cancelled,
+        ExportCancelled is raised.
+        """
+        self.rows_written = 0
+        for start in range(0, len(self.df), self.chunk_size):
+            if self._cancelled:
+                raise ExportCancelled
+            chunk = self.df.iloc[start:start + self.chunk_size]
+            chunk = chunk.set_axis(self.header, axis="columns")
+            yield chunk
+            self.rows_written += len(chunk)
+            if self.progress:
+                self.progress(self.rows_written)
+
+    def write_text(self, handle, sep=",", header=True):
+        """
+        Write the table as delimiter-separated values to a file handle.
+        """
+        first = True
+        for chunk in self.chunks():
+            chunk.to_csv(handle, sep=sep, index=False,
+                         header=header and first)
+            first = False
+        if first and header:
+            # write the header even if the table is empty:
+            self.df.iloc[0:0].set_axis(self.header, axis="columns").to_csv(
+                handle, sep=sep, index=False)
+
+    def to_string(self, sep="\t", header=True):
+        """
+        Return the table as a string of delimiter-separated values.
+        """
+        buf = io.StringIO()
+        self.write_text(buf, sep=sep, header=header)
+        return buf.getvalue()
+
+    def write(self, path, fmt=None, sep=None, encoding=None):
+        """
+        Write the table to a file.
+
+        Parameters
+        ----------
+        path : str
+            The name of the output file
+        fmt : str
+            The export format. If None, the format is determined from the
+            extension of the file name.
+        sep : str
+            The column separator used for CSV files. If None, the output
+            separator from the settings is used.
+        encoding : str
+            The encoding of text files. If None, the output encoding from
+            the settings is used.
+        """
+        if fmt is None:
+            fmt = get_export_format(path)
+        if sep is None:
+            sep = options.cfg.output_separator
+        if encoding is None:
+            encoding = options.cfg.output_encoding
+
+        if fmt == EXPORT_CSV:
+            with open(path, "w", encoding=encoding, newline="") as handle:
+                self.write_text(handle, sep=sep)
+        elif fmt == EXPORT_TSV:
+            with open(path, "w", encoding=encoding, newline="") as handle:
+                self.write_text(handle, sep="\t")
+        elif fmt == EXPORT_GZIP:
+            with gzip.open(path, "wt", encoding=encoding,
+                           newline="") as handle:
+                self.write_text(handle, sep=sep)
+        elif fmt == EXPORT_PARQUET:
+            self.write_parquet(path)
+        elif fmt == EXPORT_EXCEL:
+            self.write_excel(path)
+        else:
+            raise ValueError("Unknown export format: {}".format(fmt))
+
+    def write_parquet(self, path):
+        if not options.use_pyarrow:
+            raise DependencyError("pyarrow")
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        schema = None
+        try:
+            for chunk in self.chunks():
+                if schema is None:
+                    schema = pa.Schema.from_pandas(chunk,
+                                                   preserve_index=False)
+                    # columns that contain only missing values in the
+                    # first chunk are stored as strings:
+                    for i, field in enumerate(schema):
+                        if pa.types.is_null(field.type):
+                            schema = schema.set(
+                                i, pa.field(field.name, pa.string()))
+                    writer = pq.ParquetWriter(path, schema)
+                table = pa.Table.from_pandas(chunk, schema=schema,
+                                             preserve_index=False)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def write_excel(self, path):
+        if not options.use_openpyxl:
+            raise DependencyError("openpyxl")
+        if len(self.df) + 1 > EXCEL_MAX_ROWS:
+            raise ValueError(
+                "Excel worksheets can't contain more than {} rows.".format(
+                    EXCEL_MAX_ROWS - 1))
+        import openpyxl
+
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(self.header)
+        for chunk in self.chunks():
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                sheet.append(row)
+        workbook.save(path)
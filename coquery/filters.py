@@ -13,6 +13,7 @@ from __future__ import unicode_literals
 import logging
 import re
 import numpy as np
+import pandas as pd
 
 from coquery.general import CoqObject
 from coquery.defines import (OP_MATCH, OP_NMATCH, OP_RANGE, OP_NE, OP_EQ,
@@ -68,6 +69,11 @@ class Filter(CoqObject):
         if not feature:
             raise ValueError("No filter column specified")
 
+        # categorical columns are filtered by the dtype of their
+        # categories:
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtype = dtype.categories.dtype
+
         self.feature = feature
         self.operator = operator
         self.value = value
@@ -200,6 +206,11 @@ class Filter(CoqObject):
             return df.iloc[col[matching].index]
         else:
             try:
+                if isinstance(df[self.feature].dtype, pd.CategoricalDtype):
+                    # unordered categorical columns only support tests for
+                    # equality, so the query is evaluated on the values:
+                    values = df[[self.feature]].astype(object)
+                    return df.loc[values.query(self.get_filter_string()).index]
                 return df.query(self.get_filter_string())
             except SyntaxError as e:
                 s = "Could not apply filter {}: {}".format(self, str(e))
@@ -21,11 +21,10 @@ import numpy as np
 import operator
 import logging
 import numbers
-from scipy import stats
 
 from . import options
-# FIXME: Replace use of get_toplevel_window() to obtain a valid connection
-from .gui.pyqt_compat import get_toplevel_window
+from . import lexicaldiversity
+from . import coltypes
 from .defines import COLUMN_NAMES, QUERY_ITEM_WORD
 from .general import CoqObject, collapse_words
 from .errors import RegularExpressionError
@@ -225,7 +224,9 @@ class Function(CoqObject):
             options.cfg.current_connection.name, None)
         if ref_corpus is None:
             return None
-        res = options.cfg.current_connection.resources()[ref_corpus]
+        res = options.cfg.current_connection.find_resource(ref_corpus)
+        if res is None:
+            return None
         ResourceClass, CorpusClass, _ = res
         corpus = CorpusClass()
         resource = ResourceClass(None, corpus)
@@ -464,7 +465,7 @@ class NumFunction(Function):
         Coerce the function argument to the appropriate type depending on the
         values of the supplied data frame.
         """
-        column_dtypes = [df[col].dropna().convert_dtypes().dtype
+        column_dtypes = [coltypes.get_dtype(df[col])
                          for col in self.columns]
         if all([pd.api.types.is_numeric_dtype(dt) for dt in column_dtypes]):
             # if all columns are numeric, the value is coerced to float
@@ -864,7 +865,7 @@ class Freq(BaseFreq):
                        not y.startswith(("coquery_invisible"))]}
         d[columns[0]] = "count"
 
-        val = df.merge(df.groupby(columns, dropna=False)
+        val = df.merge(df.groupby(columns, dropna=False, observed=True)
                          .agg(d)
                          .rename(columns={columns[0]: self.get_id()})
                          .reset_index(), on=columns, how="left")[self.get_id()]
@@ -1027,6 +1028,9 @@ class ReferenceCorpusLLKeyness(ReferenceCorpusFrequency):
     _name = "reference_ll_keyness"
 
     def _func(self, x, size, ext_size, width):
+        # scipy is slow to import, so it is only imported when needed:
+        from scipy import stats
+
         obs = np.array(
             [[x.freq1, x.freq2],
              [size - x.freq1 * width, ext_size - x.freq2 * width]])
@@ -1159,7 +1163,8 @@ class Types(BaseProportion):
     no_column_labels = True
 
     def evaluate(self, df, **kwargs):
-        val = self.constant(df, len(df[self.columns].drop_duplicates()))
+        codes = lexicaldiversity.factorize(df, self.columns)
+        val = self.constant(df, lexicaldiversity.types(codes))
         return val
 
 
@@ -1184,21 +1189,13 @@ class StandardizedTypeTokenRatio(Types):
 
     def evaluate(self, df, **kwargs):
         parameter = kwargs.get("value", 2500)
-        tty_list = []
-        ix = df.sample(len(df)).index
-        for i in range(len(df) // parameter):
-            dsub = df.loc[ix].iloc[(i * parameter):(i + 1) * parameter]
-            types = super().evaluate(dsub, **kwargs)
-            tokens = Tokens(group=self.group,
-                            columns=self.columns).evaluate(dsub, **kwargs)
-            n_types = types.values[0]
-            n_tokens = tokens.values[0]
-            tty_list.append(n_types / n_tokens)
-
-        if tty_list:
-            val = self.constant(df, sum(tty_list) / len(tty_list))
-        else:
+        codes = lexicaldiversity.factorize(df, self.columns)
+        sttr = lexicaldiversity.sttr(
+            codes, parameter, random_state=kwargs.get("random_state"))
+        if np.isnan(sttr):
             val = None
+        else:
+            val = self.constant(df, sttr)
         return val
 
 
@@ -1209,6 +1206,29 @@ class StandardizedTypeTokenRatio250(StandardizedTypeTokenRatio):
         return super().evaluate(df, value=250)
 
 
+class MovingAverageTypeTokenRatio(Types):
+    _name = "MATTR"
+    no_column_labels = True
+
+    arguments = {"int": [("value", "Window size:", 500)]}
+
+    def evaluate(self, df, **kwargs):
+        parameter = kwargs.get("value", 500)
+        codes = lexicaldiversity.factorize(df, self.columns)
+        val = self.constant(df, lexicaldiversity.mattr(codes, parameter))
+        return val
+
+
+class YulesK(Types):
+    _name = "statistics_yules_k"
+    no_column_labels = True
+
+    def evaluate(self, df, **kwargs):
+        codes = lexicaldiversity.factorize(df, self.columns)
+        val = self.constant(df, lexicaldiversity.yules_k(codes))
+        return val
+
+
 class Proportion(BaseProportion):
     _name = "statistics_proportion"
     no_column_labels = True
@@ -1252,15 +1272,8 @@ class Entropy(Proportion):
     # this thing".
 
     def evaluate(self, df, **kwargs):
-        _df = df[self.columns]
-        _df["COQ_PROP"] = super().evaluate(df, **kwargs)
-        _df = _df.drop_duplicates()
-        props = _df["COQ_PROP"].values
-        if len(_df) == 1:
-            entropy = 0.0
-        else:
-            entropy = -sum(props * np.log2(props))
-        val = self.constant(df, entropy)
+        codes = lexicaldiversity.factorize(df, self.columns)
+        val = self.constant(df, lexicaldiversity.entropy(codes))
         return val
 
 
@@ -1540,6 +1553,10 @@ class ContextColumns(Function):
                             df[sentence_col] = val
                             self._sentence_column = sentence_col
 
+                # FIXME: Replace use of get_toplevel_window() to obtain a
+                # valid connection
+                from .gui.pyqt_compat import get_toplevel_window
+
                 get_toplevel_window().useContextConnection.emit(db_connection)
                 val = df.apply(lambda x: self._func(row=x,
                                                     session=session,
@@ -21,6 +21,7 @@ import numpy as np
 import io
 import ctypes
 import logging
+from collections import OrderedDict
 
 from .unicode import utf8
 from .defines import LANGUAGES
@@ -404,6 +405,57 @@ class CoqObject(object):
         return hashlib.md5(u"".join(lst).encode()).hexdigest()
 
 
+class LRUCache(object):
+    """
+    A small dictionary-like container that keeps at most `maxsize` items.
+
+    If a new item is added to a full cache, the least recently used item is
+    discarded. Unlike the caches provided by the optional cachetools module,
+    this class is always available.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def keys(self):
+        """
+        Return a list of the keys, from the least to the most recently used
+        key.
+        """
+        return list(self._data.keys())
+
+    def clear(self):
+        self._data.clear()
+
+
 def is_language_name(code):
     return code in LANGUAGES["Language name"].values()
 
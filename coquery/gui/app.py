@@ -161,6 +161,7 @@ class CoqMainWindow(QtWidgets.QMainWindow):
     columnVisibilityChanged = pyqtSignal()
     rowVisibilityChanged = pyqtSignal()
     updateMultiProgress = pyqtSignal(int)
+    updateTextgridProgress = pyqtSignal(int, int)
     updateStatusMessage = pyqtSignal(str)
     abortRequested = pyqtSignal()
     useContextConnection = pyqtSignal(object)
@@ -191,6 +192,10 @@ class CoqMainWindow(QtWidgets.QMainWindow):
         self._old_sizes = None
         self._to_file = False
         self.reaggregating = False
+        self.results_export_thread = None
+        self.results_exporter = None
+        self.textgrid_thread = None
+        self.textgrid_writer = None
         self._context_connections = []
         self.terminating = False
         self._first_visualization_call = True
@@ -383,6 +388,7 @@ class CoqMainWindow(QtWidgets.QMainWindow):
             self.ui.multi_query_progress.setValue)
         self.updateMultiProgress.connect(
             lambda n: self.ui.status_progress.setValue(0))
+        self.updateTextgridProgress.connect(self.show_textgrid_progress)
         self.updateStatusMessage.connect(
             lambda s: self.ui.status_message.setText(s))
 
@@ -654,7 +660,13 @@ class CoqMainWindow(QtWidgets.QMainWindow):
         #self.rowVisibilityChanged.connect(self.update_row_visibility)
 
     def keyPressEvent(self, e):
-        if e.key() != QtCore.Qt.Key_Escape or not self.reaggregating:
+        if (e.key() == QtCore.Qt.Key_Escape and
+                self.results_export_thread is not None):
+            self.results_exporter.cancel()
+        elif (e.key() == QtCore.Qt.Key_Escape and
+                self.textgrid_thread is not None):
+            self.textgrid_writer.cancel()
+        elif e.key() != QtCore.Qt.Key_Escape or not self.reaggregating:
             pass
         else:
             self.abortRequested.emit()
@@ -1773,6 +1785,8 @@ class CoqMainWindow(QtWidgets.QMainWindow):
         return df
 
     def save_results(self, sel_only=False):
+        from coquery import export
+
         if sel_only:
             caption = "Save selected query results – Coquery"
         else:
@@ -1780,13 +1794,27 @@ class CoqMainWindow(QtWidgets.QMainWindow):
 
         name = QtWidgets.QFileDialog.getSaveFileName(
             caption=caption,
-            directory=options.cfg.results_file_path)
+            directory=options.cfg.results_file_path,
+            filter=("CSV files (*.csv);;"
+                    "Tab-separated files (*.tsv);;"
+                    "Compressed CSV files (*.csv.gz);;"
+                    "Parquet files (*.parquet);;"
+                    "Excel files (*.xlsx);;"
+                    "All files (*)"))
 
         if type(name) == tuple:
             name = name[0]
         if not name:
             return
 
+        fmt = export.get_export_format(name)
+        if fmt == export.EXPORT_PARQUET and not options.use_pyarrow:
+            errorbox.alert_missing_module("pyarrow", self)
+            return
+        if fmt == export.EXPORT_EXCEL and not options.use_openpyxl:
+            errorbox.alert_missing_module("openpyxl", self)
+            return
+
         options.cfg.results_file_path = os.path.dirname(name)
 
         # restrict to selection?
@@ -1795,18 +1823,7 @@ class CoqMainWindow(QtWidgets.QMainWindow):
         else:
             df = self.table_model.content
 
-        df.columns = self.Session.translated_headers(df)
-
-        try:
-            df.to_csv(name,
-                      sep=options.cfg.output_separator,
-                      index=False,
-                      encoding=options.cfg.output_encoding)
-        except IOError:
-            critical_box(self, "Disk error", msg_disk_error)
-        except (UnicodeEncodeError, UnicodeDecodeError):
-            critical_box(self, "Encoding error", msg_encoding_error)
-        else:
+        def finalize():
             if not sel_only:
                 self.last_results_saved = True
             msg = "{data} saved to file {filename}.".format(
@@ -1814,35 +1831,111 @@ class CoqMainWindow(QtWidgets.QMainWindow):
                 filename=name)
             self.showMessage(msg)
 
+        self.start_results_export(
+            df, lambda: self.results_exporter.write(name, fmt), finalize)
+
     def save_selection(self):
         self.save_results(sel_only=True)
 
     def copy_to_clipboard(self):
         df = self.get_selection(self.table_model.content)
-        df.columns = self.Session.translated_headers(df)
-
-        sel_only = not df.equals(self.table_model.content)
+        sel_only = df.shape != self.table_model.content.shape
 
         # headers are provided if more than one column is selected (this should
         # facilitate copy-pasting column data -- this may be a stupid idea,
         # actually.
         header = len(df.columns) != 1
-        try:
-            s = df.to_csv(index=False,
-                          sep=utf8("\t"),
-                          header=header,
-                          encoding=options.cfg.output_encoding)
-        except (UnicodeEncodeError, UnicodeDecodeError):
-            critical_box(self, "Encoding error", msg_encoding_error)
-        else:
+        self._clipboard_text = None
+
+        def copy():
+            self._clipboard_text = self.results_exporter.to_string(
+                sep=utf8("\t"), header=header)
+
+        def finalize():
             cb = QtWidgets.QApplication.clipboard()
             cb.clear(mode=cb.Clipboard)
-            cb.setText(s, mode=cb.Clipboard)
+            cb.setText(self._clipboard_text, mode=cb.Clipboard)
+            self._clipboard_text = None
 
             msg = "{} copied to clipboard.".format(
                 "Selection" if sel_only else "Results table")
             self.showMessage(msg)
 
+        self.start_results_export(df, copy, finalize)
+
+    def start_results_export(self, df, fun, finalize):
+        """
+        Export the data frame in a separate thread.
+
+        The export is carried out by a TableExporter that is available as
+        self.results_exporter while the export is running. The progress is
+        shown in the status bar, and the export can be cancelled by
+        pressing Escape.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The data frame that is exported
+        fun : callable
+            The function that carries out the export using
+            self.results_exporter
+        finalize : callable
+            The function that is called in the GUI thread after the export
+            has been completed successfully
+        """
+        from coquery.export import TableExporter
+
+        if self.results_export_thread is not None:
+            self.showMessage("Another export is still running.")
+            return
+
+        self.results_exporter = TableExporter(
+            df, header=self.Session.translated_headers(df),
+            progress=self.updateMultiProgress.emit)
+        self._results_export_failed = False
+
+        self.ui.multi_query_progress.setFormat("Exporting... (%v of %m)")
+        self.start_progress_indicator(n=len(df))
+        self.showMessage("Exporting results table (press Escape to "
+                         "cancel)...")
+
+        self.results_export_thread = CoqThread(fun, parent=self)
+        self.results_export_thread.setInterrupt(self.results_exporter.cancel)
+        self.results_export_thread.taskException.connect(
+            self.exception_during_results_export)
+        self.results_export_thread.taskFinished.connect(
+            lambda: self.finalize_results_export(finalize))
+        self.results_export_thread.start()
+
+    def exception_during_results_export(self, e):
+        from coquery.export import ExportCancelled
+
+        self._results_export_failed = True
+        if isinstance(e, ExportCancelled):
+            return
+        elif isinstance(e, IOError):
+            critical_box(self, "Disk error", msg_disk_error)
+        elif isinstance(e, (UnicodeEncodeError, UnicodeDecodeError)):
+            critical_box(self, "Encoding error", msg_encoding_error)
+        elif isinstance(e, ValueError):
+            critical_box(self, "Export error – Coquery", str(e))
+        else:
+            errorbox.ErrorBox.show(self.exc_info, self.exception)
+
+    def finalize_results_export(self, finalize):
+        self.stop_progress_indicator()
+        self.ui.multi_query_progress.setFormat("Running query... (%v of %m)")
+        cancelled = self.results_exporter.cancelled
+        self.results_export_thread = None
+        self.results_exporter = None
+
+        if cancelled:
+            self.showMessage("Export cancelled.")
+        elif self._results_export_failed:
+            self.showMessage("Export failed.")
+        else:
+            finalize()
+
     def create_textgrids(self):
         if not options.use_tgt:
             errorbox.alert_missing_module("tgt", self)
@@ -1859,6 +1952,10 @@ class CoqMainWindow(QtWidgets.QMainWindow):
         if result:
             from coquery.textgrids import TextgridWriter
 
+            if self.textgrid_thread is not None:
+                self.showMessage("Another export is still running.")
+                return
+
             for x in ordered_headers:
                 if "_starttime_" in x or "_endtime_" in x:
                     result["columns"].append(x)
@@ -1872,27 +1969,53 @@ class CoqMainWindow(QtWidgets.QMainWindow):
                                  "coquery_invisible_corpus_endtime")):
                     tab[x] = self.table_model.invisible_content[x]
 
-            self.textgrid_writer = TextgridWriter(tab, self.Session)
+            self.textgrid_writer = TextgridWriter(
+                tab, self.Session, progress=self.updateTextgridProgress.emit)
+            self._textgrid_export_failed = False
 
+            self.ui.multi_query_progress.setFormat(
+                "Writing text grids... (%v of %m)")
             self.start_progress_indicator()
+            self.showMessage("Writing text grids (press Escape to "
+                             "cancel)...")
             result["parent"] = self
             self.textgrid_thread = CoqThread(
                 self.textgrid_writer.write_grids, **result)
+            self.textgrid_thread.setInterrupt(self.textgrid_writer.cancel)
             self.textgrid_thread.taskException.connect(
                 self.exception_during_textgrid)
             self.textgrid_thread.taskFinished.connect(
                 self.finalize_textgrid)
             self.textgrid_thread.start()
 
-    def exception_during_textgrid(self):
-        errorbox.ErrorBox.show(self.exc_info, self.exception)
-        self.showMessage("Textgrids failed.")
-        self.stop_progress_indicator()
+    def show_textgrid_progress(self, n, total):
+        self.ui.multi_query_progress.setRange(0, total)
+        self.ui.multi_query_progress.setValue(n)
+        self.ui.multi_query_progress.show()
+
+    def exception_during_textgrid(self, e):
+        from coquery.export import ExportCancelled
+
+        self._textgrid_export_failed = True
+        if not isinstance(e, ExportCancelled):
+            errorbox.ErrorBox.show(self.exc_info, self.exception)
 
     def finalize_textgrid(self):
         self.stop_progress_indicator()
-        self.showMessage(f"Done writing {self.textgrid_writer.n} text grids "
-                         f"to {self.textgrid_writer.output_path}.")
+        self.ui.multi_query_progress.setFormat("Running query... (%v of %m)")
+        self.textgrid_thread = None
+
+        writer = self.textgrid_writer
+        if writer.cancelled:
+            self.showMessage(f"Textgrid export cancelled after {writer.n} "
+                             f"text grids.")
+        elif self._textgrid_export_failed:
+            self.showMessage("Textgrids failed.")
+        else:
+            msg = f"Done writing {writer.n} text grids"
+            if writer.n_snippets:
+                msg += f" and {writer.n_snippets} audio files"
+            self.showMessage(f"{msg} to {writer.output_path}.")
 
     def showMessage(self, S):
         self.ui.status_message.setText(S)
@@ -2440,8 +2563,9 @@ class CoqMainWindow(QtWidgets.QMainWindow):
             self.ui.button_run_query_to_file.setDisabled(True)
             self.ui.button_run_query_to_file.setVisible(False)
 
+            number_of_queries = self.new_session.count_queries()
             if to_file:
-                if len(self.new_session.query_list) == 1:
+                if number_of_queries == 1:
                     self.showMessage("Running query...")
                 else:
                     self.showMessage("")
@@ -2451,7 +2575,7 @@ class CoqMainWindow(QtWidgets.QMainWindow):
             self.new_session.groups = self.ui.tree_groups.groups()
             self.new_session.column_functions = self.Session.column_functions
 
-            self.start_progress_indicator(n=len(self.new_session.query_list))
+            self.start_progress_indicator(n=number_of_queries)
             self.query_thread = CoqThread(self.new_session.run_queries,
                                           to_file=to_file,
                                           parent=self)
@@ -2810,8 +2934,8 @@ class CoqMainWindow(QtWidgets.QMainWindow):
                 self.resize_rows()
 
             try:
-                self.table_model.formatted = self.table_model.format_content(
-                    self.table_model.content)
+                self.table_model.clear_formatted()
+                self.hidden_model.clear_formatted()
             except AttributeError:
                 # raised if no query has been run yet, and therefore no
                 # table_model is available
@@ -53,6 +53,8 @@ class AvailableModulesDialog(QtWidgets.QDialog):
                 ("PyMongo", options.use_pymongo),
                 ("pyodbc", options.use_pyodbc),
                 ("meza", options.use_meza),
+                ("pyarrow", options.use_pyarrow),
+                ("openpyxl", options.use_openpyxl),
                 ]
         if sys.platform.startswith("linux"):
             modules.insert(0, ("alsaaudio", options.use_alsaaudio))
@@ -21,6 +21,8 @@ from PyQt5.QtCore import pyqtSignal
 from coquery import options
 from coquery import managers
 from coquery.unicode import utf8
+from coquery.general import LRUCache
+from coquery import coltypes
 
 from coquery.gui.pyqt_compat import (
     frameShadow, frameShape, get_toplevel_window)
@@ -1509,7 +1511,15 @@ class CoqTableView(QtWidgets.QTableView):
 class CoqTableModel(QtCore.QAbstractTableModel):
     """ Define a QAbstractTableModel class that stores the query results in a
     pandas DataFrame object. It provides the required methods so that they
-    can be shown in the results view. """
+    can be shown in the results view.
+
+    The visual representations of the cells are not created in advance.
+    Instead, the rows are formatted in blocks of `block_size` rows when one
+    of the rows is requested by the view for the first time. Only the
+    `max_blocks` most recently used blocks are kept. """
+
+    block_size = 256
+    max_blocks = 64
 
     def __init__(self, df, session=None, parent=None, *args):
         super(CoqTableModel, self).__init__(parent, *args)
@@ -1525,6 +1535,9 @@ class CoqTableModel(QtCore.QAbstractTableModel):
                                              session.Resource.name)
         self._align = []
         self._dtypes = []
+        self._dtype_map = {}
+        # formatted rows are created on demand, see get_formatted():
+        self._formatted_blocks = LRUCache(maxsize=self.max_blocks)
 
         columns = self.header
         if len(columns) != len(columns.unique()):
@@ -1534,8 +1547,9 @@ class CoqTableModel(QtCore.QAbstractTableModel):
         # prepare look-up lists that speed up data retrieval:
         for i, col in enumerate(columns):
             # remember dtype of columns:
-            dtype = df[col].dropna().convert_dtypes().dtype
+            dtype = coltypes.get_dtype(df[col])
             self._dtypes.append(dtype)
+            self._dtype_map[col] = dtype
 
             sorter = self._manager.get_sorter(col)
 
@@ -1548,7 +1562,6 @@ class CoqTableModel(QtCore.QAbstractTableModel):
             else:
                 # otherwise, left-align:
                 self._align.append(_left_align)
-        self.formatted = self.format_content(self.content)
 
     def flags(self, index):
         flags = super(CoqTableModel, self).flags(index)
@@ -1572,7 +1585,7 @@ class CoqTableModel(QtCore.QAbstractTableModel):
         if (role == QtCore.Qt.EditRole and
                 col.startswith("coq_userdata")):
             self.content[col][row] = value
-            self.formatted[col][row] = value
+            self._formatted_blocks.pop(index.row() // self.block_size)
             _id_column = "coquery_invisible_corpus_id"
             corpus_id = self.invisible_content.iloc[index.row(_id_column)]
             which = tab.coquery_invisible_corpus_id == corpus_id
@@ -1582,7 +1595,7 @@ class CoqTableModel(QtCore.QAbstractTableModel):
         return False
 
     @staticmethod
-    def format_content(source):
+    def format_content(source, dtypes=None):
         """
         Create a data frame that contains the visual representations of the
         input data frame.
@@ -1591,49 +1604,95 @@ class CoqTableModel(QtCore.QAbstractTableModel):
         - QTableView is very slow for data types that are not strings
         - Missing values need special treatment
         - Boolean and float columns require special formatting
+
+        Parameters
+        ----------
+        source : pandas.DataFrame
+            The data frame that is formatted
+        dtypes : dict
+            A dictionary with the column names as keys and the data types
+            that determine the formatting as values. If a column is missing
+            from the dictionary, the data type is determined from the values
+            in the data frame.
         """
         df = pd.DataFrame(index=source.index)
+        if dtypes is None:
+            dtypes = {}
 
         for col in source:
             val = source[col]
-            dtype = val.dropna().convert_dtypes().dtype
 
             # copy invisible columns:
             if col.startswith("coquery_invisible"):
                 df[col] = val
                 continue
 
+            dtype = dtypes.get(col)
+            if dtype is None:
+                dtype = coltypes.get_dtype(val)
+
             # FIXME: the sign of G test statistic should not be handled
             # in the output!
             if col.startswith("statistics_g_test"):
                 val = abs(val)
 
-            if pd.api.types.is_numeric_dtype(dtype):
-                if pd.api.types.is_integer_dtype(dtype):
+            values = val.values
+            if (pd.api.types.is_numeric_dtype(dtype) or
+                    pd.api.types.is_bool_dtype(dtype)):
+                missing = np.asarray(pd.isna(values), dtype=bool)
+                formatted = np.full(len(values), options.cfg.na_string,
+                                    dtype=object)
+                valid = values[~missing]
+
+                if pd.api.types.is_bool_dtype(dtype):
+                    # use bool substitute labels:
+                    formatted[~missing] = np.where(
+                        np.asarray(valid, dtype=bool), "yes", "no")
+                elif (pd.api.types.is_integer_dtype(dtype) and
+                        isinstance(valid, np.ndarray) and
+                        np.issubdtype(valid.dtype, np.integer)):
                     # integers are just converted to strings
-                    to_str_fnc = str
+                    formatted[~missing] = valid.astype(str)
                 else:
-                    # floats use the float format string function
-                    to_str_fnc = options.cfg.float_format.format
-
-                val = map(lambda x: (to_str_fnc(x)
-                                     if not pd.isna(x) else
-                                     options.cfg.na_string),
-                          val.values)
-
-            elif pd.api.types.is_bool_dtype(dtype):
-                # use bool substitute labels:
-                val = map(lambda x: (["no", "yes"][x]
-                                     if not pd.isna(x) else
-                                     options.cfg.na_string),
-                          val.values)
+                    if pd.api.types.is_integer_dtype(dtype):
+                        to_str_fnc = str
+                    else:
+                        # floats use the float format string function
+                        to_str_fnc = options.cfg.float_format.format
+                    formatted[~missing] = [to_str_fnc(x) for x in valid]
+                val = formatted
             else:
                 # just a string
-                val = val.fillna(options.cfg.na_string)
-            df[col] = pd.Series(val)
+                if isinstance(val.dtype, pd.CategoricalDtype):
+                    val = val.astype(object)
+                val = val.fillna(options.cfg.na_string).values
+            df[col] = pd.Series(val, index=source.index)
 
         return df
 
+    def clear_formatted(self):
+        """
+        Discard the visual representations of all rows, e.g. because the
+        output settings have changed.
+        """
+        self._formatted_blocks.clear()
+
+    def get_formatted(self, row, column):
+        """
+        Return the visual representation of the cell.
+
+        If the row has not been formatted yet, the block of rows that
+        contains the row is formatted using format_content().
+        """
+        block_number, offset = divmod(row, self.block_size)
+        block = self._formatted_blocks.get(block_number)
+        if block is None:
+            start = block_number * self.block_size
+            source = self.content.iloc[start:start + self.block_size]
+            block = self.format_content(source, self._dtype_map).values
+            self._formatted_blocks[block_number] = block
+        return block[offset][column]
+
     def data(self, index, role):
         """
         Return a representation of the data cell indexed by 'index', using
@@ -1648,14 +1707,14 @@ class CoqTableModel(QtCore.QAbstractTableModel):
         # for QHTML:
         ix = index.column()
         if role == QtCore.Qt.DisplayRole:
-            return self.formatted.values[index.row()][ix]
+            return self.get_formatted(index.row(), ix)
 
         elif role == QtCore.Qt.EditRole:
-            return self.formatted.values[index.row()][ix]
+            return self.get_formatted(index.row(), ix)
 
         # ToolTipRole: return the content as a tooltip:
         elif role == QtCore.Qt.ToolTipRole:
-            formatted_val = self.formatted.values[index.row()][ix]
+            formatted_val = self.get_formatted(index.row(), ix)
             return "<div>{}</div>".format(escape(formatted_val))
 
         # TextAlignmentRole: return the alignment of the column:
@@ -1742,7 +1801,7 @@ class CoqTableModel(QtCore.QAbstractTableModel):
 class CoqHiddenTableModel(CoqTableModel):
     def data(self, index, role):
         if role == QtCore.Qt.DisplayRole:
-            return self.formatted.values[index.row()][index.column()]
+            return self.get_formatted(index.row(), index.column())
         else:
             return super(CoqHiddenTableModel, self).data(index, role)
 
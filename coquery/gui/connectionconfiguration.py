@@ -661,9 +661,10 @@ class ConnectionConfiguration(QtWidgets.QDialog):
         except AttributeError:
             db_paths = []
         else:
-            db_paths = [os.path.join(from_path,
-                                     "{}.db".format(resources[x][0].db_name))
-                        for x in resources]
+            db_paths = [
+                os.path.join(from_path,
+                             "{}.db".format(resources.get_db_name(x)))
+                for x in resources]
         return db_paths
 
     @staticmethod
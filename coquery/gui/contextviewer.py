@@ -43,6 +43,7 @@ class ContextView(QtWidgets.QWidget):
         self.source_id = source_id
         self.token_width = token_width
         self.context = None
+        self._prefetch_workers = []
 
         self.meta_data = get_toplevel_window().table_model.invisible_content
 
@@ -251,7 +252,6 @@ class ContextView(QtWidgets.QWidget):
         except Exception as e:
             print("Exception in retrieve_context(): ", e)
             raise e
-        print(context)
         self.context = context
 
     @classmethod
@@ -312,6 +312,33 @@ class ContextView(QtWidgets.QWidget):
         has_next = self.lookup_row(self.token_id, self.meta_data, +1)
         self.ui.button_prev.setEnabled(has_prev is not None)
         self.ui.button_next.setEnabled(has_next is not None)
+        self.prefetch_context([x for x in (has_prev, has_next)
+                               if x is not None])
+
+    def prefetch_context(self, rows):
+        """
+        Read the contexts of the given rows from the results table in the
+        background, so that they are available immediately if the user moves
+        to the previous or the next row.
+        """
+        token_list = []
+        for df in rows:
+            row = df.iloc[0]
+            token_list.append((int(row["coquery_invisible_corpus_id"]),
+                               int(row["coquery_invisible_origin_id"]),
+                               int(row["coquery_invisible_number_of_tokens"])))
+        if not token_list:
+            return
+
+        worker = CoqWorker(self.corpus.prefetch_context,
+                           token_list=token_list,
+                           context_width=self.next_value)
+        # keep a reference to the worker until its thread has stopped, as
+        # a running QThread must not be destroyed:
+        self._prefetch_workers.append(worker)
+        worker._thread.finished.connect(
+            lambda: self._prefetch_workers.remove(worker))
+        worker.start()
 
     @staticmethod
     def get_style(font):
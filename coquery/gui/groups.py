@@ -36,6 +36,7 @@ from coquery.functions import (
                     Tokens, Types,
                     TypeTokenRatio,
                     StandardizedTypeTokenRatio, StandardizedTypeTokenRatio250,
+                    MovingAverageTypeTokenRatio, YulesK,
                     CorpusSize, SubcorpusSize)
 
 from coquery.gui.pyqt_compat import get_toplevel_window
@@ -257,6 +258,7 @@ class GroupDialog(QtWidgets.QDialog):
                      TypeTokenRatio,
                      StandardizedTypeTokenRatio,
                      StandardizedTypeTokenRatio250,
+                     MovingAverageTypeTokenRatio, YulesK,
                      Add,
                      Min, Max, Mean, Median, StandardDeviation,
                      InterquartileRange,
@@ -453,6 +455,7 @@ class SummaryDialog(GroupDialog):
                     Percent, Proportion,
                     Tokens, Types,
                     TypeTokenRatio, StandardizedTypeTokenRatio,
+                    MovingAverageTypeTokenRatio, YulesK,
                     CorpusSize, SubcorpusSize)
 
     def __init__(self, group, all_columns, parent=None):
@@ -37,19 +37,29 @@ class Ui_UniqueViewer(object):
         self.progress_bar.setObjectName("progress_bar")
         self.verticalLayout_3.addWidget(self.progress_bar)
         self.verticalLayout_2.addLayout(self.verticalLayout_3)
-        self.tableWidget = QtWidgets.QTableWidget(UniqueViewer)
-        self.tableWidget.setAlternatingRowColors(True)
-        self.tableWidget.setShowGrid(False)
-        self.tableWidget.setCornerButtonEnabled(False)
-        self.tableWidget.setObjectName("tableWidget")
-        self.tableWidget.setColumnCount(0)
-        self.tableWidget.setRowCount(0)
-        self.tableWidget.horizontalHeader().setSortIndicatorShown(True)
-        self.tableWidget.horizontalHeader().setStretchLastSection(True)
-        self.verticalLayout_2.addWidget(self.tableWidget)
+        self.layout_filter = QtWidgets.QHBoxLayout()
+        self.layout_filter.setContentsMargins(4, -1, 4, -1)
+        self.layout_filter.setObjectName("layout_filter")
+        self.edit_filter = QtWidgets.QLineEdit(UniqueViewer)
+        self.edit_filter.setClearButtonEnabled(True)
+        self.edit_filter.setObjectName("edit_filter")
+        self.layout_filter.addWidget(self.edit_filter)
+        self.check_frequency = QtWidgets.QCheckBox(UniqueViewer)
+        self.check_frequency.setObjectName("check_frequency")
+        self.layout_filter.addWidget(self.check_frequency)
+        self.verticalLayout_2.addLayout(self.layout_filter)
+        self.tableView = QtWidgets.QTableView(UniqueViewer)
+        self.tableView.setAlternatingRowColors(True)
+        self.tableView.setShowGrid(False)
+        self.tableView.setCornerButtonEnabled(False)
+        self.tableView.setObjectName("tableView")
+        self.tableView.horizontalHeader().setSortIndicatorShown(True)
+        self.tableView.horizontalHeader().setStretchLastSection(True)
+        self.tableView.verticalHeader().setVisible(False)
+        self.verticalLayout_2.addWidget(self.tableView)
         spacerItem = QtWidgets.QSpacerItem(20, 0, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
         self.verticalLayout_2.addItem(spacerItem)
-        self.verticalLayout_2.setStretch(1, 1)
+        self.verticalLayout_2.setStretch(2, 1)
         self.verticalLayout.addLayout(self.verticalLayout_2)
         self.buttonBox = QtWidgets.QDialogButtonBox(UniqueViewer)
         self.buttonBox.setStandardButtons(QtWidgets.QDialogButtonBox.Save)
@@ -63,6 +73,8 @@ class Ui_UniqueViewer(object):
         _translate = QtCore.QCoreApplication.translate
         UniqueViewer.setWindowTitle(_translate("UniqueViewer", "View unique values – Coquery"))
         self.label_inform.setText(_translate("UniqueViewer", "Retrieving values..."))
-        self.tableWidget.setSortingEnabled(True)
+        self.edit_filter.setPlaceholderText(_translate("UniqueViewer", "Filter by prefix"))
+        self.check_frequency.setText(_translate("UniqueViewer", "Show frequencies"))
+        self.tableView.setSortingEnabled(True)
 
 
@@ -8,13 +8,14 @@ Coquery is released under the terms of the GNU General Public License (v3).
 For details, see the file LICENSE that you should have received along
 with Coquery. If not, see <http://www.gnu.org/licenses/>.
 """
-import pandas as pd
 import os
 from PyQt5 import QtCore, QtWidgets
 
 from coquery import options
 from coquery.unicode import utf8
 from coquery.defines import msg_disk_error, msg_encoding_error
+from coquery.uniques import (UniqueValues,
+                             ORDER_VALUE, ORDER_FREQUENCY, FREQUENCY_COLUMN)
 from coquery.gui import errorbox
 from coquery.gui import classes
 from coquery.gui.threads import CoqThread
@@ -25,6 +26,107 @@ from coquery.gui.ui.uniqueViewerUi import Ui_UniqueViewer
 translate = QtWidgets.QApplication.instance().translate
 
 
+class UniqueValueModel(QtCore.QAbstractTableModel):
+    """
+    A table model that retrieves the values of a UniqueValues object page
+    by page while the view is scrolled.
+    """
+    orderChanged = QtCore.pyqtSignal()
+
+    def __init__(self, service, header, parent=None):
+        super(UniqueValueModel, self).__init__(parent)
+        self.service = service
+        self.header = header
+        self.total = 0
+        self._values = []
+        self._frequencies = []
+        self._counts = False
+
+    def set_values(self, df, total):
+        """
+        Replace the content of the model by the first page of values.
+        """
+        self.beginResetModel()
+        self.total = total
+        self._counts = FREQUENCY_COLUMN in df.columns
+        self._values = []
+        self._frequencies = []
+        self._append(df)
+        self.endResetModel()
+
+    def _append(self, df):
+        self._values.extend(df[self.service.column].tolist())
+        if self._counts:
+            self._frequencies.extend(df[FREQUENCY_COLUMN].tolist())
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._values)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return 2 if self._counts else 1
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return False
+        return len(self._values) < self.total
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or not self._values:
+            return
+        df = self.service.get_page(after=self._values[-1],
+                                   offset=len(self._values))
+        if not len(df):
+            # the table has changed since the values were counted:
+            self.total = len(self._values)
+            return
+        start = len(self._values)
+        self.beginInsertRows(QtCore.QModelIndex(),
+                             start, start + len(df) - 1)
+        self._append(df)
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            if index.column() == 0:
+                return utf8(self._values[index.row()])
+            else:
+                return int(self._frequencies[index.row()])
+        elif role == QtCore.Qt.TextAlignmentRole and index.column() == 1:
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if (orientation == QtCore.Qt.Horizontal and
+                role == QtCore.Qt.DisplayRole):
+            if section == 0:
+                return self.header
+            else:
+                return translate("UniqueViewer", "Frequency", None)
+        return None
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        """
+        Change the order of the values. The values are not sorted by the
+        model. Instead, the signal orderChanged is emitted so that the
+        values can be retrieved again in the new order.
+        """
+        ascending = order == QtCore.Qt.AscendingOrder
+        if column == 1:
+            new_order = ORDER_FREQUENCY
+        else:
+            new_order = ORDER_VALUE
+        if (new_order, ascending) != (self.service.order,
+                                      self.service.ascending):
+            self.service.set_order(new_order, ascending)
+            self.orderChanged.emit()
+
+
 class UniqueViewer(QtWidgets.QDialog):
     def __init__(self, rc_feature=None, db_name=None, uniques=True,
                  parent=None):
@@ -55,6 +157,7 @@ class UniqueViewer(QtWidgets.QDialog):
                 "UniqueViewer", "Number of values", None),
             label_uniques=translate(
                 "UniqueViewer", "Number of unique values", None))
+        self.label_template = label
         self.ui.label = QtWidgets.QLabel(label)
         self.ui.label.setWordWrap(True)
         self.ui.detail_layout = QtWidgets.QHBoxLayout()
@@ -76,6 +179,12 @@ class UniqueViewer(QtWidgets.QDialog):
         self.db_name = db_name
         self.resource = options.get_resource_of_database(db_name)
         self._uniques = uniques
+        self._reload = False
+        self._summary = None
+        self.thread = None
+        self.engine = None
+        self.service = None
+        self.model = None
 
         if self.db_name:
             rc_table = "{}_table".format(rc_feature.partition("_")[0])
@@ -88,11 +197,36 @@ class UniqueViewer(QtWidgets.QDialog):
                     "{}.{}".format(self.table, self.column)))
             self.ui.button_details.setAlternativeText(
                 self.ui.button_details.text())
+
+            self.engine = options.cfg.current_connection.get_engine(
+                self.db_name)
+            self.service = UniqueValues(self.engine, self.table, self.column,
+                                        uniques=uniques)
+            self.model = UniqueValueModel(
+                self.service, "{}.{}".format(self.table, self.column),
+                parent=self)
+            self.ui.tableView.setModel(self.model)
+            self.ui.tableView.sortByColumn(0, QtCore.Qt.AscendingOrder)
+            self.model.orderChanged.connect(self.get_uniques)
         else:
             self.table = None
             self.column = None
 
-        self.ui.tableWidget.itemClicked.connect(self.entry_clicked)
+        if not uniques:
+            # entries are shown in the order in which they are stored:
+            self.ui.tableView.setSortingEnabled(False)
+            self.ui.check_frequency.hide()
+
+        # The filter timer delays retrieving the values until the user has
+        # stopped typing:
+        self.filter_timer = QtCore.QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.timeout.connect(self.change_filter)
+        self.ui.edit_filter.textChanged.connect(
+            lambda: self.filter_timer.start(300))
+        self.ui.check_frequency.toggled.connect(self.toggle_frequency)
+
+        self.ui.tableView.clicked.connect(self.entry_clicked)
 
         try:
             self.resize(options.settings.value("uniqueviewer_size"))
@@ -108,50 +242,55 @@ class UniqueViewer(QtWidgets.QDialog):
         options.settings.setValue("uniqueviewer_size", self.size())
         options.settings.setValue("uniqueviewer_details",
                                   self.ui.button_details.isExpanded())
+        if self.engine is not None:
+            self.engine.dispose()
+
+    def change_filter(self):
+        self.service.prefix = str(self.ui.edit_filter.text())
+        self.get_uniques()
+
+    def toggle_frequency(self, checked):
+        self.service.counts = checked
+        if not checked and self.service.order == ORDER_FREQUENCY:
+            self.ui.tableView.sortByColumn(0, QtCore.Qt.AscendingOrder)
+        self.get_uniques()
+
+    def get_summary(self):
+        """
+        Return a string that states the number of distinct values in the
+        column, and the first five of them.
+        """
+        distinct = UniqueValues(self.engine, self.table, self.column,
+                                uniques=True)
+        n = distinct.count()
+        values = distinct.get_page(limit=5)[self.column]
+        value_str = ", ".join([str(x) for x in values])
+        if n > 6:
+            value_str = "{}, and {} other values".format(value_str, n - 5)
+        return "{} ({})".format(n, value_str)
 
     def get_unique(self):
         if not self.db_name:
             return
 
-        engine = options.cfg.current_connection.get_engine(self.db_name)
-        if self._uniques:
-            S = "SELECT DISTINCT {} FROM {}".format(self.column, self.table)
-            self.df = pd.read_sql(S, engine)
-            self.df = self.df.sort_values(self.column, ascending=True)
-        else:
-            S = "SELECT {} FROM {}".format(self.column, self.table)
-            self.df = pd.read_sql(S, engine)
-        engine.dispose()
+        self.total = self.service.count()
+        self.df = self.service.get_page()
+        if not self._uniques and self._summary is None:
+            self._summary = self.get_summary()
 
     def finalize(self):
         # update dialog appearance
         if self._uniques:
-            self.ui.label.setText(
-                str(self.ui.label.text()).format(len(self.df.index)))
-            self.ui.tableWidget.horizontalHeader().hide()
+            self.ui.label.setText(self.label_template.format(self.total))
         else:
-            self.ui.tableWidget.setHorizontalHeaderLabels(["Click to sort"])
-            uniques = sorted(self.df[self.column].dropna().unique())
-            value_str = ", ".join([str(x) for x in uniques[:5]])
-            if len(uniques) > 6:
-                value_str = "{}, and {} other values".format(
-                    value_str, len(uniques) - 5)
-            s = "{} ({})".format(len(uniques), value_str)
             self.ui.label.setText(
-                str(self.ui.label.text()).format(len(self.df.index), s))
+                self.label_template.format(self.total, self._summary))
 
-        self.ui.tableWidget.setRowCount(len(self.df))
-        self.ui.tableWidget.setColumnCount(1)
-
-        # populate table
-        items = (self.df[self.column].apply(utf8)
-                                     .apply(QtWidgets.QTableWidgetItem))
-        for row, item in enumerate(items):
-            self.ui.tableWidget.setItem(row, 0, item)
+        self.model.set_values(self.df, self.total)
 
         self.ui.progress_bar.setRange(1, 0)
         self.ui.progress_bar.hide()
-        self.ui.tableWidget.show()
+        self.ui.tableView.show()
         self.ui.button_details.show()
         self.ui.label_inform.hide()
         self.ui.label.show()
@@ -159,11 +298,14 @@ class UniqueViewer(QtWidgets.QDialog):
         self.ui.buttonBox.setEnabled(True)
         self.ui.button_details.setEnabled(True)
 
-    def entry_clicked(self, item, column=None):
-        if column:
-            text = str(item.text(column))
-        else:
-            text = str(item.text())
+        if self._reload:
+            # the filter or the order has changed while the values were
+            # retrieved:
+            self._reload = False
+            self.get_uniques()
+
+    def entry_clicked(self, index):
+        text = str(index.sibling(index.row(), 0).data())
         gui_query_string = get_toplevel_window().ui.edit_query_string
         if self.rc_feature in ("word_label", "corpus_word"):
             gui_query_string.append(text)
@@ -187,6 +329,7 @@ class UniqueViewer(QtWidgets.QDialog):
             self.close()
 
     def onException(self):
+        self.ui.progress_bar.hide()
         errorbox.ErrorBox.show(self.exc_info, self.exception)
 
     def save_list(self):
@@ -196,13 +339,19 @@ class UniqueViewer(QtWidgets.QDialog):
             name = name[0]
         if name:
             options.cfg.uniques_file_path = os.path.dirname(name)
+            header = ["{}.{}".format(self.table, self.column)]
+            if self.service.counts and self._uniques:
+                header.append("Frequency")
             try:
-                self.df[self.column].to_csv(
-                    name,
-                    sep=options.cfg.output_separator,
-                    index=False,
-                    header=["{}.{}".format(self.table, self.column)],
-                    encoding=options.cfg.output_encoding)
+                with open(name, "w", encoding=options.cfg.output_encoding,
+                          newline="") as handle:
+                    first = True
+                    for df in self.service.iter_pages():
+                        df.to_csv(handle,
+                                  sep=options.cfg.output_separator,
+                                  index=False,
+                                  header=header if first else False)
+                        first = False
             except IOError:
                 QtWidgets.QMessageBox.critical(
                     self, "Disk error", msg_disk_error)
@@ -211,10 +360,16 @@ class UniqueViewer(QtWidgets.QDialog):
                     self, "Encoding error", msg_encoding_error)
 
     def get_uniques(self):
+        if self.thread is not None and self.thread.isRunning():
+            self._reload = True
+            return
+
         self.ui.progress_bar.setRange(0, 0)
-        self.ui.tableWidget.hide()
-        self.ui.button_details.hide()
-        self.ui.label.hide()
+        self.ui.progress_bar.show()
+        if self.model is None or not self.model.rowCount():
+            self.ui.tableView.hide()
+            self.ui.button_details.hide()
+            self.ui.label.hide()
 
         self.thread = CoqThread(self.get_unique, self)
         self.thread.taskFinished.connect(self.finalize)
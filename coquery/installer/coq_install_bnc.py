@@ -1229,9 +1229,8 @@ class BuilderClass(BaseCorpusBuilder):
         the corpus."""
         if self.interrupted:
             return
-        e = self.xml_parse_file(current_file)
-        self.xml_get_meta_info(e)
-        self.xml_process_element(self.xml_get_body(e))
+        self.xml_stream_file(current_file, ("wtext", "stext"),
+                             self.xml_get_meta_info)
 
     @staticmethod
     def get_name():
@@ -18,6 +18,7 @@ import os
 import logging
 
 from coquery import options
+from coquery import annotation
 from coquery.corpusbuilder import BaseCorpusBuilder
 from coquery.corpusbuilder import (Column, Identifier, Link)
 from coquery.documents import (pdf_to_str, docx_to_str, odt_to_str,
@@ -45,6 +46,12 @@ class BuilderClass(BaseCorpusBuilder):
     file_path = "Path"
     meta_data = "metadata"
 
+    # The number of processes that annotate the text if NLTK is used (None
+    # means one process per CPU), and the number of sentences that are
+    # sent to a process at a time:
+    annotation_workers = None
+    annotation_batch_size = annotation.DEFAULT_BATCH_SIZE
+
     def __init__(self, gui=False, pos=True):
         # all corpus builders have to call the inherited __init__ function:
         super(BuilderClass, self).__init__(gui)
@@ -125,6 +132,7 @@ class BuilderClass(BaseCorpusBuilder):
         self._sentence_id = 0
         self._meta_table = None
         self._meta_file = None
+        self._annotator = None
 
     @staticmethod
     def validate_files(l):
@@ -223,12 +231,12 @@ class BuilderClass(BaseCorpusBuilder):
 
         return raw_text
 
-    def add_token(self, token_string, token_pos=None):
+    def add_token(self, token_string, token_pos=None, lemma=None):
         # get lemma string:
         if all(x in string.punctuation for x in token_string):
             token_pos = "PUNCT"
             lemma = token_string
-        else:
+        elif lemma is None:
             try:
                 # use the current lemmatizer to assign the token to a lemma:
                 lemma = self._lemmatize(token_string,
@@ -327,23 +335,11 @@ class BuilderClass(BaseCorpusBuilder):
     def build_initialize(self):
         super(BuilderClass, self).build_initialize()
         if self.arguments.use_nltk:
-            import nltk
-
             # the WordNet lemmatizer will be used to obtain the lemma for a
-            # given word:
-            self._lemmatize = (
-                lambda x, y: nltk.stem.wordnet.WordNetLemmatizer().lemmatize(
-                    x, pos=y))
-
-            # The NLTK POS tagger produces some labels that are different from
-            # the labels used in WordNet. In order to use the WordNet
-            # lemmatizer for all words, we need a function that translates
-            # these labels:
-            self._pos_translate = lambda x: {
-                'NN': nltk.corpus.wordnet.NOUN,
-                'JJ': nltk.corpus.wordnet.ADJ,
-                'VB': nltk.corpus.wordnet.VERB,
-                'RB': nltk.corpus.wordnet.ADV}[x.upper()[:2]]
+            # given word. The NLTK POS labels are translated into WordNet
+            # labels by the lemmatizer:
+            self._lemmatize = annotation.lemmatize
+            self._pos_translate = lambda x: x
         else:
             # The default lemmatizer is pretty dumb and simply turns the
             # word-form to lower case so that at least 'Dogs' and 'dogs' are
@@ -355,6 +351,22 @@ class BuilderClass(BaseCorpusBuilder):
             self._lemmatize = lambda x, y: x
             self._pos_translate = lambda x: x
 
+    def build_load_files(self):
+        if not self.arguments.use_nltk:
+            super(BuilderClass, self).build_load_files()
+            return
+
+        # The text is annotated by a pool of worker processes that is kept
+        # for all files:
+        with annotation.AnnotationPipeline(
+                workers=self.annotation_workers,
+                batch_size=self.annotation_batch_size) as annotator:
+            self._annotator = annotator
+            try:
+                super(BuilderClass, self).build_load_files()
+            finally:
+                self._annotator = None
+
     def process_file(self, file_name):
         """
         Process a text file.
@@ -403,14 +415,14 @@ class BuilderClass(BaseCorpusBuilder):
         # if possible, use NLTK for lemmatization, tokenization, and tagging:
         if self.arguments.use_nltk:
             import nltk
-            # Create a list of sentences from the content of the current file
-            # and process this list one by one:
+            # Create a list of sentences from the content of the current file.
+            # The sentences are tokenized, tagged and lemmatized in batches
+            # by the annotation pipeline, and are returned in order:
             sentence_list = nltk.sent_tokenize(raw_text)
-            for sentence in sentence_list:
+            annotator = (self._annotator or
+                         annotation.AnnotationPipeline(workers=1))
+            for tagged in annotator.annotate(sentence_list):
                 self._sentence_id += 1
-                # use NLTK tokenizer and POS tagger on this sentence:
-                tokens = nltk.word_tokenize(sentence)
-                pos_map = nltk.pos_tag(tokens)
 
                 # FIXME: the NLTK tokenizer doesn't seem to be very happy if
                 # sentences start with quotation marks. This is evidenced
@@ -421,9 +433,9 @@ class BuilderClass(BaseCorpusBuilder):
                 #
                 # is not separated from the initial quotation mark.
 
-                for current_token, current_pos in pos_map:
+                for current_token, current_pos, lemma in tagged:
                     # store each token:
-                    self.add_token(current_token, current_pos)
+                    self.add_token(current_token, current_pos, lemma)
         else:
             # use a dumb tokenizer that simply splits the file content by
             # spaces:
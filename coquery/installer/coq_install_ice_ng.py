@@ -246,6 +246,7 @@ class corpus_code():
 
 class BuilderClass(XMLCorpusBuilder):
     encoding = "latin-1"
+    stream_xml = True
     file_filter = "*.xml.pos"
 
     corpus_table = "Corpus"
@@ -701,12 +702,11 @@ class BuilderClass(XMLCorpusBuilder):
                     line = line.replace(old, new)
             return line
 
-        l = []
         content = yield_data(data)
         for line in content:
             line = fix_encoding(line)
             if line.count("\t") < 2:
-                l.append(line)
+                yield line
                 continue
             if line.count("<") > line.count(">"):
                 left_over = None
@@ -722,12 +722,11 @@ class BuilderClass(XMLCorpusBuilder):
                             fragments.append(">")
                         break
                 line = "".join(fragments)
-                l.append(line)
+                yield line
                 if left_over:
-                    l.append(html_escape(left_over))
+                    yield html_escape(left_over)
                 continue
-            l.append(html_escape(line))
-        return l
+            yield html_escape(line)
 
     def process_header(self, root):
         super(BuilderClass, self).process_header(root)
@@ -12,6 +12,7 @@ with Coquery. If not, see <http://www.gnu.org/licenses/>.
 from __future__ import unicode_literals
 from __future__ import print_function
 import os.path
+from io import StringIO
 
 
 #try:
@@ -643,9 +644,8 @@ class BuilderClass(BaseCorpusBuilder):
 
         S = file_buffer.getvalue()
 
-        e = self.xml_parse_file(StringIO(S))
-        self.xml_get_meta_information(e)
-        self.xml_process_element(self.xml_get_body(e))
+        self.xml_stream_file(StringIO(S), ("text",),
+                             self.xml_get_meta_information)
         
     def xml_get_body(self, root):
         return root.find("text")
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+lexicaldiversity.py is part of Coquery.
+
+Copyright (c) 2016-2021 Gero Kunter (gero.kunter@coquery.org)
+
+Coquery is released under the terms of the GNU General Public License (v3).
+For details, see the file LICENSE that you should have received along
+with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides measures of lexical diversity (type-token ratios,
+entropy, Yule's K).
+
+All measures operate on integer type codes instead of on the values in
+the data frame. The codes are obtained once by calling factorize() on the
+target columns, so that each statistic can be calculated with a few NumPy
+operations (mostly np.bincount() and sorting) instead of repeatedly
+slicing and deduplicating the data frame.
+"""
+
+from __future__ import division
+
+import numpy as np
+import pandas as pd
+
+# Seed used for the random sampling in sttr() if no other random state is
+# provided. Using a fixed seed makes the standardized type-token ratio
+# reproducible across repeated evaluations of the same data frame.
+DEFAULT_RANDOM_STATE = 1911
+
+
+def factorize(df, columns=None):
+    """
+    Translate the rows of the data frame into integer type codes.
+
+    Two rows receive the same code if they have equal values in all target
+    columns. Missing values are treated as a value of their own, i.e. they
+    behave like they do in df.drop_duplicates().
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The data frame
+    columns : list
+        The target columns. If None, all columns in the data frame are used.
+
+    Returns
+    -------
+    codes : numpy.ndarray
+        An array of integers with one element per row in df. The codes are
+        consecutive, starting from 0.
+    """
+    if columns is None:
+        columns = list(df.columns)
+
+    codes = np.zeros(len(df), dtype=np.int64)
+    for col in columns:
+        col_codes, uniques = pd.factorize(df[col])
+        # pd.factorize() uses -1 for missing values, so shifting by one
+        # turns missing values into a type of its own:
+        col_codes = col_codes.astype(np.int64) + 1
+        # combine the codes of the previous columns with the codes of the
+        # current column, and condense the result so that the codes don't
+        # overflow for many columns:
+        codes, _ = pd.factorize(codes * (len(uniques) + 1) + col_codes)
+        codes = codes.astype(np.int64)
+    return codes
+
+
+def frequencies(codes):
+    """
+    Return the frequency of each type code.
+    """
+    codes = np.asarray(codes)
+    if len(codes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    counts = np.bincount(codes)
+    return counts[counts > 0]
+
+
+def types(codes):
+    """
+    Return the number of distinct type codes.
+    """
+    return len(frequencies(codes))
+
+
+def ttr(codes):
+    """
+    Return the type-token ratio of the type codes.
+    """
+    if len(codes) == 0:
+        return np.nan
+    return types(codes) / len(codes)
+
+
+def _window_types(windows):
+    """
+    Return the number of types in each row of a two-dimensional array.
+    """
+    srt = np.sort(windows, axis=1)
+    return np.count_nonzero(np.diff(srt, axis=1), axis=1) + 1
+
+
+def sttr(codes, window, random_state=None):
+    """
+    Return the standardized type-token ratio of the type codes.
+
+    The codes are shuffled, and the shuffled sequence is split into chunks
+    of the size given by `window`. The standardized type-token ratio is the
+    mean of the type-token ratios of the chunks. Tokens that do not fill a
+    complete chunk are ignored.
+
+    Parameters
+    ----------
+    codes : numpy.ndarray
+        The type codes as returned by factorize()
+    window : int
+        The chunk size
+    random_state : int, numpy.random.Generator or None
+        The seed or random generator used for shuffling. If None, the seed
+        DEFAULT_RANDOM_STATE is used.
+
+    Returns
+    -------
+    x : float
+        The standardized type-token ratio, or NaN if there are fewer codes
+        than needed for a single chunk.
+    """
+    codes = np.asarray(codes)
+    chunks = len(codes) // window if window > 0 else 0
+    if chunks == 0:
+        return np.nan
+
+    if random_state is None:
+        random_state = DEFAULT_RANDOM_STATE
+    rng = np.random.default_rng(random_state)
+    shuffled = rng.permutation(codes)[:chunks * window]
+    n_types = _window_types(shuffled.reshape(chunks, window))
+    return n_types.mean() / window
+
+
+def mattr(codes, window):
+    """
+    Return the moving-average type-token ratio of the type codes.
+
+    The moving-average type-token ratio (Covington & McFall 2010) is the
+    mean of the type-token ratios of all windows of the size given by
+    `window` that can be placed over the sequence of codes. If there are
+    fewer codes than the window size, the plain type-token ratio is
+    returned.
+
+    The number of types in each window is obtained from the number of types
+    in the previous window: a token leaves the window if its type does not
+    reoccur within the window, and a token enters the window if its type
+    did not already occur within the window. In this way, all windows are
+    evaluated with a single cumulative sum.
+    """
+    codes = np.asarray(codes)
+    n = len(codes)
+    if window <= 0 or n == 0:
+        return np.nan
+    if n <= window:
+        return ttr(codes)
+
+    # for each position, determine the previous and the next position of the
+    # same type code:
+    order = np.argsort(codes, kind="stable")
+    same = codes[order][1:] == codes[order][:-1]
+    prev_pos = np.full(n, -1, dtype=np.int64)
+    next_pos = np.full(n, n, dtype=np.int64)
+    prev_pos[order[1:][same]] = order[:-1][same]
+    next_pos[order[:-1][same]] = order[1:][same]
+
+    start = np.arange(1, n - window + 1)
+    leaving = next_pos[start - 1] >= start - 1 + window
+    entering = prev_pos[start + window - 1] < start
+    delta = entering.astype(np.int64) - leaving.astype(np.int64)
+
+    first = types(codes[:window])
+    n_types = np.concatenate([[first], first + np.cumsum(delta)])
+    return n_types.mean() / window
+
+
+def entropy(codes):
+    """
+    Return Shannon's entropy (in bits) of the distribution of type codes.
+    """
+    freq = frequencies(codes)
+    if len(freq) <= 1:
+        return 0.0
+    p = freq / freq.sum()
+    return float(-(p * np.log2(p)).sum())
+
+
+def yules_k(codes):
+    """
+    Return Yule's characteristic K of the type codes.
+
+    K = 10,000 * (sum(f²) - N) / N², where f is the frequency of each type
+    and N is the number of tokens.
+    """
+    freq = frequencies(codes).astype(np.float64)
+    n = freq.sum()
+    if n == 0:
+        return np.nan
+    return float(1e4 * ((freq ** 2).sum() - n) / n ** 2)
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+linkcache.py is part of Coquery.
+
+Copyright (c) 2016-2022 Gero Kunter (gero.kunter@coquery.org)
+
+Coquery is released under the terms of the GNU General Public License (v3).
+For details, see the file LICENSE that you should have received along
+with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides the local cache for linked tables.
+
+A link joins a table from another database, e.g. a lexicon like CELEX or
+the CMUdict, to the corpus queries. Without a cache, the linked table is
+joined as `db_name.table`, which requires that the other database is
+attached to each query on SQLite connections, and the join is evaluated
+against the whole linked table.
+
+The link cache is a table in the corpus database. It contains those rows
+from the linked table that match a value from the linked corpus column,
+together with a copy of the join value in an indexed key column. The
+join value is compared in the same way as in a join of the linked table,
+so queries return the same rows whether the cache is used or not.
+Queries join the cache table instead of the linked table if the cache is
+available, so that no other database has to be attached, and the join
+can always use an index.
+
+The table CoqLinkCache in the corpus database stores the number of rows
+of the linked table and of the corpus table for each cache. These numbers
+are compared once per session. If the number of rows in the linked table
+has changed, the cache is built again. If only the number of rows in the
+corpus table has changed, rows are added and removed for the join values
+that have been added to or removed from the corpus table. Changes that
+keep the numbers of rows unchanged are not detected; in that case, the
+cache can be disabled with the --no_link_cache option.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import os
+
+from . import options
+from .defines import SQL_SQLITE
+
+CACHE_INFO_TABLE = "CoqLinkCache"
+CACHE_KEY_COLUMN = "CoqLinkKey"
+
+# the cache tables that have been validated in this session, with the
+# connection name, the corpus resource name and the link hash as keys:
+_cache_tables = {}
+
+
+def get_cache_table(resource, link):
+    """
+    Return the name of the cache table that is used for the link in
+    queries on the resource, or None if the link is not cached.
+    """
+    key = (options.cfg.current_connection.name, resource.name,
+           link.get_hash())
+    return _cache_tables.get(key)
+
+
+def clear():
+    """
+    Stop using the cache tables in queries.
+    """
+    _cache_tables.clear()
+
+
+def get_state():
+    """
+    Return a tuple that changes whenever a cache table is added or
+    removed. It is used as a part of the keys of stored query templates.
+    """
+    return tuple(sorted(_cache_tables.items()))
+
+
+class LinkCache(object):
+    """
+    The local cache of a linked table in the corpus database.
+
+    Parameters
+    ----------
+    resource : SQLResource
+        The corpus resource from which the link starts
+    link : Link
+        The link
+    linked_resource : SQLResource
+        The resource where the link ends
+    """
+    def __init__(self, resource, link, linked_resource):
+        self.resource = resource
+        self.link = link
+        self.linked_resource = linked_resource
+
+        self.table = "{}_{}".format(CACHE_INFO_TABLE, link.get_hash())
+
+        _, int_tab, _ = resource.split_resource_feature(link.rc_from)
+        self.int_table = getattr(resource, "{}_table".format(int_tab))
+        self.int_column = getattr(resource, link.rc_from)
+
+        res = linked_resource
+        _, ext_tab, _ = res.split_resource_feature(link.rc_to)
+        self.ext_db = res.db_name
+        self.ext_table = "{}.{}".format(
+            res.db_name, getattr(res, "{}_table".format(ext_tab)))
+        self.ext_column = getattr(res, link.rc_to)
+
+    @property
+    def key(self):
+        return (options.cfg.current_connection.name, self.resource.name,
+                self.link.get_hash())
+
+    def get_source_query(self):
+        """
+        Return the SQL query that selects the cache rows from the linked
+        table.
+        """
+        return ("SELECT EXT.{ext_column} AS {key}, EXT.* "
+                "FROM {ext_table} AS EXT "
+                "WHERE EXT.{ext_column} IN (SELECT {int_column} "
+                "FROM {int_table} WHERE {int_column} IS NOT NULL)").format(
+                    ext_column=self.ext_column, key=CACHE_KEY_COLUMN,
+                    ext_table=self.ext_table, int_table=self.int_table,
+                    int_column=self.int_column)
+
+    def get_source_rows(self, connection):
+        S = "SELECT COUNT(*) FROM {}".format(self.ext_table)
+        return connection.execute(S).fetchone()[0]
+
+    def get_corpus_rows(self, connection):
+        S = "SELECT COUNT(*) FROM {}".format(self.int_table)
+        return connection.execute(S).fetchone()[0]
+
+    def read_info(self, connection):
+        """
+        Return the numbers of rows of the linked table and of the corpus
+        table when the cache was last updated, or None if there is no
+        cache.
+        """
+        S = ("SELECT SourceRows, CorpusRows FROM {} "
+             "WHERE CacheTable = '{}'").format(CACHE_INFO_TABLE, self.table)
+        try:
+            row = connection.execute(S).fetchone()
+        except Exception:
+            return None
+        if row is None:
+            return None
+        return tuple(row)
+
+    def write_info(self, connection, source_rows, corpus_rows):
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS {} ("
+            "CacheTable VARCHAR(64) PRIMARY KEY, "
+            "SourceRows INTEGER, "
+            "CorpusRows INTEGER)".format(CACHE_INFO_TABLE))
+        connection.execute(
+            "DELETE FROM {} WHERE CacheTable = '{}'".format(
+                CACHE_INFO_TABLE, self.table))
+        connection.execute(
+            "INSERT INTO {} (CacheTable, SourceRows, CorpusRows) "
+            "VALUES ('{}', {}, {})".format(
+                CACHE_INFO_TABLE, self.table,
+                int(source_rows), int(corpus_rows)))
+
+    def build(self, connection):
+        """
+        Build the cache table from scratch.
+        """
+        self.drop(connection)
+        connection.execute("CREATE TABLE {} AS {}".format(
+            self.table, self.get_source_query()))
+        connection.execute(
+            "CREATE INDEX {table}_Key ON {table}({key})".format(
+                table=self.table, key=CACHE_KEY_COLUMN))
+
+    def refresh(self, connection):
+        """
+        Update the cache table for the join values that have been added to
+        or removed from the corpus table.
+        """
+        connection.execute(
+            "DELETE FROM {table} WHERE {key} NOT IN ("
+            "SELECT {int_column} FROM {int_table} "
+            "WHERE {int_column} IS NOT NULL)".format(
+                table=self.table, key=CACHE_KEY_COLUMN,
+                int_table=self.int_table, int_column=self.int_column))
+        connection.execute(
+            "INSERT INTO {table} {source} AND EXT.{ext_column} NOT IN ("
+            "SELECT {key} FROM {table})".format(
+                table=self.table, source=self.get_source_query(),
+                ext_column=self.ext_column, key=CACHE_KEY_COLUMN))
+
+    def drop(self, connection):
+        """
+        Remove the cache table.
+        """
+        _cache_tables.pop(self.key, None)
+        connection.execute("DROP TABLE IF EXISTS {}".format(self.table))
+        try:
+            connection.execute(
+                "DELETE FROM {} WHERE CacheTable = '{}'".format(
+                    CACHE_INFO_TABLE, self.table))
+        except Exception:
+            pass
+
+    def update(self, connection):
+        """
+        Build or refresh the cache table if needed, and make it available
+        for queries.
+
+        Returns
+        -------
+        b : bool
+            True if the cache table can be used, or False otherwise
+        """
+        info = self.read_info(connection)
+        if info is not None and self.key in _cache_tables:
+            # the cache has already been checked in this session:
+            return True
+
+        conn_settings = options.cfg.current_connection
+        attached = False
+        try:
+            if conn_settings.db_type() == SQL_SQLITE:
+                path = conn_settings.db_path(self.ext_db)
+                if not os.path.exists(path):
+                    raise IOError(path)
+                connection.execute("ATTACH DATABASE '{}' AS {}".format(
+                    path, self.ext_db))
+                attached = True
+
+            source_rows = self.get_source_rows(connection)
+            corpus_rows = self.get_corpus_rows(connection)
+            if info is None or info[0] != source_rows:
+                self.build(connection)
+            elif info[1] != corpus_rows:
+                self.refresh(connection)
+            self.write_info(connection, source_rows, corpus_rows)
+        except Exception as e:
+            logging.warning("Could not update link cache {}: {}".format(
+                self.table, e))
+            _cache_tables.pop(self.key, None)
+            return False
+        finally:
+            if attached:
+                connection.execute("DETACH DATABASE {}".format(self.ext_db))
+
+        _cache_tables[self.key] = self.table
+        return True
+
+
+def prepare_links(resource, selected, connection):
+    """
+    Update the caches of the links that are used by the selected features,
+    so that the queries can use them.
+
+    Parameters
+    ----------
+    resource : SQLResource
+        The corpus resource
+    selected : list
+        The selected resource features
+    connection : Connection
+        An SQLAlchemy connection to the corpus database
+    """
+    from .links import get_by_hash
+
+    done = set()
+    for rc_feature in selected:
+        hashed, _, _ = resource.split_resource_feature(rc_feature)
+        if hashed is None or hashed in done:
+            continue
+        done.add(hashed)
+        link, res = get_by_hash(hashed)
+        LinkCache(resource, link, res).update(connection)
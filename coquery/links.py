@@ -122,5 +122,5 @@ def get_by_hash(hashed, link_list=None):
     if not link:
         raise ValueError(hashed, link_list)
 
-    res = current_connection.resources()[link.res_to][0]
+    res = current_connection.find_resource(link.res_to)[0]
     return (link, res)
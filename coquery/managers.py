@@ -15,7 +15,6 @@ import logging
 import itertools
 import pandas as pd
 import numpy as np
-import scipy.stats
 
 from .defines import (QUERY_MODE_TYPES, QUERY_MODE_FREQUENCIES,
                       QUERY_MODE_CONTINGENCY, QUERY_MODE_COLLOCATIONS,
@@ -31,6 +30,7 @@ from .functions import (Freq,
 from .functionlist import FunctionList
 from .general import CoqObject, Print
 from . import options
+from . import coltypes
 from .defines import FILTER_STAGE_BEFORE_TRANSFORM, FILTER_STAGE_FINAL
 
 
@@ -68,7 +68,7 @@ class Group(CoqObject):
     def process(self, df, session, manager):
         if self.columns:
             function_list = FunctionList(self.get_functions())
-            df = (df.groupby(self.columns, as_index=False)
+            df = (df.groupby(self.columns, as_index=False, observed=True)
                     .apply(function_list.lapply,
                            session=session,
                            manager=manager))
@@ -162,6 +162,7 @@ class Manager(CoqObject):
         self._filters = []
         self._column_order = []
         self._last_query_id = None
+        self._reversed_values = {}
         self.reset_context_cache()
 
     def exceptions(self):
@@ -367,6 +368,8 @@ class Manager(CoqObject):
 
     def substitute(self, df, session, stage="first"):
         def _get_unique(column):
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype(object)
             try:
                 values = column.dropna().unique()
             except AttributeError:
@@ -446,6 +449,73 @@ class Manager(CoqObject):
 
         return df
 
+    def get_sort_key(self, column, values, ascending=True, reverse=False):
+        """
+        Return an integer array that can be used as a sort key for the
+        values.
+
+        The values are factorized so that the comparisons are carried out
+        only once for each distinct value. If `reverse` is True, the values
+        are compared by their reversed strings. The reversed strings are
+        cached for each column so that they don't have to be recreated if
+        the table is sorted again.
+
+        Missing values are always sorted to the end, irrespective of the
+        sorting direction.
+
+        For categorical values, the codes of the categories are used
+        instead of factorizing the values again.
+
+        Parameters
+        ----------
+        column : str
+            The name of the column
+        values : array-like
+            The values of the column
+        ascending : bool
+            True if the values are sorted in ascending order
+        reverse : bool
+            True if the values are sorted by their reversed strings
+
+        Returns
+        -------
+        key : numpy.ndarray
+            An integer array with one sort key for each value
+        """
+        if isinstance(values, pd.Categorical):
+            codes = values.codes
+            uniques = values.categories
+        else:
+            codes, uniques = pd.factorize(values, sort=not reverse)
+        n = len(uniques)
+        if reverse:
+            cache = self._reversed_values.setdefault(column, {})
+            reversed_uniques = np.empty(n, dtype=object)
+            for i, val in enumerate(uniques):
+                try:
+                    rev = cache[val]
+                except KeyError:
+                    rev = str(val)[::-1]
+                    cache[val] = rev
+                reversed_uniques[i] = rev
+            rank = np.empty(n, dtype=np.int64)
+            rank[np.argsort(reversed_uniques, kind="stable")] = np.arange(n)
+        elif isinstance(values, pd.Categorical):
+            # the categories are not necessarily sorted, e.g. if they have
+            # been renamed by a substitution:
+            rank = np.empty(n, dtype=np.int64)
+            rank[np.argsort(np.asarray(uniques), kind="stable")] = (
+                np.arange(n))
+        else:
+            rank = np.arange(n, dtype=np.int64)
+
+        if not ascending:
+            rank = n - 1 - rank
+
+        # pd.factorize() uses the code -1 for missing values. Appending the
+        # value n to the ranks sorts them to the end:
+        return np.append(rank, n)[codes]
+
     def arrange(self, df, session):
         if len(df) == 0:
             print("exit arrange")
@@ -453,65 +523,45 @@ class Manager(CoqObject):
 
         Print(f"\tarrange(), {len(df)} rows")
 
-        original_columns = df.columns
-        columns = []
-        directions = []
-
-        # list that stores unusuable sorters (e.g. because the sorter
-        # refers to a function column and the function has been deleted):
-        drop_list = []
-
-        # gather sorting information:
-        for sorter in self.sorters:
-            # create dummy columns for reverse sorting:
-            if sorter.reverse:
-                target = "{}__rev".format(sorter.column)
-                df[target] = (df[sorter.column].apply(lambda x: x[::-1]))
-            else:
-                target = sorter.column
+        # drop illegal sorters (e.g. because the sorter refers to a function
+        # column and the function has been deleted, or because the column
+        # was rearranged as in the contingency table):
+        self.sorters = [x for x in self.sorters if x.column in df.columns]
+        for i, x in enumerate(self.sorters):
+            x.position = i
 
-            if target not in df.columns:
-                drop_list.append(target)
-            else:
-                columns.append(target)
-                directions.append(sorter.ascending)
-        # drop illegal sorters:
-        self.sorters = [x for x in self.sorters if x.column not in drop_list]
-        # filter columns that should be in the data frame, but which aren't
-        # (this may happen for example with the contingency table which
-        # takes one column and rearranges it)
-        column_check = [x in original_columns for x in columns]
-        for i, col in enumerate(column_check):
-            if not col and not columns[i].endswith("__rev"):
-                directions.pop(i)
-                columns.pop(i)
-
-        if COLUMN_NAMES["statistics_column_total"] in df.index:
-            # make sure that the row containing the totals is the last row:
-            df_data = df[df.index != COLUMN_NAMES["statistics_column_total"]]
-            df_totals = df[df.index == COLUMN_NAMES["statistics_column_total"]]
-        else:
-            df_data = df
-            df_totals = None
+        # discard cached reversed strings of columns that are no longer
+        # sorted in reverse:
+        reversed_columns = {x.column for x in self.sorters if x.reverse}
+        for column in list(self._reversed_values.keys()):
+            if column not in reversed_columns:
+                self._reversed_values.pop(column)
 
-        if len(columns) == 0:
+        if len(self.sorters) == 0:
             return df
 
-        # sort the data frame (excluding a totals row)
-        df_data = df_data.sort_values(by=columns,
-                                      ascending=directions,
-                                      axis="index")[original_columns]
+        # make sure that the row containing the totals is the last row:
+        is_total = np.asarray(
+            df.index == COLUMN_NAMES["statistics_column_total"], dtype=bool)
+        data_rows = np.flatnonzero(~is_total)
+
+        keys = [self.get_sort_key(sorter.column,
+                                  df[sorter.column].values[data_rows],
+                                  ascending=sorter.ascending,
+                                  reverse=sorter.reverse)
+                for sorter in self.sorters]
 
-        df_data = df_data.reset_index(drop=True)
+        # np.lexsort() uses the last key as the primary key:
+        order = data_rows[np.lexsort(keys[::-1])]
+        df_data = df.iloc[order].reset_index(drop=True)
 
-        if df_totals is not None:
+        if is_total.any():
             # return sorted data frame plus a potentially totals row:
-            df = pd.concat([df_data, df_totals])
+            df = pd.concat([df_data, df[is_total]])
         else:
             df = df_data
         Print(f"\t\tdone, {len(df)} rows")
 
-        df = df[[x for x in df.columns if not x.endswith("__rev")]]
         return df
 
     def summarize(self, df, session):
@@ -585,7 +635,7 @@ class Manager(CoqObject):
         self.reset_group_filter_statistics()
 
         columns = self.get_group_columns(df, session)
-        grouped = df.groupby(columns)
+        grouped = df.groupby(columns, observed=True)
 
         sub_list = []
         for x in grouped.groups:
@@ -793,6 +843,10 @@ class Manager(CoqObject):
             df = df.sample(min(len(df), options.cfg.sample_size))
             df = df.reset_index(drop=True)
 
+        # categories that don't occur in the processed data frame would
+        # otherwise show up as empty levels, e.g. in visualizations:
+        df = coltypes.remove_unused_categories(df)
+
         return df
 
 
@@ -888,7 +942,7 @@ class ContingencyTable(FrequencyList):
             ct = pd.DataFrame(data=[len(df)],
                               columns=["statistics_column_total"])
         else:
-            freq = df.groupby(categoricals).size()
+            freq = df.groupby(categoricals, observed=True).size()
             if len(categoricals) > 1:
                 ct = freq.unstack(fill_value=0).reset_index()
                 grouper = session.translate_header(categoricals[-1])
@@ -1297,6 +1351,8 @@ class ContrastMatrix(FrequencyList):
             self.alpha = None
             self.threshold = 0
         else:
+            # scipy is slow to import, so it is only imported when needed:
+            import scipy.stats
             self.threshold = scipy.stats.chi2.ppf(1 - self.alpha, 1)
         return df
 
@@ -1341,6 +1397,7 @@ class ContrastMatrix(FrequencyList):
         total_2 = df[df["coquery_invisible_row_id"] == label][size].values[0]
 
         obs = [[freq_1, freq_2], [total_1 - freq_1, total_2 - freq_2]]
+        import scipy.stats
         try:
             g2, p_g2, _, _ = scipy.stats.chi2_contingency(
                 obs, correction=False, lambda_="log-likelihood")
@@ -15,8 +15,6 @@ import argparse
 import warnings
 import codecs
 import ast
-import glob
-import imp
 import os
 import sys
 import logging
@@ -35,7 +33,7 @@ from .defines import (
 from .unicode import utf8
 from .links import parse_link_text
 from .filters import parse_filter_text
-from .connections import get_connection, SQLiteConnection
+from .connections import Connection, get_connection, SQLiteConnection
 from coquery.general import has_module
 
 
@@ -174,6 +172,8 @@ class Options(object):
         self.args.corpus = None
         self.args.gui = True
         self.args.csv_restrict = None
+        self.args.regexp_prefilter = True
+        self.args.link_cache = True
 
         self.args.table_links = defaultdict(list)
 
@@ -226,12 +226,18 @@ class Options(object):
             self.parser.add_argument("--con", help="Run Coquery as a console program", dest="gui", action="store_false")
 
         # General options:
+        self.parser.add_argument("--corpus", help="query CORPUS (required if Coquery is run as a console program)", type=str, dest="corpus")
         self.parser.add_argument("-o", "--outputfile", help="write results to OUTPUTFILE (default: write to console)", type=str, dest="output_path")
         group = self.parser.add_mutually_exclusive_group()
         group.add_argument("-i", "--inputfile", help="read query strings from INPUTFILE", type=str, dest="input_path")
         group.add_argument("-q", "--query", help="use QUERY for search, ignoring any INPUTFILE", dest="query_list")
         self.parser.add_argument("-f", "--filter", help="use FILTER to query only a selection of texts", type=str, default="", dest="source_filter")
 
+        # Server options:
+        group = self.parser.add_argument_group("Server options")
+        group.add_argument("--server", help="run Coquery as a local query server that accepts query jobs as JSON requests", action="store_true")
+        group.add_argument("--port", help="use PORT for the query server (default: 8765)", type=int, default=8765)
+
         # File options:
         group = self.parser.add_argument_group("File options")
         group.add_argument("-a", "--append", help="append output to OUTPUTFILE, if specified (default: overwrite)", action="store_true")
@@ -260,6 +266,8 @@ class Options(object):
         group.add_argument("-C", "--output_case", help="be case-sensitive in the output (default: ignore case)", action="store_true", dest="output_case_sensitive")
         group.add_argument("--query_case", help="be case-sensitive when querying (default: ignore case)", action="store_true", dest="query_case_sensitive")
         group.add_argument("-r", "--regexp", help="use regular expressions", action="store_true", dest="regexp")
+        group.add_argument("--no_regexp_prefilter", help="evaluate regular expressions for each token instead of once for each lexicon entry (SQLite only)", action="store_false", dest="regexp_prefilter", default=None)
+        group.add_argument("--no_link_cache", help="join linked tables directly instead of using a local cache in the corpus database", action="store_false", dest="link_cache", default=None)
 
         # Output options:
         group = self.parser.add_argument_group("Output options")
@@ -269,6 +277,7 @@ class Options(object):
         group.add_argument("--sentence", help="include the sentence of the token as a context (not supported by all corpora, currently not implemented)", dest="context_sentence", action="store_true")
 
         group.add_argument("--digits", help="set the number of digits after the period", dest="digits", default=3, type=int)
+        group.add_argument("--categorical", help="store lexical columns of the results table as categorical columns to reduce memory use", action="store_true", dest="categorical_columns")
 
         group.add_argument("--number_of_tokens", help="output up to NUMBER different tokens (default: all tokens)", default=0, type=int, dest="number_of_tokens", metavar="NUMBER")
         group.add_argument("--show_filter", help="include the filter strings in the output", action="store_true", dest="show_filter")
@@ -297,7 +306,8 @@ class Options(object):
         # error.
         cmd_args, unknown = self.parser.parse_known_args()
 
-        self.args.gui = cmd_args.gui
+        # the query server is run as a console program:
+        self.args.gui = cmd_args.gui and not cmd_args.server
         self.args.to_file = False
 
         self.read_configuration(read_file)
@@ -305,7 +315,8 @@ class Options(object):
         # FIXME: Do we still need a second parse?
         cmd_args, unknown = self.parser.parse_known_args()
 
-        self.args.corpus = utf8(self.args.corpus)
+        if self.args.corpus:
+            self.args.corpus = utf8(self.args.corpus)
 
         self.parser.add_argument("-h", "--help",
                                  help="show this help message and exit",
@@ -330,7 +341,11 @@ class Options(object):
         # merge the newly-parsed command-line arguments with those read from
         # the configation file.
         for arg in cmd_args.__dict__:
-            if arg in self.args and not cmd_args.__dict__[arg]:
+            value = cmd_args.__dict__[arg]
+            # flags like --no_regexp_prefilter have None as their default, so
+            # that False is only parsed if the flag is used:
+            flag_used = value is False and self.parser.get_default(arg) is None
+            if arg in self.args and not value and not flag_used:
                 # do not overwrite the command argument if it was set in the
                 # config file stored self.args, but not set at the command
                 # line
@@ -339,6 +354,8 @@ class Options(object):
                 # overwrite the setting from the configuration file with the
                 # command-line setting:
                 self.args.__dict__[arg] = cmd_args.__dict__[arg]
+        if self.args.server:
+            self.args.gui = False
 
         try:
             self.args.MODE = QUERY_MODES[self.args.MODE]
@@ -386,6 +403,9 @@ class Options(object):
             "query_case_sensitive": False,
             "output_case_sensitive": False,
             "regexp": False,
+            "regexp_prefilter": True,
+            "link_cache": True,
+            "categorical_columns": False,
             "experimental": False,
             "output_to_lower": True,
             "drop_duplicates": True,
@@ -504,6 +524,12 @@ class Options(object):
             self.args.output_case_sensitive = config_file.bool(
                 "main", "output_case_sensitive", d=defaults)
             self.args.regexp = config_file.bool("main", "regexp", d=defaults)
+            self.args.regexp_prefilter = config_file.bool(
+                "main", "regexp_prefilter", d=defaults)
+            self.args.link_cache = config_file.bool(
+                "main", "link_cache", d=defaults)
+            self.args.categorical_columns = config_file.bool(
+                "main", "categorical_columns", d=defaults)
             self.args.experimental = config_file.bool(
                 "main", "experimental", d=defaults)
             self.args.output_to_lower = config_file.bool(
@@ -810,7 +836,11 @@ class Options(object):
                 self.args.summary_groups.append(
                     Summary(name, cols, function_list))
 
-        # Use QSettings?
+        # Use QSettings? They are only opened for the GUI, so that the
+        # command-line tool doesn't have to import Qt:
+        global settings
+        if self.args.gui:
+            settings = open_settings()
         if settings:
             column_properties = {}
             try:
@@ -933,6 +963,9 @@ def save_configuration():
     config.set("main", "output_case_sensitive", cfg.output_case_sensitive)
     config.set("main", "query_case_sensitive", cfg.query_case_sensitive)
     config.set("main", "regexp", cfg.regexp)
+    config.set("main", "regexp_prefilter", cfg.regexp_prefilter)
+    config.set("main", "link_cache", cfg.link_cache)
+    config.set("main", "categorical_columns", cfg.categorical_columns)
     config.set("main", "experimental", cfg.experimental)
     config.set("main", "drop_on_na", cfg.drop_on_na)
     config.set("main", "na_string", cfg.na_string)
@@ -1143,20 +1176,27 @@ def save_configuration():
         config.write(output_file)
 
 
+def open_settings():
+    """
+    Return the QSettings object that stores the GUI settings, or None if
+    Qt is not available.
+    """
+    if not use_qt:
+        return None
+    try:
+        from PyQt5 import QtCore
+        from coquery.gui.pyqt_compat import CoqSettings
+        return CoqSettings(
+                    os.path.join(general.get_home_dir(), "coquery.ini"),
+                    QtCore.QSettings.IniFormat)
+    except IOError:
+        return None
+
+
 def process_options(use_file=True):
     global cfg
     global settings
-    if use_qt:
-        try:
-            from PyQt5 import QtCore
-            from coquery.gui.pyqt_compat import CoqSettings
-            settings = CoqSettings(
-                        os.path.join(general.get_home_dir(), "coquery.ini"),
-                        QtCore.QSettings.IniFormat)
-        except IOError:
-            settings = None
-    else:
-        settings = None
+    settings = None
 
     options = Options()
     cfg = options.cfg
@@ -1169,7 +1209,7 @@ def process_options(use_file=True):
     add_source_path(cfg.custom_installer_path)
 
 
-def set_current_server(name):
+def set_current_server(name, find_resources=True):
     """
     Changes the current server paths. Also, update the currently available
     resources.
@@ -1178,10 +1218,14 @@ def set_current_server(name):
     ----------
     name : str
         The name of the MySQL configuration
+    find_resources : bool
+        If True, all corpus modules of the connection are loaded. If False,
+        corpus modules are only loaded when they are requested.
     """
     global cfg
     cfg.current_connection = cfg.connections.get(name, None)
-    cfg.current_connection.find_resources()
+    if find_resources:
+        cfg.current_connection.find_resources()
 
     # make sure that a subdirectory exists in "connections" for the current
     # connection:
@@ -1206,11 +1250,14 @@ def set_current_server(name):
 def get_resource_of_database(db_name):
     """
     Get the resource that uses the database.
+
+    The database names are taken from the corpus manifest, so only the
+    corpus module of the matching resource is imported.
     """
     resources = cfg.current_connection.resources()
-    for name in resources:
-        resource, _, _ = resources[name]
-        if resource.db_name == db_name:
+    for name in list(resources):
+        if resources.get_db_name(name) == db_name:
+            resource, _, _ = resources[name]
             return resource
     return None
 
@@ -1220,10 +1267,11 @@ def get_available_resources(configuration):
     Return a dictionary with the available corpus module resource classes
     as values, and the corpus module names as keys.
 
-    This method scans the content of the sub-directory 'corpora' for valid
-    corpus modules. This directory has additional subdirectories for each
-    MySQL configuration. If a corpus module is found, the resource classes
-    Resource and Corpus are retrieved from the module.
+    The available corpus modules are read from the manifest in the
+    sub-directory 'corpora' of the connection directory. The manifest is
+    updated for corpus modules that have been added or modified since it
+    was written. The resource classes Resource and Corpus are retrieved
+    from a corpus module when its entry in the dictionary is accessed.
 
     Parameters
     ----------
@@ -1238,41 +1286,12 @@ def get_available_resources(configuration):
         classes as values:
         (module.Resource, module.Corpus, module_name)
     """
-
-    d = {}
     if configuration is None:
-        return d
-
-    # add corpus_path to sys.path so that modules can be imported from
-    # that location:
-    corpora_path = os.path.join(general.get_home_dir(),
-                                "connections", configuration, "corpora")
+        return {}
 
-    # create the directory if it doesn't exist yet:
-    # cycle through the modules in the corpus path:
-    for module_name in glob.glob(os.path.join(corpora_path, "*.py")):
-        corpus_name, ext = os.path.splitext(os.path.basename(module_name))
-        corpus_name = utf8(corpus_name)
-
-        try:
-            find = imp.find_module(corpus_name, [corpora_path])
-            module = imp.load_module(corpus_name, *find)
-        except Exception as e:
-            s = (f"There is an error in corpus module '{corpus_name}': {e}\n"
-                 "The corpus is not available for queries.")
-            print(s)
-            logging.warning(s)
-        else:
-            try:
-                d[module.Resource.name] = (module.Resource,
-                                           module.Corpus,
-                                           module_name)
-            except (AttributeError, ImportError) as e:
-                print(e)
-                s = (f"'{corpus_name}' does not appear to be a valid corpus "
-                     "module.")
-                warnings.warn(s)
-    return d
+    connection = Connection(configuration)
+    connection.find_resources()
+    return connection.resources()
 
 
 def decode_query_string(s):
@@ -1349,6 +1368,8 @@ use_sqlparse = has_module("sqlparse")
 use_pymongo = has_module("pymongo")
 use_pyodbc = has_module("pyodbc")
 use_meza = has_module("meza")
+use_pyarrow = has_module("pyarrow")
+use_openpyxl = has_module("openpyxl")
 
 missing_modules = []
 for mod in ["sqlalchemy", "pandas", "scipy", "PyQt5", "lxml"]:
@@ -14,11 +14,13 @@ import os
 
 import pandas as pd
 import numpy as np
+import sqlalchemy
 
 from coquery.defines import (QUERY_ITEM_LEMMA, QUERY_ITEM_WORD,
                              CONTEXT_NONE)
 from coquery.errors import SQLQueryCancelled
 
+from . import linkcache
 from . import tokens
 from . import options
 from coquery.connections import SQLiteConnection
@@ -42,7 +44,9 @@ class TokenQuery(object):
         self.Resource = Session.Resource
         self.Corpus = Session.Corpus
         self.Results = []
-        self.input_frame = pd.DataFrame()
+        # the names and values of the columns from the input file:
+        self.input_columns = []
+        self.input_values = ()
         self.results_frame = pd.DataFrame()
         self._keys = []
         self.empty_query = False
@@ -91,8 +95,11 @@ class TokenQuery(object):
         Run the query, and store the results in an internal data frame.
 
         This method runs all required subqueries for the query string, e.g.
-        the quantified queries if quantified tokens are used. The results are
-        stored in self.results_frame.
+        the quantified queries if quantified tokens are used. If the
+        resource can combine the subqueries by UNION ALL (see
+        SQLResource.get_union_query_templates()), only the combined
+        statements are executed. The results are stored in
+        self.results_frame.
 
         Parameters
         ----------
@@ -117,96 +124,172 @@ class TokenQuery(object):
 
         self.sql_list = []
 
+        # use the local caches of linked tables if possible:
+        if options.cfg.link_cache and connection is not None:
+            linkcache.prepare_links(self.Resource,
+                                    options.cfg.selected_features,
+                                    connection)
+        else:
+            linkcache.clear()
+
         if isinstance(options.cfg.current_connection, SQLiteConnection):
             attach_list = self.Resource.get_attach_list(
                 options.cfg.selected_features)
             self.attach_databases(connection, attach_list)
 
-        for i, self._sub_query in enumerate(self.query_list):
-            sub_str = [item if item else "_NULL"
-                       for _, item in self._sub_query]
-            self.sql_list.append(
-                "-- query string: {}".format(" ".join(sub_str)))
+        # Quantified query strings are expanded into several sub-queries.
+        # If possible, these are combined into as few SQL statements as
+        # the database allows:
+        statements = None
+        if len(self.query_list) > 1:
+            statements = self.Resource.get_union_query_templates(
+                query_list=self.query_list,
+                selected=options.cfg.selected_features,
+                to_file=to_file)
+
+        if statements is not None:
+            for self._sub_query in self.query_list:
+                sub_str = [item if item else "_NULL"
+                           for _, item in self._sub_query]
+                self.sql_list.append(
+                    "-- query string: {}".format(" ".join(sub_str)))
             lst = [utf8(x) for _, x in self._sub_query if x]
             self._current_number_of_tokens = len(lst)
             self._current_subquery_string = " ".join(lst)
 
-            if len(self.query_list) > 1:
-                s = "Subquery #{} of {}: {}".format(
-                            i+1,
-                            len(self.query_list),
-                            self._current_subquery_string)
-                logging.info(s)
+            logging.info("Combining {} subqueries in {} statements".format(
+                len(self.query_list), len(statements)))
 
-            query_string = self.Resource.get_query_string(
-                query_items=self._sub_query,
-                selected=options.cfg.selected_features,
-                to_file=to_file)
+            df_list = []
+            for template, params in statements:
+                query_string = self.Resource.render_query_template(
+                    template, params)
+                self.sql_list.append(query_string)
+
+                df = self.get_results(connection, template, params,
+                                      query_string, manager_hash)
+                df_list.append(self.fix_case(df))
+            df = pd.concat(df_list, ignore_index=True)
+
+            # restore the order of the sub-queries:
+            df = (df.sort_values("coquery_invisible_subquery",
+                                 kind="mergesort")
+                    .drop("coquery_invisible_subquery", axis="columns"))
+            if len(df) > 0:
+                self.results_frame = df
+        else:
+            for i, self._sub_query in enumerate(self.query_list):
+                sub_str = [item if item else "_NULL"
+                           for _, item in self._sub_query]
+                self.sql_list.append(
+                    "-- query string: {}".format(" ".join(sub_str)))
+                lst = [utf8(x) for _, x in self._sub_query if x]
+                self._current_number_of_tokens = len(lst)
+                self._current_subquery_string = " ".join(lst)
+
+                if len(self.query_list) > 1:
+                    s = "Subquery #{} of {}: {}".format(
+                                i+1,
+                                len(self.query_list),
+                                self._current_subquery_string)
+                    logging.info(s)
+
+                template, params = self.Resource.get_query_template(
+                    query_items=self._sub_query,
+                    selected=options.cfg.selected_features,
+                    to_file=to_file)
+                query_string = self.Resource.render_query_template(
+                    template, params)
+
+                self.sql_list.append(query_string)
+
+                df = self.get_results(connection, template, params,
+                                      query_string, manager_hash)
+                df = self.fix_case(df)
+
+                n = self._current_number_of_tokens
+                df["coquery_invisible_number_of_tokens"] = n
+
+                if len(df) > 0:
+                    if self.results_frame.empty:
+                        self.results_frame = df
+                    else:
+                        self.results_frame = self.results_frame.append(df)
 
-            self.sql_list.append(query_string)
+        self.results_frame = self.results_frame.reset_index(drop=True)
+        TokenQuery._id += 1
+        self._query_id = TokenQuery._id
+        return self.results_frame
+
+    def get_results(self, connection, template, params, query_string,
+                    manager_hash):
+        """
+        Return a data frame with the results of the SQL template.
+
+        If the query cache is used, the results are taken from the cache if
+        possible, and stored in the cache otherwise.
+
+        Parameters
+        ----------
+        connection : sqlalchemy.engine.Connection
+            The database connection
+        template : str
+            The SQL template as returned by get_query_template()
+        params : dict
+            The bind values for the template
+        query_string : str
+            The SQL string with the bind values inserted
+        manager_hash : str
+            The hash of the current manager, used as part of the cache key
+        """
+        df = None
+        if options.cfg.use_cache and query_string:
+            try:
+                s = "".join(sorted(query_string)).encode()
+                md5 = hashlib.md5(s).hexdigest()
+                df = options.cfg.query_cache.get((self.Resource.name,
+                                                  manager_hash, md5))
+            except KeyError:
+                md5 = ""
+
+        if df is None:
+            if not query_string:
+                df = pd.DataFrame()
+            else:
+                if options.cfg.verbose:
+                    logging.info(query_string)
 
-            df = None
-            if options.cfg.use_cache and query_string:
                 try:
-                    s = "".join(sorted(query_string)).encode()
-                    md5 = hashlib.md5(s).hexdigest()
-                    df = options.cfg.query_cache.get((self.Resource.name,
-                                                      manager_hash, md5))
-                except KeyError:
-                    md5 = ""
-
-            if df is None:
-                if not query_string:
-                    df = pd.DataFrame()
-                else:
-                    if options.cfg.verbose:
-                        logging.info(query_string)
+                    results = (connection
+                               .execution_options(stream_results=True)
+                               .execute(sqlalchemy.text(template),
+                                        params))
+                except Exception as e:
+                    print(query_string)
+                    raise e
 
-                    try:
-                        results = (connection
-                                   .execution_options(stream_results=True)
-                                   .execute(query_string.replace("%", "%%")))
-                    except Exception as e:
-                        print(query_string)
-                        raise e
+                try:
+                    df = pd.DataFrame(results, columns=results.keys())
+                except Exception as e:
+                    if not self.Session._query_connection:
+                        raise SQLQueryCancelled
+                    raise e
 
+                if len(df) == 0:
                     try:
-                        df = pd.DataFrame(results, columns=results.keys())
+                        df = pd.DataFrame(columns=results.keys())
                     except Exception as e:
                         if not self.Session._query_connection:
                             raise SQLQueryCancelled
                         raise e
 
-                    if len(df) == 0:
-                        try:
-                            df = pd.DataFrame(columns=results.keys())
-                        except Exception as e:
-                            if not self.Session._query_connection:
-                                raise SQLQueryCancelled
-                            raise e
-
-                    del results
-
-                    if options.cfg.use_cache:
-                        options.cfg.query_cache.add(
-                            (self.Resource.name, manager_hash, md5),
-                            df)
-
-            df = self.fix_case(df)
-
-            n = self._current_number_of_tokens
-            df["coquery_invisible_number_of_tokens"] = n
-
-            if len(df) > 0:
-                if self.results_frame.empty:
-                    self.results_frame = df
-                else:
-                    self.results_frame = self.results_frame.append(df)
+                del results
 
-        self.results_frame = self.results_frame.reset_index(drop=True)
-        TokenQuery._id += 1
-        self._query_id = TokenQuery._id
-        return self.results_frame
+                if options.cfg.use_cache:
+                    options.cfg.query_cache.add(
+                        (self.Resource.name, manager_hash, md5),
+                        df)
+        return df
 
     def get_max_tokens(self):
         """
@@ -313,7 +396,6 @@ class TokenQuery(object):
 
         columns = [x for x in options.cfg.selected_features
                    if x.startswith("coquery_")]
-        columns += list(self.input_frame.columns)
 
         for column in columns:
             if column == "coquery_query_string":
@@ -331,19 +413,10 @@ class TokenQuery(object):
                     L += [token] * length
                 for i, item in enumerate(L):
                     df["{}_{}".format(column, i+1)] = item
-            else:
-                # add column labels for the columns in the input file:
-                if all([x is None for x in self.input_frame.columns]):
-                    # no header in input file, so use X1, X2, ..., Xn:
-                    input_columns = [
-                        ("coq_X{}".format(x), x)
-                        for x in range(len(self.input_frame.columns))]
-                else:
-                    input_columns = [
-                        ("coq_{}".format(x), x)
-                        for x in self.input_frame.columns]
-                for df_col, input_col in input_columns:
-                    df[df_col] = self.input_frame[input_col][0]
+
+        # add the columns from the input file:
+        for input_col, value in zip(self.input_columns, self.input_values):
+            df["coq_{}".format(input_col)] = value
         df["coquery_invisible_query_id"] = self._query_id
         return df
 
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+querysource.py is part of Coquery.
+
+Copyright (c) 2016-2022 Gero Kunter (gero.kunter@coquery.org)
+
+Coquery is released under the terms of the GNU General Public License (v3).
+For details, see the file LICENSE that you should have received along
+with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides the QuerySource class that reads the rows of a query
+input file.
+
+The rows are read one at a time while the queries are run, so that the
+first query can be executed before the whole file has been read, and so
+that the memory used does not depend on the number of rows in the file.
+The values of each row are returned as a list of strings.
+"""
+
+from __future__ import unicode_literals
+
+import codecs
+import csv
+import itertools
+
+from .errors import EmptyInputFileError
+
+
+class QuerySource(object):
+    """
+    Read the rows of a delimiter-separated query input file.
+
+    Parameters
+    ----------
+    path : str
+        The name of the input file. Sources that are read from a file can
+        be read several times.
+    handle : file-like object
+        A text stream that is read instead of a file, e.g. the standard
+        input. Such a source can only be read once.
+    sep, quote_char : str
+        The column separator and the quote character
+    encoding : str
+        The encoding of the input file
+    has_header : bool
+        True if the first row contains the column names
+    max_rows : int
+        If not None, only this number of rows after the header is read.
+    """
+    def __init__(self, path=None, handle=None, sep=",", quote_char='"',
+                 encoding="utf-8", has_header=False, max_rows=None):
+        if (path is None) == (handle is None):
+            raise ValueError("Either a path or a handle is required.")
+        self.path = path
+        self.handle = handle
+        self.sep = sep
+        self.quote_char = quote_char or '"'
+        # the byte order mark is not part of the first column name:
+        if codecs.lookup(encoding or "utf-8").name == "utf-8":
+            encoding = "utf-8-sig"
+        self.encoding = encoding
+        self.has_header = has_header
+        self.max_rows = max_rows
+        self._rows = None
+        self._pending = []
+
+    @property
+    def name(self):
+        return self.path if self.path is not None else "<stdin>"
+
+    @property
+    def rewindable(self):
+        return self.path is not None
+
+    def _read(self):
+        """
+        Yield the non-empty rows of the input, including the header.
+        """
+        if self.path is not None:
+            with open(self.path, "rt", encoding=self.encoding,
+                      newline="") as handle:
+                yield from self._parse(handle)
+        else:
+            yield from self._parse(self.handle)
+
+    def _parse(self, handle):
+        reader = csv.reader(handle, delimiter=self.sep,
+                            quotechar=self.quote_char)
+        for row in reader:
+            if row:
+                yield row
+
+    def _get_rows(self):
+        if self._rows is None or self.rewindable:
+            self._rows = self._read()
+            self._pending = []
+        return self._rows
+
+    def read_header(self):
+        """
+        Return the column names.
+
+        If the input has no header, the columns are named X1, X2, ..., Xn.
+        The number of columns is taken from the first row, which is read
+        again when the rows are iterated.
+        """
+        rows = self._get_rows()
+        try:
+            first = next(rows)
+        except (StopIteration, UnicodeDecodeError, csv.Error):
+            raise EmptyInputFileError(self.name)
+
+        if self.has_header:
+            return list(first)
+        self._pending = [first]
+        return ["X{}".format(i + 1) for i in range(len(first))]
+
+    def iter_rows(self):
+        """
+        Yield the rows that follow the header, one list of strings per row.
+
+        Sources that can be read several times start again at the first
+        row after the header.
+        """
+        if self.rewindable or self._rows is None:
+            self.read_header()
+
+        rows = itertools.chain(self._pending, self._rows)
+        self._pending = []
+        if self.max_rows is not None:
+            rows = itertools.islice(rows, self.max_rows)
+        yield from rows
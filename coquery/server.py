@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+server.py is part of Coquery.
+
+Copyright (c) 2016-2022 Gero Kunter (gero.kunter@coquery.org)
+
+Coquery is released under the terms of the GNU General Public License (v3).
+For details, see the file LICENSE that you should have received along
+with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides the QueryServer class that runs Coquery as a
+long-running query server with a local JSON API.
+
+A command-line session has to connect to the database, import the corpus
+module and fill the frequency and corpus size caches of the corpus every
+time it is started. The query server does this only once for each corpus:
+the sessions, their database engines and the caches are kept between
+queries. The server only listens on the local host.
+
+The server accepts these requests:
+
+GET /status
+    Return information about the server as a JSON object.
+
+POST /query
+    Run a query job. The request body is a JSON object with the following
+    keys (only 'queries' is required):
+
+    queries     a query string, or a list of query strings
+    corpus      the name of the corpus (default: the corpus specified
+                with --corpus)
+    mode        the query mode, e.g. 'TOKEN' or 'FREQ' (default: the mode
+                specified on the command line)
+    features    a list of the selected output features, e.g.
+                ['word_label', 'source_genre']
+    filters     a list of filters, either as dictionaries with the
+                arguments of Filter(), or as strings produced by
+                Filter.__repr__()
+    chunk_size  the number of rows in each chunk of the response
+
+    The response is a stream of JSON objects, one per line. The first
+    object contains the column names ('columns'), each following object
+    contains a chunk of rows ('rows'), and the last object reports the
+    total number of rows ('done'). If an error occurs while the query is
+    run, an object with an 'error' key is sent instead.
+
+POST /shutdown
+    Stop the server.
+
+Query jobs are run one after the other, as they use the global settings
+in options.cfg.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import options
+from .defines import QUERY_MODES, QUERY_MODE_STATISTICS
+from .filters import Filter, parse_filter_text
+
+DEFAULT_PORT = 8765
+DEFAULT_CHUNK_SIZE = 1000
+
+# the settings in options.cfg that are changed by query jobs:
+JOB_OPTIONS = ("corpus", "MODE", "query_list", "selected_features",
+               "filter_list")
+
+
+class JobError(ValueError):
+    """
+    Raised if a query job can't be run because of invalid arguments.
+    """
+    def __init__(self, msg, status=400):
+        super(JobError, self).__init__(msg)
+        self.status = status
+
+
+def get_job_options(job, defaults):
+    """
+    Return the settings that are used to run the query job.
+
+    Parameters
+    ----------
+    job : dict
+        The query job as read from the request
+    defaults : dict
+        The settings that are used if the job doesn't specify them
+
+    Returns
+    -------
+    d : dict
+        A dictionary with the names from JOB_OPTIONS as keys
+    """
+    if not isinstance(job, dict):
+        raise JobError("The query job has to be a JSON object.")
+
+    d = dict(defaults)
+
+    queries = job.get("queries")
+    if isinstance(queries, str):
+        queries = [queries]
+    if (not isinstance(queries, list) or
+            not all(isinstance(x, str) for x in queries)):
+        raise JobError("'queries' has to be a string or a list of strings.")
+    d["query_list"] = queries
+
+    if job.get("corpus"):
+        d["corpus"] = str(job["corpus"])
+    if not d["corpus"]:
+        raise JobError("No corpus specified.")
+
+    if "mode" in job:
+        mode = job["mode"]
+        if not isinstance(mode, str):
+            raise JobError("'mode' has to be a string.")
+        if mode in QUERY_MODES:
+            mode = QUERY_MODES[mode]
+        elif mode not in QUERY_MODES.values():
+            raise JobError("Unknown query mode '{}'".format(mode))
+        d["MODE"] = mode
+
+    if "features" in job:
+        if not isinstance(job["features"], list):
+            raise JobError("'features' has to be a list of strings.")
+        d["selected_features"] = list(job["features"])
+
+    if "filters" in job:
+        filter_list = []
+        for filt in job["filters"]:
+            try:
+                if isinstance(filt, dict):
+                    filt = dict(filt)
+                    filt.setdefault("dtype", None)
+                    filter_list.append(Filter(**filt))
+                else:
+                    filter_list.append(parse_filter_text(str(filt)))
+            except (TypeError, ValueError) as e:
+                raise JobError("Invalid filter {}: {}".format(filt, e))
+        d["filter_list"] = filter_list
+
+    return d
+
+
+def iter_messages(columns, df, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the JSON objects that are sent as the response to a query job.
+
+    Parameters
+    ----------
+    columns : list
+        The column names used in the response
+    df : pandas.DataFrame
+        The query results. The data frame has one column for each entry in
+        `columns`.
+    chunk_size : int
+        The maximum number of rows in each chunk
+    """
+    yield {"columns": list(columns)}
+    chunk_size = max(1, int(chunk_size))
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        yield {"rows": chunk.values.tolist()}
+    yield {"done": True, "rows": len(df)}
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.info("Query server: {}".format(format % args))
+
+    def send_json(self, obj, status=200):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, obj):
+        data = "{}\n".format(json.dumps(obj, default=str)).encode("utf-8")
+        self.wfile.write("{:x}\r\n".format(len(data)).encode("ascii"))
+        self.wfile.write(data)
+        self.wfile.write(b"\r\n")
+        self.wfile.flush()
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except ValueError as e:
+            raise JobError("Invalid JSON: {}".format(e))
+
+    def do_GET(self):
+        if self.path == "/status":
+            self.send_json(self.server.get_status())
+        else:
+            self.send_json({"error": "Not found"}, status=404)
+
+    def do_POST(self):
+        if self.path == "/query":
+            self.handle_query()
+        elif self.path == "/shutdown":
+            self.send_json({"shutdown": True})
+            threading.Thread(target=self.server.shutdown).start()
+        else:
+            self.send_json({"error": "Not found"}, status=404)
+
+    def handle_query(self):
+        start_time = time.time()
+        try:
+            job = self.read_json()
+            columns, df = self.server.run_job(job)
+        except JobError as e:
+            self.send_json({"error": str(e)}, status=e.status)
+            return
+        except Exception as e:
+            logging.error("Query job failed: {}".format(e))
+            self.send_json({"error": str(e)}, status=500)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk_size = job.get("chunk_size", DEFAULT_CHUNK_SIZE)
+        try:
+            for message in iter_messages(columns, df, chunk_size):
+                if "done" in message:
+                    message["seconds"] = round(time.time() - start_time, 3)
+                self.send_chunk(message)
+        except Exception as e:
+            self.send_chunk({"error": str(e)})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class QueryServer(ThreadingHTTPServer):
+    """
+    A local HTTP server that runs query jobs.
+
+    Parameters
+    ----------
+    port : int
+        The port on which the server listens. If 0, a free port is used.
+    host : str
+        The address on which the server listens
+    """
+    daemon_threads = True
+
+    def __init__(self, port=DEFAULT_PORT, host="127.0.0.1"):
+        super(QueryServer, self).__init__((host, port), QueryRequestHandler)
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self.jobs = 0
+        self.defaults = {name: getattr(options.cfg, name, None)
+                         for name in JOB_OPTIONS}
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def get_status(self):
+        return {"corpus": self.defaults["corpus"],
+                "connection": options.cfg.current_connection.name,
+                "sessions": sorted(corpus for corpus, _ in self._sessions),
+                "jobs": self.jobs}
+
+    def get_session(self, corpus, mode):
+        """
+        Return the session for the corpus. Sessions are created once for
+        each corpus, and are reused by later jobs.
+        """
+        from . import session
+
+        statistics = mode == QUERY_MODE_STATISTICS
+        key = (corpus, statistics)
+        if key not in self._sessions:
+            if not options.cfg.current_connection.find_resource(corpus):
+                raise JobError(
+                    "No corpus available with name '{}'".format(corpus),
+                    status=404)
+            if statistics:
+                self._sessions[key] = session.StatisticsSession()
+            else:
+                self._sessions[key] = session.SessionCommandLine(
+                    summary_groups=options.cfg.summary_groups)
+        return self._sessions[key]
+
+    def run_job(self, job):
+        """
+        Run a query job, and return the visible column names and the
+        query results.
+        """
+        settings = get_job_options(job, self.defaults)
+        with self._lock:
+            for name, value in settings.items():
+                setattr(options.cfg, name, value)
+            session = self.get_session(settings["corpus"], settings["MODE"])
+            if not session.is_statistics_session():
+                session.prepare_queries()
+            session.run_queries()
+            session.aggregate_data()
+            df = session.output_object
+            visible = [x for x in df.columns
+                       if not str(x).startswith("coquery_invisible")]
+            columns = [session.translate_header(x) for x in visible]
+            self.jobs += 1
+        logging.info("Query job {}: {} queries, {} rows".format(
+            self.jobs, len(settings["query_list"]), len(df)))
+        return columns, df[visible]
+
+
+def serve(port=DEFAULT_PORT):
+    """
+    Run the query server until it is shut down.
+    """
+    server = QueryServer(port)
+    logging.info("Query server listening on port {}".format(server.port))
+    print("Coquery query server listening on http://127.0.0.1:{}/".format(
+        server.port))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
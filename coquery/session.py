@@ -12,14 +12,12 @@ with Coquery. If not, see <http://www.gnu.org/licenses/>.
 import sys
 import time
 import datetime
-import fileinput
 import codecs
 import warnings
 import logging
 import re
 
 import pandas as pd
-import numpy as np
 import sqlalchemy.engine
 
 from . import options
@@ -32,6 +30,9 @@ from .general import Print
 from coquery.queries import StatisticsQuery, TokenQuery
 from . import managers
 from . import functionlist
+from . import coltypes
+from . import sqliteregexp
+from .querysource import QuerySource
 
 
 class Session(object):
@@ -43,6 +44,8 @@ class Session(object):
         self.header = None
         self.max_number_of_input_columns = 0
         self.query_list = []
+        self.query_source = None
+        self._max_token_count = 0
         self.requested_fields = []
         self.sql_queries = []
         self.groups = []
@@ -107,8 +110,11 @@ class Session(object):
         """
         Return the maximal number of tokens that may be produced by the
         queries from this session.
+
+        Queries that are read from a query source are only taken into
+        account once they have been run.
         """
-        maximum = 0
+        maximum = self._max_token_count
         for query in self.query_list:
             maximum = max(maximum, query.get_max_tokens())
         return maximum
@@ -156,23 +162,28 @@ class Session(object):
         self._first_saved_dataframe = False
 
     def connect_to_db(self) -> sqlalchemy.engine.Connection:
-        def _sqlite_regexp(expr, item):
-            """
-            Function which adds regular expressions to SQLite
-            """
-            if options.cfg.query_case_sensitive:
-                match = re.search(expr, item)
-            else:
-                match = re.search(expr, item, re.IGNORECASE)
-            return match is not None
-
         dbc = self.db_engine.connect()
         if options.cfg.current_connection.db_type() == SQL_SQLITE:
-            dbc.connection.create_function("REGEXP", 2, _sqlite_regexp)
+            sqliteregexp.register(
+                dbc.connection,
+                case_sensitive=options.cfg.query_case_sensitive)
         return dbc
 
+    def iter_queries(self):
+        """
+        Yield the queries of the session.
+        """
+        yield from self.query_list
+
+    def count_queries(self):
+        """
+        Return the number of queries of the session.
+        """
+        return len(self.query_list)
+
     def prepare_queries(self):
         self.query_list = []
+        self.query_source = None
         for query_string in options.cfg.query_list:
             if self.query_type:
                 new_query = self.query_type(query_string, self)
@@ -203,40 +214,57 @@ class Session(object):
 
         self.data_table = pd.DataFrame()
         self.quantified_number_labels = []
+        self._max_token_count = 0
         Session.query_id += 1
 
-        number_of_queries = len(self.query_list)
+        # The number of queries read from a query source is not known
+        # before the source has been read completely:
+        if self.query_source is None:
+            number_of_queries = len(self.query_list)
+        else:
+            number_of_queries = None
         manager = self.get_manager(options.cfg.MODE)
         manager.set_filters(options.cfg.filter_list)
         manager.set_groups(self.groups)
         manager.set_column_order(options.cfg.column_order)
 
         self.queries = {}
-        _queried = []
+        _queried = set()
+        numbering_query = None
 
         self.sql_queries = []
 
         self._query_connection = self.connect_to_db()
         self.query_cancelled = False
         try:
-            for i, current_query in enumerate(self.query_list):
+            for i, current_query in enumerate(self.iter_queries()):
                 if current_query.query_string in _queried and not to_file:
                     warnings.warn(
                         "Duplicate query string detected: {}".format(
                             current_query.query_string))
                     continue
-                _queried.append(current_query.query_string)
-                self.queries[i] = current_query
+                if not to_file:
+                    _queried.add(current_query.query_string)
+                    self.queries[i] = current_query
 
-                if options.cfg.gui and number_of_queries > 1:
+                if options.cfg.gui and number_of_queries != 1:
                     options.cfg.main_window.updateMultiProgress.emit(i+1)
 
-                if not self.quantified_number_labels:
-                    self.quantified_number_labels = [
-                        current_query.get_token_numbering(i)
-                        for i in range(self.get_max_token_count())]
+                # the number labels of the query tokens are extended if a
+                # query has more tokens than the previous queries:
+                self._max_token_count = max(self._max_token_count,
+                                            current_query.get_max_tokens())
+                if numbering_query is None:
+                    numbering_query = current_query
+                self.quantified_number_labels += [
+                    numbering_query.get_token_numbering(n)
+                    for n in range(len(self.quantified_number_labels),
+                                   self.get_max_token_count())]
                 start_time = time.time()
-                if number_of_queries > 1:
+                if number_of_queries is None:
+                    info = (f"Start query ({i+1}): "
+                            f"'{current_query.query_string}'")
+                elif number_of_queries > 1:
                     info = (f"Start query ({i+1} of {number_of_queries}): "
                             f"'{current_query.query_string}'")
                 else:
@@ -252,7 +280,8 @@ class Session(object):
                     self.query_cancelled = True
                     raise SQLQueryCancelled
 
-                self.sql_queries.append(current_query.sql_list)
+                if not to_file:
+                    self.sql_queries.append(current_query.sql_list)
                 raw_length = len(df)
 
                 df = current_query.insert_static_data(df)
@@ -298,20 +327,52 @@ class Session(object):
             list(self.data_table.columns))
         self.data_table = self.data_table[ordered_columns]
 
-        # Handle dtypes and deal with missing values
-        for col in self.data_table.columns:
-            S = self.data_table[col]
-            S = S.replace({None: pd.NA, np.NaN: pd.NA})
-            dtype = S.dropna().convert_dtypes().dtype
-            if pd.api.types.is_integer_dtype(dtype):
-                S = pd.Series(S, dtype=pd.Int64Dtype())
-            elif pd.api.types.is_numeric_dtype(dtype):
-                S = pd.to_numeric(S, errors="coerce", downcast="integer")
-            self.data_table[col] = S
+        # Handle dtypes and deal with missing values. Each column is cast
+        # only once, and the table is assembled from the cast columns. If
+        # requested, string columns that correspond to resource features
+        # are stored as categorical columns:
+        kinds = self.get_column_kinds(ordered_columns)
+        categorical = options.cfg.categorical_columns
+        self.data_table = pd.DataFrame(
+            {col: coltypes.cast_column(self.data_table[col], kinds.get(col),
+                                       categorical and col in kinds)
+             for col in ordered_columns},
+            columns=ordered_columns)
 
         # Reset row index
         self.data_table = self.data_table.reset_index(drop=True)
 
+    def get_column_kinds(self, columns):
+        """
+        Return the kinds of the columns that correspond to resource
+        features, as given by the SQL data types in the corpus schema.
+
+        Returns
+        -------
+        d : dict
+            A dictionary with column names as keys and kinds (see
+            coltypes.py) as values. Columns for which the schema doesn't
+            provide a data type are not included.
+        """
+        if not self.Resource or not hasattr(self.Resource,
+                                            "get_feature_types"):
+            return {}
+        try:
+            feature_types = self.Resource.get_feature_types()
+        except (AttributeError, sqlalchemy.exc.SQLAlchemyError) as e:
+            logging.warning("Could not retrieve column types: {}".format(e))
+            return {}
+
+        d = {}
+        for col in columns:
+            match = re.match(r"coq_(.*)_\d+$", col)
+            if match:
+                kind = coltypes.get_sql_kind(
+                    feature_types.get(match.group(1)))
+                if kind:
+                    d[col] = kind
+        return d
+
     def get_manager(self, query_mode):
         if not self.Resource:
             return None
@@ -608,92 +669,114 @@ class SessionCommandLine(Session):
 
 
 class SessionInputFile(Session):
+    """
+    A session that reads the query strings from an input file.
+
+    The queries are created one at a time while the input file is read, so
+    that the first query can run before the whole file has been read. The
+    values of the other columns in the input file are stored as tuples in
+    the queries.
+    """
+    def get_query_source(self):
+        return QuerySource(
+            path=options.cfg.input_path,
+            sep=options.cfg.input_separator,
+            quote_char=options.cfg.quote_char,
+            encoding=options.cfg.input_encoding,
+            has_header=options.cfg.file_has_headers,
+            max_rows=options.cfg.csv_restrict)
+
     def prepare_queries(self):
-        with open(options.cfg.input_path, "rt") as InputFile:
-            read_lines = 0
-            try:
-                input_file = pd.read_csv(
-                    filepath_or_buffer=InputFile,
-                    sep=options.cfg.input_separator,
-                    header=0 if options.cfg.file_has_headers else None,
-                    quotechar=options.cfg.quote_char,
-                    encoding=options.cfg.input_encoding,
-                    nrows=options.cfg.csv_restrict,
-                    na_filter=False)
-            except ValueError:
-                raise EmptyInputFileError(InputFile)
-            if self.header is None:
-                if options.cfg.file_has_headers:
-                    self.header = input_file.columns.values.tolist()
-                else:
-                    self.header = ["X{}".format(i+1) for i, _
-                                   in enumerate(input_file.columns)]
-                    input_file.columns = self.header
-
-            options.cfg.query_label = self.header.pop(
-                options.cfg.query_column_number - 1)
-            for current_line in input_file.iterrows():
-                current_line = list(current_line[1])
-                if options.cfg.query_column_number > len(current_line):
-                    raise IllegalArgumentError(
-                        "Column number for queries too big (-n {})".format(
-                            options.cfg.query_column_number))
-
-                if read_lines >= options.cfg.skip_lines:
-                    try:
-                        query_string = current_line.pop(
-                            options.cfg.query_column_number - 1)
-                    except AttributeError:
-                        continue
-                    new_query = self.query_type(query_string, self)
-                    if len(current_line) != len(self.header):
-                        raise TokenParseError
-                    new_query.input_frame = pd.DataFrame(
-                        [current_line], columns=self.header)
-                    self.query_list.append(new_query)
-                self.max_number_of_input_columns = max(
-                    len(current_line),
-                    self.max_number_of_input_columns)
-                read_lines += 1
-            self.input_columns = ["coq_{}".format(x) for x in self.header]
-
-        logging.info(
-            "Input file: {} ({} {})".format(
-                options.cfg.input_path,
-                len(self.query_list),
-                "query" if len(self.query_list) == 1 else "queries"))
+        self.query_list = []
+        self.query_source = self.get_query_source()
+        columns = self.query_source.read_header()
+        if self.header is None:
+            self.header = columns
+
+        options.cfg.query_label = self.header.pop(
+            options.cfg.query_column_number - 1)
+        self.input_columns = ["coq_{}".format(x) for x in self.header]
+        self.max_number_of_input_columns = len(self.header)
+
+        # Create the first query so that errors in the input file are
+        # reported before any query is run:
+        if self.query_source.rewindable:
+            for _ in self.iter_queries():
+                break
+
+        logging.info("Input file: {}".format(self.query_source.name))
         if options.cfg.skip_lines:
             logging.info(
                 "Skipped first {}.".format(
                     ("query" if options.cfg.skip_lines == 1
                      else "{} queries".format(options.cfg.skip_lines))))
 
+    def iter_rows(self):
+        """
+        Yield the query string and the values of the other input columns
+        for each row in the input file.
+        """
+        column = options.cfg.query_column_number
+        for i, row in enumerate(self.query_source.iter_rows()):
+            if column > len(row):
+                raise IllegalArgumentError(
+                    "Column number for queries too big (-n {})".format(
+                        column))
+            if i < options.cfg.skip_lines:
+                continue
+            query_string = row.pop(column - 1)
+            if len(row) != len(self.header):
+                raise TokenParseError
+            yield query_string, tuple(row)
+
+    def iter_queries(self):
+        if self.query_source is None:
+            yield from super(SessionInputFile, self).iter_queries()
+            return
+        for query_string, values in self.iter_rows():
+            new_query = self.query_type(query_string, self)
+            new_query.input_columns = self.header
+            new_query.input_values = values
+            yield new_query
+
+    def count_queries(self):
+        """
+        Return the number of queries in the input file, or None if the
+        input can only be read once.
+        """
+        if self.query_source is None:
+            return super(SessionInputFile, self).count_queries()
+        if not self.query_source.rewindable:
+            return None
+        return sum(1 for _ in self.iter_rows())
+
+    def finalize_table(self):
+        # Values from the input file are read as strings. As in the
+        # earlier pandas-based reader, input columns that contain only
+        # numbers are converted to numeric columns:
+        for col in self.input_columns:
+            if col in self.data_table.columns:
+                try:
+                    self.data_table[col] = pd.to_numeric(
+                        self.data_table[col])
+                except (ValueError, TypeError):
+                    pass
+        super(SessionInputFile, self).finalize_table()
 
-class SessionStdIn(Session):
+
+class SessionStdIn(SessionInputFile):
+    """
+    A session that reads the query strings from the standard input. The
+    queries are run while the standard input is read.
+    """
     def __init__(self, summary_groups=None):
         super(SessionStdIn, self).__init__(summary_groups)
-
-        for current_string in fileinput.input("-"):
-            read_lines = 0
-            current_line = [x.strip() for x
-                            in current_string.split(
-                                options.cfg.input_separator)]
-            if current_line:
-                if options.cfg.file_has_headers and not self.header:
-                    self.header = current_line
-                else:
-                    if read_lines >= options.cfg.skip_lines:
-                        query_string = current_line.pop(
-                            options.cfg.query_column_number - 1)
-                        new_query = self.query_type(query_string, self)
-                        self.query_list.append(new_query)
-                self.max_number_of_input_columns = max(
-                    len(current_line), self.max_number_of_input_columns)
-            read_lines += 1
-        logging.info("Reading standard input ({} {})".format(
-            len(self.query_list),
-            "query" if len(self.query_list) == 1 else "queries"))
-        if options.cfg.skip_lines:
-            logging.info("Skipping first {} {}.".format(
-                options.cfg.skip_lines,
-                "query" if options.cfg.skip_lines == 1 else "queries"))
+        self.prepare_queries()
+
+    def get_query_source(self):
+        return QuerySource(
+            handle=sys.stdin,
+            sep=options.cfg.input_separator,
+            quote_char=options.cfg.quote_char,
+            has_header=options.cfg.file_has_headers,
+            max_rows=options.cfg.csv_restrict)
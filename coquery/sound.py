@@ -9,10 +9,11 @@ For details, see the file LICENSE that you should have received along
 with Coquery. If not, see <http://www.gnu.org/licenses/>.
 """
 
+import collections
 import wave
 import logging
+import mmap
 import threading
-import tempfile
 import os
 import struct
 import sys
@@ -101,57 +102,237 @@ else:
     print("Loaded audio module: {}".format(_audio_module))
 
 
-def _read_as_wav(source):
-    try:
-        if type(source) is bytes:
-            in_wav = wave.open(io.BytesIO(source))
+# The number of audio files that are kept open by open_audio():
+AUDIO_CACHE_SIZE = 8
+
+NIST_HEADER = b"NIST_1A"
+
+
+def _ulaw_table():
+    """
+    Return the table that maps mu-law bytes to 16 bit samples (G.711).
+    """
+    u = ~np.arange(256, dtype=np.uint8)
+    exponent = (u >> 4) & 0x07
+    mantissa = (u & 0x0F).astype(np.int32)
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(u & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+class AudioData(object):
+    """
+    The sample data of an audio file.
+
+    The samples are not copied: they are exposed as numpy views of the
+    buffer, which is usually a memory map of the audio file. Only the
+    parts of the file that are actually accessed are read from disk.
+
+    Parameters
+    ----------
+    buffer : bytes-like object
+        The content of the audio file, e.g. a mmap.mmap object
+    offset : int
+        The position of the first sample in the buffer
+    n_frames : int
+        The number of frames
+    framerate, channels, samplewidth : int
+        The frame rate, the number of channels, and the number of bytes
+        per sample
+    byteorder : str
+        '<' for little-endian samples, '>' for big-endian samples
+    encoding : str
+        'pcm' for linear samples, or 'ulaw' for mu-law encoded samples.
+        Mu-law samples are decoded to 16 bit samples when they are
+        accessed.
+    """
+    _ulaw = None
+
+    def __init__(self, buffer, offset, n_frames, framerate, channels,
+                 samplewidth, byteorder="<", encoding="pcm"):
+        if encoding == "ulaw":
+            samplewidth = 1
+        if samplewidth not in (1, 2, 4) or not channels or not framerate:
+            raise TypeError("Unsupported audio format")
+        self.buffer = buffer
+        self.offset = offset
+        self.framerate = framerate
+        self.channels = channels
+        self.encoding = encoding
+        self._width = samplewidth
+        available = (len(buffer) - offset) // (samplewidth * channels)
+        self.n_frames = max(0, min(n_frames, available))
+        if samplewidth == 1:
+            # 8 bit WAV samples are unsigned:
+            self._dtype = np.dtype(np.uint8)
         else:
-            in_wav = wave.open(source, "rb")
-    except FileNotFoundError:
-        raise IOError("Could not read WAV file '{}'.".format(source))
-    except wave.Error:
-        raise TypeError("WAV file not readable")
+            self._dtype = np.dtype("{}i{}".format(byteorder, samplewidth))
+
+    @property
+    def samplewidth(self):
+        """
+        The number of bytes per sample of the data returned by samples()
+        """
+        if self.encoding == "ulaw":
+            return 2
+        return self._width
+
+    def samples(self, first=0, last=None):
+        """
+        Return the samples of a range of frames as a one-dimensional array
+        with interleaved channels.
+
+        For PCM data, the array is a read-only view of the buffer.
+
+        Parameters
+        ----------
+        first, last : int
+            The first frame, and the frame after the last frame
+        """
+        if last is None or last > self.n_frames:
+            last = self.n_frames
+        first = min(max(0, first), last)
+        count = (last - first) * self.channels
+        data = np.frombuffer(
+            self.buffer, dtype=self._dtype, count=count,
+            offset=self.offset + first * self.channels * self._width)
+        if self.encoding == "ulaw":
+            if AudioData._ulaw is None:
+                AudioData._ulaw = _ulaw_table()
+            data = AudioData._ulaw[data]
+        return data
+
+    def frames(self, first=0, last=None):
+        """
+        Return the raw frames of a range of frames as a bytes-like object
+        that can be written to a WAV file or to an audio device.
+        """
+        data = self.samples(first, last)
+        if self.encoding == "pcm" and (self._width == 1 or
+                                       self._dtype.byteorder != ">"):
+            return memoryview(data).cast("B")
+        return data.astype("<i{}".format(self.samplewidth)).tobytes()
+
+
+def _parse_wav(buffer):
+    """
+    Return an AudioData object for the content of a WAV file.
+    """
+    if bytes(buffer[0:4]) != b"RIFF" or bytes(buffer[8:12]) != b"WAVE":
+        raise TypeError("Not a WAV file")
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(buffer):
+        chunk_id = bytes(buffer[pos:pos + 4])
+        size, = struct.unpack("<I", buffer[pos + 4:pos + 8])
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", buffer[pos + 8:pos + 24])
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise TypeError("WAV file not readable")
+            tag, channels, framerate, _, _, bits = fmt
+            # 0xFFFE is WAVE_FORMAT_EXTENSIBLE, which is used for PCM data
+            # with more than two channels or more than 16 bits:
+            if tag not in (1, 0xFFFE):
+                raise TypeError("Unsupported WAV format {}".format(tag))
+            samplewidth = (bits + 7) // 8
+            return AudioData(buffer, pos + 8,
+                             size // max(1, samplewidth * channels),
+                             framerate, channels, samplewidth)
+        # chunks are padded to an even size:
+        pos += 8 + size + (size & 1)
+    raise TypeError("WAV file not readable")
+
+
+def _parse_sph(buffer):
+    """
+    Return an AudioData object for the content of a NIST SPHERE file.
+
+    Only uncompressed files are supported.
+    """
+    if bytes(buffer[:7]) != NIST_HEADER:
+        raise TypeError("Not a SPHERE file")
+    try:
+        header_size = int(bytes(buffer[8:16]).split()[0])
+    except (ValueError, IndexError):
+        raise TypeError("SPHERE file not readable")
+
+    fields = {}
+    for line in bytes(buffer[16:header_size]).decode("ascii",
+                                                    "replace").splitlines():
+        values = line.split(None, 2)
+        if values and values[0] == "end_head":
+            break
+        if len(values) == 3:
+            fields[values[0]] = values[2].strip()
+
+    coding = fields.get("sample_coding", "pcm").lower()
+    if coding in ("mu-law", "ulaw"):
+        encoding = "ulaw"
+    elif coding == "pcm":
+        encoding = "pcm"
     else:
-        return in_wav
+        raise TypeError("Unsupported SPHERE coding '{}'".format(coding))
+
+    try:
+        framerate = int(fields["sample_rate"])
+        channels = int(fields.get("channel_count", 1))
+        samplewidth = int(fields.get("sample_n_bytes", 2))
+        n_frames = int(fields.get("sample_count", len(buffer)))
+    except (KeyError, ValueError):
+        raise TypeError("SPHERE file not readable")
+    byteorder = ">" if fields.get("sample_byte_format") == "10" else "<"
+    return AudioData(buffer, header_size, n_frames, framerate, channels,
+                     samplewidth, byteorder=byteorder, encoding=encoding)
+
+
+def _read_buffer(source):
+    """
+    Return the content of the source as a bytes-like object. Files are
+    memory-mapped.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return source
+    if hasattr(source, "read"):
+        return source.read()
+    try:
+        with open(source, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        raise IOError("Could not read audio file '{}'.".format(source))
+    except ValueError:
+        # empty files can't be memory-mapped:
+        raise TypeError("Empty audio file")
+
+
+def _read_as_wav(source):
+    return _parse_wav(_read_buffer(source))
 
 
 def _read_as_sph(source):
-    in_wav = None
-    if _use_sphfile:
-        try:
-            if type(source) is bytes:
-                raise NotImplementedError
-            else:
-                with open(source, "rb") as f:
-                    header = f.read(4)
-                    if header != "NIST":
-                        raise TypeError
-                sph_file = sphfile.SPHFile(source)
-                sph_file.open()
-
-                tmp = tempfile.NamedTemporaryFile()
-                temp_name = tmp.name
-                tmp.close()
-
-                try:
-                    sph_file.write_wav(temp_name)
-                    in_wav = _read_as_wav(tmp.name)
-                finally:
-                    os.remove(temp_name)
-
-        except (wave.Error, ValueError, TypeError) as e:
-            raise TypeError
-        else:
-            return in_wav
-    else:
-        raise TypeError("SPHFile not unsupported")
+    buffer = _read_buffer(source)
+    try:
+        return _parse_sph(buffer)
+    except TypeError:
+        if not _use_sphfile or bytes(buffer[:7]) != NIST_HEADER:
+            raise
+        if isinstance(source, (bytes, bytearray)) or hasattr(source, "read"):
+            raise
+
+    # use sphfile for formats that can't be accessed directly:
+    sph_file = sphfile.SPHFile(source)
+    sph_file.open()
+    content = np.ascontiguousarray(sph_file.content, dtype="<i2")
+    channels = int(sph_file.format.get("channel_count", 1))
+    return AudioData(content.tobytes(), 0, len(content) // channels,
+                     int(sph_file.format["sample_rate"]), channels, 2)
 
 
 class AudioReader(object):
     """
     This class provides the read() class method which can be used to read an
-    audio file. It takes the file name as an input, and returns a
-    wave.Wave_read instance, or None the audio file could not be read.
+    audio file. It takes the file name, the file content, or a stream as
+    an input, and returns an AudioData instance, or None if the audio file
+    could not be read.
 
     Support for different audio file formats is provided by adding a reader
     method to the class module `reader_methods`.
@@ -162,6 +343,9 @@ class AudioReader(object):
     def __init__(self, source=None):
         self._n = len(self.reader_methods)
         self._i = 0
+        if hasattr(source, "read"):
+            # streams can only be read once:
+            source = source.read()
         self._source = source
 
     def __iter__(self):
@@ -191,76 +375,164 @@ class AudioReader(object):
         return None
 
 
+class _AudioCache(object):
+    """
+    A small LRU cache of the audio files that have been opened, so that
+    the same recording is only mapped once if several snippets are taken
+    from it.
+    """
+    def __init__(self, size=AUDIO_CACHE_SIZE):
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        audio = AudioReader.read(path)
+        if audio is not None:
+            with self._lock:
+                self._entries[key] = audio
+                while len(self._entries) > self.size:
+                    # the memory map is closed once the last sound that
+                    # uses it has been deleted:
+                    self._entries.popitem(last=False)
+        return audio
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_audio_cache = _AudioCache()
+
+
+def open_audio(source):
+    """
+    Return an AudioData object for the source, or None if the source
+    could not be read.
+
+    Parameters
+    ----------
+    source : str, bytes, or file-like object
+        The name of the audio file, the content of the file, or a stream.
+        Audio files that are specified by name are memory-mapped, and are
+        kept open for later calls.
+    """
+    if isinstance(source, str):
+        try:
+            return _audio_cache.get(source)
+        except FileNotFoundError:
+            raise IOError("Could not read audio file '{}'.".format(source))
+    return AudioReader.read(source)
+
+
 class Sound(object):
-    def __init__(self, source, start=0, end=None):
+    """
+    A sound, i.e. a range of frames from an audio file.
 
-        in_wav = AudioReader.read(source)
+    The frames are not copied from the audio file: the sound is a view of
+    the memory-mapped audio data, and extracting a part of the sound
+    creates a new view of the same data.
 
-        if not in_wav:
+    Parameters
+    ----------
+    source : str, bytes, file-like object, or AudioData
+        The audio file
+    start, end : float
+        The beginning and the end of the sound in the audio file, in
+        seconds. If `end` is None, the sound lasts until the end of the
+        file.
+    """
+    def __init__(self, source, start=0, end=None):
+        if isinstance(source, AudioData):
+            audio = source
+        else:
+            audio = open_audio(source)
+
+        if not audio:
             raise TypeError
 
-        self.framerate = in_wav.getframerate()
-        self.channels = in_wav.getnchannels()
-        self.samplewidth = in_wav.getsampwidth()
-        in_wav.setpos(int(start * self.framerate))
+        self.audio = audio
+        self.framerate = audio.framerate
+        self.channels = audio.channels
+        self.samplewidth = audio.samplewidth
+        self._first = min(int(start * self.framerate), audio.n_frames)
         if end is None:
-            end = (in_wav.getnframes() - start / self.framerate)
-        self.raw = in_wav.readframes(int((end - start) * self.framerate))
-        in_wav.close()
-
-    def astype(self, t):
-        if self.samplewidth == 2:
-            c_type = "h"
+            self._last = audio.n_frames
         else:
-            c_type = "b"
-        if "little" in sys.byteorder:
-            frm = "<{}".format(c_type)
-        else:
-            frm = ">{}".format(c_type)
+            self._last = max(self._first,
+                             min(int(end * self.framerate), audio.n_frames))
+
+    @property
+    def raw(self):
+        """
+        The frames of the sound as a bytes-like object
+        """
+        return self.audio.frames(self._first, self._last)
+
+    def channel_samples(self):
+        """
+        Return the samples of the sound as an array with one row per frame
+        and one column per channel.
+        """
+        data = self.audio.samples(self._first, self._last)
+        if self.audio.samplewidth == 1 and self.audio.encoding == "pcm":
+            data = data.astype(np.int16) - 128
+        return data.reshape(-1, self.channels)
+
+    def samples(self):
+        """
+        Return the samples of the sound as a one-dimensional array. If the
+        sound has more than one channel, the channels are mixed down to
+        their mean.
+        """
+        data = self.channel_samples()
+        if self.channels == 1:
+            return data.reshape(-1)
+        return np.round(data.mean(axis=1)).astype(data.dtype)
 
-        S = struct.Struct(frm)
-        return np.array([S.unpack(self.raw[x * self.samplewidth:
-                                           (x+1) * self.samplewidth])[0]
-                         for x in range(len(self))]).astype(t)
+    def astype(self, t):
+        return self.samples().astype(t)
 
     def __len__(self):
         """
         Return the length of the sound in frames
         """
-        return int(len(self.raw) / self.samplewidth)
+        return self._last - self._first
 
     def duration(self):
         return len(self) / self.framerate
 
     def to_index(self, t):
-        val = int(self.framerate * t) * self.samplewidth
-        return val
+        return min(max(0, int(self.framerate * t)), len(self))
 
     def to_time(self, i):
-        return i / (self.framerate * self.samplewidth)
+        return i / self.framerate
 
-    def extract_sound(self, start=0, end=None):
-        if not start and not end:
-            raise ValueError
-        start_pos = self.to_index(start)
+    def _get_range(self, start, end):
+        first = self._first + self.to_index(start)
         if end:
-            end_pos = self.to_index(end)
+            last = self._first + self.to_index(end)
         else:
-            end_pos = len(self.raw)
+            last = self._last
+        return first, max(first, last)
 
-        _buffer = io.BytesIO()
-        _output = wave.open(_buffer, "wb")
-        _output.setnchannels(self.channels)
-        _output.setsampwidth(self.samplewidth)
-        _output.setframerate(self.framerate)
-        _output.writeframes(self.raw[start_pos:end_pos])
-        _output.close()
-        _buffer.seek(0)
-        return Sound(_buffer)
+    def extract_sound(self, start=0, end=None):
+        if not start and not end:
+            raise ValueError
+        sound = Sound(self.audio)
+        sound._first, sound._last = self._get_range(start, end)
+        return sound
 
-    def play(self, start=0, end=None, async=True):
+    def play(self, start=0, end=None, asynchronous=True):
         self.thread = _get_sound_thread(sound=self, start=start, end=end)
-        if not async:
+        if not asynchronous:
             self.thread.run()
             return None
         else:
@@ -272,17 +544,13 @@ class Sound(object):
         self.thread.stop_device()
 
     def write(self, target, start=0, end=None):
-        start_pos = self.to_index(start)
-        if end:
-            end_pos = self.to_index(end)
-        else:
-            end_pos = len(self.raw)
+        first, last = self._get_range(start, end)
 
         _output = wave.open(target, "wb")
         _output.setnchannels(self.channels)
         _output.setsampwidth(self.samplewidth)
         _output.setframerate(self.framerate)
-        _output.writeframes(self.raw[start_pos:end_pos])
+        _output.writeframes(self.audio.frames(first, last))
         _output.close()
 
 
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+sqliteregexp.py is part of Coquery.
+
+Copyright (c) 2016-2022 Gero Kunter (gero.kunter@coquery.org)
+
+Coquery is released under the terms of the GNU General Public License (v3).
+For details, see the file LICENSE that you should have received along
+with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides the REGEXP function for SQLite databases.
+
+SQLite has no built-in implementation of the REGEXP operator. Instead, the
+operator calls a user function that has to be registered for each
+connection. As this function is called once for every row that is
+compared to the regular expression, it is kept as lean as possible: the
+regular expressions are compiled only once and kept in a cache of compiled
+patterns, and the case sensitivity is determined when the function is
+registered, not when it is called.
+"""
+
+from __future__ import unicode_literals
+
+import re
+import sqlite3
+import logging
+
+from .general import LRUCache
+
+_compiled_patterns = LRUCache(maxsize=256)
+
+
+def compile_pattern(expr, case_sensitive=False):
+    """
+    Return the compiled regular expression.
+
+    Compiled regular expressions are cached, so repeated calls with the
+    same arguments return the same pattern object.
+
+    Parameters
+    ----------
+    expr : str
+        The regular expression
+    case_sensitive : bool
+        False if the regular expression should ignore case
+
+    Returns
+    -------
+    pattern : re.Pattern
+        The compiled regular expression
+    """
+    key = (expr, case_sensitive)
+    pattern = _compiled_patterns.get(key)
+    if pattern is None:
+        flags = 0 if case_sensitive else re.IGNORECASE
+        pattern = re.compile(expr, flags)
+        _compiled_patterns[key] = pattern
+    return pattern
+
+
+def get_regexp_function(case_sensitive=False):
+    """
+    Return a function that implements the SQLite REGEXP operator.
+
+    The returned function takes the regular expression and the value of
+    the current row as arguments, and returns True if the regular
+    expression matches the value. NULL values never match.
+    """
+    # Within a query, the function is usually called with the same
+    # regular expression for many consecutive rows, so the last pattern is
+    # kept at hand without looking it up in the cache:
+    last = [None, None]
+
+    def _sqlite_regexp(expr, item):
+        if item is None:
+            return False
+        if expr != last[0]:
+            last[1] = compile_pattern(expr, case_sensitive)
+            last[0] = expr
+        return last[1].search(str(item)) is not None
+
+    return _sqlite_regexp
+
+
+def register(dbapi_connection, case_sensitive=False):
+    """
+    Register the REGEXP function for the SQLite connection.
+
+    The function is registered as deterministic if the SQLite library
+    supports this, which allows SQLite to evaluate it only once for
+    constant arguments, and to use it in indexed expressions.
+
+    Parameters
+    ----------
+    dbapi_connection : sqlite3.Connection
+        The DBAPI connection, i.e. the `connection` attribute of an
+        SQLAlchemy connection
+    case_sensitive : bool
+        False if regular expressions should ignore case
+    """
+    func = get_regexp_function(case_sensitive)
+    try:
+        dbapi_connection.create_function(
+            "REGEXP", 2, func, deterministic=True)
+    except (TypeError, sqlite3.NotSupportedError) as e:
+        # Python versions before 3.8 don't know the 'deterministic'
+        # argument, and SQLite versions before 3.8.3 don't support it:
+        logging.info("Registering REGEXP as non-deterministic ({})".format(e))
+        dbapi_connection.create_function("REGEXP", 2, func)
+
+
+def clear_cache():
+    """
+    Remove all compiled regular expressions from the cache.
+    """
+    _compiled_patterns.clear()
@@ -7,29 +7,386 @@ Copyright (c) 2016-2021 Gero Kunter (gero.kunter@coquery.org)
 Coquery is released under the terms of the GNU General Public License (v3).
 For details, see the file LICENSE that you should have received along
 with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides the TextgridWriter class that writes the query
+results as Praat TextGrids, optionally together with the matching audio
+snippets.
+
+The intervals of the tiers are collected as NumPy arrays in GridData
+objects. They are turned into tgt objects only if the text grids are
+requested by fill_grids(). write_grids() serializes the arrays directly
+into TextGrid files in the short text format.
 """
 
 from __future__ import unicode_literals
 
+import bisect
 import collections
+import multiprocessing
 import os
 import logging
 
+import numpy as np
+import pandas as pd
 import tgt
+from tgt.core import Time
 
 from . import options
+from .export import ExportCancelled
 from .links import get_by_hash
 from .unicode import utf8
 
 
+# The precision of time values in tgt. Two times that differ by less than
+# this value are considered to be equal:
+TIME_PRECISION = 0.0001
+
+
+def format_time(t):
+    return str(float(t))
+
+
+def escape_text(text):
+    return text.replace('"', '""')
+
+
+def remove_overlaps(starts, ends):
+    """
+    Return a mask of the intervals that can be added to a tier.
+
+    The intervals are added to the tier one after the other, in the order
+    of the arrays. An interval is dropped if it ends before it starts, or
+    if it overlaps with an interval that has been added before. This is
+    the same behavior as adding tgt.Interval objects to a tgt tier and
+    ignoring the ValueErrors.
+
+    Parameters
+    ----------
+    starts, ends : numpy.ndarray
+        The start and end times of the intervals
+
+    Returns
+    -------
+    mask : numpy.ndarray
+        A boolean array that is True for the intervals that are kept
+    """
+    mask = starts <= ends
+    valid = np.flatnonzero(mask)
+    order = valid[np.argsort(starts[valid], kind="stable")]
+    s = starts[order]
+    e = ends[order]
+
+    if len(s) < 2 or (s[1:] > np.maximum.accumulate(e)[:-1] -
+                      TIME_PRECISION).all():
+        # usual case: there are no overlapping intervals
+        return mask
+
+    # Some intervals overlap. Whether an interval is kept depends on the
+    # intervals that have been kept before, so the intervals have to be
+    # checked one by one:
+    kept_starts = []
+    kept_ends = []
+    for i in valid:
+        start = starts[i]
+        end = ends[i]
+        if not kept_ends or start > kept_ends[-1] - TIME_PRECISION:
+            kept_starts.append(start)
+            kept_ends.append(end)
+            continue
+        lo = bisect.bisect_right(kept_ends, start + TIME_PRECISION)
+        hi = bisect.bisect_left(kept_starts, end - TIME_PRECISION)
+        if lo < hi:
+            mask[i] = False
+        else:
+            kept_starts.insert(hi, start)
+            kept_ends.insert(hi, end)
+    return mask
+
+
+def fill_gaps(starts, ends, labels, start_time, end_time):
+    """
+    Fill the gaps between the intervals with empty intervals, in the same
+    way as tgt does when writing a tier.
+
+    Returns
+    -------
+    tup : tuple
+        The arrays of start times, end times and labels of the intervals,
+        including the empty intervals
+    """
+    n = len(starts)
+    all_starts = np.empty(2 * n + 1)
+    all_ends = np.empty(2 * n + 1)
+    all_labels = np.empty(2 * n + 1, dtype=object)
+
+    all_starts[0::2] = np.concatenate(([start_time], ends))
+    all_ends[0::2] = np.concatenate((starts, [end_time]))
+    all_labels[0::2] = ""
+    all_starts[1::2] = starts
+    all_ends[1::2] = ends
+    all_labels[1::2] = labels
+
+    keep = np.ones(2 * n + 1, dtype=bool)
+    keep[0::2] = all_ends[0::2] - all_starts[0::2] >= TIME_PRECISION
+    return all_starts[keep], all_ends[keep], all_labels[keep]
+
+
+class GridData(object):
+    """
+    The content of a text grid.
+
+    The tiers are taken from a tgt.TextGrid, but the intervals of the
+    interval tiers are stored as arrays. The arrays are only turned into
+    tgt.Interval objects by to_textgrid().
+
+    Parameters
+    ----------
+    grid : tgt.TextGrid
+        The text grid that contains the (empty) tiers
+    """
+    def __init__(self, grid):
+        self.grid = grid
+        self._index = {}
+        for i, tier in enumerate(grid.tiers):
+            self._index.setdefault(tier.name, i)
+        self._parts = collections.defaultdict(list)
+        self._end_times = {}
+        self._intervals = {}
+
+    def add_intervals(self, tier_name, starts, ends, labels, end_time,
+                      warn=False):
+        """
+        Add intervals to the tier.
+
+        Parameters
+        ----------
+        tier_name : str
+            The name of the tier
+        starts, ends, labels : numpy.ndarray
+            The start times, end times and labels of the intervals
+        end_time : float
+            The end time of the tier
+        warn : bool
+            If True, a warning is logged if intervals are dropped because
+            they overlap with other intervals
+        """
+        i = self._index.get(tier_name)
+        if i is None:
+            return
+        self._parts[i].append((starts, ends, labels, warn))
+        self._end_times[i] = max(self._end_times.get(i, 0), end_time)
+        self._intervals.pop(i, None)
+
+    def has_intervals(self, tier_name):
+        return bool(self._parts.get(self._index.get(tier_name)))
+
+    def get_intervals(self, i):
+        """
+        Return the intervals of the i-th tier.
+
+        Returns
+        -------
+        tup : tuple
+            The arrays of start times, end times and labels of the
+            intervals, sorted by start time and without overlaps
+        """
+        if i not in self._intervals:
+            parts = self._parts.get(i)
+            if not parts:
+                return np.empty(0), np.empty(0), np.empty(0, dtype=object)
+            starts = np.concatenate([x[0] for x in parts]).astype(float)
+            ends = np.concatenate([x[1] for x in parts]).astype(float)
+            labels = np.concatenate([x[2] for x in parts])
+
+            mask = remove_overlaps(starts, ends)
+            if not mask.all() and any(x[3] for x in parts):
+                logging.warning(
+                    "{}: {} overlapping intervals dropped".format(
+                        self.grid.tiers[i].name, (~mask).sum()))
+            starts, ends, labels = starts[mask], ends[mask], labels[mask]
+            order = np.argsort(starts, kind="stable")
+            self._intervals[i] = starts[order], ends[order], labels[order]
+        return self._intervals[i]
+
+    def tier_times(self, i):
+        """
+        Return the start and the end time of the i-th tier.
+
+        The times are compared in the same way as in tgt, i.e. times that
+        differ by less than the time precision are considered to be
+        equal.
+        """
+        tier = self.grid.tiers[i]
+        if not isinstance(tier, tgt.IntervalTier):
+            return tier.start_time, tier.end_time
+        starts, ends, _ = self.get_intervals(i)
+        start_time = tier.start_time
+        end_time = max([tier.end_time, Time(self._end_times.get(i, 0))])
+        if len(starts):
+            start_time = min([Time(starts[0]), start_time])
+            end_time = max([Time(ends[-1]), end_time])
+        return start_time, end_time
+
+    @property
+    def start_time(self):
+        return min([self.tier_times(i)[0]
+                    for i in range(len(self.grid.tiers))], default=Time(0))
+
+    @property
+    def end_time(self):
+        return max([self.tier_times(i)[1]
+                    for i in range(len(self.grid.tiers))], default=Time(0))
+
+    def to_textgrid(self):
+        """
+        Add the intervals to the tiers, and return the text grid.
+        """
+        for i, tier in enumerate(self.grid.tiers):
+            if not isinstance(tier, tgt.IntervalTier):
+                continue
+            _, end_time = self.tier_times(i)
+            tier.add_intervals(
+                [tgt.Interval(start, end, label)
+                 for start, end, label in zip(*self.get_intervals(i))])
+            tier.end_time = end_time
+        self._parts.clear()
+        self._intervals.clear()
+        return self.grid
+
+    def to_text(self):
+        """
+        Return the text grid as a string in the short TextGrid format.
+
+        The result is the same as the output of tgt.write_to_file(), but
+        no tgt objects are created for the intervals.
+        """
+        start_time = self.start_time
+        end_time = self.end_time
+        lines = ['File type = "ooTextFile"',
+                 'Object class = "TextGrid"',
+                 '',
+                 format_time(start_time),
+                 format_time(end_time),
+                 '<exists>',
+                 str(len(self.grid.tiers))]
+        for i, tier in enumerate(self.grid.tiers):
+            name = escape_text(tier.name)
+            if isinstance(tier, tgt.IntervalTier):
+                starts, ends, labels = self.get_intervals(i)
+                if len(starts):
+                    starts, ends, labels = fill_gaps(
+                        starts, ends, labels, start_time, end_time)
+                    tier_start = min(start_time, starts[0])
+                    tier_end = max(end_time, ends[-1])
+                else:
+                    # tgt fills an empty tier with an interval that spans
+                    # the tier, not the whole text grid:
+                    tier_start, tier_end = self.tier_times(i)
+                    starts = [tier_start]
+                    ends = [tier_end]
+                    labels = [""]
+                    tier_start = start_time
+                    tier_end = end_time
+                lines += ['"IntervalTier"', f'"{name}"',
+                          format_time(tier_start), format_time(tier_end),
+                          str(len(starts))]
+                lines += [f'{format_time(start)}\n{format_time(end)}\n'
+                          f'"{escape_text(label.strip())}"'
+                          for start, end, label in zip(starts, ends, labels)]
+            else:
+                lines += ['"TextTier"', f'"{name}"',
+                          format_time(tier.start_time),
+                          format_time(tier.end_time),
+                          str(len(tier))]
+                lines += [f'{format_time(point.time)}\n'
+                          f'"{escape_text(point.text)}"'
+                          for point in tier]
+        return "\n".join(lines)
+
+    def write(self, target):
+        """
+        Write the text grid to the target file.
+        """
+        with open(target, "w", encoding="utf-8", newline="") as f:
+            f.write(self.to_text())
+
+
+def write_files(task):
+    """
+    Write the text grids and the audio snippets of one source file.
+
+    Parameters
+    ----------
+    task : tuple
+        A tuple (grid_files, audio_path, snippets). `grid_files` is a list
+        of tuples (data, target) for the text grids, where `data` is a
+        GridData object. `audio_path` is the
+        path to the audio file of the source, or None. `snippets` is a list
+        of tuples (target, start, end) for the audio snippets that are cut
+        from the audio file.
+
+    Returns
+    -------
+    tup : tuple
+        The number of text grids and the number of audio snippets that
+        have been written
+    """
+    grid_files, audio_path, snippets = task
+    for data, target in grid_files:
+        data.write(target)
+
+    if not audio_path:
+        return len(grid_files), 0
+
+    from .sound import Sound
+
+    try:
+        sound = Sound(audio_path)
+    except TypeError:
+        return len(grid_files), 0
+    for target, start, end in snippets:
+        sound.write(target, start, end)
+    return len(grid_files), len(snippets)
+
+
 class TextgridWriter(object):
-    def __init__(self, df, session):
+    """
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The query results
+    session : Session
+        The session that produced the query results
+    progress : callable
+        A function that is called with the number of text grids written
+        so far and the total number of text grids
+    workers : int
+        The number of worker processes. If None, one process is used for
+        each CPU. If 1, the files are written in the current process.
+    """
+    def __init__(self, df, session, progress=None, workers=None):
         self.df = df
         self.resource = session.Resource
         self.session = session
+        self.progress = progress
+        self.workers = workers
+        self.n = 0
+        self.n_snippets = 0
         self._artificial_corpus_id = False
         self._offsets = {}
         self._file_data = None
+        self._file_index = None
+        self._cancelled = False
+
+    def cancel(self):
+        """
+        Stop the export after the current source file.
+        """
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled
 
     @property
     def file_data(self):
@@ -39,6 +396,18 @@ class TextgridWriter(object):
                 ["file_name", "file_duration"])
         return self._file_data.reset_index(drop=True)
 
+    @property
+    def file_index(self):
+        """
+        The file data, indexed by corpus ID
+        """
+        if self._file_index is None:
+            corpus_id = self.resource.corpus_id
+            self._file_index = (self.file_data
+                                .drop_duplicates(corpus_id)
+                                .set_index(corpus_id))
+        return self._file_index
+
     def prepare_textgrids(self, order=None, one_grid_per_match=False,
                           remember_time=False):
         """
@@ -58,8 +427,8 @@ class TextgridWriter(object):
         else:
             key_columns = [self.resource.file_name]
 
-        for i in self.file_data.index:
-            grid_id = tuple(self.file_data.iloc[i][key_columns])
+        for grid_id in self.file_data[key_columns].itertuples(index=False,
+                                                              name=None):
             grids[grid_id] = tgt.TextGrid()
 
         if ("corpus_starttime" in options.cfg.selected_features and
@@ -153,197 +522,265 @@ class TextgridWriter(object):
 
         return grids
 
-    def process_dataframe(self, df, grid, offset, end_time, left_padding,
-                          right_padding, remember_time, grid_id):
+    def get_tier_info(self, col):
         """
-        Fill the grid by using the content of the data frame.
+        Return the tier that is filled by a data frame column.
+
+        Returns
+        -------
+        tup : tuple
+            A tuple (tier_name, number). `number` is the query item number
+            of the column, or None. If the column does not fill a tier,
+            None is returned.
         """
-        corpus_features = [x for x, _ in self.resource.get_corpus_features()]
-
-        data_columns = [x for x in df.columns
-                        if "_starttime_" not in x and "_endtime_" not in x]
-
-        max_stop = end_time + left_padding + right_padding
-
-        for col in data_columns:
-            interval = None
-            # add the corpus IDs if no real feature is selected:
-            if col == "coquery_invisible_corpus_id":
-                if self._artificial_corpus_id:
-                    tier_name = "corpus_id"
-                else:
-                    continue
-                number = 1
-            elif col.startswith("coquery_invisible"):
-                continue
-            elif col.startswith(("func", "coquery", "db")):
-                tier_name = self.session.translate_header(col)
+        # add the corpus IDs if no real feature is selected:
+        if col == "coquery_invisible_corpus_id":
+            if self._artificial_corpus_id:
+                return "corpus_id", 1
             else:
-                s = col.partition("coq_")[-1]
-                rc_feature, _, number = s.rpartition("_")
-                _, tab, feature = (
-                    self.resource.split_resource_feature(rc_feature))
-                tier_name = f"{tab}_{feature}"
-
-            tier = grid.get_tier_by_name(tier_name)
-            if (not tier_name.startswith("segment") and
-                    tier_name in corpus_features and
-                    not self.resource.is_tokenized(tier_name)):
-                # corpus feature -- add one interval that
-                # covers the whole text grid
-                content = utf8(df[col].values[0])
-                stop = max_stop
-                interval = tgt.Interval(0, stop, content)
-                if len(tier.intervals) == 0:
-                    tier.add_interval(interval)
-            else:
-                if not tier_name.startswith("segment"):
-                    # lexical feature -- add one interval per entry
-                    for i in df.index:
-                        row = df.loc[i]
-                        dtype = df.dtypes[col]
-                        try:
-                            val = utf8(row[col].astype(dtype))
-                        except AttributeError:
-                            val = utf8(row[col])
-                        try:
-                            label_s, label_e = self.feature_timing[tier_name]
-                            start_col = f"coq_{label_s}_{number}"
-                            end_col = f"coq_{label_e}_{number}"
-                            start = left_padding - offset + row[start_col]
-                            stop = left_padding - offset + row[end_col]
-                        except KeyError:
-                            start = 0
-                            stop = max_stop
-
-                        interval = tgt.Interval(start, stop, val)
-                        try:
-                            tier.add_interval(interval)
-                        except ValueError:
-                            # ValueErrors occur if the new interval overlaps
-                            # with a previous interval.
-                            # This can happen if no word boundaries are
-                            # selected in a multi-word query.
-                            pass
-                else:
-                    # segment features
-                    start_label, end_label = self.feature_timing[tier_name]
-                    start_col = f"coq_{start_label}_1"
-                    end_col = f"coq_{end_label}_1"
-                    for i in df.index:
-                        row = df.loc[i]
-                        val = utf8(row[col])
-                        try:
-                            start = row[start_col]
-                            end = row[end_col]
-                        except KeyError:
-                            start = 0
-                            end = end_time
-
-                        interval = tgt.Interval(
-                            left_padding - offset + start,
-                            left_padding - offset + end,
-                            val)
-                        try:
-                            tier.add_interval(interval)
-                        except ValueError as e:
-                            logging.warning("{}: {} ({})".format(
-                                self.session.translate_header(tier.name),
-                                e, grid_id))
-            if interval:
-                # make sure that the tier is always correctly padded to the
-                # right:
-                tier.end_time = max(tier.end_time,
-                                    interval.end_time + right_padding)
-                tier.end_time = min(tier.end_time, max_stop)
-
-        if remember_time:
-            tier = grid.get_tier_by_name("Original timing")
-            str_start = utf8(offset - left_padding)
-            str_end = utf8(offset + grid.end_time - left_padding)
-            tier.add_point(tgt.Point(0, str_start))
-            tier.add_point(tgt.Point(grid.end_time, str_end))
-
-        return grid
+                return None
+        elif col.startswith("coquery_invisible"):
+            return None
+        elif col.startswith(("func", "coquery", "db")):
+            return self.session.translate_header(col), None
+        else:
+            s = col.partition("coq_")[-1]
+            rc_feature, _, number = s.rpartition("_")
+            _, tab, feature = (
+                self.resource.split_resource_feature(rc_feature))
+            return f"{tab}_{feature}", number
 
-    def fill_grids(self, columns=None, one_grid_per_match=False,
-                   sound_path="", left_padding=0, right_padding=0,
-                   remember_time=False):
+    def collect_grids(self, columns=None, one_grid_per_match=False,
+                      sound_path="", left_padding=0, right_padding=0,
+                      remember_time=False):
         """
-        Fill the grids required for the data frame.
+        Collect the intervals of the grids required for the data frame.
 
-        Filling is done by iterating over the rows in the data frame. For
-        each row, an interval is added to the tier corresponding to the
-        columns of the data frame.
+        The rows of the data frame are grouped into matches. The file of
+        a match is looked up in the file data that is indexed by corpus
+        ID. For each data column, the intervals of all matches are
+        calculated at once, and the arrays are then distributed to the
+        grids.
 
         Parameters
         ----------
-        order: list
-            A list of columns that specifies the order of the text grid tiers.
+        columns: list
+            A list of columns that specifies the order of the text grid
+            tiers.
+
+        Returns
+        -------
+        grids : dict
+            A dictionary with the grid IDs as keys and GridData objects as
+            values
         """
         grids = self.prepare_textgrids(columns,
                                        one_grid_per_match, remember_time)
+        grids = {grid_id: GridData(grid) for grid_id, grid in grids.items()}
 
         if "coquery_invisible_origin_id" not in self.df.columns:
             one_grid_per_match = True
 
         if one_grid_per_match:
-            grouped = self.df.groupby("coquery_invisible_corpus_id")
+            key_column = "coquery_invisible_corpus_id"
+        else:
+            key_column = "coquery_invisible_origin_id"
+
+        # sort the rows by match, so that the intervals are in the same
+        # order as if the matches were processed one after the other:
+        df = self.df[self.df[key_column].notnull()]
+        df = df.sort_values(key_column, kind="mergesort")
+        df = df.reset_index(drop=True)
+        if not len(df):
+            return grids
+
+        keys = df[key_column].values
+        corpus_ids = df["coquery_invisible_corpus_id"]
+        if one_grid_per_match:
+            match_ids = corpus_ids.values
         else:
-            grouped = self.df.groupby("coquery_invisible_origin_id")
+            match_ids = corpus_ids.groupby(keys).transform("first").values
 
-        for key, match_df in grouped:
-            if one_grid_per_match:
-                corpus_id = key
-            else:
-                corpus_id = match_df["coquery_invisible_corpus_id"].values[0]
+        files = self.file_index.reindex(match_ids)
+        file_names = files[self.resource.file_name].values
+        if one_grid_per_match:
+            grid_ids = list(zip(file_names, match_ids))
+        else:
+            grid_ids = list(zip(file_names))
 
-            f_row = self.file_data[
-                self.file_data[self.resource.corpus_id] == corpus_id]
+        start_columns = [x for x in df.columns if "starttime_" in x]
+        end_columns = [x for x in df.columns if "endtime_" in x]
 
-            start_columns = [x for x in match_df.columns if "starttime_" in x]
-            end_columns = [x for x in match_df.columns if "endtime_" in x]
+        if sound_path and start_columns and end_columns:
+            offsets = (df[start_columns].min(axis=1)
+                       .groupby(keys).transform("min").values)
+            end_times = (df[end_columns].max(axis=1)
+                         .groupby(keys).transform("max").values - offsets)
+        else:
+            offsets = np.zeros(len(df))
+            end_times = files[self.resource.file_duration].values
+        max_stops = end_times + left_padding + right_padding
 
-            if sound_path and start_columns and end_columns:
-                offset = match_df[start_columns].values.min()
-                end_time = match_df[end_columns].values.max() - offset
-            else:
-                offset = 0
-                end_time = f_row[self.resource.file_duration].values[0]
+        # the row indices of each grid:
+        codes, uniques = pd.factorize(pd.Series(grid_ids, dtype=object))
+        order = np.argsort(codes, kind="stable")
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        rows = np.split(order, bounds)
+        grid_codes = codes[order[np.concatenate(([0], bounds))]]
+        grid_list = [grids.get(uniques[code]) for code in grid_codes]
 
-            if one_grid_per_match:
-                key_columns = [self.resource.file_name,
-                               self.resource.corpus_id]
-            else:
-                key_columns = [self.resource.file_name]
+        # the grid of each match:
+        match_codes = pd.Series(codes).groupby(keys).first()
 
-            grid_id = tuple(f_row[key_columns].values[0])
-            grid = grids[grid_id]
-            grids[grid_id] = self.process_dataframe(
-                match_df, grid, offset, end_time,
-                left_padding, right_padding, remember_time, grid_id)
+        corpus_features = [x for x, _ in self.resource.get_corpus_features()]
+        data_columns = [x for x in df.columns
+                        if "_starttime_" not in x and "_endtime_" not in x]
 
+        for col in data_columns:
+            info = self.get_tier_info(col)
+            if info is None:
+                continue
+            tier_name, number = info
+
+            labels = np.array([utf8(x) for x in df[col].values],
+                              dtype=object)
+            first_only = False
+            warn = False
+
+            if (not tier_name.startswith("segment") and
+                    tier_name in corpus_features and
+                    not self.resource.is_tokenized(tier_name)):
+                # corpus feature -- add one interval that covers the whole
+                # text grid
+                starts = np.zeros(len(df))
+                stops = max_stops
+                first_only = True
+            elif not tier_name.startswith("segment"):
+                # lexical feature -- add one interval per entry
+                label_s, label_e = self.feature_timing.get(tier_name,
+                                                           (None, None))
+                start_col = f"coq_{label_s}_{number}"
+                end_col = f"coq_{label_e}_{number}"
+                if start_col in df.columns and end_col in df.columns:
+                    starts = (left_padding - offsets +
+                              df[start_col].values.astype(float))
+                    stops = (left_padding - offsets +
+                             df[end_col].values.astype(float))
+                else:
+                    starts = np.zeros(len(df))
+                    stops = max_stops
+            else:
+                # segment features
+                start_label, end_label = self.feature_timing[tier_name]
+                start_col = f"coq_{start_label}_1"
+                end_col = f"coq_{end_label}_1"
+                if start_col in df.columns and end_col in df.columns:
+                    start = df[start_col].values.astype(float)
+                    end = df[end_col].values.astype(float)
+                else:
+                    start = np.zeros(len(df))
+                    end = end_times
+                starts = left_padding - offsets + start
+                stops = left_padding - offsets + end
+                warn = True
+
+            # make sure that the tier is always correctly padded to the
+            # right, based on the last interval of each match:
+            match_ends = np.minimum(
+                pd.Series(stops).groupby(keys).last() + right_padding,
+                pd.Series(max_stops).groupby(keys).first())
+            # like tgt, treat end times that differ by less than the time
+            # precision as equal, and use the first of them:
+            latest = match_ends.groupby(match_codes).transform("max")
+            tier_ends = (match_ends[match_ends > latest - TIME_PRECISION]
+                         .groupby(match_codes).first().to_dict())
+
+            for code, data, idx in zip(grid_codes, grid_list, rows):
+                if data is None:
+                    continue
+                if first_only:
+                    if data.has_intervals(tier_name):
+                        continue
+                    idx = idx[:1]
+                data.add_intervals(tier_name, starts[idx], stops[idx],
+                                   labels[idx], tier_ends[code], warn=warn)
+
+        # remember the offset of the last match of each grid:
+        last_offsets = pd.Series(offsets).groupby(codes).last().to_dict()
+        for code, data in zip(grid_codes, grid_list):
+            if data is None:
+                continue
+            grid_id = uniques[code]
+            offset = last_offsets[code]
             self._offsets[grid_id] = offset
+            if remember_time:
+                tier = data.grid.get_tier_by_name("Original timing")
+                end_time = data.end_time
+                str_start = utf8(offset - left_padding)
+                str_end = utf8(offset + end_time - left_padding)
+                tier.add_point(tgt.Point(0, str_start))
+                tier.add_point(tgt.Point(end_time, str_end))
 
         return grids
 
+    def fill_grids(self, columns=None, one_grid_per_match=False,
+                   sound_path="", left_padding=0, right_padding=0,
+                   remember_time=False):
+        """
+        Fill the grids required for the data frame.
+
+        Parameters
+        ----------
+        columns: list
+            A list of columns that specifies the order of the text grid
+            tiers.
+
+        Returns
+        -------
+        grids : dict
+            A dictionary with the grid IDs as keys and tgt.TextGrid
+            objects as values
+        """
+        grids = self.collect_grids(columns, one_grid_per_match, sound_path,
+                                   left_padding, right_padding,
+                                   remember_time)
+        return {grid_id: data.to_textgrid()
+                for grid_id, data in grids.items()}
+
     def write_grids(self, output_path, columns, one_grid_per_match,
                     sound_path, left_padding, right_padding, remember_time,
                     file_prefix):
+        """
+        Write the text grids, and the matching audio snippets if a sound
+        path is given.
+
+        The grids are grouped by their source file. Each group is written
+        as one task, so that the audio file of a source is opened only
+        once, and all snippets are cut from the same memory-mapped audio
+        data. If there is more than one group, the tasks are carried out
+        by a pool of worker processes.
+
+        Raises
+        ------
+        ExportCancelled
+            If the export has been cancelled by calling cancel()
+        """
         if "coquery_invisible_origin_id" not in self.df.columns:
             one_grid_per_match = True
 
         self.output_path = output_path
-        grids = self.fill_grids(columns, one_grid_per_match, sound_path,
-                                left_padding, right_padding, remember_time)
+        self.n = 0
+        self.n_snippets = 0
 
-        textgrids = collections.defaultdict(list)
+        grids = self.collect_grids(columns, one_grid_per_match, sound_path,
+                                   left_padding, right_padding,
+                                   remember_time)
 
-        self.n = 0
+        textgrids = collections.defaultdict(list)
 
         for x in grids:
-            grid = grids[x]
-            for i, tier in enumerate(grid.tiers):
+            data = grids[x]
+            for i, tier in enumerate(data.grid.tiers):
                 try:
                     tup = self.resource.split_resource_feature(tier.name)
                     hashed, tab, feature = tup
@@ -369,34 +806,65 @@ class TextgridWriter(object):
                 match_fn, = x
                 basename, _ = os.path.splitext(os.path.basename(match_fn))
                 filename = basename
-            target = os.path.join(output_path,
-                                  f"{file_prefix}{filename}.TextGrid")
-            tgt.write_to_file(grid, target)
-            self.n += 1
-            textgrids[basename].append((grid, filename, self._offsets[x]))
+            textgrids[basename].append(
+                (data, filename, self._offsets.get(x, 0)))
 
+        audio_files = {}
         if sound_path:
-            from .sound import Sound
-
             for root, _, files in os.walk(sound_path):
                 for file_name in files:
                     basename, _ = os.path.splitext(file_name)
                     sources = self.resource.audio_to_source(basename)
-                    for source in sources:
-                        if source in textgrids:
-                            source_path = os.path.join(root, file_name)
-
-                            try:
-                                sound = Sound(source_path)
-                            except TypeError:
-                                continue
-
-                            for tup in textgrids.get(source, []):
-                                grid, grid_name, offs = tup
-                                wav_name = f"{file_prefix}{grid_name}.wav"
-                                dest_path = os.path.join(output_path, wav_name)
-
-                                start = max(0, offs - left_padding)
-                                end = offs - left_padding + grid.end_time
-
-                                sound.write(dest_path, start, end)
+                    for source in sources or []:
+                        if source in textgrids and source not in audio_files:
+                            audio_files[source] = os.path.join(root,
+                                                               file_name)
+
+        tasks = []
+        for source, lst in textgrids.items():
+            grid_files = []
+            snippets = []
+            for data, grid_name, offs in lst:
+                target = os.path.join(output_path,
+                                      f"{file_prefix}{grid_name}.TextGrid")
+                grid_files.append((data, target))
+                wav_name = f"{file_prefix}{grid_name}.wav"
+                snippets.append((os.path.join(output_path, wav_name),
+                                 max(0, offs - left_padding),
+                                 offs - left_padding + data.end_time))
+            tasks.append((grid_files, audio_files.get(source), snippets))
+
+        self._run_tasks(tasks)
+
+    def _run_tasks(self, tasks):
+        """
+        Carry out the tasks, either in a pool of worker processes or in the
+        current process, and report the progress after each task.
+        """
+        total = sum(len(grid_files) for grid_files, _, _ in tasks)
+        workers = self.workers or os.cpu_count() or 1
+        workers = min(workers, len(tasks))
+
+        pool = None
+        if workers > 1:
+            pool = multiprocessing.Pool(workers)
+            results = pool.imap_unordered(write_files, tasks)
+        else:
+            results = map(write_files, tasks)
+
+        try:
+            for n_grids, n_snippets in results:
+                if self._cancelled:
+                    raise ExportCancelled
+                self.n += n_grids
+                self.n_snippets += n_snippets
+                if self.progress:
+                    self.progress(self.n, total)
+        except BaseException:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            raise
+        if pool is not None:
+            pool.close()
+            pool.join()
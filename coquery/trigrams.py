@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+trigrams.py is part of Coquery.
+
+Copyright (c) 2016-2022 Gero Kunter (gero.kunter@coquery.org)
+
+Coquery is released under the terms of the GNU General Public License (v3).
+For details, see the file LICENSE that you should have received along
+with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides the functions used for the trigram index of lexicon
+tables.
+
+A trigram index maps each sequence of three characters to the lexicon
+entries that contain this sequence. Query items with infix wildcards such
+as '*tion*' or regular expressions can't use an ordinary index. Instead,
+the trigrams that every matching string has to contain are extracted from
+the query item, and the index is used to restrict the lexicon entries that
+have to be compared to the query item to those that contain all of these
+trigrams.
+
+Trigrams are always stored and looked up in lower case. For case-sensitive
+queries, this produces a superset of the matching entries, which is fine
+because the actual comparison is still carried out on the candidates.
+"""
+
+from __future__ import unicode_literals
+
+TRIGRAM_COLUMN = "Trigram"
+
+_REGEX_SPECIAL = set(".^$[]()|")
+_REGEX_OPTIONAL = set("?*{")
+
+
+def get_trigrams(s):
+    """
+    Return the set of lower-case trigrams contained in the string.
+    """
+    if not s:
+        return set()
+    s = str(s).lower()
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def get_wildcard_segments(s):
+    """
+    Return the literal segments of a query item string that uses the
+    wildcards '*' and '?'. Escaped wildcard characters are treated as
+    literal characters.
+    """
+    segments = []
+    current = []
+    escaped = False
+    for ch in s:
+        if escaped:
+            current.append(ch)
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch in "*?":
+            segments.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    segments.append("".join(current))
+    return [x for x in segments if x]
+
+
+def find_class_end(s, i):
+    """
+    Return the index of the ']' that closes the character class starting
+    at index i of the regular expression, or None if the class is not
+    closed.
+
+    A ']' directly after the opening '[' or '[^' is a literal character,
+    and so are escaped characters.
+    """
+    j = i + 1
+    if s[j:j + 1] == "^":
+        j += 1
+    if s[j:j + 1] == "]":
+        j += 1
+    while j < len(s):
+        if s[j] == "\\":
+            j += 2
+            continue
+        if s[j] == "]":
+            return j
+        j += 1
+    return None
+
+
+def get_regex_segments(s):
+    """
+    Return literal segments that every string matching the regular
+    expression has to contain.
+
+    The analysis is conservative: if the regular expression contains an
+    alternation outside of a group or a character class that is not
+    closed, no segment is returned. Characters that
+    are followed by a quantifier that allows zero repetitions, character
+    classes, and groups are treated as segment boundaries.
+    """
+    segments = []
+    current = []
+    depth = 0
+    i = 0
+    while i < len(s):
+        ch = s[i]
+        if ch == "\\":
+            nxt = s[i + 1:i + 2]
+            if depth == 0 and nxt and not nxt.isalnum():
+                current.append(nxt)
+            else:
+                # escape sequences such as \w or \d, or the end of the
+                # string:
+                segments.append("".join(current))
+                current = []
+            i += 2
+            continue
+        elif ch == "(":
+            depth += 1
+            segments.append("".join(current))
+            current = []
+        elif ch == ")":
+            depth = max(0, depth - 1)
+        elif ch == "|" and depth == 0:
+            return []
+        elif ch == "[":
+            # skip the character class, also within groups so that
+            # brackets or parentheses in the class are not interpreted:
+            close = find_class_end(s, i)
+            if close is None:
+                return []
+            segments.append("".join(current))
+            current = []
+            i = close + 1
+            continue
+        elif depth > 0:
+            pass
+        elif ch in _REGEX_OPTIONAL:
+            # the preceding character may be missing:
+            if current:
+                current.pop()
+            segments.append("".join(current))
+            current = []
+            if ch == "{":
+                close = s.find("}", i)
+                i = len(s) if close == -1 else close + 1
+                continue
+        elif ch == "+":
+            segments.append("".join(current))
+            current = []
+        elif ch in _REGEX_SPECIAL:
+            segments.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    segments.append("".join(current))
+    return [x for x in segments if x]
+
+
+def get_pattern_trigrams(s, regexp=False):
+    """
+    Return the set of trigrams that every string matching the query item
+    string has to contain.
+
+    Parameters
+    ----------
+    s : str
+        The query item string, either using the wildcards '*' and '?', or
+        a regular expression
+    regexp : bool
+        True if s is a regular expression
+
+    Returns
+    -------
+    trigrams : set
+        A set of lower-case trigrams. The set is empty if no trigrams can be
+        determined, e.g. because all literal parts are too short.
+    """
+    if regexp:
+        segments = get_regex_segments(s)
+    else:
+        segments = get_wildcard_segments(s)
+    trigrams = set()
+    for segment in segments:
+        trigrams.update(get_trigrams(segment))
+    return trigrams
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+uniques.py is part of Coquery.
+
+Copyright (c) 2016-2022 Gero Kunter (gero.kunter@coquery.org)
+
+Coquery is released under the terms of the GNU General Public License (v3).
+For details, see the file LICENSE that you should have received along
+with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+This module provides the UniqueValues class that retrieves the values of a
+corpus table column in pages.
+
+Instead of loading the whole column into a data frame, the values are
+sorted, filtered and counted by the database, and only one page of values
+is retrieved at a time. If the values are ordered by the column itself,
+the next page is requested by keyset pagination (i.e. by asking for the
+values that follow the last value of the previous page), which can use
+the index of the column and does not get slower for later pages. In all
+other cases, the pages are requested by using an offset.
+"""
+
+from __future__ import unicode_literals
+
+import pandas as pd
+from sqlalchemy import text
+
+ORDER_VALUE = "value"
+ORDER_FREQUENCY = "frequency"
+
+FREQUENCY_COLUMN = "coq_frequency"
+
+
+def escape_like(s, escape="!"):
+    """
+    Escape the wildcard characters of a LIKE pattern.
+    """
+    for ch in (escape, "%", "_"):
+        s = s.replace(ch, "{}{}".format(escape, ch))
+    return s
+
+
+class UniqueValues(object):
+    """
+    Retrieve the values of a table column in pages.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine of the corpus database
+    table, column : str
+        The name of the table and of the column
+    uniques : bool
+        If True, each distinct value is retrieved once, and missing values
+        are ignored. If False, all entries of the column are retrieved in
+        the order in which they are stored.
+    counts : bool
+        If True, the number of entries with each distinct value is
+        retrieved as well. This is ignored if `uniques` is False.
+    prefix : str
+        If not empty, only values that start with this string are
+        retrieved.
+    page_size : int
+        The number of values retrieved by each query
+    """
+    def __init__(self, engine, table, column, uniques=True, counts=False,
+                 prefix="", page_size=500):
+        self.engine = engine
+        self.table = table
+        self.column = column
+        self.uniques = uniques
+        self.counts = counts
+        self.prefix = prefix
+        self.page_size = max(1, page_size)
+        self.order = ORDER_VALUE
+        self.ascending = True
+
+    def set_order(self, order, ascending=True):
+        self.order = order
+        self.ascending = ascending
+
+    @property
+    def uses_keyset(self):
+        """
+        True if the pages are requested by keyset pagination.
+        """
+        return self.uniques and self.order == ORDER_VALUE
+
+    def _get_conditions(self, params, after=None):
+        conditions = []
+        if self.uniques:
+            conditions.append("{} IS NOT NULL".format(self.column))
+        if self.prefix:
+            conditions.append(
+                "{} LIKE :coq_prefix ESCAPE '!'".format(self.column))
+            params["coq_prefix"] = "{}%".format(escape_like(self.prefix))
+        if after is not None:
+            conditions.append("{} {} :coq_after".format(
+                self.column, ">" if self.ascending else "<"))
+            # numpy scalars can't be used as bound parameters:
+            if hasattr(after, "item"):
+                after = after.item()
+            params["coq_after"] = after
+        if conditions:
+            return "WHERE {}".format(" AND ".join(conditions))
+        return ""
+
+    def _read(self, S, params):
+        return pd.read_sql(text(S), self.engine, params=params)
+
+    def count(self):
+        """
+        Return the number of values that match the prefix filter.
+
+        If `uniques` is True, this is the number of distinct values,
+        otherwise the number of entries.
+        """
+        params = {}
+        where = self._get_conditions(params)
+        if self.uniques:
+            select = "COUNT(DISTINCT {})".format(self.column)
+        else:
+            select = "COUNT(*)"
+        S = "SELECT {} AS coq_count FROM {} {}".format(
+            select, self.table, where)
+        return int(self._read(S, params).iloc[0, 0])
+
+    def get_page(self, after=None, offset=0, limit=None):
+        """
+        Return a page of values as a data frame.
+
+        The data frame has a column named like the table column, and the
+        column FREQUENCY_COLUMN if frequencies are retrieved.
+
+        Parameters
+        ----------
+        after : object
+            If not None, and if keyset pagination is used, the page starts
+            with the value that follows this value.
+        offset : int
+            The number of values that are skipped. This is ignored if
+            `after` is not None and keyset pagination is used.
+        limit : int
+            The maximum number of values. If None, the page size is used.
+        """
+        if limit is None:
+            limit = self.page_size
+        if not self.uses_keyset:
+            after = None
+        if after is not None:
+            offset = 0
+
+        params = {}
+        where = self._get_conditions(params, after)
+        direction = "ASC" if self.ascending else "DESC"
+
+        if self.uniques:
+            columns = [self.column]
+            if self.counts:
+                columns.append("COUNT(*) AS {}".format(FREQUENCY_COLUMN))
+            if self.order == ORDER_FREQUENCY:
+                order = "COUNT(*) {}, {} ASC".format(direction, self.column)
+            else:
+                order = "{} {}".format(self.column, direction)
+            S = "SELECT {} FROM {} {} GROUP BY {} ORDER BY {}".format(
+                ", ".join(columns), self.table, where, self.column, order)
+        else:
+            S = "SELECT {} FROM {} {}".format(self.column, self.table, where)
+
+        S = "{} LIMIT {}".format(S, int(limit))
+        if offset:
+            S = "{} OFFSET {}".format(S, int(offset))
+        return self._read(S, params)
+
+    def iter_pages(self):
+        """
+        Yield all values matching the prefix filter, one page at a time.
+        """
+        after = None
+        offset = 0
+        while True:
+            df = self.get_page(after=after, offset=offset)
+            if len(df):
+                yield df
+            if len(df) < self.page_size:
+                break
+            offset += len(df)
+            after = df[self.column].iloc[-1]
@@ -7,18 +7,126 @@ Copyright (c) 2016-2022 Gero Kunter (gero.kunter@coquery.org)
 Coquery is released under the terms of the GNU General Public License (v3).
 For details, see the file LICENSE that you should have received along
 with Coquery. If not, see <http://www.gnu.org/licenses/>.
+
+Barcode plots draw one line for each token. For large result tables, this
+produces more lines than there are pixels along the corpus axis, and
+building the matplotlib artists for all of them takes a long time. If the
+number of tokens exceeds a threshold, the token positions are therefore
+binned at a fixed resolution that is finer than the resolution of a
+screen, and one line is drawn for each bin that contains at least one
+token. The binned data is cached for each facet, so that changing colours,
+palettes or the layout of the figure doesn't require binning the tokens
+again.
 """
 import math
+import functools
 from PyQt5 import QtWidgets, QtCore
 
 import matplotlib.pyplot as plt
+import matplotlib.colors as mpl_colors
 import pandas as pd
 import numpy as np
 
 from coquery.visualizer import visualizer as vis
+from coquery.general import LRUCache
 from coquery.gui.pyqt_compat import tr
 
 
+def get_bin_rows(values, pos, codes, size, resolution):
+    """
+    Return the rows that represent the occupied bins of a barcode plot.
+
+    The range from 0 to `size` is divided into `resolution` bins. For each
+    combination of bin, plot position and colour code that occurs in the
+    data, the first row is selected.
+
+    Parameters
+    ----------
+    values : array
+        The corpus positions of the tokens
+    pos : array
+        The plot positions (i.e. the index of the level) of the tokens
+    codes : array
+        Integer codes that identify the colour of the tokens
+    size : int
+        The size of the corpus
+    resolution : int
+        The number of bins
+
+    Returns
+    -------
+    tup : tuple
+        A tuple containing the index of the first row for each occupied bin,
+        and the center of each occupied bin
+    """
+    bw = max(size, 1) / resolution
+    bins = np.clip((np.asarray(values, dtype=float) // bw).astype(int),
+                   0, resolution - 1)
+    codes = np.asarray(codes, dtype=np.int64)
+    n_codes = int(codes.max(initial=0)) + 1
+    # tokens without a plot position are kept apart from the other tokens
+    # by using a negative position:
+    pos = np.nan_to_num(np.asarray(pos, dtype=float), nan=-1)
+    keys = ((pos.astype(np.int64) * n_codes + codes) *
+            resolution + bins)
+    _, rows = np.unique(keys, return_index=True)
+    return rows, (bins[rows] + 0.5) * bw
+
+
+def draw_lines(func, values, start, end, colors, ax=None):
+    """
+    Draw the lines of a barcode plot with one artist per colour.
+
+    The result looks like the result of calling func(values, start, end,
+    colors), where `func` is either plt.hlines or plt.vlines. But instead of
+    creating a line collection that contains one path for each line, the
+    lines are joined into a single path per colour, with NaN values
+    separating the lines. This is much faster for large numbers of lines.
+    """
+    ax = ax or plt.gca()
+    values = np.asarray(values, dtype=float)
+    start = np.broadcast_to(np.asarray(start, dtype=float), values.shape)
+    end = np.broadcast_to(np.asarray(end, dtype=float), values.shape)
+    gaps = np.full(values.shape, np.nan)
+
+    color_codes, color_values = pd.factorize(
+        pd.Series([mpl_colors.to_hex(col) for col in colors]))
+    for i, col in enumerate(color_values):
+        select = color_codes == i
+        pos = np.column_stack(
+            [values[select], values[select], gaps[select]]).ravel()
+        span = np.column_stack(
+            [start[select], end[select], gaps[select]]).ravel()
+        if func == plt.hlines:
+            ax.plot(span, pos, color=col, linewidth=1)
+        else:
+            ax.plot(pos, span, color=col, linewidth=1)
+
+
+def get_heat_bins(values, bw, n):
+    """
+    Return an array of `n` bins with the token positions in `values`
+    distributed across the bins.
+
+    The increments are the same as in HeatbarPlot.increment_bins(), but all
+    values are processed at once. Values that fall outside of the bins are
+    ignored.
+    """
+    pct_in_bin, target_bin = np.modf(np.asarray(values, dtype=float) / bw)
+    target_bin = target_bin.astype(int)
+    inc = np.where(pct_in_bin <= 0.5, 0.5 + pct_in_bin, 1.5 - pct_in_bin)
+    inc_before = np.maximum(0.0, 0.5 - pct_in_bin)
+    inc_after = np.maximum(0.0, pct_in_bin - 0.5)
+
+    # The increments of each value are added in the same order as in
+    # increment_bins(), so that the sums are exactly the same:
+    indices = np.stack([target_bin, target_bin - 1, target_bin + 1], axis=1)
+    weights = np.stack([inc, inc_before, inc_after], axis=1)
+    valid = (indices >= 0) & (indices < n)
+    valid[:, 1:] &= ((target_bin >= 0) & (target_bin < n))[:, None]
+    return np.bincount(indices[valid], weights=weights[valid], minlength=n)
+
+
 class BarcodePlot(vis.Visualizer):
     axes_style = "white"
     TOP = 0.975
@@ -32,6 +140,52 @@ class BarcodePlot(vis.Visualizer):
 
     force_horizontal = True
 
+    # If a facet contains more tokens than this, the token positions are
+    # binned into BIN_RESOLUTION bins:
+    MAX_LINES = 5000
+    BIN_RESOLUTION = 4000
+
+    def __init__(self, *args, **kwargs):
+        super(BarcodePlot, self).__init__(*args, **kwargs)
+        self._bin_cache = LRUCache(maxsize=64)
+
+    def get_corpus_size(self, values):
+        try:
+            return self.session.Corpus.get_corpus_size()
+        except AttributeError:
+            return int(np.nanmax(values, initial=0)) + 1
+
+    def get_facet_key(self, data, *args):
+        """
+        Return a key that identifies the facet data and the plot
+        parameters given as additional arguments.
+        """
+        columns = [self._id_column, self.x, self.y, self.z]
+        return (vis.get_data_hash(data, [col for col in columns if col]),
+                tuple(args))
+
+    def get_binned_rows(self, data, params, **kwargs):
+        """
+        Return the rows from `data` that are drawn if the token positions
+        are binned, and the bin centers used as their positions.
+
+        The result is cached for each facet.
+        """
+        z = kwargs.get("z")
+        values = np.asarray(params["values"], dtype=float)
+        size = self.get_corpus_size(values)
+        key = self.get_facet_key(data, z, size, self.BIN_RESOLUTION)
+        result = self._bin_cache.get(key)
+        if result is None:
+            if z:
+                codes, _ = pd.factorize(data[z])
+            else:
+                codes = np.zeros(len(data), dtype=int)
+            result = get_bin_rows(values, np.asarray(params["pos"]), codes,
+                                  size, self.BIN_RESOLUTION)
+            self._bin_cache[key] = result
+        return result
+
     def get_custom_widgets(self, *args, **kwargs):
         label = tr("BarcodePlot", "Plot horizontal by default", None)
 
@@ -124,11 +278,20 @@ class BarcodePlot(vis.Visualizer):
         In a barcode plot, each token is represented by a line drawn at the
         location of the corresponding corpus id.
         """
-        params = self.prepare_arguments(data.dropna(), **kwargs)
+        data = data.dropna()
+        params = self.prepare_arguments(data, **kwargs)
         _func = params["func"]
         self.horizontal = params["horizontal"]
 
-        cols = self.prepare_colors(data.dropna(), **kwargs)
+        if len(data) > self.MAX_LINES:
+            rows, centers = self.get_binned_rows(data, params, **kwargs)
+            data = data.iloc[rows]
+            params["values"] = centers
+            params["pos"] = params["pos"].iloc[rows]
+            _func = functools.partial(draw_lines, params["func"],
+                                      ax=kwargs.get("ax"))
+
+        cols = self.prepare_colors(data, **kwargs)
 
         if rug:
             if "top" in rug:
@@ -145,7 +308,7 @@ class BarcodePlot(vis.Visualizer):
                   cols)
 
         ax = kwargs.get("ax", plt.gca())
-        ax_kwargs = self.prepare_ax_kwargs(data.dropna(), **kwargs)
+        ax_kwargs = self.prepare_ax_kwargs(data, **kwargs)
         ax.set(**ax_kwargs)
 
     def suggest_legend(self):
@@ -352,25 +515,20 @@ class HeatbarPlot(BarcodePlot):
 
         self.horizontal = True
 
+        n = int(1 + (size // bw))
+
         if x or y:
             self.horizontal = bool(x)
 
             for val in levels_x or levels_y:
-                binned = np.zeros(1 + (size // bw))
                 values = (num_column[data[x or y] == val]).values
-                for i in values:
-                    binned = self.increment_bins(binned, i, bw)
-
-                M.append(np.array(binned))
+                binned = get_heat_bins(values, bw, n)
+                M.append(binned)
         else:
             self.horizontal = not self.force_horizontal
 
-            binned = np.zeros(1 + (size // bw))
-            values = num_column.values
-            for i in values:
-                binned = self.increment_bins(binned, i, bw)
-
-            M.append(np.array(binned))
+            binned = get_heat_bins(num_column.values, bw, n)
+            M.append(binned)
 
         width = len(binned) * bw - 1
         if x:
@@ -389,7 +547,7 @@ class HeatbarPlot(BarcodePlot):
     def set_bandwidth(self, bw):
         self.bandwidth = int(bw)
         self.spin_bandwidth.blockSignals(True)
-        self.spin_bandwidth.setValue(bw)
+        self.spin_bandwidth.setValue(self.bandwidth)
         self.spin_bandwidth.blockSignals(False)
 
     def plot_facet(self, data, color, **kwargs):
@@ -402,14 +560,27 @@ class HeatbarPlot(BarcodePlot):
         size = self.session.Corpus.get_corpus_size()
         if not self.bandwidth:
             self.set_bandwidth(max(size / 250, 5))
-        param = self.prepare_im_arguments(data, bw=self.bandwidth, size=size,
-                                          **kwargs)
+
+        levels = (kwargs.get("levels_x"), kwargs.get("levels_y"))
+        key = self.get_facet_key(
+            data, "heatbar", self.bandwidth, size, self.force_horizontal,
+            *[tuple(lvl) if lvl is not None else None for lvl in levels])
+        cached = self._bin_cache.get(key)
+        if cached is None:
+            param = self.prepare_im_arguments(data, bw=self.bandwidth,
+                                              size=size, **kwargs)
+            self._bin_cache[key] = (param, self.horizontal)
+        else:
+            # prepare_im_arguments() also sets the orientation of the plot:
+            param, self.horizontal = cached
+        param = dict(param)
         M = param.pop("M")
 
         left, right, bottom, top = param["extent"]
 
         if self.normalize:
-            M = np.array([[val / max(X) for val in X] for X in M])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                M = M / M.max(axis=1, keepdims=True)
 
         if not self.horizontal:
             M = M[::-1]
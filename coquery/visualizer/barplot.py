@@ -379,7 +379,7 @@ class StackedBars(BarPlot):
             data = data.reset_index(drop=True)
 
             if len(data[category].unique()) > 1:
-                df = (data.groupby(category, dropna=False)
+                df = (data.groupby(category, dropna=False, observed=True)
                           .apply(self.group_transform, self.NUM_COLUMN)
                           .reset_index(0))
                 data[self.NUM_COLUMN] = df[self.NUM_COLUMN]
@@ -110,19 +110,16 @@ class Heatmap(vis.Visualizer):
         ct = pd.crosstab(data[row_fact], data[col_fact])
         ct = ct.reindex(row_names, axis="index")
         ct = ct.reindex(col_names, axis="columns")
-        if self.fill is not None:
-            ct = ct.fillna(self.fill)
         return ct
 
-    def plot_facet(self, data, color, **kwargs):
-        x = kwargs.get("x")
-        y = kwargs.get("y")
-        z = kwargs.get("z")
-        levels_x = kwargs.get("levels_x")
-        levels_y = kwargs.get("levels_y")
-        levels_z = kwargs.get("levels_z")
+    def get_table(self, data, x, y, z, levels_x, levels_y, levels_z):
+        """
+        Return a tuple containing the table of values that is plotted, and
+        the labels of the X and the Y axis.
 
-        cmap = (kwargs.get("palette", "Blues"))
+        Missing values are not filled, and the values are not normalized,
+        so that the table can be reused if these options change.
+        """
         param_count = sum([bool(x), bool(y), bool(z)])
 
         if param_count == 3:
@@ -136,15 +133,16 @@ class Heatmap(vis.Visualizer):
                 levels_y = levels_z
             else:
                 numeric = z
-            ct = (data[[x, y, numeric]].groupby([x, y], dropna=False)
+            ct = (data[[x, y, numeric]].groupby([x, y], dropna=False,
+                                                observed=True)
                                        .agg("mean")
                                        .reset_index()
                                        .pivot(x, y, numeric)
                                        .T)
             ct = ct.reindex(levels_y, axis=0)
             ct = ct.reindex(levels_x, axis=1)
-            self._xlab = x
-            self._ylab = y
+            xlab = x
+            ylab = y
 
         elif param_count == 2:
             numeric = None
@@ -162,7 +160,8 @@ class Heatmap(vis.Visualizer):
                     z = None
             if numeric:
                 cat = [fact for fact in [x, y, z] if fact][0]
-                ct = (data[[cat, numeric]].groupby(cat, dropna=False)
+                ct = (data[[cat, numeric]].groupby(cat, dropna=False,
+                                                   observed=True)
                                           .agg("mean"))
                 if cat == x or cat == z:
                     ct = ct.reindex(levels_x).T
@@ -170,20 +169,38 @@ class Heatmap(vis.Visualizer):
                     ct = ct.reindex(levels_y)
             else:
                 ct = self.get_crosstab(data, x, y, levels_x, levels_y).T
-            self._xlab = x
-            self._ylab = y
+            xlab = x
+            ylab = y
         elif x:
             ct = pd.crosstab(pd.Series([""] * len(data[x]), name=""),
                              data[x])
             ct = ct.reindex(levels_x, axis=1)
-            self._xlab = x
-            self._ylab = "Frequency"
+            xlab = x
+            ylab = "Frequency"
         else:
             ct = pd.crosstab(pd.Series([""] * len(data[y]), name=""),
                              data[y]).T
             ct = ct.reindex(levels_y, axis=0)
-            self._ylab = y
-            self._xlab = "Frequency"
+            ylab = y
+            xlab = "Frequency"
+
+        return ct, xlab, ylab
+
+    def plot_facet(self, data, color, **kwargs):
+        x = kwargs.get("x")
+        y = kwargs.get("y")
+        z = kwargs.get("z")
+        levels_x = kwargs.get("levels_x")
+        levels_y = kwargs.get("levels_y")
+        levels_z = kwargs.get("levels_z")
+
+        cmap = (kwargs.get("palette", "Blues"))
+
+        levels = [None if lvl is None else tuple(lvl)
+                  for lvl in (levels_x, levels_y, levels_z)]
+        ct, self._xlab, self._ylab = vis.get_cached(
+            data, [x, y, z], ("heatmap", x, y, z, *levels),
+            self.get_table, data, x, y, z, levels_x, levels_y, levels_z)
 
         fmt = ".1%"
 
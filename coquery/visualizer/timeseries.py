@@ -11,6 +11,7 @@ with Coquery. If not, see <http://www.gnu.org/licenses/>.
 from PyQt5 import QtWidgets
 from coquery.visualizer import visualizer as vis
 import math
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
@@ -58,19 +59,19 @@ class TimeSeries(vis.Visualizer):
                    levels_x=None, levels_y=None, levels_z=None,
                    palette=None, **kwargs):
 
-        def to_num(x):
+        def to_bins(val):
             bw = TimeSeries.bandwidth
-            val = pd.to_numeric(x, errors="coerce")
-            val = val.apply(
-                lambda x: x if pd.isnull(x) else (int(x) // bw) * bw)
+            val = (np.trunc(val) // bw) * bw
+            if not val.isnull().any():
+                val = val.astype(int)
             return val
 
+        def to_num(x):
+            return to_bins(pd.to_numeric(x, errors="coerce"))
+
         def to_year(x):
-            bw = TimeSeries.bandwidth
             val = pd.to_datetime(x.astype(str), errors="coerce")
-            val = val.apply(
-                lambda x: x if pd.isnull(x) else (int(x.year) // bw) * bw)
-            return val
+            return to_bins(val.dt.year)
 
         category = None
         levels = None
@@ -133,23 +134,31 @@ class TimeSeries(vis.Visualizer):
             plt.xticks(x_range, labels)
         else:
             col = self.get_palette(palette, len(levels))[::-1]
-            index = (val.dropna()
-                        .drop_duplicates()
-                        .sort_values())
-            tmp = {}
-
-            for i, level in enumerate(levels):
-                df = data[data[category] == level]
-                val = fun(df[numeric])
-                tab = val.value_counts().sort_index()
-                tab = tab.reindex(index).fillna(0)
-                tmp[level] = tab
-            df = pd.DataFrame(tmp)
+            df = vis.get_cached(
+                data, [numeric, category],
+                ("timeseries", numeric, category, fun.__name__,
+                 TimeSeries.bandwidth, tuple(levels)),
+                self.get_counts, val, data[category], levels)
             self.plot_func(df=df, color=col, ax=plt.gca())
         if levels:
             self.legend_title = category
             self.legend_levels = levels
 
+    @staticmethod
+    def get_counts(val, categories, levels):
+        """
+        Return a data frame with the number of values in each time bin
+        (rows) for each level (columns).
+        """
+        index = val.dropna().drop_duplicates().sort_values()
+        counts = (pd.crosstab(val, categories)
+                    .reindex(index=index, columns=levels)
+                    .fillna(0)
+                    .astype(float))
+        counts.index.name = None
+        counts.columns.name = None
+        return counts
+
     def plot_func(self, S=None, df=None, *args, **kwargs):
         if S is not None:
             pd.Series(S).plot.line(*args, **kwargs)
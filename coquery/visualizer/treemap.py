@@ -217,7 +217,7 @@ class TreeMap(vis.Visualizer):
         if second_category:
             df = aggregator.process(data, [category, second_category])
             _df = (df[[category, numeric]].drop_duplicates()
-                                          .groupby(category)
+                                          .groupby(category, observed=True)
                                           .agg({numeric: "sum"})
                                           .reset_index()
                                           .sort_values([numeric, category]))
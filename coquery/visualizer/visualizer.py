@@ -15,6 +15,7 @@ from __future__ import unicode_literals
 
 import math
 import collections
+import hashlib
 import logging
 
 import scipy.stats as st
@@ -25,6 +26,7 @@ import seaborn as sns
 from PyQt5 import QtCore
 
 from coquery.defines import PALETTE_BW
+from coquery.general import LRUCache
 
 from coquery.visualizer.colorizer import (
     Colorizer, ColorizeByFactor, ColorizeByNum)
@@ -32,6 +34,72 @@ from coquery.visualizer.colorizer import (
 mpl.use("Qt5Agg")
 mpl.rcParams["backend"] = "Qt5Agg"
 
+# Aggregated data frames are shared by all visualizers, so that redrawing
+# a figure after changing the figure type or a style option doesn't
+# aggregate the data again:
+_data_cache = LRUCache(maxsize=32)
+
+
+def get_data_hash(df, columns):
+    """
+    Return a hash value for the values of the given columns.
+
+    The hash value depends on the order of the rows, because cached
+    results such as the first value of a group or row positions change if
+    the rows are sorted differently.
+    """
+    columns = [col for col in dict.fromkeys(columns) if col in df.columns]
+    hashed = pd.util.hash_pandas_object(df[columns], index=False)
+    return (tuple(columns), len(df),
+            hashlib.sha1(hashed.values.tobytes()).hexdigest())
+
+
+def get_cached(df, columns, key, func, *args, **kwargs):
+    """
+    Return the result of calling func(*args, **kwargs), using the shared
+    cache of aggregated data.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The data frame from which the result is computed
+    columns : list
+        The columns of the data frame that the result depends on
+    key : tuple
+        A hashable tuple that describes the other parameters that the
+        result depends on
+    func : callable
+        The function that computes the result
+
+    Returns
+    -------
+    result : object
+        The result of the function call. Data frames and series, also if
+        contained in a tuple, are returned as copies, so that they can be
+        modified by the caller.
+    """
+    cache_key = (get_data_hash(df, columns), key)
+    result = _data_cache.get(cache_key)
+    if result is None:
+        result = func(*args, **kwargs)
+        _data_cache[cache_key] = result
+    if isinstance(result, tuple):
+        return tuple(_copy(x) for x in result)
+    return _copy(result)
+
+
+def _copy(x):
+    if isinstance(x, (pd.DataFrame, pd.Series)):
+        return x.copy()
+    return x
+
+
+def clear_cache():
+    """
+    Remove all aggregated data frames from the shared cache.
+    """
+    _data_cache.clear()
+
 
 class Aggregator(QtCore.QObject):
     def __init__(self, id_column=None):
@@ -44,42 +112,80 @@ class Aggregator(QtCore.QObject):
         self._names_dict = collections.defaultdict(list)
 
     def add(self, column, fnc, name=None):
-        if fnc == "mode":
-            fnc = self._get_most_frequent
-        elif fnc == "ci":
-            fnc = self._get_interval
         self._aggs_dict[column].append(fnc)
         self._names_dict[column].append(name or column)
 
     def process(self, df, grouping):
+        """
+        Return the aggregated data frame.
 
+        The result is taken from the shared cache if the same aggregation
+        has been applied to the same data before.
+        """
         # if there is an id column in the data frame, make sure that the
         # aggregation samples the first ID
         if self._id_column not in df.columns:
-            if self._id_column in self._aggs_dict:
-                self._aggs_dict.remove(self._id_column)
-            if self._id_column in self._names_dict:
-                self._names_dict.remove(self._id_column)
-        else:
+            self._aggs_dict.pop(self._id_column, None)
+            self._names_dict.pop(self._id_column, None)
+        elif "first" not in self._aggs_dict.get(self._id_column, []):
             self.add(self._id_column, "first")
 
-        df = df.groupby(grouping).agg(self._aggs_dict)
-        agg_columns = []
-        for names in [self._names_dict[x] for x in df.columns.levels[0]]:
-            agg_columns += names
-        df.columns = agg_columns
+        if not isinstance(grouping, list):
+            grouping = [grouping]
+        aggs = tuple((column, tuple(self._aggs_dict[column]),
+                      tuple(self._names_dict[column]))
+                     for column in self._aggs_dict)
+        return get_cached(df, grouping + list(self._aggs_dict),
+                          ("aggregate", tuple(grouping), aggs),
+                          self._aggregate, df, grouping)
+
+    def _aggregate(self, df, grouping):
+        grouped = df.groupby(grouping, observed=True)
+        index = grouped.size().index
+
+        values = []
+        names = []
+        for column, functions in self._aggs_dict.items():
+            for fnc, name in zip(functions, self._names_dict[column]):
+                if fnc == "mode":
+                    S = self._get_most_frequent(df, grouping, column)
+                elif fnc == "ci":
+                    S = self._get_interval(grouped, column)
+                else:
+                    S = grouped[column].agg(fnc)
+                values.append(S.reindex(index))
+                names.append(name)
+
+        df = pd.concat(values, axis=1, ignore_index=True)
+        df.columns = names
         df = df.reset_index()
         return df
 
     @staticmethod
-    def _get_most_frequent(x):
-        counts = x.value_counts()
-        val = counts[counts == counts.max()].sort_index().index[0]
-        return val
+    def _get_most_frequent(df, grouping, column):
+        """
+        Return the most frequent value of the column in each group. If
+        there are several values with the same frequency, the one that is
+        sorted first is used.
+        """
+        counts = df.groupby(grouping + [column], observed=True).size()
+        # the counts are sorted by groups and values, so the first maximum
+        # of each group is the smallest of the most frequent values:
+        levels = list(range(len(grouping)))
+        counts = counts[counts == counts.groupby(level=levels).transform("max")]
+        groups = counts.index.droplevel(-1)
+        counts = counts[~groups.duplicated()]
+        return pd.Series(counts.index.get_level_values(-1),
+                         index=groups[~groups.duplicated()])
 
     @staticmethod
-    def _get_interval(x):
-        return x.sem() * st.t.ppf(1 - 0.025, len(x))
+    def _get_interval(grouped, column):
+        """
+        Return the half-width of the 95% confidence interval of the mean of
+        the column in each group.
+        """
+        return (grouped[column].sem() *
+                st.t.ppf(1 - 0.025, grouped.size()))
 
 
 class Visualizer(QtCore.QObject):
@@ -28,6 +28,10 @@ def main():
     else:
         print("Running complete tests")
 
+    if not args or "annotation" in args:
+        from test.test_annotation import provided_tests
+        test_list += provided_tests
+
     if not args or "bibliography" in args:
         from test.test_bibliography import provided_tests
         test_list += provided_tests
@@ -36,6 +40,10 @@ def main():
         from test.test_colorizers import provided_tests
         test_list += provided_tests
 
+    if not args or "coltypes" in args:
+        from test.test_coltypes import provided_tests
+        test_list += provided_tests
+
     if not args or "connections" in args:
         from test.test_connections import provided_tests
         test_list += provided_tests
@@ -48,6 +56,10 @@ def main():
         from test.test_corpusbuilder import provided_tests
         test_list += provided_tests
 
+    if not args or "export" in args:
+        from test.test_export import provided_tests
+        test_list += provided_tests
+
     if not args or "filters" in args:
         from test.test_filters import provided_tests
         test_list += provided_tests
@@ -81,6 +93,14 @@ def main():
         from test.test_switchboard import provided_tests
         test_list += provided_tests
 
+    if not args or "lexicaldiversity" in args:
+        from test.test_lexicaldiversity import provided_tests
+        test_list += provided_tests
+
+    if not args or "linkcache" in args:
+        from test.test_linkcache import provided_tests
+        test_list += provided_tests
+
     if not args or "managers" in args:
         from test.test_managers import provided_tests
         test_list += provided_tests
@@ -89,14 +109,34 @@ def main():
         from test.test_options import provided_tests
         test_list += provided_tests
 
+    if not args or "querysource" in args:
+        from test.test_querysource import provided_tests
+        test_list += provided_tests
+
     if not args or "queries" in args:
         from test.test_queries import provided_tests
         test_list += provided_tests
 
+    if not args or "server" in args:
+        from test.test_server import provided_tests
+        test_list += provided_tests
+
     if not args or "sessions" in args:
         from test.test_sessions import provided_tests
         test_list += provided_tests
 
+    if not args or "sound" in args:
+        from test.test_sound import provided_tests
+        test_list += provided_tests
+
+    if not args or "sqliteregexp" in args:
+        from test.test_sqliteregexp import provided_tests
+        test_list += provided_tests
+
+    if not args or "startup" in args:
+        from test.test_startup import provided_tests
+        test_list += provided_tests
+
     if not args or "tables" in args:
         from test.test_tables import provided_tests
         test_list += provided_tests
@@ -109,10 +149,18 @@ def main():
         from test.test_tokens import provided_tests
         test_list += provided_tests
 
+    if not args or "trigrams" in args:
+        from test.test_trigrams import provided_tests
+        test_list += provided_tests
+
     if not args or "unicode" in args:
         from test.test_unicode import provided_tests
         test_list += provided_tests
 
+    if not args or "uniques" in args:
+        from test.test_uniques import provided_tests
+        test_list += provided_tests
+
     if not args or "visualizer" in args:
         from test.vis.test_barplot import provided_tests
         test_list += provided_tests
@@ -120,6 +168,8 @@ def main():
         test_list += provided_tests
         from test.vis.test_bubbleplot import provided_tests
         test_list += provided_tests
+        from test.vis.test_visualizer import provided_tests
+        test_list += provided_tests
 
     suite = unittest.TestSuite(
         [unittest.TestLoader().loadTestsFromTestCase(x)
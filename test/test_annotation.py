@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the annotation module.
+
+Run it like so:
+
+coquery$ python -m test.test_annotation
+
+"""
+
+from __future__ import unicode_literals
+
+import os
+import unittest
+
+from coquery import options
+from coquery.annotation import (AnnotationPipeline, annotate_sentence,
+                                iter_batches, lemmatize)
+
+from test.testcase import CoqTestCase, run_tests
+
+
+def has_nltk_data():
+    if not options.use_nltk:
+        return False
+    import nltk
+    try:
+        for resource in ("tokenizers/punkt",
+                         "taggers/averaged_perceptron_tagger",
+                         "corpora/wordnet"):
+            nltk.data.find(resource)
+    except LookupError:
+        return False
+    return True
+
+
+def split_batch(sentences):
+    """
+    Annotate a batch of sentences by splitting them at spaces, and record
+    the process that annotated them.
+    """
+    return [[(token, "X", token.lower()) for token in sentence.split()] +
+            [(None, os.getpid(), None)]
+            for sentence in sentences]
+
+
+class TestAnnotationPipeline(CoqTestCase):
+    sentences = ["Sentence number {} .".format(i) for i in range(50)]
+
+    def check_order(self, results):
+        self.assertEqual(len(results), len(self.sentences))
+        for sentence, tokens in zip(self.sentences, results):
+            self.assertListEqual([token for token, _, _ in tokens[:-1]],
+                                 sentence.split())
+
+    def test_in_process(self):
+        with AnnotationPipeline(workers=1, batch_size=7,
+                                annotate=split_batch,
+                                initializer=None) as pipeline:
+            results = list(pipeline.annotate(self.sentences))
+        self.check_order(results)
+        self.assertSetEqual({tokens[-1][1] for tokens in results},
+                            {os.getpid()})
+
+    def test_worker_processes(self):
+        with AnnotationPipeline(workers=2, batch_size=3,
+                                annotate=split_batch,
+                                initializer=None) as pipeline:
+            results = list(pipeline.annotate(iter(self.sentences)))
+            # the pool can be used for several files:
+            more = list(pipeline.annotate(self.sentences[:5]))
+        self.check_order(results)
+        self.assertEqual(len(more), 5)
+        self.assertNotIn(os.getpid(), {tokens[-1][1] for tokens in results})
+
+    def test_empty(self):
+        pipeline = AnnotationPipeline(workers=1, annotate=split_batch)
+        self.assertListEqual(list(pipeline.annotate([])), [])
+
+    def test_iter_batches(self):
+        self.assertListEqual(list(iter_batches(range(5), 2)),
+                             [[0, 1], [2, 3], [4]])
+        self.assertListEqual(list(iter_batches([], 2)), [])
+
+    def test_lemmatize_unknown_pos(self):
+        # words with POS tags that don't have a WordNet label are not
+        # lemmatized:
+        self.assertEqual(lemmatize("the", "DT"), "the")
+        self.assertEqual(lemmatize("the", None), "the")
+
+    @unittest.skipIf(has_nltk_data(), "NLTK data available")
+    def test_missing_nltk_data(self):
+        # the error is passed on instead of restarting the workers:
+        with self.assertRaises(Exception):
+            with AnnotationPipeline(workers=2) as pipeline:
+                list(pipeline.annotate(["The dogs were barking."]))
+
+    @unittest.skipUnless(has_nltk_data(), "NLTK data not available")
+    def test_annotate_sentence(self):
+        tokens = annotate_sentence("The dogs were barking.")
+        self.assertListEqual([token for token, _, _ in tokens],
+                             ["The", "dogs", "were", "barking", "."])
+        self.assertEqual(tokens[1][2], "dog")
+        self.assertIsNone(tokens[-1][2])
+
+
+provided_tests = [TestAnnotationPipeline]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the coltypes module.
+
+Run it like so:
+
+coquery$ python -m test.test_coltypes
+
+"""
+
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from coquery import coltypes
+from coquery.coltypes import (KIND_INT, KIND_FLOAT, KIND_BOOL, KIND_STR,
+                              KIND_OBJECT)
+
+from test.testcase import CoqTestCase, run_tests
+
+
+class TestColumnTypes(CoqTestCase):
+    def test_get_sql_kind(self):
+        self.assertEqual(coltypes.get_sql_kind("MEDIUMINT(7) NOT NULL"),
+                         KIND_INT)
+        self.assertEqual(coltypes.get_sql_kind("INTEGER"), KIND_INT)
+        self.assertEqual(coltypes.get_sql_kind("REAL"), KIND_FLOAT)
+        self.assertEqual(coltypes.get_sql_kind("varchar(12)"), KIND_STR)
+        self.assertEqual(coltypes.get_sql_kind("ENUM('a','b')"), KIND_STR)
+        self.assertIsNone(coltypes.get_sql_kind("BLOB"))
+        self.assertIsNone(coltypes.get_sql_kind(None))
+
+    def test_infer_kind(self):
+        self.assertEqual(coltypes.infer_kind(pd.Series([1, 2])), KIND_INT)
+        self.assertEqual(coltypes.infer_kind(pd.Series([1.0, np.nan])),
+                         KIND_INT)
+        self.assertEqual(coltypes.infer_kind(pd.Series([1.5, np.nan])),
+                         KIND_FLOAT)
+        self.assertEqual(coltypes.infer_kind(pd.Series([1.0, np.inf])),
+                         KIND_FLOAT)
+        self.assertEqual(coltypes.infer_kind(pd.Series([True, None])),
+                         KIND_BOOL)
+        self.assertEqual(coltypes.infer_kind(pd.Series(["a", None])),
+                         KIND_STR)
+        self.assertEqual(coltypes.infer_kind(pd.Series([1, "a"])),
+                         KIND_OBJECT)
+
+    def test_get_dtype(self):
+        for S in [pd.Series([1, 2]),
+                  pd.Series([1.0, np.nan]),
+                  pd.Series([1.5, np.nan]),
+                  pd.Series([True, None]),
+                  pd.Series(["a", None]),
+                  pd.Series([1, None], dtype=object),
+                  pd.Series([None, None]),
+                  pd.Series(["a", "b"], dtype="category")]:
+            self.assertEqual(coltypes.get_dtype(S),
+                             S.dropna().convert_dtypes().dtype)
+
+    def test_cast_column_int(self):
+        S = coltypes.cast_column(pd.Series([1.0, np.nan, 3.0]))
+        self.assertEqual(S.dtype, pd.Int64Dtype())
+        self.assertListEqual(list(S.isna()), [False, True, False])
+        S = coltypes.cast_column(pd.Series([1, None], dtype=object))
+        self.assertEqual(S.dtype, pd.Int64Dtype())
+
+    def test_cast_column_float(self):
+        S = pd.Series([1.5, np.nan])
+        self.assertIs(coltypes.cast_column(S), S)
+
+    def test_cast_column_str(self):
+        S = coltypes.cast_column(pd.Series(["a", None, np.nan]), KIND_STR)
+        self.assertEqual(S.dtype, object)
+        self.assertIs(S[1], pd.NA)
+        self.assertIs(S[2], pd.NA)
+
+    def test_cast_column_schema_str(self):
+        # with a string kind from the schema, numeric strings are not
+        # converted:
+        S = pd.Series(["1", "2"])
+        self.assertEqual(coltypes.cast_column(S, KIND_STR).dtype, object)
+
+    def test_to_categorical(self):
+        S = pd.Series(["the", "a", "the", None, "a", "the"], name="word")
+        cat = coltypes.to_categorical(S)
+        self.assertIsInstance(cat.dtype, pd.CategoricalDtype)
+        self.assertListEqual(list(cat.cat.categories), ["a", "the"])
+        self.assertEqual(cat.name, "word")
+        self.assertTrue(pd.isna(cat[3]))
+        self.assertListEqual(list(cat.astype(object).dropna()),
+                             list(S.dropna()))
+
+    def test_to_categorical_unique_values(self):
+        # columns with many distinct values are not converted:
+        S = pd.Series(["a", "b", "c"])
+        self.assertIs(coltypes.to_categorical(S), S)
+
+    def test_cast_column_categorical(self):
+        S = pd.Series(["b", "a", "b", "a"])
+        self.assertIsInstance(
+            coltypes.cast_column(S, KIND_STR, categorical=True).dtype,
+            pd.CategoricalDtype)
+        self.assertEqual(coltypes.cast_column(S, KIND_STR).dtype, object)
+
+    def test_remove_unused_categories(self):
+        df = pd.DataFrame({"word": pd.Categorical(["a", "b", "a"]),
+                           "x": [1, 2, 3]})
+        df = coltypes.remove_unused_categories(df[df["word"] == "a"])
+        self.assertListEqual(list(df["word"].cat.categories), ["a"])
+        self.assertListEqual(list(df["x"]), [1, 3])
+
+
+provided_tests = [
+    TestColumnTypes,
+]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
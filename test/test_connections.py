@@ -16,6 +16,8 @@ import sys
 import select
 import random
 import string
+import shutil
+import tempfile
 
 from coquery.connections import (Connection,
                                  MySQLConnection,
@@ -94,6 +96,129 @@ class TestConnection(CoqTestCase):
         self.assertEqual(con.count_resources(), 0)
 
 
+MODULE_TEMPLATE = """
+from coquery.corpus import BaseResource, CorpusClass
+
+class Resource(BaseResource):
+    name = "{name}"
+
+class Corpus(CorpusClass):
+    pass
+"""
+
+
+class LocalConnection(Connection):
+    def __init__(self, name, path):
+        super(LocalConnection, self).__init__(name)
+        self.path = path
+
+    def resource_path(self):
+        return self.path
+
+
+class TestFindResource(CoqTestCase):
+    def setUp(self):
+        self.name = "test_local"
+        self.path = tempfile.mkdtemp()
+        self.write_module("corpus_one", "Corpus_One")
+        self.write_module("corpus_two", "Corpus_Two")
+        self.write_module("other", "Renamed")
+        # a corpus module with an error:
+        with open(os.path.join(self.path, "broken.py"), "w") as f:
+            f.write("raise ValueError\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        self.clear_modules()
+        sys.modules.pop("corpus_three", None)
+
+    def write_module(self, file_name, name):
+        with open(os.path.join(self.path, "{}.py".format(file_name)),
+                  "w") as f:
+            f.write(MODULE_TEMPLATE.format(name=name))
+
+    def loaded_modules(self):
+        return sorted(x for x in ("corpus_one", "corpus_two", "other",
+                                  "broken")
+                      if x in sys.modules)
+
+    def clear_modules(self):
+        for module in ("corpus_one", "corpus_two", "other", "broken"):
+            sys.modules.pop(module, None)
+
+    def test_find_resources_writes_manifest(self):
+        con = LocalConnection(self.name, self.path)
+        con.find_resources()
+        manifest = con.read_manifest()
+        self.assertEqual(sorted(manifest),
+                         ["broken.py", "corpus_one.py", "corpus_two.py",
+                          "other.py"])
+        self.assertEqual(manifest["other.py"]["name"], "Renamed")
+        self.assertIn("error", manifest["broken.py"])
+        self.assertEqual(sorted(con.resources()),
+                         ["Corpus_One", "Corpus_Two", "Renamed"])
+
+    def test_find_resources_from_manifest(self):
+        LocalConnection(self.name, self.path).find_resources()
+        self.clear_modules()
+
+        con = LocalConnection(self.name, self.path)
+        con.find_resources()
+        self.assertEqual(sorted(con.resources()),
+                         ["Corpus_One", "Corpus_Two", "Renamed"])
+        self.assertEqual(self.loaded_modules(), [])
+
+        res, _, module_name = con.resources()["Renamed"]
+        self.assertEqual(res.name, "Renamed")
+        self.assertEqual(os.path.basename(module_name), "other.py")
+        self.assertEqual(self.loaded_modules(), ["other"])
+
+    def test_find_resource_loads_one_module(self):
+        LocalConnection(self.name, self.path).find_resources()
+        self.clear_modules()
+
+        con = LocalConnection(self.name, self.path)
+        res, _, _ = con.find_resource("Corpus_One")
+        self.assertEqual(res.name, "Corpus_One")
+        self.assertEqual(self.loaded_modules(), ["corpus_one"])
+        self.assertTrue(con.resources().is_loaded("Corpus_One"))
+        self.assertFalse(con.resources().is_loaded("Corpus_Two"))
+
+    def test_find_resource_unknown(self):
+        con = LocalConnection(self.name, self.path)
+        self.assertIsNone(con.find_resource("Unknown"))
+        self.assertEqual(len(con.resources()), 3)
+
+    def test_manifest_update(self):
+        LocalConnection(self.name, self.path).find_resources()
+        self.clear_modules()
+
+        # change one module, add a new one, and remove another one:
+        self.write_module("corpus_two", "Changed")
+        os.utime(os.path.join(self.path, "corpus_two.py"), ns=(0, 0))
+        self.write_module("corpus_three", "Corpus_Three")
+        os.remove(os.path.join(self.path, "other.py"))
+
+        con = LocalConnection(self.name, self.path)
+        con.find_resources()
+        self.assertEqual(sorted(con.resources()),
+                         ["Changed", "Corpus_One", "Corpus_Three"])
+        self.assertEqual(self.loaded_modules(), ["corpus_two"])
+        self.assertNotIn("other.py", con.read_manifest())
+
+    def test_get_db_name(self):
+        con = LocalConnection(self.name, self.path)
+        con.find_resources()
+        self.assertIsNone(con.resources().get_db_name("Corpus_One"))
+
+    def test_find_resource_cached(self):
+        con = LocalConnection(self.name, self.path)
+        con.find_resources()
+        tup = con.resources()["Corpus_Two"]
+        os.remove(os.path.join(self.path, "corpus_two.py"))
+        self.assertIs(con.find_resource("Corpus_Two"), tup)
+
+
 class TestMySQLConnection(CoqTestCase):
     skip_root = False
     root_password = None
@@ -283,7 +408,8 @@ class TestSQLiteConnection(CoqTestCase):
         self.assertEqual(url, con.url(self.db_name))
 
 
-provided_tests = (TestConnection, TestMySQLConnection, TestSQLiteConnection)
+provided_tests = (TestConnection, TestFindResource, TestMySQLConnection,
+                  TestSQLiteConnection)
 
 
 def main():
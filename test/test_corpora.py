@@ -3,12 +3,16 @@
 from __future__ import print_function
 import argparse
 import os
+import re
+from unittest import mock
 import pandas as pd
 import numpy as np
+import sqlalchemy
 
 from coquery.defines import DEFAULT_CONFIGURATION
-from coquery.connections import MySQLConnection
+from coquery.connections import MySQLConnection, SQLiteConnection
 from coquery.corpus import SQLResource, CorpusClass, BaseResource
+from coquery import corpus as corpus_module
 from coquery.coquery import options
 from coquery.defines import SQL_MYSQL, CONTEXT_NONE
 from coquery.queries import TokenQuery
@@ -74,6 +78,10 @@ class CorpusResourceRevWord(CorpusResource):
     word_label_rev = "WordRev"
 
 
+class CorpusResourceTrigram(CorpusResource):
+    word_label_trigrams = "LexiconWordTrigrams"
+
+
 def simple(s):
     s = s.replace("\n", " ")
     s = s.replace("\t", " ")
@@ -1330,6 +1338,159 @@ class TestCorpus(CoqTestCase):
         self.assertEqual(target, value)
 
 
+    ### QUERY TEMPLATES
+
+    def test_query_template_render(self):
+        for S in ["a*.[n*]", "~a*.[n*]", "walk|talk", "#walk", "[n*] has",
+                  "d'oh", "a|b|c* _NULL x", "/'b*/"]:
+            query = TokenQuery(S, self.Session)
+            for query_items in query.query_list:
+                query_string = self.resource.get_query_string(
+                    query_items, ["word_label", "source_label"])
+                template, params = self.resource.get_query_template(
+                    query_items, ["word_label", "source_label"])
+                self.assertEqual(
+                    simple(self.resource.render_query_template(template,
+                                                               params)),
+                    simple(query_string))
+
+    def test_query_template_reuse(self):
+        items1 = TokenQuery("walk*.[v*]", self.Session).query_list[0]
+        items2 = TokenQuery("talk*.[n*]", self.Session).query_list[0]
+        template1, params1 = self.resource.get_query_template(
+            items1, ["word_label"])
+        template2, params2 = self.resource.get_query_template(
+            items2, ["word_label"])
+        self.assertIs(template1, template2)
+        self.assertListEqual(sorted(params1.values()), ["v%", "walk%"])
+        self.assertListEqual(sorted(params2.values()), ["n%", "talk%"])
+
+    def test_query_template_structure(self):
+        items1 = TokenQuery("walk", self.Session).query_list[0]
+        items2 = TokenQuery("walk*", self.Session).query_list[0]
+        template1, _ = self.resource.get_query_template(
+            items1, ["word_label"])
+        template2, _ = self.resource.get_query_template(
+            items2, ["word_label"])
+        self.assertNotEqual(template1, template2)
+
+    def test_query_template_quote_char(self):
+        items = TokenQuery("d'oh", self.Session).query_list[0]
+        _, params = self.resource.get_query_template(items, ["word_label"])
+        self.assertListEqual(list(params.values()), ["d'oh"])
+
+    def test_union_query_template(self):
+        query_list = TokenQuery("a b{0,1} c", self.Session).query_list
+        statements = self.resource.get_union_query_templates(
+            query_list, ["word_label"])
+        self.assertEqual(len(statements), 1)
+        template, params = statements[0]
+        branches = self.resource.render_query_template(
+            template, params).split("\nUNION ALL\n")
+        self.assertEqual(len(branches), len(query_list))
+        for k, (branch, query_items) in enumerate(zip(branches, query_list)):
+            query_string = self.resource.get_query_string(
+                query_items, ["word_label"])
+            n = len([x for _, x in query_items if x])
+            self.assertEqual(
+                simple(branch),
+                simple(f"SELECT {k} AS coquery_invisible_subquery, "
+                       f"{n} AS coquery_invisible_number_of_tokens, "
+                       f"COQ_UNION_{k+1}.* FROM ({query_string}) "
+                       f"AS COQ_UNION_{k+1}"))
+        self.assertListEqual(sorted(params.values()),
+                             ["a", "a", "b", "c", "c"])
+
+    def test_union_query_execute(self):
+        engine = sqlalchemy.create_engine("sqlite://")
+        query_list = TokenQuery("a b{0,1} c", self.Session).query_list
+        [(template, params)] = self.resource.get_union_query_templates(
+            query_list, ["word_label"])
+        with engine.connect() as connection:
+            connection.execute("""
+                CREATE TABLE Corpus (ID INT, WordId INT, FileId INT,
+                                     Start REAL, End REAL)""")
+            connection.execute("""
+                CREATE TABLE Lexicon (WordId INT, Word TEXT, POS TEXT,
+                                      LemmaId INT, Transcript TEXT)""")
+            connection.execute("""
+                INSERT INTO Lexicon VALUES (1, 'a', 'x', 1, ''),
+                                           (2, 'b', 'x', 2, ''),
+                                           (3, 'c', 'x', 3, '')""")
+            connection.execute("""
+                INSERT INTO Corpus VALUES (1, 1, 1, 0, 0), (2, 3, 1, 0, 0),
+                                          (3, 1, 1, 0, 0), (4, 2, 1, 0, 0),
+                                          (5, 3, 1, 0, 0)""")
+            results = connection.execute(sqlalchemy.text(template), params)
+            df = pd.DataFrame(results.fetchall(), columns=results.keys())
+
+        self.assertListEqual(
+            list(df.columns),
+            ["coquery_invisible_subquery",
+             "coquery_invisible_number_of_tokens",
+             "coq_word_label_1", "coq_word_label_2", "coq_word_label_3",
+             "coquery_invisible_corpus_id", "coquery_invisible_origin_id"])
+        df = df.sort_values("coquery_invisible_subquery")
+        self.assertListEqual(
+            df["coquery_invisible_number_of_tokens"].tolist(), [2, 3])
+        self.assertListEqual(
+            df["coquery_invisible_corpus_id"].tolist(), [1, 3])
+        self.assertListEqual(
+            df["coq_word_label_2"].tolist(), [None, "b"])
+
+    def test_union_query_templates_limits(self):
+        # 512 expansions, which is more than SQLite accepts in a single
+        # compound statement:
+        query_list = TokenQuery(
+            "a{0,1} b{0,1} a{0,1} b{0,1} a{0,1} b{0,1} a{0,1} b{0,1} "
+            "a{0,1} c", self.Session).query_list
+        self.assertGreater(len(query_list), 500)
+        statements = self.resource.get_union_query_templates(
+            query_list, ["word_label"])
+        self.assertGreater(len(statements), 1)
+
+        engine = sqlalchemy.create_engine("sqlite://")
+        subqueries = []
+        with engine.connect() as connection:
+            connection.execute("""
+                CREATE TABLE Corpus (ID INT, WordId INT, FileId INT,
+                                     Start REAL, End REAL)""")
+            connection.execute("""
+                CREATE TABLE Lexicon (WordId INT, Word TEXT, POS TEXT,
+                                      LemmaId INT, Transcript TEXT)""")
+            connection.execute("""
+                INSERT INTO Lexicon VALUES (1, 'a', 'x', 1, ''),
+                                           (2, 'b', 'x', 2, ''),
+                                           (3, 'c', 'x', 3, '')""")
+            connection.execute("""
+                INSERT INTO Corpus VALUES (1, 1, 1, 0, 0), (2, 2, 1, 0, 0),
+                                          (3, 3, 1, 0, 0)""")
+            for template, params in statements:
+                branches = template.split("\nUNION ALL\n")
+                self.assertLessEqual(len(branches),
+                                     corpus_module.MAX_UNION_BRANCHES)
+                self.assertLessEqual(len(params),
+                                     corpus_module.MAX_UNION_PARAMETERS)
+                subqueries += [int(re.match(r"SELECT (\d+) AS", x).group(1))
+                               for x in branches]
+                connection.execute(sqlalchemy.text(template), params)
+        self.assertListEqual(subqueries, list(range(len(query_list))))
+
+    def test_union_query_templates_branches(self):
+        query_list = TokenQuery("a b{0,3} c", self.Session).query_list
+        [(combined, _)] = self.resource.get_union_query_templates(
+            query_list, ["word_label"])
+        with mock.patch.object(corpus_module, "MAX_UNION_BRANCHES", 3):
+            statements = self.resource.get_union_query_templates(
+                query_list, ["word_label"])
+        self.assertListEqual(
+            [template.count("\nUNION ALL\n") + 1
+             for template, _ in statements], [3, 1])
+        self.assertEqual(
+            "\nUNION ALL\n".join([template for template, _ in statements]),
+            combined)
+
+
 class TestRevCorpus(CoqTestCase):
     @classmethod
     def pos_check_function(cls, l):
@@ -1367,6 +1528,14 @@ class TestRevCorpus(CoqTestCase):
         self.assertDictEqual(
             d, {"word": ["COQ_WORD_1.WordRev LIKE 'gni%'"]})
 
+    def test_get_token_conditions_OR_rev(self):
+        token = COCAToken("*ing|*ed|walk")
+        d = self.resource.get_token_conditions(0, token)
+        self.assertDictEqual(
+            d, {"word": ["COQ_WORD_1.WordRev LIKE 'gni%' OR "
+                         "COQ_WORD_1.WordRev LIKE 'de%' OR "
+                         "COQ_WORD_1.WordRev IN ('klaw')"]})
+
     def test_query_string_initial_wildcard(self):
         query = TokenQuery("*ing", self.Session)
         query_string = self.resource.get_query_string(query.query_list[0],
@@ -1407,6 +1576,85 @@ class TestRevCorpus(CoqTestCase):
                          simple(target_string))
 
 
+class TestTrigramCorpus(CoqTestCase):
+    pos_check_function = TestRevCorpus.pos_check_function
+
+    def setUp(self):
+        TestRevCorpus.setUp(self)
+        self.resource = CorpusResourceTrigram(None, None)
+
+    def test_get_token_conditions_infix(self):
+        token = COCAToken("*tion*")
+        d = self.resource.get_token_conditions(0, token)
+        self.assertDictEqual(
+            d, {"word": ["COQ_WORD_1.Word LIKE '%tion%' AND "
+                         "COQ_WORD_1.WordId IN ("
+                         "SELECT WordId FROM LexiconWordTrigrams "
+                         "WHERE Trigram IN ('ion', 'tio') "
+                         "GROUP BY WordId "
+                         "HAVING COUNT(DISTINCT Trigram) = 2)"]})
+
+    def test_get_token_conditions_prefix(self):
+        # prefix queries can use the index on the word column, so the
+        # trigram table is not used:
+        token = COCAToken("nation*")
+        d = self.resource.get_token_conditions(0, token)
+        self.assertDictEqual(
+            d, {"word": ["COQ_WORD_1.Word LIKE 'nation%'"]})
+
+    def test_get_token_conditions_short(self):
+        token = COCAToken("*ab*")
+        d = self.resource.get_token_conditions(0, token)
+        self.assertDictEqual(
+            d, {"word": ["COQ_WORD_1.Word LIKE '%ab%'"]})
+
+    def test_get_token_conditions_regexp(self):
+        options.cfg.regexp = True
+        token = COCAToken("walk[se]+")
+        d = self.resource.get_token_conditions(0, token)
+        self.assertDictEqual(
+            d, {"word": ["COQ_WORD_1.Word REGEXP 'walk[se]+' AND "
+                         "COQ_WORD_1.WordId IN ("
+                         "SELECT WordId FROM LexiconWordTrigrams "
+                         "WHERE Trigram IN ('alk', 'wal') "
+                         "GROUP BY WordId "
+                         "HAVING COUNT(DISTINCT Trigram) = 2)"]})
+
+
+class TestRegexpPrefilter(CoqTestCase):
+    pos_check_function = TestRevCorpus.pos_check_function
+
+    def setUp(self):
+        TestRevCorpus.setUp(self)
+        self.resource = CorpusResource(None, None)
+        options.cfg.current_connection = SQLiteConnection(
+            "regexp_test", path=os.path.expanduser("~"))
+        options.cfg.regexp = True
+        options.cfg.regexp_prefilter = True
+
+    def test_get_token_conditions(self):
+        token = COCAToken("walk[se]+")
+        d = self.resource.get_token_conditions(0, token)
+        self.assertDictEqual(
+            d, {"word": ["COQ_WORD_1.WordId IN ("
+                         "SELECT WordId FROM Lexicon "
+                         "WHERE Word REGEXP 'walk[se]+' COLLATE NOCASE)"]})
+
+    def test_get_token_conditions_no_prefilter(self):
+        options.cfg.regexp_prefilter = False
+        token = COCAToken("walk[se]+")
+        d = self.resource.get_token_conditions(0, token)
+        self.assertDictEqual(
+            d, {"word": ["COQ_WORD_1.Word REGEXP 'walk[se]+' COLLATE NOCASE"]})
+
+    def test_get_token_conditions_corpus(self):
+        # regular expressions on corpus columns are not prefiltered:
+        token = COCAToken("=1[0-9]+")
+        d = self.resource.get_token_conditions(0, token)
+        self.assertDictEqual(
+            d, {"corpus": ["ID1 REGEXP '1[0-9]+' COLLATE NOCASE"]})
+
+
 class TestSuperFlat(CoqTestCase):
     """
     This TestCase tests issues with a corpus that doesn't have a Lexicon
@@ -2257,6 +2505,68 @@ class TestRenderedContext(CoqTestCase):
         val = self.corpus.parse_df(df, tags, token_id=2025, token_width=2)
         np.testing.assert_array_equal(val, target)
 
+    def test_parse_df_3(self):
+        df = pd.DataFrame(
+            {'coquery_invisible_corpus_id': [2023, 2024, 2025, 2026, 2027],
+             'coq_word_label_1': ["'", 'said', 'Alice', 'to', 'herself']})
+        self.corpus.id_start_list = np.array([2024])
+        self.corpus.id_end_list = np.array([2026])
+        style = "<span style='{};'>".format(
+            self.corpus.resource.render_token_style)
+        target = ["'",
+                  style,
+                  "said",
+                  "<b>",
+                  "Alice",
+                  "to",
+                  "</b>",
+                  "</span>",
+                  'herself']
+
+        val = self.corpus.parse_df(df, None, token_id=2025, token_width=2)
+        self.assertListEqual(val, target)
+
+    def test_get_result_token_ids(self):
+        df = pd.DataFrame(
+            {"coquery_invisible_corpus_id": [500, 10, 2000, None, 1500],
+             "coquery_invisible_number_of_tokens": [1, 2, 3, 1, 2]})
+        starts, ends = CorpusClass.get_result_token_ids(df, 10, 2000)
+        np.testing.assert_array_equal(starts, [500, 1500])
+        np.testing.assert_array_equal(ends, [500, 1501])
+
+        # a new table replaces the cached index:
+        df = pd.DataFrame(
+            {"coquery_invisible_corpus_id": [20, 30],
+             "coquery_invisible_number_of_tokens": [1, 2]})
+        starts, ends = CorpusClass.get_result_token_ids(df, 0, 100)
+        np.testing.assert_array_equal(starts, [20, 30])
+        np.testing.assert_array_equal(ends, [20, 31])
+
+    def test_get_context_window_cached(self):
+        self.corpus.resource = CorpusResource
+        df = pd.DataFrame({"coquery_invisible_corpus_id": range(100, 201)})
+        tags = pd.DataFrame()
+        key = (self.corpus.resource.db_name, 1, 100, 200)
+        self.corpus._context_cache[key] = (df, tags)
+
+        def read_context(*args):
+            raise AssertionError("context not taken from cache")
+
+        self.corpus._read_context_for_renderer = read_context
+        try:
+            val = self.corpus.get_context_window(150, 1, 2, context_width=10)
+            self.assertIs(val[0], df)
+            # different source:
+            self.assertRaises(AssertionError,
+                              self.corpus.get_context_window,
+                              150, 2, 2, context_width=10)
+            # window not covered by the cached window:
+            self.assertRaises(AssertionError,
+                              self.corpus.get_context_window,
+                              150, 1, 2, context_width=60)
+        finally:
+            self.corpus._context_cache.pop(key)
+
 
 def mock_get_available_resources(configuration):
     path = os.path.join(os.path.expanduser("~"),
@@ -2269,6 +2579,8 @@ def mock_get_available_resources(configuration):
 provided_tests = [
                   TestCorpus,
                   TestRevCorpus,
+                  TestTrigramCorpus,
+                  TestRegexpPrefilter,
                   TestSuperFlat,
                   TestCorpusWithExternal,
                   TestNGramCorpus,
@@ -3,16 +3,20 @@
 from __future__ import print_function
 import sys
 import os
+import shutil
 import argparse
+from io import BytesIO
 
 from coquery.defines import SQL_SQLITE
 from coquery.coquery import options
+from coquery import sqlwrap
+from coquery.connections import SQLiteConnection
 from coquery.corpusbuilder import (
     BaseCorpusBuilder, XMLCorpusBuilder, TEICorpusBuilder,
-    disambiguate_label)
+    XMLStreamProcessor, disambiguate_label, iter_chunks, join_lines)
 from coquery.tables import Table, Column, Identifier, Link
 
-from test.testcase import CoqTestCase, run_tests, tmp_filename
+from test.testcase import CoqTestCase, run_tests, tmp_filename, tmp_path
 from test.test_corpora import simple
 
 
@@ -498,6 +502,239 @@ class TestTEICorpusBuilder(TestXMLCorpusBuilder):
         self.assertEqual(len(builder.content), 139)
 
 
+class HookRecorder(BaseCorpusBuilder):
+    def __init__(self):
+        super(HookRecorder, self).__init__()
+        self.calls = []
+        self.meta = None
+        self.max_children = 0
+
+    def xml_get_meta_information(self, root):
+        self.meta = root.find("header").find("source").text
+
+    def xml_preprocess_tag(self, element):
+        self.calls.append(("pre", element.tag, bool(list(element))))
+
+    def xml_process_content(self, text):
+        self.calls.append(("content", text))
+
+    def xml_process_tail(self, text):
+        self.calls.append(("tail", text))
+
+    def xml_postprocess_tag(self, element):
+        self.calls.append(("post", element.tag))
+        parent = element.getparent()
+        if parent is not None:
+            self.max_children = max(self.max_children, len(parent))
+
+
+class TestXMLStream(CoqTestCase):
+    content = """<?xml version="1.0" encoding="UTF-8"?>
+<file>
+    <header><source>XXX</source></header>
+    <text type="test">
+        <p>This <b>is</b> a <i/>test. <!-- comment --></p>
+        <p><s n="1">Deep<x><y>er</y></x></s> tail</p>
+        <p>{}</p>
+    </text>
+</file>
+""".format(" ".join("<w>{}</w>".format(i) for i in range(100)))
+
+    def test_hook_order(self):
+        recursive = HookRecorder()
+        root = ET.XML(bytes(self.content, encoding="utf8"))
+        recursive.xml_get_meta_information(root)
+        for comment in root.xpath("//comment()"):
+            comment.getparent().remove(comment)
+        recursive.xml_process_element(root.find("text"))
+
+        streaming = HookRecorder()
+        streaming.xml_stream_file(BytesIO(bytes(self.content, "utf8")),
+                                  ["text"],
+                                  streaming.xml_get_meta_information)
+        self.assertEqual(streaming.meta, "XXX")
+        self.assertListEqual(streaming.calls, recursive.calls)
+
+    def test_elements_are_cleared(self):
+        builder = HookRecorder()
+        processor = XMLStreamProcessor(
+            builder.xml_preprocess_tag, builder.xml_postprocess_tag,
+            lambda x: None, is_body=lambda x: x.tag == "text")
+        root = processor.parse(
+            iter_chunks(BytesIO(bytes(self.content, "utf8")), size=16))
+        # only the elements that the parser has read ahead are kept, not
+        # all 100 <w> elements:
+        self.assertLess(builder.max_children, 10)
+        # the header is kept:
+        self.assertEqual(root.find("header").find("source").text, "XXX")
+        self.assertEqual(len(root.find("text")), 0)
+
+    def test_string_chunks(self):
+        builder = HookRecorder()
+        processor = XMLStreamProcessor(
+            builder.xml_preprocess_tag, builder.xml_postprocess_tag,
+            lambda x: None, is_body=lambda x: x.tag == "a")
+        processor.parse(["<a>x<b>", "y</b>", "z</a>"])
+        self.assertListEqual(builder.calls,
+                             [("pre", "a", True), ("pre", "b", False),
+                              ("post", "b"), ("post", "a")])
+
+    def test_join_lines(self):
+        lines = ["<a>", "text", "</a>"] * 10
+        self.assertEqual("".join(join_lines(lines, size=7)),
+                         "\n".join(lines))
+        self.assertListEqual(list(join_lines([])), [])
+
+
+class TestXMLCorpusBuilderStream(TestXMLCorpusBuilder):
+    def test_stream_file(self):
+        with open(self.temp_file_name, "w") as temp_file:
+            temp_file.write(xml_content)
+
+        builder = TestingXML()
+        builder.stream_xml = True
+        builder.process_file(self.temp_file_name)
+        self.assertEqual(len(builder.header), 3)
+        self.assertListEqual(builder.content,
+                             ["This", "is", "a", "test."])
+        self.assertEqual(builder._last_open, "p")
+        self.assertEqual(builder._last_close, "text")
+
+    def test_stream_tei_file(self):
+        with open(self.temp_file_name, "w") as temp_file:
+            temp_file.write(tei_content)
+
+        builder = TestingTEI()
+        builder.process_file(self.temp_file_name)
+        content = builder.content
+
+        builder = TestingTEI()
+        builder.stream_xml = True
+        builder.process_file(self.temp_file_name)
+        self.assertEqual(len(builder.header), 1)
+        self.assertListEqual(builder.content, content)
+
+
+class TestReverseColumns(CoqTestCase):
+    def setUp(self):
+        self.db_path = tmp_path()
+        os.makedirs(self.db_path)
+        options.cfg = argparse.Namespace()
+        options.cfg.current_connection = SQLiteConnection("temporary",
+                                                          self.db_path)
+        options.cfg.explain_queries = False
+
+        self.builder = NgramBuilder()
+        self.builder.DB = sqlwrap.SqlDB(Host=None, Port=None, Type=SQL_SQLITE,
+                                        User=None, Password=None,
+                                        db_name="reverse_test")
+        table = self.builder.table("Lexicon")
+        table.setDB(self.builder.DB)
+        self.builder.DB.create_table(
+            "Lexicon",
+            table.get_create_string(SQL_SQLITE,
+                                    self.builder._new_tables.values()))
+        with self.builder.DB.engine.connect() as connection:
+            connection.execute(
+                "INSERT INTO Lexicon VALUES (1, 'kindness'), (2, 'walk')")
+
+    def tearDown(self):
+        self.builder.DB.engine.dispose()
+        shutil.rmtree(self.db_path)
+
+    def test_build_reverse_columns(self):
+        with self.builder.DB.engine.connect() as self.builder.DB.connection:
+            self.builder.build_reverse_columns()
+            rows = self.builder.DB.connection.execute(
+                "SELECT Word, WordRev FROM Lexicon ORDER BY WordId")
+            self.assertListEqual(list(rows), [("kindness", "ssendnik"),
+                                              ("walk", "klaw")])
+        self.assertEqual(self.builder.word_label_rev, "WordRev")
+        self.assertIsNotNone(
+            self.builder.table("Lexicon").get_column("WordRev"))
+        self.assertNotIn("word_label_rev",
+                         self.builder.get_resource_features())
+
+    def test_find_reverse_columns(self):
+        with self.builder.DB.engine.connect() as self.builder.DB.connection:
+            self.builder.build_reverse_columns()
+
+        # a builder that only writes the corpus module:
+        builder = NgramBuilder()
+        builder.DB = self.builder.DB
+        self.assertFalse(hasattr(builder, "word_label_rev"))
+        builder.find_reverse_columns()
+        self.assertEqual(builder.word_label_rev, "WordRev")
+
+    def test_find_reverse_columns_missing(self):
+        builder = NgramBuilder()
+        builder.DB = self.builder.DB
+        builder.find_reverse_columns()
+        self.assertFalse(hasattr(builder, "word_label_rev"))
+
+    def test_build_reverse_columns_opt_out(self):
+        self.builder.reverse_query_items = []
+        with self.builder.DB.engine.connect() as self.builder.DB.connection:
+            self.builder.build_reverse_columns()
+        self.assertFalse(hasattr(self.builder, "word_label_rev"))
+
+
+class TestTrigramIndex(CoqTestCase):
+    setUp = TestReverseColumns.setUp
+    tearDown = TestReverseColumns.tearDown
+
+    def test_build_trigram_index(self):
+        with self.builder.DB.engine.connect() as self.builder.DB.connection:
+            self.builder.build_trigram_index()
+            table = self.builder.word_label_trigrams
+            rows = self.builder.DB.connection.execute(
+                f"SELECT Trigram, WordId FROM {table} ORDER BY WordId, "
+                "Trigram")
+            self.assertListEqual(
+                list(rows),
+                [("dne", 1), ("ess", 1), ("ind", 1), ("kin", 1), ("ndn", 1),
+                 ("nes", 1), ("alk", 2), ("wal", 2)])
+        self.assertNotIn("word_label_trigrams",
+                         self.builder.get_resource_features())
+
+    def test_find_trigram_indexes(self):
+        with self.builder.DB.engine.connect() as self.builder.DB.connection:
+            self.builder.build_trigram_index()
+
+        # a builder that only writes the corpus module:
+        builder = NgramBuilder()
+        builder.DB = self.builder.DB
+        self.assertFalse(hasattr(builder, "word_label_trigrams"))
+        builder.find_trigram_indexes()
+        self.assertEqual(builder.word_label_trigrams,
+                         self.builder.word_label_trigrams)
+
+    def test_find_trigram_indexes_missing(self):
+        builder = NgramBuilder()
+        builder.DB = self.builder.DB
+        builder.find_trigram_indexes()
+        self.assertFalse(hasattr(builder, "word_label_trigrams"))
+
+    def test_build_trigram_index_chunks(self):
+        self.builder.trigram_chunk_size = 1
+        with self.builder.DB.engine.connect() as self.builder.DB.connection:
+            self.builder.build_trigram_index()
+            table = self.builder.word_label_trigrams
+            rows = self.builder.DB.connection.execute(
+                f"SELECT COUNT(*) FROM {table}")
+            self.assertEqual(list(rows), [(8,)])
+
+    def test_trigram_column_type(self):
+        # MySQL can only index columns with a fixed width:
+        with self.builder.DB.engine.connect() as self.builder.DB.connection:
+            self.builder.build_trigram_index()
+            table = self.builder.word_label_trigrams
+            rows = self.builder.DB.connection.execute(
+                f"PRAGMA table_info({table})")
+            types = {row[1]: row[2] for row in rows}
+        self.assertEqual(types["Trigram"], "VARCHAR(3)")
+
+
 class TestDisambiguateLabel(CoqTestCase):
     def test_label(self):
         lst = ["Word", "ID", "FileId"]
@@ -510,6 +747,10 @@ provided_tests = [
     TestFlatCorpusBuilder,
     TestXMLCorpusBuilder,
     TestTEICorpusBuilder,
+    TestXMLStream,
+    TestXMLCorpusBuilderStream,
+    TestReverseColumns,
+    TestTrigramIndex,
     TestDisambiguateLabel
     ]
 
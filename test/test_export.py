@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the export module.
+
+Run it like so:
+
+coquery$ python -m test.test_export
+
+"""
+
+from __future__ import unicode_literals
+
+import argparse
+import gzip
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from coquery import options
+from coquery.export import (
+    TableExporter, ExportCancelled, get_export_format,
+    EXPORT_CSV, EXPORT_TSV, EXPORT_GZIP, EXPORT_PARQUET, EXPORT_EXCEL)
+
+from test.testcase import CoqTestCase, run_tests
+
+
+class TestExport(CoqTestCase):
+    def setUp(self):
+        options.cfg = argparse.Namespace()
+        options.cfg.output_separator = ","
+        options.cfg.output_encoding = "utf-8"
+        self.df = pd.DataFrame(
+            {"coq_word_label_1": ["a", "b", None, "d", "e"],
+             "coquery_query_frequency": [1, 2, 3, 4, 5]})
+        self.header = ["Word", "Freq"]
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in os.listdir(self.path):
+            os.remove(os.path.join(self.path, name))
+        os.rmdir(self.path)
+
+    def test_get_export_format(self):
+        self.assertEqual(get_export_format("results.csv"), EXPORT_CSV)
+        self.assertEqual(get_export_format("results.TSV"), EXPORT_TSV)
+        self.assertEqual(get_export_format("results.csv.gz"), EXPORT_GZIP)
+        self.assertEqual(get_export_format("results.parquet"),
+                         EXPORT_PARQUET)
+        self.assertEqual(get_export_format("results.xlsx"), EXPORT_EXCEL)
+        self.assertEqual(get_export_format("results"), EXPORT_CSV)
+
+    def test_to_string(self):
+        exporter = TableExporter(self.df, self.header, chunk_size=2)
+        self.assertEqual(
+            exporter.to_string(sep="\t"),
+            "Word\tFreq\na\t1\nb\t2\n\t3\nd\t4\ne\t5\n")
+        self.assertEqual(
+            exporter.to_string(sep="\t", header=False),
+            "a\t1\nb\t2\n\t3\nd\t4\ne\t5\n")
+        # the data frame is not modified:
+        self.assertListEqual(list(self.df.columns),
+                             ["coq_word_label_1", "coquery_query_frequency"])
+
+    def test_to_string_empty(self):
+        exporter = TableExporter(self.df.iloc[0:0], self.header)
+        self.assertEqual(exporter.to_string(sep=","), "Word,Freq\n")
+
+    def test_write_csv(self):
+        name = os.path.join(self.path, "results.csv")
+        TableExporter(self.df, self.header, chunk_size=2).write(name)
+        df = pd.read_csv(name)
+        self.assertListEqual(list(df.columns), self.header)
+        self.assertListEqual(df["Freq"].tolist(), [1, 2, 3, 4, 5])
+
+    def test_write_tsv(self):
+        name = os.path.join(self.path, "results.tsv")
+        TableExporter(self.df, self.header, chunk_size=2).write(name)
+        df = pd.read_csv(name, sep="\t")
+        self.assertListEqual(df["Freq"].tolist(), [1, 2, 3, 4, 5])
+
+    def test_write_gzip(self):
+        name = os.path.join(self.path, "results.csv.gz")
+        TableExporter(self.df, self.header, chunk_size=2).write(name)
+        with gzip.open(name, "rt", encoding="utf-8") as handle:
+            content = handle.read()
+        self.assertEqual(content, "Word,Freq\na,1\nb,2\n,3\nd,4\ne,5\n")
+
+    @unittest.skipUnless(options.use_pyarrow, "pyarrow not available")
+    def test_write_parquet(self):
+        name = os.path.join(self.path, "results.parquet")
+        TableExporter(self.df, self.header, chunk_size=2).write(name)
+        df = pd.read_parquet(name)
+        self.assertListEqual(list(df.columns), self.header)
+        self.assertListEqual(df["Freq"].tolist(), [1, 2, 3, 4, 5])
+
+    @unittest.skipUnless(options.use_openpyxl, "openpyxl not available")
+    def test_write_excel(self):
+        name = os.path.join(self.path, "results.xlsx")
+        TableExporter(self.df, self.header, chunk_size=2).write(name)
+        df = pd.read_excel(name)
+        self.assertListEqual(list(df.columns), self.header)
+        self.assertListEqual(df["Freq"].tolist(), [1, 2, 3, 4, 5])
+
+    def test_progress(self):
+        progress = []
+        exporter = TableExporter(self.df, self.header, chunk_size=2,
+                                 progress=progress.append)
+        exporter.to_string()
+        self.assertListEqual(progress, [2, 4, 5])
+
+    def test_cancel(self):
+        exporter = TableExporter(self.df, self.header, chunk_size=2)
+        exporter.progress = lambda n: exporter.cancel()
+        with self.assertRaises(ExportCancelled):
+            exporter.to_string()
+        self.assertEqual(exporter.rows_written, 2)
+
+
+provided_tests = [
+    TestExport,
+]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
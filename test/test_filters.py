@@ -298,6 +298,21 @@ class TestApply(CoqTestCase):
         self.assert_index_equal(
             filt13.apply(self.df), self.df[~self.df[STRING_COLUMN].isnull()])
 
+    def test_categorical_filter(self):
+        df = self.df.assign(
+            **{STRING_COLUMN: self.df[STRING_COLUMN].astype("category")})
+        dtype = df[STRING_COLUMN].dtype
+        filt1 = Filter(STRING_COLUMN, dtype, OP_EQ, "xxx")
+        filt2 = Filter(STRING_COLUMN, dtype, OP_LT, "xxx")
+        filt3 = Filter(STRING_COLUMN, dtype, OP_MATCH, ".b")
+
+        self.assertEqual(filt1.dtype, object)
+        self.assert_index_equal(
+            filt1.apply(df), self.df[self.df[STRING_COLUMN] == "xxx"])
+        self.assert_index_equal(
+            filt2.apply(df), self.df[self.df[STRING_COLUMN] < "xxx"])
+        self.assertListEqual(filt3.apply(df).index.tolist(), [0])
+
     def test_numeric_filter(self):
         filt1 = Filter(FLOAT_COLUMN, float, OP_EQ, 1.2345)
         filt2 = Filter(FLOAT_COLUMN, float, OP_NE, 1.2345)
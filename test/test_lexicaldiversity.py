@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the lexicaldiversity module.
+
+Run it like so:
+
+coquery$ python -m test.test_lexicaldiversity
+
+"""
+
+from __future__ import division
+
+import pandas as pd
+import numpy as np
+
+from coquery import lexicaldiversity as ld
+
+from test.testcase import CoqTestCase, run_tests
+
+
+class TestFactorize(CoqTestCase):
+    def test_single_column(self):
+        df = pd.DataFrame({"a": ["x", "y", "x", "z"]})
+        codes = ld.factorize(df, ["a"])
+        self.assertListEqual(codes.tolist(), [0, 1, 0, 2])
+
+    def test_multiple_columns(self):
+        df = pd.DataFrame({"a": ["x", "x", "x", "y"],
+                           "b": ["1", "2", "1", "1"]})
+        codes = ld.factorize(df, ["a", "b"])
+        self.assertEqual(codes[0], codes[2])
+        self.assertEqual(len(set(codes)), 3)
+
+    def test_missing_values(self):
+        df = pd.DataFrame({"a": ["x", pd.NA, "x", pd.NA]})
+        codes = ld.factorize(df, ["a"])
+        self.assertEqual(codes[1], codes[3])
+        self.assertEqual(ld.types(codes), len(df.drop_duplicates()))
+
+
+class TestMeasures(CoqTestCase):
+    def test_ttr(self):
+        codes = np.array([0, 1, 0, 2])
+        self.assertEqual(ld.ttr(codes), 0.75)
+
+    def test_sttr_reproducible(self):
+        codes = np.random.default_rng(0).integers(0, 50, 1000)
+        self.assertEqual(ld.sttr(codes, 100), ld.sttr(codes, 100))
+
+    def test_sttr_constant(self):
+        codes = np.zeros(1000, dtype=int)
+        self.assertEqual(ld.sttr(codes, 100), 0.01)
+
+    def test_sttr_too_short(self):
+        self.assertTrue(np.isnan(ld.sttr(np.arange(10), 100)))
+
+    def test_mattr(self):
+        codes = np.random.default_rng(0).integers(0, 20, 500)
+        window = 25
+        expected = np.mean([len(set(codes[i:i + window])) / window
+                            for i in range(len(codes) - window + 1)])
+        self.assertAlmostEqual(ld.mattr(codes, window), expected)
+
+    def test_mattr_short(self):
+        codes = np.array([0, 1, 0, 2])
+        self.assertEqual(ld.mattr(codes, 10), ld.ttr(codes))
+
+    def test_entropy(self):
+        self.assertEqual(ld.entropy(np.array([0, 0, 0])), 0.0)
+        self.assertAlmostEqual(ld.entropy(np.array([0, 1, 2, 3])), 2.0)
+
+    def test_yules_k(self):
+        codes = np.array([0, 0, 1, 2])
+        # sum(f²) = 4 + 1 + 1 = 6, N = 4
+        self.assertAlmostEqual(ld.yules_k(codes), 1e4 * (6 - 4) / 16)
+
+
+provided_tests = [
+    TestFactorize,
+    TestMeasures,
+]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the linkcache module.
+
+Run it like so:
+
+coquery$ python -m test.test_linkcache
+
+"""
+
+from __future__ import unicode_literals
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+
+import sqlalchemy
+
+from coquery import options
+from coquery import linkcache
+from coquery.connections import SQLiteConnection
+from coquery.links import Link
+
+from test.testcase import CoqTestCase, run_tests
+from test.test_corpora import CorpusResource, ExternalCorpus, simple
+
+
+class TestLinkCache(CoqTestCase):
+    resource = CorpusResource
+    external = ExternalCorpus
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        options.cfg = argparse.Namespace()
+        options.cfg.current_connection = SQLiteConnection(
+            "linkcache_test", path=self.path)
+        options.cfg.current_connection.add_resource(self.resource, None)
+        options.cfg.current_connection.add_resource(self.external, None)
+
+        self.link = Link(self.resource.name, "word_label",
+                         self.external.name, "word_label")
+        options.cfg.table_links = {"linkcache_test": [self.link]}
+
+        self.execute(self.external.db_name,
+                     "CREATE TABLE Lexicon (WordId INT, Word TEXT, "
+                     "ExtData TEXT)",
+                     "INSERT INTO Lexicon VALUES (1, 'Dog', 'animal'), "
+                     "(2, 'cat', 'animal'), (3, 'tree', 'plant')")
+        self.execute(self.resource.db_name,
+                     "CREATE TABLE Lexicon (WordId INT, Word TEXT)",
+                     "INSERT INTO Lexicon VALUES (1, 'dog'), (2, 'cat')")
+
+        self.engine = sqlalchemy.create_engine(
+            options.cfg.current_connection.url(self.resource.db_name))
+        self.connection = self.engine.connect()
+
+    def tearDown(self):
+        linkcache.clear()
+        self.connection.close()
+        self.engine.dispose()
+        shutil.rmtree(self.path)
+
+    def execute(self, db_name, *commands):
+        engine = sqlalchemy.create_engine(
+            options.cfg.current_connection.url(db_name))
+        with engine.connect() as connection:
+            for S in commands:
+                connection.execute(S)
+        engine.dispose()
+
+    def get_cache(self):
+        return linkcache.LinkCache(self.resource, self.link, self.external)
+
+    def get_rows(self, cache):
+        S = "SELECT {}, ExtData FROM {} ORDER BY WordId".format(
+            linkcache.CACHE_KEY_COLUMN, cache.table)
+        return [tuple(row) for row in self.connection.execute(S)]
+
+    def get_join_rows(self):
+        ext_feature = "{}.word_data".format(self.link.get_hash())
+        S = ("SELECT COQ_WORD_1.Word, EXTCORP_LEXICON_1.ExtData "
+             "FROM Lexicon AS COQ_WORD_1 {} "
+             "ORDER BY COQ_WORD_1.WordId, EXTCORP_LEXICON_1.ExtData").format(
+                 self.resource.get_external_join(0, ext_feature))
+        return [tuple(row) for row in self.connection.execute(S)]
+
+    def test_build(self):
+        cache = self.get_cache()
+        self.assertTrue(cache.update(self.connection))
+        # only the rows that match the corpus are cached:
+        self.assertListEqual(self.get_rows(cache), [("cat", "animal")])
+        self.assertEqual(
+            linkcache.get_cache_table(self.resource, self.link), cache.table)
+
+    def test_same_rows_as_linked_table(self):
+        self.execute(self.external.db_name,
+                     "INSERT INTO Lexicon VALUES (4, 'Cat', 'name')")
+        self.execute(self.resource.db_name,
+                     "INSERT INTO Lexicon VALUES (3, 'Cat')")
+
+        path = options.cfg.current_connection.db_path(self.external.db_name)
+        self.connection.execute("ATTACH DATABASE '{}' AS {}".format(
+            path, self.external.db_name))
+        rows = self.get_join_rows()
+        self.connection.execute(
+            "DETACH DATABASE {}".format(self.external.db_name))
+
+        self.get_cache().update(self.connection)
+        self.assertListEqual(self.get_join_rows(), rows)
+        self.assertListEqual(rows, [("dog", None), ("cat", "animal"),
+                                    ("Cat", "name")])
+
+    def test_query(self):
+        linkcache.prepare_links(
+            self.resource, ["{}.word_data".format(self.link.get_hash())],
+            self.connection)
+        ext_feature = "{}.word_data".format(self.link.get_hash())
+        join = self.resource.get_external_join(0, ext_feature)
+        self.assertEqual(
+            join,
+            simple("""
+                LEFT JOIN {} AS EXTCORP_LEXICON_1
+                ON EXTCORP_LEXICON_1.{} = COQ_WORD_1.Word""".format(
+                    self.get_cache().table, linkcache.CACHE_KEY_COLUMN)))
+        # the external database doesn't have to be attached:
+        self.assertEqual(self.resource.get_attach_list([ext_feature]), set())
+
+        # the join works without the external database:
+        S = ("SELECT COQ_WORD_1.Word, EXTCORP_LEXICON_1.ExtData "
+             "FROM Lexicon AS COQ_WORD_1 {} "
+             "ORDER BY COQ_WORD_1.WordId").format(join)
+        rows = [tuple(row) for row in self.connection.execute(S)]
+        self.assertListEqual(rows, [("dog", None), ("cat", "animal")])
+
+    def test_refresh_corpus(self):
+        cache = self.get_cache()
+        cache.update(self.connection)
+
+        self.execute(self.resource.db_name,
+                     "INSERT INTO Lexicon VALUES (3, 'tree'), (4, 'stone')",
+                     "DELETE FROM Lexicon WHERE Word = 'cat'")
+        # in a new session, the changed corpus table is detected:
+        linkcache.clear()
+        cache.update(self.connection)
+        self.assertListEqual(self.get_rows(cache), [("tree", "plant")])
+        self.assertEqual(cache.read_info(self.connection), (3, 3))
+
+    def test_rebuild_external(self):
+        cache = self.get_cache()
+        cache.update(self.connection)
+
+        self.execute(self.external.db_name,
+                     "INSERT INTO Lexicon VALUES (4, 'dog', 'noun')")
+        linkcache.clear()
+        cache.update(self.connection)
+        self.assertListEqual(self.get_rows(cache),
+                             [("cat", "animal"), ("dog", "noun")])
+
+    def test_missing_external(self):
+        os.remove(options.cfg.current_connection.db_path(
+            self.external.db_name))
+        logging.disable(logging.WARNING)
+        try:
+            self.assertFalse(self.get_cache().update(self.connection))
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertIsNone(
+            linkcache.get_cache_table(self.resource, self.link))
+
+    def test_drop(self):
+        cache = self.get_cache()
+        cache.update(self.connection)
+        cache.drop(self.connection)
+        self.assertIsNone(
+            linkcache.get_cache_table(self.resource, self.link))
+        self.assertIsNone(cache.read_info(self.connection))
+
+
+provided_tests = [TestLinkCache]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
@@ -106,6 +106,94 @@ class TestManager(TestMeta):
 
         np.testing.assert_array_equal(df.values, sorted_df.values)
 
+    def test_manager_arrange(self):
+        df = pd.DataFrame(
+            {"coq_word_label_1": ["walked", "talking", None, "walking",
+                                  "talked"],
+             "coquery_invisible_corpus_id": [1, 2, 3, 4, 5]})
+        self.manager.add_sorter("coq_word_label_1")
+        df = self.manager.arrange(df, session=self.Session)
+        self.assertListEqual(
+            list(df["coquery_invisible_corpus_id"].values), [5, 2, 1, 4, 3])
+        self.assertListEqual(list(df.index), [0, 1, 2, 3, 4])
+
+    def test_manager_arrange_descending(self):
+        df = pd.DataFrame(
+            {"coq_word_label_1": ["walked", "talking", None, "walking",
+                                  "talked"],
+             "coquery_invisible_corpus_id": [1, 2, 3, 4, 5]})
+        self.manager.add_sorter("coq_word_label_1", ascending=False)
+        df = self.manager.arrange(df, session=self.Session)
+        # missing values are sorted to the end:
+        self.assertListEqual(
+            list(df["coquery_invisible_corpus_id"].values), [4, 1, 2, 5, 3])
+
+    def test_manager_arrange_categorical(self):
+        # the categories are not sorted, so the sort order has to be
+        # determined from their values:
+        words = pd.Categorical(
+            ["walked", "talking", None, "walking", "talked"],
+            categories=["walking", "walked", "talking", "talked"])
+        df = pd.DataFrame({"coq_word_label_1": words,
+                           "coquery_invisible_corpus_id": [1, 2, 3, 4, 5]})
+        self.manager.add_sorter("coq_word_label_1")
+        df = self.manager.arrange(df, session=self.Session)
+        self.assertListEqual(
+            list(df["coquery_invisible_corpus_id"].values), [5, 2, 1, 4, 3])
+
+    def test_manager_process_categorical(self):
+        group = Group("Test",
+                      ["coq_word_label_1", "coq_word_label_2"],
+                      functions=[(Freq,
+                                  ["coq_word_label_1", "coq_word_label_2"])])
+        func = group.get_functions()[0]
+        self.manager.set_groups([group])
+        df = self.df.assign(
+            coq_word_label_1=self.df["coq_word_label_1"].astype("category"),
+            coq_word_label_2=self.df["coq_word_label_2"].astype("category"))
+
+        df = self.manager.process(df, session=self.Session)
+        self.assertListEqual(
+            list(df[func.get_id()].values),
+            [2] * 2 + [4] * 4 + [4] * 4)
+
+    def test_manager_arrange_reverse(self):
+        df = pd.DataFrame(
+            {"coq_word_label_1": ["walking", "talked", "sing", "walked",
+                                  "bring"],
+             "coquery_invisible_corpus_id": [1, 2, 3, 4, 5]})
+        self.manager.add_sorter("coq_word_label_1", reverse=True)
+        df = self.manager.arrange(df, session=self.Session)
+        # reversed strings: "deklat", "deklaw", "gnigniklaw" < "gnirb" <
+        # "gnis":
+        self.assertListEqual(
+            list(df["coq_word_label_1"].values),
+            ["talked", "walked", "walking", "bring", "sing"])
+        self.assertListEqual(list(df.columns),
+                             ["coq_word_label_1",
+                              "coquery_invisible_corpus_id"])
+        # the reversed strings are cached:
+        self.assertEqual(
+            self.manager._reversed_values["coq_word_label_1"]["bring"],
+            "gnirb")
+
+    def test_manager_arrange_multiple(self):
+        self.manager.add_sorter("coq_word_label_2")
+        self.manager.add_sorter("coq_word_label_3", ascending=False)
+        df = self.manager.arrange(self.df, session=self.Session)
+        self.assertListEqual(
+            list(df["coquery_invisible_corpus_id"].values),
+            [5, 3, 1, 6, 4, 2, 9, 7, 10, 8])
+
+    def test_manager_arrange_illegal_sorter(self):
+        self.manager.add_sorter("coq_word_label_4")
+        self.manager.add_sorter("coq_word_label_2")
+        df = self.manager.arrange(self.df, session=self.Session)
+        self.assertEqual(len(self.manager.sorters), 1)
+        self.assertEqual(self.manager.sorters[0].position, 0)
+        self.assertListEqual(
+            list(df["coq_word_label_2"].values), list("xxxxxxyyyy"))
+
     def test_manager_mutate_groups_tokens_1(self):
         group = Group("Test",
                       ["coq_word_label_1"],
@@ -10,8 +10,12 @@ coquery$ python -m test.test_options
 
 from __future__ import print_function
 
-from coquery.options import decode_query_string, encode_query_string
-from test.testcase import CoqTestCase, run_tests
+import os
+import sys
+
+from coquery.options import (Options,
+                             decode_query_string, encode_query_string)
+from test.testcase import CoqTestCase, run_tests, tmp_filename
 
 
 class TestQueryStringParse(CoqTestCase):
@@ -47,7 +51,45 @@ class TestQueryStringParse(CoqTestCase):
             self.assertEqual(decode_query_string(encode_query_string(S)), S)
 
 
-provided_tests = [TestQueryStringParse]
+class TestSwitchOffFlags(CoqTestCase):
+    """
+    Test that flags like --no_regexp_prefilter only overwrite the settings from
+    the configuration file if they are used.
+    """
+    def setUp(self):
+        self.argv = sys.argv
+        self.config_path = tmp_filename()
+
+    def tearDown(self):
+        sys.argv = self.argv
+        if os.path.exists(self.config_path):
+            os.remove(self.config_path)
+
+    def get_options(self, args, config):
+        sys.argv = ["coquery"] + args
+        with open(self.config_path, "w") as config_file:
+            config_file.write("[main]\n{}\n".format(config))
+        opt = Options()
+        opt.args.config_path = self.config_path
+        opt.get_options(read_file=True)
+        return opt.args.regexp_prefilter, opt.args.link_cache
+
+    def test_defaults(self):
+        self.assertEqual(self.get_options([], ""), (True, True))
+
+    def test_config_file(self):
+        config = "regexp_prefilter = False\nlink_cache = False"
+        self.assertEqual(self.get_options([], config), (False, False))
+
+    def test_command_line(self):
+        config = "regexp_prefilter = True\nlink_cache = True"
+        self.assertEqual(self.get_options(["--no_link_cache"], config),
+                         (True, False))
+        self.assertEqual(self.get_options(["--no_regexp_prefilter"], config),
+                         (False, True))
+
+
+provided_tests = [TestQueryStringParse, TestSwitchOffFlags]
 
 
 def main():
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the querysource module.
+
+Run it like so:
+
+coquery$ python -m test.test_querysource
+
+"""
+
+from __future__ import unicode_literals
+
+import io
+import os
+
+from coquery.errors import EmptyInputFileError
+from coquery.querysource import QuerySource
+
+from test.testcase import CoqTestCase, run_tests, tmp_filename
+
+
+class TestQuerySource(CoqTestCase):
+    def setUp(self):
+        self.path = tmp_filename()
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write(self, s, encoding="utf-8"):
+        with open(self.path, "w", encoding=encoding, newline="") as f:
+            f.write(s)
+
+    def test_header(self):
+        self.write("QUERY,DATA\na*,1\n\nb*,2\n")
+        source = QuerySource(path=self.path, has_header=True)
+        self.assertListEqual(source.read_header(), ["QUERY", "DATA"])
+        self.assertListEqual(list(source.iter_rows()),
+                             [["a*", "1"], ["b*", "2"]])
+
+    def test_no_header(self):
+        self.write("a*,1\nb*,2\n")
+        source = QuerySource(path=self.path, has_header=False)
+        self.assertListEqual(source.read_header(), ["X1", "X2"])
+        self.assertListEqual(list(source.iter_rows()),
+                             [["a*", "1"], ["b*", "2"]])
+
+    def test_rewind(self):
+        self.write("QUERY\na*\nb*\n")
+        source = QuerySource(path=self.path, has_header=True)
+        source.read_header()
+        rows = source.iter_rows()
+        self.assertListEqual(next(rows), ["a*"])
+        # a second iteration starts again after the header:
+        self.assertListEqual(list(source.iter_rows()), [["a*"], ["b*"]])
+
+    def test_quotes_and_separator(self):
+        self.write('QUERY;DATA\n"a;b";"x ""y"""\n')
+        source = QuerySource(path=self.path, sep=";", has_header=True)
+        source.read_header()
+        self.assertListEqual(list(source.iter_rows()), [["a;b", 'x "y"']])
+
+    def test_byte_order_mark(self):
+        self.write("QUERY\na*\n", encoding="utf-8-sig")
+        source = QuerySource(path=self.path, has_header=True)
+        self.assertListEqual(source.read_header(), ["QUERY"])
+
+    def test_max_rows(self):
+        self.write("QUERY\na*\nb*\nc*\n")
+        source = QuerySource(path=self.path, has_header=True, max_rows=2)
+        source.read_header()
+        self.assertListEqual(list(source.iter_rows()), [["a*"], ["b*"]])
+
+    def test_empty(self):
+        self.write("")
+        source = QuerySource(path=self.path)
+        with self.assertRaises(EmptyInputFileError):
+            source.read_header()
+
+    def test_handle(self):
+        handle = io.StringIO("a*\nb*\n")
+        source = QuerySource(handle=handle)
+        self.assertFalse(source.rewindable)
+        self.assertListEqual(source.read_header(), ["X1"])
+        self.assertListEqual(list(source.iter_rows()), [["a*"], ["b*"]])
+        self.assertListEqual(list(source.iter_rows()), [])
+
+    def test_path_or_handle(self):
+        with self.assertRaises(ValueError):
+            QuerySource()
+        with self.assertRaises(ValueError):
+            QuerySource(path=self.path, handle=io.StringIO(""))
+
+
+provided_tests = [TestQuerySource]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
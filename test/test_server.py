@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the server module.
+
+Run it like so:
+
+coquery$ python -m test.test_server
+
+"""
+
+from __future__ import unicode_literals
+
+import argparse
+import json
+import threading
+import urllib.error
+import urllib.request
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from coquery import options
+from coquery.connections import Connection
+from coquery.defines import (QUERY_MODE_TOKENS, QUERY_MODE_FREQUENCIES,
+                             OP_EQ)
+from coquery.filters import Filter
+from coquery.server import (QueryServer, JobError, JOB_OPTIONS,
+                            get_job_options, iter_messages)
+
+from test.testcase import CoqTestCase, run_tests
+
+
+class StubServer(QueryServer):
+    """
+    A query server that returns a fixed data frame instead of running
+    queries.
+    """
+    df = pd.DataFrame({"coq_word_label_1": ["a", "b", "c", None, "e"],
+                       "coquery_invisible_corpus_id": [1, 2, 3, 4, 5]})
+
+    def run_job(self, job):
+        settings = get_job_options(job, self.defaults)
+        self.last_settings = settings
+        self.jobs += 1
+        return ["Word"], self.df[["coq_word_label_1"]]
+
+
+class TestServer(CoqTestCase):
+    def setUp(self):
+        options.cfg = argparse.Namespace()
+        options.cfg.corpus = "Test"
+        options.cfg.MODE = QUERY_MODE_TOKENS
+        options.cfg.query_list = []
+        options.cfg.selected_features = ["word_label"]
+        options.cfg.filter_list = []
+        options.cfg.current_connection = Connection("test")
+
+        self.server = StubServer(port=0)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def url(self, path):
+        return "http://127.0.0.1:{}{}".format(self.server.port, path)
+
+    def post(self, path, data):
+        request = urllib.request.Request(
+            self.url(path), data=data,
+            headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return response.read().decode("utf-8")
+
+    def test_status(self):
+        with urllib.request.urlopen(self.url("/status")) as response:
+            status = json.loads(response.read().decode("utf-8"))
+        self.assertEqual(status["corpus"], "Test")
+        self.assertEqual(status["connection"], "test")
+        self.assertEqual(status["jobs"], 0)
+
+    def test_query(self):
+        job = {"queries": ["a*"], "chunk_size": 2}
+        body = self.post("/query", json.dumps(job).encode("utf-8"))
+        messages = [json.loads(line) for line in body.splitlines()]
+
+        self.assertDictEqual(messages[0], {"columns": ["Word"]})
+        self.assertListEqual([x["rows"] for x in messages[1:-1]],
+                             [[["a"], ["b"]], [["c"], [None]], [["e"]]])
+        self.assertTrue(messages[-1]["done"])
+        self.assertEqual(messages[-1]["rows"], 5)
+        self.assertEqual(self.server.last_settings["query_list"], ["a*"])
+        self.assertEqual(self.server.jobs, 1)
+
+    def test_query_invalid_json(self):
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            self.post("/query", b"{queries")
+        self.assertEqual(cm.exception.code, 400)
+        error = json.loads(cm.exception.read().decode("utf-8"))
+        self.assertIn("error", error)
+
+    def test_query_invalid_job(self):
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            self.post("/query", json.dumps({"queries": 1}).encode("utf-8"))
+        self.assertEqual(cm.exception.code, 400)
+
+
+class MockSession(object):
+    """
+    A session that stores the job settings from options.cfg instead of
+    running queries.
+    """
+    def __init__(self, summary_groups=None):
+        self.settings = []
+        self.prepared = 0
+
+    def is_statistics_session(self):
+        return False
+
+    def prepare_queries(self):
+        self.prepared += 1
+
+    def run_queries(self):
+        self.settings.append({name: getattr(options.cfg, name)
+                              for name in JOB_OPTIONS})
+        self.output_object = pd.DataFrame(
+            {"coq_word_label_1": options.cfg.query_list,
+             "coquery_invisible_corpus_id": range(
+                 len(options.cfg.query_list))})
+
+    def aggregate_data(self):
+        pass
+
+    def translate_header(self, header):
+        return header
+
+
+class TestRunJob(CoqTestCase):
+    def setUp(self):
+        options.cfg = argparse.Namespace()
+        options.cfg.corpus = "Test"
+        options.cfg.MODE = QUERY_MODE_TOKENS
+        options.cfg.query_list = []
+        options.cfg.selected_features = ["word_label"]
+        options.cfg.filter_list = []
+        options.cfg.summary_groups = []
+        options.cfg.current_connection = Connection("test")
+        self.server = QueryServer(port=0)
+
+    def tearDown(self):
+        self.server.server_close()
+
+    def test_run_jobs_same_corpus(self):
+        job1 = {"queries": ["a*", "b*"],
+                "mode": "FREQ",
+                "features": ["word_label", "source_genre"],
+                "filters": [{"feature": "coq_word_label_1",
+                             "operator": OP_EQ,
+                             "value": "a"}]}
+        job2 = {"queries": "c"}
+
+        with mock.patch("coquery.session.SessionCommandLine",
+                        MockSession), \
+                mock.patch.object(options.cfg.current_connection,
+                                  "find_resource", return_value=True):
+            columns1, df1 = self.server.run_job(job1)
+            columns2, df2 = self.server.run_job(job2)
+
+        self.assertEqual(len(self.server._sessions), 1)
+        session = list(self.server._sessions.values())[0]
+        self.assertIsInstance(session, MockSession)
+        self.assertEqual(session.prepared, 2)
+        self.assertEqual(self.server.jobs, 2)
+
+        settings1, settings2 = session.settings
+        self.assertEqual(settings1["query_list"], ["a*", "b*"])
+        self.assertEqual(settings1["MODE"], QUERY_MODE_FREQUENCIES)
+        self.assertEqual(settings1["selected_features"],
+                         ["word_label", "source_genre"])
+        self.assertEqual(len(settings1["filter_list"]), 1)
+
+        # the settings of the first job are not used by the second job:
+        self.assertEqual(settings2["query_list"], ["c"])
+        self.assertEqual(settings2["MODE"], QUERY_MODE_TOKENS)
+        self.assertEqual(settings2["selected_features"], ["word_label"])
+        self.assertEqual(settings2["filter_list"], [])
+        self.assertEqual(settings2["corpus"], "Test")
+
+        self.assertListEqual(columns1, ["coq_word_label_1"])
+        self.assertListEqual(df1["coq_word_label_1"].tolist(), ["a*", "b*"])
+        self.assertListEqual(df2["coq_word_label_1"].tolist(), ["c"])
+
+
+class TestJobOptions(CoqTestCase):
+    def setUp(self):
+        self.defaults = {"corpus": "Test",
+                         "MODE": QUERY_MODE_TOKENS,
+                         "query_list": [],
+                         "selected_features": ["word_label"],
+                         "filter_list": []}
+
+    def test_defaults(self):
+        d = get_job_options({"queries": "a*"}, self.defaults)
+        self.assertEqual(d["query_list"], ["a*"])
+        self.assertEqual(d["corpus"], "Test")
+        self.assertEqual(d["MODE"], QUERY_MODE_TOKENS)
+        self.assertEqual(d["selected_features"], ["word_label"])
+
+    def test_job_settings(self):
+        job = {"queries": ["a*", "b*"],
+               "corpus": "Other",
+               "mode": "FREQ",
+               "features": ["word_label", "source_genre"]}
+        d = get_job_options(job, self.defaults)
+        self.assertEqual(d["query_list"], ["a*", "b*"])
+        self.assertEqual(d["corpus"], "Other")
+        self.assertEqual(d["MODE"], QUERY_MODE_FREQUENCIES)
+        self.assertEqual(d["selected_features"],
+                         ["word_label", "source_genre"])
+        # the defaults are not changed:
+        self.assertEqual(self.defaults["corpus"], "Test")
+
+    def test_filters(self):
+        filt = Filter("coq_word_label_1", object, OP_EQ, "a")
+        job = {"queries": "a*",
+               "filters": [{"feature": "coq_word_label_1",
+                            "operator": OP_EQ,
+                            "value": "a"},
+                           repr(filt)]}
+        d = get_job_options(job, self.defaults)
+        self.assertEqual(len(d["filter_list"]), 2)
+        for x in d["filter_list"]:
+            self.assertEqual(x.feature, "coq_word_label_1")
+            self.assertEqual(x.operator, OP_EQ)
+            self.assertEqual(x.value, "a")
+
+    def test_invalid_jobs(self):
+        for job in ([], {}, {"queries": [1]},
+                    {"queries": "a*", "mode": "UNKNOWN"},
+                    {"queries": "a*", "filters": [{"feature": "x"}]}):
+            with self.assertRaises(JobError):
+                get_job_options(job, self.defaults)
+
+        defaults = dict(self.defaults, corpus=None)
+        with self.assertRaises(JobError):
+            get_job_options({"queries": "a*"}, defaults)
+
+
+class TestMessages(CoqTestCase):
+    def test_iter_messages(self):
+        df = pd.DataFrame({"a": pd.array([1, None, 3], dtype="Int64"),
+                           "b": [0.5, np.nan, 1.5]})
+        messages = list(iter_messages(["A", "B"], df, chunk_size=2))
+        self.assertDictEqual(messages[0], {"columns": ["A", "B"]})
+        self.assertDictEqual(messages[1], {"rows": [[1, 0.5], [None, None]]})
+        self.assertDictEqual(messages[2], {"rows": [[3, 1.5]]})
+        self.assertDictEqual(messages[3], {"done": True, "rows": 3})
+        json.dumps(messages)
+
+    def test_iter_messages_empty(self):
+        df = pd.DataFrame({"a": []})
+        messages = list(iter_messages(["A"], df))
+        self.assertListEqual(messages, [{"columns": ["A"]},
+                                        {"done": True, "rows": 0}])
+
+
+provided_tests = [TestServer, TestRunJob, TestJobOptions, TestMessages]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@ from __future__ import print_function
 import argparse
 import os
 import warnings
+import numpy as np
 import pandas as pd
 
 from coquery.coquery import options
@@ -66,7 +67,7 @@ class TestSessionInputFile(CoqTestCase):
         self.assertListEqual(session.header, [])
         self.assertEqual(options.cfg.query_label,
                          d["header"][options.cfg.query_column_number])
-        self.assertListEqual(session.query_list, [])
+        self.assertListEqual(list(session.iter_queries()), [])
 
     def test_input_file_session_init_simple_file(self):
         options.cfg.file_has_headers = True
@@ -88,10 +89,10 @@ class TestSessionInputFile(CoqTestCase):
         self.assertEqual(options.cfg.query_label,
                          d["header"][options.cfg.query_column_number - 1])
 
-        self.assertEqual(len(session.query_list),
+        self.assertEqual(session.count_queries(),
                          len(d.get("queries", [])))
         self.assertListEqual(
-            [x.query_string for x in session.query_list],
+            [x.query_string for x in session.iter_queries()],
             d.get("queries", []))
 
     def test_input_file_session_init_query_space(self):
@@ -114,10 +115,10 @@ class TestSessionInputFile(CoqTestCase):
         self.assertEqual(options.cfg.query_label,
                          d["header"][options.cfg.query_column_number - 1])
 
-        self.assertEqual(len(session.query_list),
+        self.assertEqual(session.count_queries(),
                          len(d.get("queries", [])))
         self.assertListEqual(
-            [x.query_string for x in session.query_list],
+            [x.query_string for x in session.iter_queries()],
             d.get("queries", []))
 
     def test_input_file_session_init_header_and_content(self):
@@ -141,9 +142,9 @@ class TestSessionInputFile(CoqTestCase):
         self.assertListEqual(session.header, [])
         self.assertEqual(options.cfg.query_label,
                          d["header"][options.cfg.query_column_number - 1])
-        self.assertEqual(len(session.query_list), len(queries))
+        self.assertEqual(session.count_queries(), len(queries))
         self.assertListEqual(
-            [x.query_string for x in session.query_list], queries)
+            [x.query_string for x in session.iter_queries()], queries)
 
     def test_input_file_session_init_complex_file(self):
         options.cfg.file_has_headers = True
@@ -165,9 +166,34 @@ class TestSessionInputFile(CoqTestCase):
         self.assertListEqual(session.header, ["DATA1", "DATA2"])
         self.assertEqual(options.cfg.query_label,
                          d["header"][options.cfg.query_column_number - 1])
-        self.assertEqual(len(session.query_list), len(queries))
+        self.assertEqual(session.count_queries(), len(queries))
         self.assertListEqual(
-            [x.query_string for x in session.query_list], queries)
+            [x.query_string for x in session.iter_queries()], queries)
+
+    def test_input_file_session_input_values(self):
+        options.cfg.file_has_headers = True
+        options.cfg.query_column_number = 2
+        options.cfg.skip_lines = 1
+
+        d = {"header": ["DATA1", "QUERY", "DATA2"],
+             "queries": ["a,QUERY1,b", "c,QUERY2,d", "e,QUERY3,f"]}
+
+        write_to_temp_file(options.cfg.input_path, d)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            session = SessionInputFile()
+
+        session.prepare_queries()
+        queries = list(session.iter_queries())
+
+        self.assertListEqual(session.input_columns,
+                             ["coq_DATA1", "coq_DATA2"])
+        self.assertListEqual([x.query_string for x in queries],
+                             ["QUERY2", "QUERY3"])
+        self.assertListEqual([x.input_values for x in queries],
+                             [("c", "d"), ("e", "f")])
+        self.assertEqual(session.count_queries(), 2)
 
     def test_issue249(self):
         options.cfg.file_has_headers = True
@@ -410,6 +436,8 @@ class TestSessionQueries(CoqTestCase):
         options.cfg.verbose = False
         options.cfg.stopword_list = []
         options.cfg.drop_on_na = False
+        options.cfg.categorical_columns = False
+        options.cfg.query_case_sensitive = False
         options.cfg.sample_matches = False
         options.cfg.output_path = None
         options.cfg.output_separator = ","
@@ -441,6 +469,50 @@ class TestSessionQueries(CoqTestCase):
 
         pd.testing.assert_frame_equal(df1, df2)
 
+    def test_finalize_table_column_kinds(self):
+        class MockTypedResource(MockResource):
+            @classmethod
+            def get_feature_types(cls):
+                return {"corpus_word": "VARCHAR(20)",
+                        "corpus_x32": "MEDIUMINT"}
+
+        session = SessionCommandLine()
+        session.Resource = MockTypedResource
+        session.data_table = pd.DataFrame(
+            {"coq_corpus_word_1": ["1", None, "3"],
+             "coq_corpus_x32_1": [1.0, np.nan, 3.0],
+             "coquery_invisible_corpus_id": [10, 20, 30]})
+        self.assertDictEqual(
+            session.get_column_kinds(list(session.data_table.columns)),
+            {"coq_corpus_word_1": "str", "coq_corpus_x32_1": "int"})
+
+        session.finalize_table()
+        df = session.data_table
+        self.assertEqual(df["coq_corpus_word_1"].dtype, object)
+        self.assertIs(df["coq_corpus_word_1"][1], pd.NA)
+        self.assertEqual(df["coq_corpus_x32_1"].dtype, pd.Int64Dtype())
+        self.assertEqual(df["coquery_invisible_corpus_id"].dtype,
+                         pd.Int64Dtype())
+
+    def test_finalize_table_categorical(self):
+        class MockTypedResource(MockResource):
+            @classmethod
+            def get_feature_types(cls):
+                return {"corpus_word": "VARCHAR(20)"}
+
+        options.cfg.categorical_columns = True
+        session = SessionCommandLine()
+        session.Resource = MockTypedResource
+        session.data_table = pd.DataFrame(
+            {"coq_corpus_word_1": ["b", "a", "b", "a", None, "b"],
+             "coquery_invisible_corpus_id": [1, 2, 3, 4, 5, 6]})
+
+        session.finalize_table()
+        S = session.data_table["coq_corpus_word_1"]
+        self.assertIsInstance(S.dtype, pd.CategoricalDtype)
+        self.assertListEqual(list(S.cat.categories), ["a", "b"])
+        self.assertTrue(pd.isna(S[4]))
+
     # def test_finalize_table(self):
     #     """
     #     This test asserts that a data table containing mixed-type columns (as
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the sound module.
+
+Run it like so:
+
+coquery$ python -m test.test_sound
+
+"""
+
+from __future__ import unicode_literals
+
+import io
+import os
+import wave
+
+import numpy as np
+
+from coquery.sound import Sound, AudioReader, open_audio, _audio_cache
+
+from test.testcase import CoqTestCase, run_tests, tmp_filename
+
+
+FRAMERATE = 100
+
+
+def make_wav(samples, channels=1, samplewidth=2, framerate=FRAMERATE):
+    buffer = io.BytesIO()
+    output = wave.open(buffer, "wb")
+    output.setnchannels(channels)
+    output.setsampwidth(samplewidth)
+    output.setframerate(framerate)
+    output.writeframes(
+        np.asarray(samples, dtype="<i{}".format(samplewidth)).tobytes())
+    output.close()
+    return buffer.getvalue()
+
+
+def make_sph(data, coding="pcm", byte_format="01", sample_n_bytes=2,
+             channels=1):
+    fields = ["NIST_1A", "   1024",
+              "sample_rate -i {}".format(FRAMERATE),
+              "channel_count -i {}".format(channels),
+              "sample_n_bytes -i {}".format(sample_n_bytes),
+              "sample_count -i {}".format(len(data) // sample_n_bytes //
+                                          channels),
+              "sample_byte_format -s2 {}".format(byte_format),
+              "sample_coding -s{} {}".format(len(coding), coding),
+              "end_head"]
+    header = "\n".join(fields).encode("ascii") + b"\n"
+    return header.ljust(1024, b" ") + data
+
+
+class TestSound(CoqTestCase):
+    samples = np.arange(-500, 500, 2, dtype=np.int16)
+
+    def setUp(self):
+        self.path = tmp_filename()
+        with open(self.path, "wb") as f:
+            f.write(make_wav(self.samples))
+
+    def tearDown(self):
+        _audio_cache.clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_read_file(self):
+        sound = Sound(self.path)
+        self.assertEqual(sound.framerate, FRAMERATE)
+        self.assertEqual(sound.channels, 1)
+        self.assertEqual(sound.samplewidth, 2)
+        self.assertEqual(len(sound), len(self.samples))
+        self.assertEqual(sound.duration(), len(self.samples) / FRAMERATE)
+        np.testing.assert_array_equal(sound.astype(np.int32), self.samples)
+
+    def test_read_range(self):
+        sound = Sound(self.path, start=1, end=2.5)
+        self.assertEqual(len(sound), 150)
+        np.testing.assert_array_equal(sound.samples(),
+                                      self.samples[100:250])
+        self.assertEqual(bytes(sound.raw), self.samples[100:250].tobytes())
+
+    def test_read_bytes_and_stream(self):
+        content = make_wav(self.samples)
+        for source in (content, io.BytesIO(content)):
+            np.testing.assert_array_equal(Sound(source).samples(),
+                                          self.samples)
+
+    def test_samples_are_views(self):
+        sound = Sound(self.path)
+        samples = sound.samples()
+        self.assertFalse(samples.flags.owndata)
+        self.assertFalse(samples.flags.writeable)
+
+    def test_extract_sound(self):
+        sound = Sound(self.path, start=1)
+        part = sound.extract_sound(0.5, 1.5)
+        self.assertIs(part.audio, sound.audio)
+        np.testing.assert_array_equal(part.samples(),
+                                      self.samples[150:250])
+        # extracting until the end of the sound:
+        part = sound.extract_sound(3)
+        np.testing.assert_array_equal(part.samples(),
+                                      self.samples[400:])
+
+    def test_write(self):
+        target = io.BytesIO()
+        Sound(self.path).write(target, 1, 2)
+        target.seek(0)
+        np.testing.assert_array_equal(Sound(target).samples(),
+                                      self.samples[100:200])
+
+    def test_stereo(self):
+        samples = np.array([[1, -1], [2, -4], [3, 5]])
+        sound = Sound(make_wav(samples, channels=2))
+        self.assertEqual(len(sound), 3)
+        np.testing.assert_array_equal(sound.channel_samples(), samples)
+        # the channels are mixed down for the waveform and the spectrogram:
+        self.assertEqual(sound.samples().shape, (3,))
+        np.testing.assert_array_equal(sound.astype(np.int32), [0, -1, 4])
+        np.testing.assert_array_equal(
+            sound.extract_sound(0.01).channel_samples(), samples[1:])
+
+    def test_channel_samples_mono(self):
+        sound = Sound(self.path, end=0.1)
+        np.testing.assert_array_equal(sound.channel_samples(),
+                                      self.samples[:10].reshape(-1, 1))
+
+    def test_unsigned_8bit(self):
+        sound = Sound(make_wav([0, 128, 255], samplewidth=1))
+        np.testing.assert_array_equal(sound.samples(), [-128, 0, 127])
+
+    def test_invalid(self):
+        with self.assertRaises(TypeError):
+            Sound(b"not a sound file")
+        with self.assertRaises(IOError):
+            Sound(self.path + ".missing")
+        self.assertIsNone(AudioReader.read(b""))
+
+    def test_open_audio_cache(self):
+        audio = open_audio(self.path)
+        self.assertIs(open_audio(self.path), audio)
+
+        # changed files are read again:
+        with open(self.path, "wb") as f:
+            f.write(make_wav(self.samples[:10]))
+        audio = open_audio(self.path)
+        self.assertEqual(audio.n_frames, 10)
+
+
+class TestSphere(CoqTestCase):
+    samples = np.array([0, 1000, -1000, 32767, -32768], dtype=np.int16)
+
+    def test_pcm(self):
+        sound = Sound(make_sph(self.samples.astype("<i2").tobytes()))
+        self.assertEqual(sound.framerate, FRAMERATE)
+        np.testing.assert_array_equal(sound.samples(), self.samples)
+
+    def test_pcm_big_endian(self):
+        sound = Sound(make_sph(self.samples.astype(">i2").tobytes(),
+                               byte_format="10"))
+        np.testing.assert_array_equal(sound.samples(), self.samples)
+        # WAV frames are little-endian:
+        self.assertEqual(bytes(sound.raw),
+                         self.samples.astype("<i2").tobytes())
+
+    def test_ulaw(self):
+        # 0xFF and 0x7F are zero, 0x80 and 0x00 are the extreme values:
+        sound = Sound(make_sph(bytes([0xFF, 0x7F, 0x80, 0x00, 0xEF]),
+                               coding="ulaw", sample_n_bytes=1))
+        self.assertEqual(sound.samplewidth, 2)
+        np.testing.assert_array_equal(sound.samples(),
+                                      [0, 0, 32124, -32124, 132])
+
+    def test_stereo_extract(self):
+        data = np.arange(20, dtype="<i2")
+        sound = Sound(make_sph(data.tobytes(), channels=2))
+        part = sound.extract_sound(0.02, 0.04)
+        np.testing.assert_array_equal(part.channel_samples(),
+                                      data.reshape(-1, 2)[2:4])
+
+    def test_unsupported_coding(self):
+        with self.assertRaises(TypeError):
+            Sound(make_sph(b"\x00" * 10,
+                           coding="pcm,embedded-shorten-v2.00"))
+
+
+provided_tests = [TestSound, TestSphere]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the sqliteregexp module.
+
+Run it like so:
+
+coquery$ python -m test.test_sqliteregexp
+
+"""
+
+from __future__ import unicode_literals
+
+import sqlite3
+
+from coquery import sqliteregexp
+
+from test.testcase import CoqTestCase, run_tests
+
+
+class TestSQLiteRegexp(CoqTestCase):
+    def setUp(self):
+        sqliteregexp.clear_cache()
+
+    def test_compile_pattern_cached(self):
+        pat1 = sqliteregexp.compile_pattern("walk.*")
+        pat2 = sqliteregexp.compile_pattern("walk.*")
+        pat3 = sqliteregexp.compile_pattern("walk.*", case_sensitive=True)
+        self.assertIs(pat1, pat2)
+        self.assertIsNot(pat1, pat3)
+
+    def test_regexp_function(self):
+        func = sqliteregexp.get_regexp_function()
+        self.assertTrue(func("^walk", "Walked"))
+        self.assertFalse(func("^walk", "talked"))
+        self.assertFalse(func("^walk", None))
+        self.assertTrue(func("^\\d+$", 123))
+
+    def test_regexp_function_case_sensitive(self):
+        func = sqliteregexp.get_regexp_function(case_sensitive=True)
+        self.assertFalse(func("^walk", "Walked"))
+        self.assertTrue(func("^Walk", "Walked"))
+
+    def test_register(self):
+        con = sqlite3.connect(":memory:")
+        sqliteregexp.register(con)
+        con.execute("CREATE TABLE Lexicon (WordId INT, Word TEXT)")
+        con.executemany("INSERT INTO Lexicon VALUES (?, ?)",
+                        [(1, "walk"), (2, "Walked"), (3, "talk"),
+                         (4, None)])
+        rows = con.execute(
+            "SELECT WordId FROM Lexicon WHERE Word REGEXP ? "
+            "ORDER BY WordId", ("^walk",)).fetchall()
+        self.assertListEqual(rows, [(1,), (2,)])
+        con.close()
+
+
+provided_tests = [
+    TestSQLiteRegexp,
+]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests that the command-line program can be started without
+loading the modules that are only needed by the GUI or by some functions.
+
+Run it like so:
+
+coquery$ python -m test.test_startup
+
+"""
+
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import sys
+
+from test.testcase import CoqTestCase, run_tests
+
+# These modules take a long time to import, and are not needed to run
+# queries from the command line:
+HEAVY_MODULES = ("PyQt5", "matplotlib", "seaborn", "scipy")
+
+SCRIPT = """
+import sys
+import time
+t0 = time.perf_counter()
+import coquery.coquery
+import coquery.session
+print(time.perf_counter() - t0)
+print(",".join(sorted(set(name.partition(".")[0] for name in sys.modules))))
+"""
+
+
+class TestStartup(CoqTestCase):
+    def test_no_heavy_imports(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [root] + [x for x in [env.get("PYTHONPATH")] if x])
+        output = subprocess.check_output(
+            [sys.executable, "-c", SCRIPT], env=env, cwd=root,
+            universal_newlines=True)
+        duration, modules = output.strip().splitlines()[-2:]
+        modules = modules.split(",")
+
+        for name in HEAVY_MODULES:
+            self.assertNotIn(name, modules,
+                             "'{}' imported at startup ({:.2f}s)".format(
+                                 name, float(duration)))
+
+
+provided_tests = [TestStartup]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
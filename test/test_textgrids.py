@@ -5,7 +5,12 @@
 from __future__ import print_function
 
 import argparse
+import os
+import shutil
 import tempfile
+import wave
+
+import numpy as np
 import pandas as pd
 
 from coquery import options
@@ -13,8 +18,10 @@ from coquery.corpus import CorpusClass, SQLResource
 from coquery.general import has_module
 from coquery.connections import SQLiteConnection
 from coquery.defines import QUERY_MODE_TOKENS
+from coquery.export import ExportCancelled
 
 if has_module("tgt"):
+    import tgt
     from coquery import textgrids
 
 from test.testcase import CoqTestCase, run_tests
@@ -248,8 +255,185 @@ class TestTextGridModuleMethods(CoqTestCase):
         self.assertEqual(interval3.end_time, 8.5)
         self.assertEqual(interval3.text, "boat")
 
+    def test_fill_grids_one_grid_per_match(self):
+        options.cfg.selected_features = self.selected_features2
+        writer = textgrids.TextgridWriter(self.df2, self.session)
+        grids = writer.fill_grids(one_grid_per_match=True)
+        self.assertEqual(len(grids), 5)
+
+        tier = grids[("File2.txt", 4)].tiers[0]
+        self.assertEqual(len(tier.intervals), 1)
+        self.assertEqual(tier.intervals[0].text, "tiny")
 
-provided_tests = [TestTextGridModuleMethods]
+    def test_collect_grids_text(self):
+        # the serialized grids are identical to the grids written by tgt:
+        options.cfg.selected_features = self.selected_features2
+        for kwargs in [dict(),
+                       dict(sound_path="sounds", left_padding=0.5,
+                            right_padding=0.25),
+                       dict(one_grid_per_match=True, sound_path="sounds",
+                            remember_time=True)]:
+            writer = textgrids.TextgridWriter(self.df2, self.session)
+            grids = writer.collect_grids(**kwargs)
+            for grid_id, data in grids.items():
+                text = data.to_text()
+                self.assertEqual(
+                    text,
+                    tgt.io.export_to_short_textgrid(data.to_textgrid()))
+
+
+class TestIntervalArrays(CoqTestCase):
+    def setUp(self):
+        if not has_module("tgt"):
+            self.skipTest("Module 'tgt' not available.")
+
+    def test_remove_overlaps(self):
+        starts = np.array([0, 1, 2, 0.5, 3])
+        ends = np.array([1, 2, 3, 1.5, 2.5])
+        mask = textgrids.remove_overlaps(starts, ends)
+        # the interval that overlaps with earlier intervals and the
+        # interval that ends before it starts are dropped:
+        self.assertListEqual(list(mask), [True, True, True, False, False])
+
+    def test_remove_overlaps_insertion_order(self):
+        # the first interval is kept, even though a later interval starts
+        # earlier:
+        starts = np.array([1, 0, 2])
+        ends = np.array([3, 2, 2.5])
+        mask = textgrids.remove_overlaps(starts, ends)
+        self.assertListEqual(list(mask), [True, False, False])
+
+        # a later interval is kept if the overlapping one was dropped:
+        starts = np.array([0, 0.5, 1])
+        ends = np.array([1, 1.5, 2])
+        mask = textgrids.remove_overlaps(starts, ends)
+        self.assertListEqual(list(mask), [True, False, True])
+
+    def test_remove_overlaps_precision(self):
+        # intervals that overlap by less than the time precision are
+        # considered to be adjacent:
+        starts = np.array([0, 0.99999])
+        ends = np.array([1, 2])
+        mask = textgrids.remove_overlaps(starts, ends)
+        self.assertListEqual(list(mask), [True, True])
+
+    def test_fill_gaps(self):
+        starts, ends, labels = textgrids.fill_gaps(
+            np.array([1, 2]), np.array([2, 3]),
+            np.array(["a", "b"], dtype=object), 0, 4)
+        self.assertListEqual(list(starts), [0, 1, 2, 3])
+        self.assertListEqual(list(ends), [1, 2, 3, 4])
+        self.assertListEqual(list(labels), ["", "a", "b", ""])
+
+    def test_grid_data(self):
+        grid = tgt.TextGrid()
+        grid.add_tier(tgt.IntervalTier(name="word"))
+        grid.add_tier(tgt.IntervalTier(name="empty"))
+        data = textgrids.GridData(grid)
+        data.add_intervals("word", np.array([2.0]), np.array([3.0]),
+                           np.array(['say "hi"'], dtype=object), 3.5)
+        data.add_intervals("word", np.array([0.5, 2.5]),
+                           np.array([1.0, 4.0]),
+                           np.array(["a", "b"], dtype=object), 4.0)
+        self.assertEqual(data.end_time, 4.0)
+
+        text = data.to_text()
+        grid = data.to_textgrid()
+        self.assertEqual(text, tgt.io.export_to_short_textgrid(grid))
+        tier = grid.get_tier_by_name("word")
+        self.assertListEqual([x.text for x in tier.intervals],
+                             ["a", 'say "hi"'])
+        self.assertEqual(tier.end_time, 4.0)
+
+
+class TestTextGridWriter(CoqTestCase):
+    framerate = 100
+
+    def setUp(self):
+        # use the resource and the data frames from the module tests:
+        TestTextGridModuleMethods.setUp(self)
+        options.cfg.selected_features = self.selected_features2
+        self.resource.audio_features = ["file_name"]
+        self.output_path = tempfile.mkdtemp()
+        self.sound_path = tempfile.mkdtemp()
+        for name, duration in (("File1", 10), ("File2", 20)):
+            output = wave.open(os.path.join(self.sound_path,
+                                            "{}.wav".format(name)), "wb")
+            output.setnchannels(1)
+            output.setsampwidth(2)
+            output.setframerate(self.framerate)
+            output.writeframes(
+                np.arange(duration * self.framerate,
+                          dtype="<i2").tobytes())
+            output.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_path)
+        shutil.rmtree(self.sound_path)
+
+    def write_grids(self, writer, sound_path=""):
+        writer.write_grids(self.output_path, columns=None,
+                           one_grid_per_match=False,
+                           sound_path=sound_path,
+                           left_padding=0, right_padding=0,
+                           remember_time=False, file_prefix="coq_")
+
+    def read_wav(self, name):
+        wav = wave.open(os.path.join(self.output_path, name), "rb")
+        frames = np.frombuffer(wav.readframes(wav.getnframes()),
+                               dtype="<i2")
+        wav.close()
+        return frames
+
+    def check_output(self, writer):
+        self.assertEqual(writer.n, 2)
+        self.assertEqual(writer.n_snippets, 2)
+        self.assertListEqual(
+            sorted(os.listdir(self.output_path)),
+            ["coq_File1.TextGrid", "coq_File1.wav",
+             "coq_File2.TextGrid", "coq_File2.wav"])
+
+        # the snippets span the matches from the respective files:
+        frames = self.read_wav("coq_File1.wav")
+        self.assertEqual(frames[0], 4 * self.framerate)
+        self.assertEqual(len(frames), 1.5 * self.framerate)
+        frames = self.read_wav("coq_File2.wav")
+        self.assertEqual(frames[0], 4 * self.framerate)
+        self.assertEqual(len(frames), 4.5 * self.framerate)
+
+    def test_write_grids(self):
+        progress = []
+        writer = textgrids.TextgridWriter(
+            self.df2, self.session, workers=1,
+            progress=lambda n, total: progress.append((n, total)))
+        self.write_grids(writer, self.sound_path)
+        self.check_output(writer)
+        self.assertListEqual(progress, [(1, 2), (2, 2)])
+
+    def test_write_grids_worker_processes(self):
+        writer = textgrids.TextgridWriter(self.df2, self.session, workers=2)
+        self.write_grids(writer, self.sound_path)
+        self.check_output(writer)
+
+    def test_write_grids_without_sound(self):
+        writer = textgrids.TextgridWriter(self.df2, self.session, workers=1)
+        self.write_grids(writer)
+        self.assertEqual(writer.n, 2)
+        self.assertEqual(writer.n_snippets, 0)
+        self.assertListEqual(sorted(os.listdir(self.output_path)),
+                             ["coq_File1.TextGrid", "coq_File2.TextGrid"])
+
+    def test_cancel(self):
+        writer = textgrids.TextgridWriter(self.df2, self.session, workers=1)
+        writer.progress = lambda n, total: writer.cancel()
+        with self.assertRaises(ExportCancelled):
+            self.write_grids(writer, self.sound_path)
+        self.assertTrue(writer.cancelled)
+        self.assertEqual(writer.n, 1)
+
+
+provided_tests = [TestTextGridModuleMethods, TestIntervalArrays,
+                  TestTextGridWriter]
 
 
 def main():
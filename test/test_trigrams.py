@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the trigrams module.
+
+Run it like so:
+
+coquery$ python -m test.test_trigrams
+
+"""
+
+from __future__ import unicode_literals
+
+import re
+
+from coquery.trigrams import (
+    get_trigrams, get_wildcard_segments, get_regex_segments,
+    get_pattern_trigrams)
+
+from test.testcase import CoqTestCase, run_tests
+
+
+class TestTrigrams(CoqTestCase):
+    def test_get_trigrams(self):
+        self.assertSetEqual(get_trigrams("Walk"), {"wal", "alk"})
+        self.assertSetEqual(get_trigrams("ab"), set())
+        self.assertSetEqual(get_trigrams(None), set())
+
+    def test_wildcard_segments(self):
+        self.assertListEqual(get_wildcard_segments("*tion*"), ["tion"])
+        self.assertListEqual(get_wildcard_segments("a?cde*fgh"),
+                             ["a", "cde", "fgh"])
+        self.assertListEqual(get_wildcard_segments("ab\\*cd*"), ["ab*cd"])
+
+    def test_regex_segments(self):
+        self.assertListEqual(get_regex_segments("^walk(s|ed)?$"), ["walk"])
+        self.assertListEqual(get_regex_segments("colou?r"), ["colo", "r"])
+        self.assertListEqual(get_regex_segments("ab+c"), ["ab", "c"])
+        self.assertListEqual(get_regex_segments("[aeiou]tion"), ["tion"])
+        self.assertListEqual(get_regex_segments("a\\.bc\\w"), ["a.bc"])
+        self.assertListEqual(get_regex_segments("walk|talk"), [])
+
+    def test_regex_character_classes(self):
+        # a ']' directly after '[' or '[^' is part of the class:
+        self.assertListEqual(get_regex_segments("x[^]abc]yz"), ["x", "yz"])
+        self.assertListEqual(get_regex_segments("x[]abc]yz"), ["x", "yz"])
+        # escaped brackets don't close the class:
+        self.assertListEqual(get_regex_segments("x[a\\]bcd]yz"),
+                             ["x", "yz"])
+        # parentheses in a class within a group don't close the group:
+        self.assertListEqual(get_regex_segments("(a[)]bcd)?xyz"), ["xyz"])
+        # classes that are not closed can't be analyzed:
+        self.assertListEqual(get_regex_segments("abcd[efg"), [])
+
+    def test_regex_character_classes_match(self):
+        for pattern, s in [("x[^]abc]yz", "xqyz"), ("x[a\\]bcd]yz", "xbyz"),
+                           ("(a[)]bcd)?xyz", "xyz")]:
+            self.assertIsNotNone(re.search(pattern, s))
+            self.assertTrue(get_pattern_trigrams(pattern, regexp=True) <=
+                            get_trigrams(s))
+
+    def test_pattern_trigrams(self):
+        self.assertSetEqual(get_pattern_trigrams("*tion*"),
+                            {"tio", "ion"})
+        self.assertSetEqual(get_pattern_trigrams("*ab*"), set())
+        self.assertSetEqual(get_pattern_trigrams("Nation.*", regexp=True),
+                            {"nat", "ati", "tio", "ion"})
+
+
+provided_tests = [
+    TestTrigrams,
+]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the uniques module.
+
+Run it like so:
+
+coquery$ python -m test.test_uniques
+
+"""
+
+from __future__ import unicode_literals
+
+import sqlalchemy
+
+from coquery.uniques import (UniqueValues, escape_like,
+                             ORDER_FREQUENCY, FREQUENCY_COLUMN)
+
+from test.testcase import CoqTestCase, run_tests
+
+
+class TestUniqueValues(CoqTestCase):
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine("sqlite://")
+        words = ["walk", "talk", "walk", "walked", "w_lk", None, "talk",
+                 "walk", "balk"]
+        with self.engine.connect() as connection:
+            connection.execute("CREATE TABLE Lexicon (Word TEXT)")
+            for word in words:
+                connection.execute(
+                    sqlalchemy.text("INSERT INTO Lexicon VALUES (:word)"),
+                    {"word": word})
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_escape_like(self):
+        self.assertEqual(escape_like("50%_!"), "50!%!_!!")
+
+    def test_count(self):
+        values = UniqueValues(self.engine, "Lexicon", "Word")
+        self.assertEqual(values.count(), 5)
+        values = UniqueValues(self.engine, "Lexicon", "Word", uniques=False)
+        self.assertEqual(values.count(), 9)
+
+    def test_count_prefix(self):
+        values = UniqueValues(self.engine, "Lexicon", "Word", prefix="wa")
+        self.assertEqual(values.count(), 2)
+        # underscores are not treated as wildcards:
+        values.prefix = "w_"
+        self.assertEqual(values.count(), 1)
+
+    def test_keyset_pages(self):
+        values = UniqueValues(self.engine, "Lexicon", "Word", page_size=2)
+        pages = [list(df["Word"]) for df in values.iter_pages()]
+        self.assertListEqual(pages, [["balk", "talk"],
+                                     ["w_lk", "walk"],
+                                     ["walked"]])
+
+    def test_keyset_pages_descending(self):
+        values = UniqueValues(self.engine, "Lexicon", "Word", page_size=2)
+        values.set_order("value", ascending=False)
+        page = values.get_page(after="walk")
+        self.assertListEqual(list(page["Word"]), ["w_lk", "talk"])
+
+    def test_frequency_order(self):
+        values = UniqueValues(self.engine, "Lexicon", "Word", counts=True)
+        values.set_order(ORDER_FREQUENCY, ascending=False)
+        df = values.get_page(limit=2)
+        self.assertListEqual(list(df["Word"]), ["walk", "talk"])
+        self.assertListEqual(list(df[FREQUENCY_COLUMN]), [3, 2])
+        # pages are retrieved by offset:
+        df = values.get_page(after="talk", offset=2, limit=2)
+        self.assertListEqual(list(df["Word"]), ["balk", "w_lk"])
+
+    def test_all_entries(self):
+        values = UniqueValues(self.engine, "Lexicon", "Word", uniques=False,
+                              page_size=4)
+        pages = [len(df) for df in values.iter_pages()]
+        self.assertListEqual(pages, [4, 4, 1])
+
+
+provided_tests = [
+    TestUniqueValues,
+]
+
+
+def main():
+    run_tests(provided_tests)
+
+
+if __name__ == '__main__':
+    main()
@@ -164,6 +164,70 @@ class TestBarcodePlotAxisArguments(TestBarcodePlotArguments):
         self.assertDictEqual(ax_args, target)
 
 
+class TestBarcodePlotBinning(CoqTestCase):
+    def setUp(self):
+        from coquery.visualizer.barcodeplot import BarcodePlot
+
+        self.df = pd.DataFrame(
+            {"X": list("AAAABBBB"),
+             "Z": list("12121111"),
+             "ID": [0, 1, 2, 50, 3, 4, 60, 99]})
+        self.vis = BarcodePlot(None, None, "ID")
+        self.vis.x = "X"
+        self.vis.y = None
+        self.vis.z = "Z"
+
+    def test_get_bin_rows(self):
+        from coquery.visualizer.barcodeplot import get_bin_rows
+
+        # ten bins of width 10; rows 0 and 2 share bin, level and colour,
+        # rows 4 and 5 share bin and level:
+        rows, centers = get_bin_rows(
+            self.df["ID"],
+            pos=[0, 0, 0, 0, 1, 1, 1, 1],
+            codes=[0, 1, 0, 1, 0, 0, 0, 0],
+            size=100, resolution=10)
+        self.assertListEqual(list(rows), [0, 1, 3, 4, 6, 7])
+        np.testing.assert_array_equal(centers, [5, 5, 55, 5, 65, 95])
+
+    def test_get_binned_rows_cached(self):
+        levels = ["A", "B"]
+        params = self.vis.prepare_arguments(
+            data=self.df, x="X", y=None, z=None,
+            levels_x=levels, levels_y=None)
+        result = self.vis.get_binned_rows(self.df, params, z="Z")
+        self.assertIs(
+            self.vis.get_binned_rows(self.df.copy(), params, z="Z"), result)
+
+        # different data produces a new result:
+        df = self.df.assign(ID=self.df["ID"] + 1)
+        params["values"] = df["ID"]
+        self.assertIsNot(self.vis.get_binned_rows(df, params, z="Z"),
+                         result)
+
+    def test_get_binned_rows_sorted(self):
+        # ten bins of width 10, so that rows share bins:
+        self.vis.BIN_RESOLUTION = 10
+        self.vis.get_corpus_size = lambda values: 100
+        levels = ["A", "B"]
+
+        params = self.vis.prepare_arguments(
+            data=self.df, x="X", y=None, z=None,
+            levels_x=levels, levels_y=None)
+        rows, _ = self.vis.get_binned_rows(self.df, params, z="Z")
+        self.assertListEqual(list(self.df["ID"].iloc[rows]),
+                             [0, 1, 50, 3, 60, 99])
+
+        # the row positions cached for the original order are not used
+        # for the re-sorted data:
+        df = self.df.sort_values("ID", ascending=False)
+        params = self.vis.prepare_arguments(
+            data=df, x="X", y=None, z=None,
+            levels_x=levels, levels_y=None)
+        rows, _ = self.vis.get_binned_rows(df, params, z="Z")
+        self.assertListEqual(sorted(df["ID"].iloc[rows]),
+                             [1, 2, 4, 50, 60, 99])
+
 class TestHeatbarPlotArguments(CoqTestCase):
     NUM_COLUMN = "NUM"
 
@@ -238,6 +302,16 @@ class TestHeatbarPlotArguments(CoqTestCase):
                 increments[i],
                 self.vis.increment_bins(bins, 5 + p * 5, 5))
 
+    def test_get_heat_bins(self):
+        from coquery.visualizer.barcodeplot import get_heat_bins
+
+        np.random.seed(123)
+        values = np.random.randint(0, 1000, 500)
+        binned = np.zeros(34)
+        for i in values:
+            binned = self.vis.increment_bins(binned, i, 30)
+        np.testing.assert_array_equal(get_heat_bins(values, 30, 34), binned)
+
     def test_horizontal_no_subgroup(self):
         binned = np.zeros(10)
 
@@ -324,6 +398,7 @@ class TestHeatbarPlotArguments(CoqTestCase):
 provided_tests = (
     TestBarcodePlotArguments,
     TestBarcodePlotAxisArguments,
+    TestBarcodePlotBinning,
     TestHeatbarPlotArguments,
     )
 
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+This module tests the visualizer base module.
+
+Run it like so:
+
+coquery$ python -m test.vis.test_visualizer
+
+"""
+
+import unittest
+import pandas as pd
+import numpy as np
+import scipy.stats as st
+
+from test.testcase import CoqTestCase
+
+
+class TestAggregator(CoqTestCase):
+    def setUp(self):
+        from coquery.visualizer import visualizer as vis
+
+        self.vis = vis
+        vis.clear_cache()
+        np.random.seed(123)
+        self.df = pd.DataFrame(
+            {"X": list("AAAAAABBBB"),
+             "Z": list("qpqpxxzzyy"),
+             "NUM": np.random.randint(0, 100, 10)})
+
+    def test_mode(self):
+        aggregator = self.vis.Aggregator()
+        aggregator.add("Z", "mode", name="COL")
+        df = aggregator.process(self.df, ["X"])
+        # ties are resolved by taking the smallest value:
+        self.assertListEqual(list(df["COL"]), ["p", "y"])
+        self.assertListEqual(list(df.columns), ["X", "COL"])
+
+    def test_ci(self):
+        aggregator = self.vis.Aggregator()
+        aggregator.add("NUM", "mean", name="MEAN")
+        aggregator.add("NUM", "ci", name="CI")
+        df = aggregator.process(self.df, "X")
+
+        target = (self.df.groupby("X")["NUM"]
+                      .agg(lambda x: x.sem() * st.t.ppf(0.975, len(x))))
+        np.testing.assert_array_almost_equal(df["CI"], target.values)
+        np.testing.assert_array_almost_equal(
+            df["MEAN"], self.df.groupby("X")["NUM"].mean().values)
+
+    def test_id_column(self):
+        df = self.df.assign(coquery_invisible_corpus_id=range(10, 0, -1))
+        aggregator = self.vis.Aggregator()
+        aggregator.add("X", "count", name="COUNT")
+        df = aggregator.process(df, ["X"])
+        self.assertListEqual(list(df.columns),
+                             ["X", "COUNT", "coquery_invisible_corpus_id"])
+        self.assertListEqual(list(df["COUNT"]), [6, 4])
+        self.assertListEqual(list(df["coquery_invisible_corpus_id"]),
+                             [10, 4])
+
+    def test_shared_cache(self):
+        aggregator1 = self.vis.Aggregator()
+        aggregator1.add("NUM", "mean")
+        df1 = aggregator1.process(self.df, ["X"])
+        df1["NUM"] = 0
+
+        # another aggregator with the same aggregation on equal data
+        # returns the cached result, which is not affected by changes to
+        # the first result:
+        calls = []
+        aggregator2 = self.vis.Aggregator()
+        aggregator2.add("NUM", "mean")
+        aggregator2._aggregate = lambda *args: calls.append(args)
+        df2 = aggregator2.process(self.df.copy(), ["X"])
+        self.assertListEqual(calls, [])
+        self.assertListEqual(
+            list(df2["NUM"]), list(self.df.groupby("X")["NUM"].mean()))
+
+    def test_get_cached(self):
+        calls = []
+
+        def func(x):
+            calls.append(x)
+            return x * 2
+
+        self.assertEqual(
+            self.vis.get_cached(self.df, ["X"], ("test",), func, 1), 2)
+        self.assertEqual(
+            self.vis.get_cached(self.df, ["X"], ("test",), func, 1), 2)
+        self.assertListEqual(calls, [1])
+
+        # changing the data invalidates the cached value:
+        df = self.df.assign(X=list("AAAAABBBBB"))
+        self.vis.get_cached(df, ["X"], ("test",), func, 1)
+        self.assertListEqual(calls, [1, 1])
+
+        # columns that are not used don't affect the cached value:
+        df = self.df.assign(NUM=0)
+        self.vis.get_cached(df, ["X"], ("test",), func, 1)
+        self.assertListEqual(calls, [1, 1])
+
+    def test_get_cached_sorted(self):
+        calls = []
+
+        def func(df):
+            calls.append(len(calls))
+            return df.groupby("X")["Z"].first()
+
+        result = self.vis.get_cached(self.df, ["X", "Z"], ("first",),
+                                     func, self.df)
+        self.assertListEqual(list(result), ["q", "z"])
+
+        # the same rows in a different order produce a cache miss:
+        df = self.df.sort_values(["X", "Z"])
+        result = self.vis.get_cached(df, ["X", "Z"], ("first",), func, df)
+        self.assertListEqual(calls, [0, 1])
+        self.assertListEqual(list(result), ["p", "y"])
+
+
+provided_tests = (
+    TestAggregator,
+    )
+
+
+def main():
+    suite = unittest.TestSuite(
+        [unittest.TestLoader().loadTestsFromTestCase(x)
+         for x in provided_tests])
+    unittest.TextTestRunner().run(suite)
+
+
+if __name__ == '__main__':
+    main()